@@ -27,6 +27,7 @@ os.umask(022)
 from checks.check_status import CollectorStatus
 from checks.collector import Collector
 from config import (
+    _is_affirmative,
     get_config,
     get_parsed_args,
     get_system_stats,
@@ -43,7 +44,7 @@ from utils.flare import Flare
 from utils.configcheck import configcheck, sd_configcheck
 from utils.jmx import jmx_command
 from utils.pidfile import PidFile
-from utils.profile import AgentProfiler
+from utils.profile import AgentProfiler, SamplingProfiler
 from utils.service_discovery.config_stores import get_config_store
 from utils.service_discovery.sd_backend import get_sd_backend
 
@@ -78,6 +79,7 @@ class Agent(Daemon):
         self.check_frequency = None
         self.reload_configs_flag = False
         self.sd_backend = None
+        self.sampling_profiler = None
 
     def _handle_sigterm(self, signum, frame):
         """Handles SIGTERM and SIGINT, which gracefully stops the agent."""
@@ -98,17 +100,37 @@ class Agent(Daemon):
         log.info("SIGHUP caught! Scheduling configuration reload before next collection run.")
         self.reload_configs_flag = True
 
-    def reload_configs(self):
-        """Reloads the agent configuration and checksd configurations."""
-        log.info("Attempting a configuration reload...")
+    def _handle_sigusr2(self, signum, frame):
+        """Handles SIGUSR2, which starts the sampling profiler for a fixed window."""
+        log.info("SIGUSR2 caught! Starting the sampling profiler.")
+        if self.sampling_profiler:
+            self.sampling_profiler.start()
+
+    def reload_configs(self, checks_to_reload=None):
+        """Reloads the agent configuration and checksd configurations.
+        When `checks_to_reload` is given, only these checks are reloaded."""
+        if checks_to_reload is None:
+            log.info("Attempting a configuration reload...")
+        else:
+            log.info("Attempting a configuration reload of %s..." % ', '.join(sorted(checks_to_reload)))
 
         # Stop checks
         for check in self._checksd.get('initialized_checks', []):
-            check.stop()
+            if checks_to_reload is None or check.name in checks_to_reload:
+                check.stop()
 
         # Reload checksd configs
         hostname = get_hostname(self._agentConfig)
-        self._checksd = load_check_directory(self._agentConfig, hostname)
+        if checks_to_reload is None:
+            self._checksd = load_check_directory(self._agentConfig, hostname)
+        else:
+            checksd = load_check_directory(self._agentConfig, hostname, check_names=checks_to_reload)
+            checksd['initialized_checks'] += [check for check in self._checksd.get('initialized_checks', [])
+                                              if check.name not in checks_to_reload]
+            for check_name, failure in self._checksd.get('init_failed_checks', {}).iteritems():
+                if check_name not in checks_to_reload:
+                    checksd['init_failed_checks'].setdefault(check_name, failure)
+            self._checksd = checksd
 
         # Logging
         num_checks = len(self._checksd['initialized_checks'])
@@ -138,6 +160,9 @@ class Agent(Daemon):
         # A SIGHUP signals a configuration reload
         signal.signal(signal.SIGHUP, self._handle_sighup)
 
+        # A SIGUSR2 starts the sampling profiler
+        signal.signal(signal.SIGUSR2, self._handle_sigusr2)
+
         # Save the agent start-up stats.
         CollectorStatus().persist()
 
@@ -166,6 +191,14 @@ class Agent(Daemon):
         self.collector_profile_interval = self._agentConfig.get('collector_profile_interval',
                                                                 DEFAULT_COLLECTOR_PROFILE_INTERVAL)
 
+        # The sampling profiler can be started with a SIGUSR2, or right away from the config
+        self.sampling_profiler = SamplingProfiler(
+            output_path=self._agentConfig.get('sampling_profiler_output'),
+            duration=self._agentConfig.get('sampling_profiler_duration'),
+        )
+        if _is_affirmative(self._agentConfig.get('sampling_profiler', False)):
+            self.sampling_profiler.start()
+
         # Configure the watchdog.
         self.check_frequency = int(self._agentConfig['check_freq'])
         watchdog = self._get_watchdog(self.check_frequency)
@@ -189,19 +222,26 @@ class Agent(Daemon):
                     log.warn("Cannot enable profiler: %s" % str(e))
 
             if self.reload_configs_flag:
-                self.reload_configs()
+                if isinstance(self.reload_configs_flag, set):
+                    self.reload_configs(checks_to_reload=self.reload_configs_flag)
+                else:
+                    self.reload_configs()
 
             # Do the work. Pass `configs_reloaded` to let the collector know if it needs to
             # look for the AgentMetrics check and pop it out.
             self.collector.run(checksd=self._checksd,
                                start_event=self.start_event,
-                               configs_reloaded=self.reload_configs_flag)
+                               configs_reloaded=bool(self.reload_configs_flag))
 
             self.reload_configs_flag = False
 
+            # Close the sampling profiler window if it has elapsed
+            self.sampling_profiler.poll()
+
             # Look for change in the config template store.
             # The self.sd_backend.reload_check_configs flag is set
-            # to True if a config reload is needed.
+            # to True if a config reload is needed, or to the set of
+            # checks to reload when the templates are watched.
             if self._agentConfig.get('service_discovery') and self.sd_backend and \
                not self.sd_backend.reload_check_configs:
                 try:
@@ -215,7 +255,7 @@ class Agent(Daemon):
             # using ConfigStore.crawl_config_template
             if self._agentConfig.get('service_discovery') and self.sd_backend and \
                self.sd_backend.reload_check_configs:
-                self.reload_configs_flag = True
+                self.reload_configs_flag = self.sd_backend.reload_check_configs
                 self.sd_backend.reload_check_configs = False
 
             if profiled:
@@ -32,6 +32,16 @@ class UnknownValue(Exception):
     pass
 
 
+class TagSet(tuple):
+    """
+    A normalized (deduplicated and sorted) tag set, as used in metric contexts.
+
+    Normalize the tags of an entity once with `MetricsAggregator.tag_set` and reuse
+    the result for all its metrics: the aggregator skips the normalization for them.
+    """
+    __slots__ = ()
+
+
 class Metric(object):
     """
     A base metric class that accepts points, slices them into time intervals
@@ -873,6 +883,8 @@ class MetricsAggregator(Aggregator):
             utf8_decoding
         )
         self.metrics = {}
+        # Monotonic count of submitted points, used for check telemetry
+        self.submitted_points = 0
         self.metric_type_to_class = {
             'g': Gauge,
             'ct': Count,
@@ -890,22 +902,79 @@ class MetricsAggregator(Aggregator):
 
         # Keep hostname with empty string to unset it
         hostname = hostname if hostname is not None else self.hostname
+        self.submitted_points += 1
 
         if tags is None:
             context = (name, tuple(), hostname, device_name)
+        elif tags.__class__ is TagSet:
+            context = (name, tags, hostname, device_name)
         else:
             context = (name, tuple(sorted(set(tags))), hostname, device_name)
         if context not in self.metrics:
             metric_class = self.metric_type_to_class[mtype]
             self.metrics[context] = metric_class(self.formatter, name, tags,
                 hostname, device_name, self.metric_config.get(metric_class))
-        cur_time = time()
-        if timestamp is not None and cur_time - int(timestamp) > self.recent_point_threshold:
-            log.debug("Discarding %s - ts = %s , current ts = %s " % (name, timestamp, cur_time))
+        if timestamp is not None and self._is_too_old(timestamp):
+            log.debug("Discarding %s - ts = %s" % (name, timestamp))
             self.num_discarded_old_points += 1
         else:
             self.metrics[context].sample(value, sample_rate, timestamp)
 
+    def _is_too_old(self, timestamp):
+        return time() - int(timestamp) > self.recent_point_threshold
+
+    @staticmethod
+    def tag_set(tags):
+        """
+        Normalize `tags` once into a `TagSet`, to be reused for all the metrics
+        of an entity (container, VM...).
+        """
+        if tags is None or tags.__class__ is TagSet:
+            return tags
+        return TagSet(sorted(set(tags)))
+
+    def submit_metrics(self, metrics, mtype, tags=None, hostname=None,
+                       device_name=None, timestamp=None):
+        """
+        Bulk version of `submit_metric`: submit many `(name, value)` points of the
+        same type that share the same tags, hostname and device name.
+
+        The tags are normalized and the timestamp checked once for the whole batch.
+        `metrics` can be a dictionary or an iterable of `(name, value)` tuples.
+        """
+        hostname = hostname if hostname is not None else self.hostname
+        if isinstance(metrics, dict):
+            metrics = metrics.iteritems()
+
+        if tags is None:
+            context_tags = tuple()
+        else:
+            context_tags = tags = self.tag_set(tags)
+
+        if timestamp is not None and self._is_too_old(timestamp):
+            discarded = sum(1 for _ in metrics)
+            log.debug("Discarding %s points - ts = %s" % (discarded, timestamp))
+            self.num_discarded_old_points += discarded
+            self.submitted_points += discarded
+            return
+
+        metric_class = self.metric_type_to_class[mtype]
+        metric_config = self.metric_config.get(metric_class)
+        contexts = self.metrics
+        formatter = self.formatter
+
+        submitted = 0
+        for name, value in metrics:
+            context = (name, context_tags, hostname, device_name)
+            metric = contexts.get(context)
+            if metric is None:
+                metric = contexts[context] = metric_class(formatter, name, tags,
+                    hostname, device_name, metric_config)
+            metric.sample(value, 1, timestamp)
+            submitted += 1
+
+        self.submitted_points += submitted
+
     def gauge(self, name, value, tags=None, hostname=None, device_name=None, timestamp=None):
         self.submit_metric(name, value, 'g', tags, hostname, device_name, timestamp)
 
@@ -47,27 +47,29 @@ class ActiveMQXML(AgentCheck):
 
         tags = custom_tags + ["url:{0}".format(url)]
 
+        auth = None
+        if username and password:
+            auth = (username, password)
+        http = self.http_client(instance, auth=auth)
+
         self.log.debug("Processing ActiveMQ data for %s" % url)
-        data = self._fetch_data(url, QUEUE_URL, username, password, suppress_errors)
+        data = self._fetch_data(http, url, QUEUE_URL, suppress_errors)
         if data:
             self._process_data(data, "queue", tags, max_queues, detailed_queues)
 
-        data = self._fetch_data(url, TOPIC_URL, username, password, suppress_errors)
+        data = self._fetch_data(http, url, TOPIC_URL, suppress_errors)
         if data:
             self._process_data(data, "topic", tags, max_topics, detailed_topics)
 
-        data = self._fetch_data(url, SUBSCRIBER_URL, username, password, suppress_errors)
+        data = self._fetch_data(http, url, SUBSCRIBER_URL, suppress_errors)
         if data:
             self._process_subscriber_data(data, tags, max_subscribers, detailed_subscribers)
 
-    def _fetch_data(self, base_url, xml_url, username, password, suppress_errors):
-        auth = None
-        if username and password:
-            auth = (username, password)
+    def _fetch_data(self, http, base_url, xml_url, suppress_errors):
         url = "%s%s" % (base_url, xml_url)
         self.log.debug("ActiveMQ Fetching queue data from: %s" % url)
         try:
-            r = requests.get(url, auth=auth)
+            r = http.get(url)
             r.raise_for_status()
         except requests.exceptions.ConnectionError:
             if suppress_errors:
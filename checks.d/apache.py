@@ -5,9 +5,6 @@
 # stdlib
 import urlparse
 
-# 3rd party
-import requests
-
 # project
 from checks import AgentCheck
 from util import headers
@@ -54,6 +51,8 @@ class Apache(AgentCheck):
         auth = None
         if 'apache_user' in instance and 'apache_password' in instance:
             auth = (instance['apache_user'], instance['apache_password'])
+        http = self.http_client(instance, auth=auth, headers=headers(self.agentConfig),
+                                verify=not disable_ssl_validation)
 
         # Submit a service check for status page availability.
         parsed_url = urlparse.urlparse(url)
@@ -62,7 +61,7 @@ class Apache(AgentCheck):
         service_check_name = 'apache.can_connect'
         service_check_tags = ['host:%s' % apache_host, 'port:%s' % apache_port]
         try:
-            r = requests.get(url, auth=auth, headers=headers(self.agentConfig), verify=not disable_ssl_validation)
+            r = http.get(url)
             r.raise_for_status()
 
         except Exception:
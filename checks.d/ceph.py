@@ -56,7 +56,7 @@ class Ceph(AgentCheck):
         return raw
 
     def _extract_tags(self, raw, instance):
-        tags = instance.get('tags', [])
+        tags = list(instance.get('tags', []))
         if 'mon_status' in raw:
             fsid = raw['mon_status']['monmap']['fsid']
             tags.append(self.NAMESPACE + '_fsid:%s' % fsid)
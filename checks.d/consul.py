@@ -50,13 +50,14 @@ class ConsulCheck(AgentCheck):
             privatekeyfile = instance.get('private_key_file', self.init_config.get('private_key_file', False))
             cabundlefile = instance.get('ca_bundle_file', self.init_config.get('ca_bundle_file', True))
 
+            cert = None
             if clientcertfile:
                 if privatekeyfile:
-                    resp = requests.get(url, cert=(clientcertfile,privatekeyfile), verify=cabundlefile)
+                    cert = (clientcertfile, privatekeyfile)
                 else:
-                    resp = requests.get(url, cert=clientcertfile, verify=cabundlefile)
-            else:
-                resp = requests.get(url, verify=cabundlefile)
+                    cert = clientcertfile
+
+            resp = self.http_client(instance, cert=cert, verify=cabundlefile).get(url)
 
         except requests.exceptions.Timeout:
             self.log.exception('Consul request to {0} timed out'.format(url))
@@ -43,7 +43,7 @@ class CouchDb(AgentCheck):
                     metric_tags.append('db:%s' % db_name)
                     self.gauge(metric_name, val, tags=metric_tags, device_name=db_name)
 
-    def _get_stats(self, url, instance):
+    def _get_stats(self, url, instance, conditional=False):
         "Hit a given URL and return the parsed json"
         self.log.debug('Fetching Couchdb stats at url: %s' % url)
 
@@ -53,10 +53,9 @@ class CouchDb(AgentCheck):
         # Override Accept request header so that failures are not redirected to the Futon web-ui
         request_headers = headers(self.agentConfig)
         request_headers['Accept'] = 'text/json'
-        r = requests.get(url, auth=auth, headers=request_headers,
-                         timeout=int(instance.get('timeout', self.TIMEOUT)))
-        r.raise_for_status()
-        return r.json()
+        http = self.http_client(instance, auth=auth, headers=request_headers,
+                                timeout=int(instance.get('timeout', self.TIMEOUT)))
+        return http.get_json(url, conditional=conditional)
 
     def check(self, instance):
         server = instance.get('server', None)
@@ -111,7 +110,7 @@ class CouchDb(AgentCheck):
         self.db_blacklist.setdefault(server,[])
         self.db_blacklist[server].extend(instance.get('db_blacklist',[]))
         whitelist = set(db_whitelist) if db_whitelist else None
-        databases = set(self._get_stats(url, instance)) - set(self.db_blacklist[server])
+        databases = set(self._get_stats(url, instance, conditional=True)) - set(self.db_blacklist[server])
         databases = databases.intersection(whitelist) if whitelist else databases
 
         if len(databases) > self.MAX_DB:
@@ -130,7 +130,7 @@ class Couchbase(AgentCheck):
                     metric_tags.append('node:%s' % node_name)
                     self.gauge(metric_name, val, tags=metric_tags, device_name=node_name)
 
-    def _get_stats(self, url, instance):
+    def _get_stats(self, url, instance, conditional=False):
         """ Hit a given URL and return the parsed json. """
         self.log.debug('Fetching Couchbase stats at url: %s' % url)
 
@@ -140,10 +140,9 @@ class Couchbase(AgentCheck):
         if 'user' in instance and 'password' in instance:
             auth = (instance['user'], instance['password'])
 
-        r = requests.get(url, auth=auth, headers=headers(self.agentConfig),
-            timeout=timeout)
-        r.raise_for_status()
-        return r.json()
+        http = self.http_client(instance, auth=auth, headers=headers(self.agentConfig),
+                                timeout=timeout)
+        return http.get_json(url, conditional=conditional)
 
     def check(self, instance):
         server = instance.get('server', None)
@@ -203,7 +202,7 @@ class Couchbase(AgentCheck):
         endpoint = overall_stats['buckets']['uri']
 
         url = '%s%s' % (server, endpoint)
-        buckets = self._get_stats(url, instance)
+        buckets = self._get_stats(url, instance, conditional=True)
 
         if buckets is not None:
             for bucket in buckets:
@@ -5,19 +5,136 @@
 
 
 # stdlib
-from fnmatch import fnmatch
+from fnmatch import translate
 from os import stat
-from os.path import abspath, exists, join
+from os.path import abspath, exists, join, normcase
+import re
 import time
 
 # 3p
-from scandir import walk
+from scandir import scandir, walk
 
 # project
 from checks import AgentCheck
 from config import _is_affirmative
 
 
+class DirectoryScan(object):
+    """
+    Files of a directory tree kept between runs, each directory being only
+    listed again when its mtime changed. The stats of a file are kept as long
+    as its inode doesn't change: in place writes are only seen once its
+    directory changed.
+
+    A scan can be spread over several runs, the results are those of the
+    last complete one.
+    """
+
+    # mtimes this close to the scan may be followed by changes with the same mtime
+    MTIME_GRANULARITY = 1
+
+    def __init__(self, directory, pattern, recursive, countonly):
+        self.directory = directory
+        self.recursive = recursive
+        self.countonly = countonly
+        self._match = re.compile(translate(normcase(pattern))).match
+        # path -> (mtime, subdirectories, sorted [(filename, (inode, size, mtime, ctime) or None)])
+        self._dirs = {}
+        # (directory, files) of the last complete scan, in scan order, None until there is one
+        self._scanned = None
+        # Scan in progress: directories left to visit, and the ones visited
+        self._pending = None
+        self._visited = None
+
+    def _list(self, path, mtime, cached):
+        subdirs = []
+        files = []
+        cached_files = dict(cached[2]) if cached is not None else {}
+        for entry in scandir(path):
+            if entry.is_dir():
+                # Like os.walk, don't follow links to directories
+                if not entry.is_symlink():
+                    subdirs.append(entry.path)
+                continue
+            if not self._match(normcase(entry.path)):
+                continue
+            if self.countonly:
+                files.append((entry.name, None))
+                continue
+            previous = cached_files.get(entry.name)
+            if previous is not None and previous[0] == entry.inode():
+                files.append((entry.name, previous))
+                continue
+            try:
+                file_stat = entry.stat()
+            except OSError:
+                # Removed since it was listed
+                continue
+            files.append((entry.name, (entry.inode(), file_stat.st_size, file_stat.st_mtime, file_stat.st_ctime)))
+        files.sort()
+        return (mtime, sorted(subdirs), files)
+
+    def scan(self, max_time=0, log=None):
+        """
+        Visit the tree, listing the directories which changed. Returns False if
+        `max_time` (seconds) elapsed first, the scan then resumes at the next call.
+        """
+        start = time.time()
+        if self._pending is None:
+            self._pending = [self.directory]
+            self._visited = []
+
+        while self._pending:
+            path = self._pending.pop()
+            try:
+                mtime = stat(path).st_mtime
+            except OSError:
+                # Removed since its parent was listed
+                continue
+            cached = self._dirs.get(path)
+            if cached is None or cached[0] is None or cached[0] != mtime:
+                try:
+                    cached = self._list(path, mtime, cached)
+                except OSError as e:
+                    if log is not None:
+                        log.warning("DirectoryCheck: could not list %s - %s", path, e)
+                    continue
+                if mtime >= start - self.MTIME_GRANULARITY:
+                    # Changed too recently to be sure the next changes will change its mtime
+                    cached = (None,) + cached[1:]
+                self._dirs[path] = cached
+            self._visited.append(path)
+            if self.recursive:
+                # Reversed, to visit them in order
+                self._pending.extend(reversed(cached[1]))
+            if max_time and self._pending and time.time() - start > max_time:
+                return False
+
+        visited = set(self._visited)
+        for path in self._dirs.keys():
+            if path not in visited:
+                del self._dirs[path]
+        # The file lists of `_dirs` are replaced, not modified: these ones don't
+        # change while the next scan is in progress
+        self._scanned = [(path, self._dirs[path][2]) for path in self._visited if path in self._dirs]
+        self._pending = self._visited = None
+        return True
+
+    def has_results(self):
+        """
+        Whether a scan was ever complete
+        """
+        return self._scanned is not None
+
+    def iter_files(self):
+        """
+        Yield the (directory, [(filename, stats)]) of the last complete scan,
+        stats being (inode, size, mtime, ctime), or None when only counting.
+        """
+        for path, files in self._scanned or []:
+            yield path, files
+
+
 class DirectoryCheck(AgentCheck):
     """This check is for monitoring and reporting metrics on the files for a provided directory
 
@@ -31,10 +148,17 @@ class DirectoryCheck(AgentCheck):
         "filegauges" - boolean, when true stats will be an individual gauge per file (max. 20 files!) and not a histogram of the whole directory. default False
         "pattern" - string, the `fnmatch` pattern to use when reading the "directory"'s files. default "*"
         "recursive" - boolean, when true the stats will recurse into directories. default False
+        "incremental" - boolean, when true only the directories whose mtime changed are listed again. default False
+        "max_scan_time" - number, in incremental mode, seconds after which the scan is continued at the next run. default 0 (no limit)
     """
 
     SOURCE_TYPE_NAME = 'system'
 
+    def __init__(self, name, init_config, agentConfig, instances=None):
+        AgentCheck.__init__(self, name, init_config, agentConfig, instances)
+        # Incremental scans, by instance
+        self._scans = {}
+
     def check(self, instance):
         if "directory" not in instance:
             raise Exception('DirectoryCheck: missing "directory" in config')
@@ -48,21 +172,68 @@ class DirectoryCheck(AgentCheck):
         filetagname = instance.get("filetagname", "filename")
         filegauges = _is_affirmative(instance.get("filegauges", False))
         countonly = _is_affirmative(instance.get("countonly", False))
+        incremental = _is_affirmative(instance.get("incremental", False))
+        max_scan_time = float(instance.get("max_scan_time", 0))
 
         if not exists(abs_directory):
             raise Exception("DirectoryCheck: the directory (%s) does not exist" % abs_directory)
 
-        self._get_stats(abs_directory, name, dirtagname, filetagname, filegauges, pattern, recursive, countonly)
+        if incremental:
+            key = (abs_directory, pattern, recursive, countonly)
+            scan = self._scans.get(key)
+            if scan is None:
+                scan = self._scans[key] = DirectoryScan(abs_directory, pattern, recursive, countonly)
+            self._get_incremental_stats(scan, name, dirtagname, filetagname, filegauges, max_scan_time)
+        else:
+            self._get_stats(abs_directory, name, dirtagname, filetagname, filegauges, pattern, recursive, countonly)
+
+    def _submit_file_metrics(self, filename, size, mtime, ctime, file_index, dirtags, filetagname, filegauges, now):
+        if filegauges and file_index <= 20:
+            filetags = list(dirtags)
+            filetags.append(filetagname + ":%s" % filename)
+            self.gauge("system.disk.directory.file.bytes", size, tags=filetags)
+            self.gauge("system.disk.directory.file.modified_sec_ago", now - mtime, tags=filetags)
+            self.gauge("system.disk.directory.file.created_sec_ago", now - ctime, tags=filetags)
+        elif not filegauges:
+            self.histogram("system.disk.directory.file.bytes", size, tags=dirtags)
+            self.histogram("system.disk.directory.file.modified_sec_ago", now - mtime, tags=dirtags)
+            self.histogram("system.disk.directory.file.created_sec_ago", now - ctime, tags=dirtags)
+
+    def _get_incremental_stats(self, scan, name, dirtagname, filetagname, filegauges, max_scan_time):
+        if not scan.scan(max_scan_time, self.log):
+            self.log.debug("DirectoryCheck: scan of %s to be continued at the next run", scan.directory)
+            # Report the last complete scan meanwhile
+            if not scan.has_results():
+                return
+
+        dirtags = [dirtagname + ":%s" % name]
+        directory_bytes = 0
+        directory_files = 0
+        now = time.time()
+        for root, files in scan.iter_files():
+            for filename, file_stat in files:
+                directory_files += 1
+                if file_stat is None:
+                    continue
+                directory_bytes += file_stat[1]
+                self._submit_file_metrics(join(root, filename), file_stat[1], file_stat[2], file_stat[3],
+                                          directory_files, dirtags, filetagname, filegauges, now)
+
+        self.gauge("system.disk.directory.files", directory_files, tags=dirtags)
+        if not scan.countonly:
+            self.gauge("system.disk.directory.bytes", directory_bytes, tags=dirtags)
 
     def _get_stats(self, directory, name, dirtagname, filetagname, filegauges, pattern, recursive, countonly):
         dirtags = [dirtagname + ":%s" % name]
         directory_bytes = 0
         directory_files = 0
+        match = re.compile(translate(normcase(pattern))).match
+        now = time.time()
         for root, dirs, files in walk(directory):
             for filename in files:
                 filename = join(root, filename)
                 # check if it passes our filter
-                if not fnmatch(filename, pattern):
+                if not match(normcase(filename)):
                     continue
 
                 directory_files += 1
@@ -79,16 +250,8 @@ class DirectoryCheck(AgentCheck):
                 else:
                     # file specific metrics
                     directory_bytes += file_stat.st_size
-                    if filegauges and directory_files <= 20:
-                        filetags = list(dirtags)
-                        filetags.append(filetagname + ":%s" % filename)
-                        self.gauge("system.disk.directory.file.bytes", file_stat.st_size, tags=filetags)
-                        self.gauge("system.disk.directory.file.modified_sec_ago", time.time() - file_stat.st_mtime, tags=filetags)
-                        self.gauge("system.disk.directory.file.created_sec_ago", time.time() - file_stat.st_ctime, tags=filetags)
-                    elif not filegauges:
-                        self.histogram("system.disk.directory.file.bytes", file_stat.st_size, tags=dirtags)
-                        self.histogram("system.disk.directory.file.modified_sec_ago", time.time() - file_stat.st_mtime, tags=dirtags)
-                        self.histogram("system.disk.directory.file.created_sec_ago", time.time() - file_stat.st_ctime, tags=dirtags)
+                    self._submit_file_metrics(filename, file_stat.st_size, file_stat.st_mtime, file_stat.st_ctime,
+                                              directory_files, dirtags, filetagname, filegauges, now)
 
             # os.walk gives us all sub-directories and their files
             # if we do not want to do this recursively and just want
@@ -5,7 +5,6 @@
 # stdlib
 import os
 import re
-import requests
 import socket
 import urllib2
 from collections import defaultdict, Counter, deque
@@ -14,7 +13,7 @@ from math import ceil
 # project
 from checks import AgentCheck
 from config import _is_affirmative
-from utils.dockerutil import DockerUtil, MountException
+from utils.dockerutil import ContainerPidIndex, DockerUtil, MountException
 from utils.kubeutil import KubeUtil
 from utils.platform import Platform
 from utils.service_discovery.sd_backend import get_sd_backend
@@ -24,7 +23,7 @@ EVENT_TYPE = 'docker'
 SERVICE_CHECK_NAME = 'docker.service_up'
 SIZE_REFRESH_RATE = 5  # Collect container sizes every 5 iterations of the check
 MAX_CGROUP_LISTING_RETRIES = 3
-CONTAINER_ID_RE = re.compile('[0-9a-f]{64}')
+CGROUP_READ_SIZE = 65536
 
 GAUGE = AgentCheck.gauge
 RATE = AgentCheck.rate
@@ -78,6 +77,12 @@ CGROUP_METRICS = [
     },
 ]
 
+# cgroup v2 memory.stat keys of the cgroup v1 ones
+CGROUP2_MEMORY_STATS = {
+    "cache": "file",
+    "rss": "anon",
+}
+
 DEFAULT_CONTAINER_TAGS = [
     "docker_image",
     "image_name",
@@ -159,11 +164,26 @@ class DockerDaemon(AgentCheck):
             self.docker_client = self.docker_util.client
             if self.is_k8s():
                 self.kubeutil = KubeUtil()
-            self._mountpoints = self.docker_util.get_mountpoints(CGROUP_METRICS)
+            try:
+                self._mountpoints = self.docker_util.get_mountpoints(CGROUP_METRICS)
+                self._cgroup2_mountpoint = None
+            except Exception as e:
+                # Hosts with the cgroup v2 unified hierarchy only
+                self._cgroup2_mountpoint = self.docker_util.find_cgroup2()
+                if self._cgroup2_mountpoint is None:
+                    raise e
+                self._mountpoints = {}
+            # container id -> its cgroup stat files ({cgroup: path}), or its directory with cgroup v2
+            self._cgroup_paths = {}
+            self._clock_ticks = os.sysconf('SC_CLK_TCK')
             self.cgroup_listing_retries = 0
             self._latest_size_query = 0
             self._filtered_containers = set()
             self._disable_net_metrics = False
+            self._pid_index = ContainerPidIndex(os.path.join(self.docker_util._docker_root, 'proc'))
+            self._inventory = self.docker_util.get_inventory()
+            # (container id, tag type) -> (container entry, tags, pod name), see _get_entity_tags
+            self._tags_cache = {}
 
             # Set tagging options
             self.custom_tags = instance.get("tags", [])
@@ -276,7 +296,10 @@ class DockerDaemon(AgentCheck):
         all_containers_count = Counter()
 
         try:
-            containers = self.docker_client.containers(all=True, size=must_query_size)
+            if self._inventory is not None and not must_query_size:
+                containers = self._inventory.containers()
+            else:
+                containers = self.docker_client.containers(all=True, size=must_query_size)
         except Exception as e:
             message = "Unable to list Docker containers: {0}".format(e)
             self.service_check(SERVICE_CHECK_NAME, AgentCheck.CRITICAL,
@@ -307,6 +330,13 @@ class DockerDaemon(AgentCheck):
 
             containers_by_id[container['Id']] = container
 
+        # Forget the tags of the containers which are gone
+        if self._tags_cache:
+            container_ids = set(container['Id'] for container in containers)
+            for key in self._tags_cache.keys():
+                if key[0] not in container_ids:
+                    del self._tags_cache[key]
+
         for tags, count in running_containers_count.iteritems():
             self.gauge("docker.containers.running", count, tags=list(tags))
 
@@ -326,71 +356,90 @@ class DockerDaemon(AgentCheck):
 
     def _get_tags(self, entity=None, tag_type=None):
         """Generate the tags for a given entity (container or image) according to a list of tag names."""
-        # Start with custom tags
-        tags = list(self.custom_tags)
-
         # Collect pod names as tags on kubernetes
         if self.is_k8s() and KubeUtil.POD_NAME_LABEL not in self.collect_labels_as_tags:
             self.collect_labels_as_tags.append(KubeUtil.POD_NAME_LABEL)
 
-        if entity is not None:
-            pod_name = None
-
-            # Get labels as tags
-            labels = entity.get("Labels")
-            if labels is not None:
-                for k in self.collect_labels_as_tags:
-                    if k in labels:
-                        v = labels[k]
-                        if k == KubeUtil.POD_NAME_LABEL and self.is_k8s():
-                            pod_name = v
-                            k = "pod_name"
-                            if "-" in pod_name:
-                                replication_controller = "-".join(pod_name.split("-")[:-1])
-                                if "/" in replication_controller: # k8s <= 1.1
-                                    namespace, replication_controller = replication_controller.split("/", 1)
-
-                                elif KubeUtil.NAMESPACE_LABEL in labels: # k8s >= 1.2
-                                    namespace = labels[KubeUtil.NAMESPACE_LABEL]
-                                    pod_name = "{0}/{1}".format(namespace, pod_name)
-
-                                tags.append("kube_namespace:%s" % namespace)
-                                tags.append("kube_replication_controller:%s" % replication_controller)
-                                tags.append("pod_name:%s" % pod_name)
-
-                        elif not v:
-                            tags.append(k)
-
-                        else:
-                            tags.append("%s:%s" % (k,v))
-
-                    if k == KubeUtil.POD_NAME_LABEL and self.is_k8s() and k not in labels:
-                        tags.append("pod_name:no_pod")
-
-            # Get entity specific tags
-            if tag_type is not None:
-                tag_names = self.tag_names[tag_type]
-                for tag_name in tag_names:
-                    tag_value = self._extract_tag_value(entity, tag_name)
-                    if tag_value is not None:
-                        for t in tag_value:
-                            tags.append('%s:%s' % (tag_name, str(t).strip()))
-
-            # Add ECS tags
-            if self.collect_ecs_tags:
-                entity_id = entity.get("Id")
-                if entity_id in self.ecs_tags:
-                    ecs_tags = self.ecs_tags[entity_id]
-                    tags.extend(ecs_tags)
-
-            # Add kube labels
-            if self.is_k8s():
-                kube_tags = self.kube_labels.get(pod_name)
-                if kube_tags:
-                    tags.extend(list(kube_tags))
+        if entity is None:
+            return list(self.custom_tags)
+
+        tags, pod_name = self._get_entity_tags(entity, tag_type)
+        tags = list(tags)
+
+        # Add ECS tags
+        if self.collect_ecs_tags:
+            entity_id = entity.get("Id")
+            if entity_id in self.ecs_tags:
+                ecs_tags = self.ecs_tags[entity_id]
+                tags.extend(ecs_tags)
+
+        # Add kube labels
+        if self.is_k8s():
+            kube_tags = self.kube_labels.get(pod_name)
+            if kube_tags:
+                tags.extend(list(kube_tags))
 
         return tags
 
+    def _get_entity_tags(self, entity, tag_type):
+        """Custom tags, labels and tag names of an entity, and its pod name.
+
+        They only depend on the entity: the ones of the containers from the inventory
+        are cached, it returns the same entry as long as the container doesn't change.
+        """
+        key = (entity.get("Id"), tag_type)
+        cached = self._tags_cache.get(key)
+        if cached is not None and cached[0] is entity:
+            return cached[1], cached[2]
+
+        # Start with custom tags
+        tags = list(self.custom_tags)
+        pod_name = None
+
+        # Get labels as tags
+        labels = entity.get("Labels")
+        if labels is not None:
+            for k in self.collect_labels_as_tags:
+                if k in labels:
+                    v = labels[k]
+                    if k == KubeUtil.POD_NAME_LABEL and self.is_k8s():
+                        pod_name = v
+                        k = "pod_name"
+                        if "-" in pod_name:
+                            replication_controller = "-".join(pod_name.split("-")[:-1])
+                            if "/" in replication_controller: # k8s <= 1.1
+                                namespace, replication_controller = replication_controller.split("/", 1)
+
+                            elif KubeUtil.NAMESPACE_LABEL in labels: # k8s >= 1.2
+                                namespace = labels[KubeUtil.NAMESPACE_LABEL]
+                                pod_name = "{0}/{1}".format(namespace, pod_name)
+
+                            tags.append("kube_namespace:%s" % namespace)
+                            tags.append("kube_replication_controller:%s" % replication_controller)
+                            tags.append("pod_name:%s" % pod_name)
+
+                    elif not v:
+                        tags.append(k)
+
+                    else:
+                        tags.append("%s:%s" % (k,v))
+
+                if k == KubeUtil.POD_NAME_LABEL and self.is_k8s() and k not in labels:
+                    tags.append("pod_name:no_pod")
+
+        # Get entity specific tags
+        if tag_type is not None:
+            tag_names = self.tag_names[tag_type]
+            for tag_name in tag_names:
+                tag_value = self._extract_tag_value(entity, tag_name)
+                if tag_value is not None:
+                    for t in tag_value:
+                        tags.append('%s:%s' % (tag_name, str(t).strip()))
+
+        if self._inventory is not None and tag_type != IMAGE:
+            self._tags_cache[key] = (entity, tags, pod_name)
+        return tags, pod_name
+
     def _extract_tag_value(self, entity, tag_name):
         """Extra tag information from the API result (containers or images).
         Cache extracted tags inside the entity object.
@@ -415,7 +464,7 @@ class DockerDaemon(AgentCheck):
         port = ports.keys()[0].split('/')[0] if ports else None
         ecs_tags = {}
         if ip and port:
-            tasks = requests.get('http://%s:%s/v1/tasks' % (ip, port)).json()
+            tasks = self.http_client('ecs-agent').get_json('http://%s:%s/v1/tasks' % (ip, port))
             for task in tasks.get('Tasks', []):
                 for container in task.get('Containers', []):
                     tags = ['task_name:%s' % task['Family'], 'task_version:%s' % task['Version']]
@@ -486,17 +535,24 @@ class DockerDaemon(AgentCheck):
     def _report_performance_metrics(self, containers_by_id):
 
         containers_without_proc_root = []
+        reported = set()
         for container in containers_by_id.itervalues():
             if self._is_container_excluded(container) or not self._is_container_running(container):
                 continue
 
-            tags = self._get_tags(container, PERFORMANCE)
+            tags = self.tag_set(self._get_tags(container, PERFORMANCE))
+            reported.add(container['Id'])
             self._report_cgroup_metrics(container, tags)
             if "_proc_root" not in container:
                 containers_without_proc_root.append(DockerUtil.container_name_extractor(container)[0])
                 continue
             self._report_net_metrics(container, tags)
 
+        # Forget the cgroups of the containers which stopped
+        for container_id in self._cgroup_paths.keys():
+            if container_id not in reported:
+                del self._cgroup_paths[container_id]
+
         if containers_without_proc_root:
             message = "Couldn't find pid directory for containers: {0}. They'll be missing network metrics".format(
                 ", ".join(containers_without_proc_root))
@@ -507,15 +563,17 @@ class DockerDaemon(AgentCheck):
                 self.log.debug(message)
 
     def _report_cgroup_metrics(self, container, tags):
+        # Points are grouped by metric function and submitted in bulk
+        # when histograms are not used
+        points = {GAUGE: [], RATE: []}
         try:
+            cgroup_stats = self._read_cgroup_stats(container['Id'])
             for cgroup in CGROUP_METRICS:
-                stat_file = self._get_cgroup_file(cgroup["cgroup"], container['Id'], cgroup['file'])
-                stats = self._parse_cgroup_file(stat_file)
+                stats = cgroup_stats.get(cgroup["cgroup"])
                 if stats:
                     for key, (dd_key, metric_func) in cgroup['metrics'].iteritems():
-                        metric_func = FUNC_MAP[metric_func][self.use_histogram]
                         if key in stats:
-                            metric_func(self, dd_key, int(stats[key]), tags=tags)
+                            points[metric_func].append((dd_key, int(stats[key])))
 
                     # Computed metrics
                     for mname, (key_list, fct, metric_func) in cgroup.get('to_compute', {}).iteritems():
@@ -524,9 +582,8 @@ class DockerDaemon(AgentCheck):
                             self.log.debug("Couldn't compute {0}, some keys were missing.".format(mname))
                             continue
                         value = fct(*values)
-                        metric_func = FUNC_MAP[metric_func][self.use_histogram]
                         if value is not None:
-                            metric_func(self, mname, value, tags=tags)
+                            points[metric_func].append((mname, value))
 
         except MountException as ex:
             if self.cgroup_listing_retries > MAX_CGROUP_LISTING_RETRIES:
@@ -537,6 +594,19 @@ class DockerDaemon(AgentCheck):
                 self.cgroup_listing_retries += 1
         else:
             self.cgroup_listing_retries = 0
+        finally:
+            self._submit_points(points, tags)
+
+    def _submit_points(self, points, tags):
+        """Submit the `(name, value)` points grouped by metric function (GAUGE/RATE)."""
+        if self.use_histogram:
+            for metric_func, metric_points in points.iteritems():
+                metric_func = FUNC_MAP[metric_func][True]
+                for name, value in metric_points:
+                    metric_func(self, name, value, tags=tags)
+        else:
+            self.gauges(points[GAUGE], tags=tags)
+            self.rates(points[RATE], tags=tags)
 
     def _report_net_metrics(self, container, tags):
         """Find container network metrics by looking at /proc/$PID/net/dev of the container process."""
@@ -734,28 +804,122 @@ class DockerDaemon(AgentCheck):
 
     # Cgroups
 
-    def _get_cgroup_file(self, cgroup, container_id, filename):
-        """Find a specific cgroup file, containing metrics to extract."""
-        params = {
-            "mountpoint": self._mountpoints[cgroup],
-            "id": container_id,
-            "file": filename,
-        }
+    def _get_cgroup_paths(self, container_id):
+        """The cgroup stat files of a container ({cgroup: path}), or its directory with cgroup v2.
 
-        return DockerUtil.find_cgroup_filename_pattern(self._mountpoints, container_id) % (params)
+        They are found once, and kept until the container stops.
+        """
+        paths = self._cgroup_paths.get(container_id)
+        if paths is None:
+            if self._cgroup2_mountpoint is not None:
+                paths = DockerUtil.find_cgroup2_path(self._cgroup2_mountpoint, container_id)
+            else:
+                pattern = DockerUtil.find_cgroup_filename_pattern(self._mountpoints, container_id)
+                paths = {}
+                for cgroup in CGROUP_METRICS:
+                    paths[cgroup["cgroup"]] = pattern % {
+                        "mountpoint": self._mountpoints[cgroup["cgroup"]],
+                        "id": container_id,
+                        "file": cgroup["file"],
+                    }
+            self._cgroup_paths[container_id] = paths
+        return paths
+
+    def _read_cgroup_stats(self, container_id):
+        """The stats of a container by cgroup, as read from the cgroup v1 stat files of CGROUP_METRICS."""
+        paths = self._get_cgroup_paths(container_id)
+        if self._cgroup2_mountpoint is not None:
+            cgroup_stats = self._read_cgroup2_stats(paths)
+        else:
+            cgroup_stats = {}
+            for cgroup, stat_file in paths.iteritems():
+                cgroup_stats[cgroup] = self._parse_cgroup_file(stat_file)
+
+        if not all(cgroup_stats.itervalues()):
+            # Look for the files again at the next run
+            self._cgroup_paths.pop(container_id, None)
+        return cgroup_stats
+
+    def _read_cgroup_file(self, stat_file):
+        """Content of a cgroup pseudo file, None if it can't be read."""
+        self.log.debug("Opening cgroup file: %s", stat_file)
+        try:
+            fd = os.open(stat_file, os.O_RDONLY)
+            try:
+                chunks = []
+                chunk = os.read(fd, CGROUP_READ_SIZE)
+                while chunk:
+                    chunks.append(chunk)
+                    chunk = os.read(fd, CGROUP_READ_SIZE)
+            finally:
+                os.close(fd)
+        except OSError:
+            # It is possible that the container got stopped between the API call and now
+            self.log.info("Can't open %s. Metrics for this container are skipped." % stat_file)
+            return None
+        return ''.join(chunks)
 
     def _parse_cgroup_file(self, stat_file):
         """Parse a cgroup pseudo file for key/values."""
-        self.log.debug("Opening cgroup file: %s" % stat_file)
+        content = self._read_cgroup_file(stat_file)
+        if content is None:
+            return None
+        if 'blkio' in stat_file:
+            return self._parse_blkio_metrics(content.splitlines())
+        return dict(line.split(' ', 1) for line in content.splitlines())
+
+    def _read_cgroup2_value(self, path, filename):
+        """Content of a single value cgroup v2 file, None if it doesn't exist (e.g. without swap)."""
         try:
-            with open(stat_file, 'r') as fp:
-                if 'blkio' in stat_file:
-                    return self._parse_blkio_metrics(fp.read().splitlines())
-                else:
-                    return dict(map(lambda x: x.split(' ', 1), fp.read().splitlines()))
+            with open(os.path.join(path, filename), 'r') as fp:
+                return fp.read().strip()
         except IOError:
-            # It is possible that the container got stopped between the API call and now
-            self.log.info("Can't open %s. Metrics for this container are skipped." % stat_file)
+            return None
+
+    def _read_cgroup2_stats(self, path):
+        """The stats of a container from its cgroup v2 directory, as the cgroup v1 ones."""
+        cgroup_stats = dict.fromkeys(cgroup["cgroup"] for cgroup in CGROUP_METRICS)
+
+        memory_stat = self._parse_cgroup_file(os.path.join(path, "memory.stat"))
+        if memory_stat is not None:
+            memory = {}
+            for key, cgroup2_key in CGROUP2_MEMORY_STATS.iteritems():
+                if cgroup2_key in memory_stat:
+                    memory[key] = memory_stat[cgroup2_key]
+            swap = self._read_cgroup2_value(path, "memory.swap.current")
+            if swap is not None:
+                memory["swap"] = swap
+            # The limits are "max" when not set
+            limit = self._read_cgroup2_value(path, "memory.max")
+            if limit is not None and limit.isdigit():
+                memory["hierarchical_memory_limit"] = limit
+                swap_limit = self._read_cgroup2_value(path, "memory.swap.max")
+                if swap_limit is not None and swap_limit.isdigit():
+                    # The cgroup v1 one is the limit of the memory and swap together
+                    memory["hierarchical_memsw_limit"] = str(int(limit) + int(swap_limit))
+            cgroup_stats["memory"] = memory
+
+        cpu_stat = self._parse_cgroup_file(os.path.join(path, "cpu.stat"))
+        if cpu_stat is not None:
+            # Microseconds, to the clock ticks of cpuacct.stat
+            cgroup_stats["cpuacct"] = dict(
+                (key, int(cpu_stat[key + "_usec"]) * self._clock_ticks // 1000000)
+                for key in ("user", "system") if key + "_usec" in cpu_stat)
+
+        io_stat = self._read_cgroup_file(os.path.join(path, "io.stat"))
+        if io_stat is not None:
+            # One line by device: "8:0 rbytes=1459200 wbytes=314773504 rios=192 wios=353 ..."
+            blkio = {'io_read': 0, 'io_write': 0}
+            for line in io_stat.splitlines():
+                for field in line.split()[1:]:
+                    key, _, value = field.partition('=')
+                    if key == 'rbytes':
+                        blkio['io_read'] += int(value)
+                    elif key == 'wbytes':
+                        blkio['io_write'] += int(value)
+            cgroup_stats["blkio"] = blkio
+
+        return cgroup_stats
 
     def _parse_blkio_metrics(self, stats):
         """Parse the blkio metrics."""
@@ -771,12 +935,24 @@ class DockerDaemon(AgentCheck):
         return metrics
 
     # proc files
+    def _get_container_pid(self, container_id):
+        """The pid of a container according to the Docker API, None if unknown."""
+        try:
+            if self._inventory is not None:
+                return self._inventory.inspect(container_id).get('State', {}).get('Pid')
+            return self.docker_client.inspect_container(container_id).get('State', {}).get('Pid')
+        except Exception as e:
+            self.log.debug("Unable to get the pid of container %s from the Docker API: %s", container_id, e)
+            return None
+
     def _crawl_container_pids(self, container_dict):
-        """Crawl `/proc` to find container PIDs and add them to `containers_by_id`."""
-        proc_path = os.path.join(self.docker_util._docker_root, 'proc')
-        pid_dirs = [_dir for _dir in os.listdir(proc_path) if _dir.isdigit()]
+        """Find a pid of each running container and add it to `containers_by_id`."""
+        proc_path = self._pid_index.proc_path
+        running_ids = [container_id for container_id, container in container_dict.iteritems()
+                       if self._is_container_running(container)]
+        container_pids = self._pid_index.update(running_ids, self._get_container_pid)
 
-        if len(pid_dirs) == 0:
+        if self._pid_index.empty_proc:
             self.warning("Unable to find any pid directory in {0}. "
                 "If you are running the agent in a container, make sure to "
                 'share the volume properly: "/proc:/host/proc:ro". '
@@ -787,38 +963,11 @@ class DockerDaemon(AgentCheck):
 
         self._disable_net_metrics = False
 
-        for folder in pid_dirs:
-
-            try:
-                path = os.path.join(proc_path, folder, 'cgroup')
-                with open(path, 'r') as f:
-                    content = [line.strip().split(':') for line in f.readlines()]
-            except IOError as e:
-                #  Issue #2074
-                self.log.debug("Cannot read %s, "
-                               "process likely raced to finish : %s" %
-                               (path, str(e)))
-            except Exception as e:
-                self.warning("Cannot read %s : %s" % (path, str(e)))
-                continue
-
-            try:
-                for line in content:
-                    if line[1] in ('cpu,cpuacct', 'cpuacct,cpu', 'cpuacct') and 'docker' in line[2]:
-                        cpuacct = line[2]
-                        break
-                else:
-                    continue
-
-                matches = re.findall(CONTAINER_ID_RE, cpuacct)
-                if matches:
-                    container_id = matches[-1]
-                    if container_id not in container_dict:
-                        self.log.debug("Container %s not in container_dict, it's likely excluded", container_id)
-                        continue
-                    container_dict[container_id]['_pid'] = folder
-                    container_dict[container_id]['_proc_root'] = os.path.join(proc_path, folder)
-            except Exception as e:
-                self.warning("Cannot parse %s content: %s" % (path, str(e)))
-                continue
+        for container in container_dict.itervalues():
+            # The entries of the inventory are kept between runs
+            container.pop('_pid', None)
+            container.pop('_proc_root', None)
+        for container_id, pid in container_pids.iteritems():
+            container_dict[container_id]['_pid'] = pid
+            container_dict[container_id]['_proc_root'] = os.path.join(proc_path, pid)
         return container_dict
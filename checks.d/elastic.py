@@ -7,9 +7,6 @@ from collections import defaultdict, namedtuple
 import time
 import urlparse
 
-# 3p
-import requests
-
 # project
 from checks import AgentCheck
 from config import _is_affirmative
@@ -456,7 +453,7 @@ class ESCheck(AgentCheck):
         if isinstance(config.ssl_verify, bool) or isinstance(config.ssl_verify, str):
             verify = config.ssl_verify
         else:
-            verify = None
+            verify = True
         if config.ssl_cert and config.ssl_key:
             cert = (config.ssl_cert, config.ssl_key)
         elif config.ssl_cert:
@@ -465,14 +462,15 @@ class ESCheck(AgentCheck):
             cert = None
 
         try:
-            resp = requests.get(
-                url,
+            http = self.http_client(
+                config.url,
                 timeout=config.timeout,
                 headers=headers(self.agentConfig),
                 auth=auth,
                 verify=verify,
                 cert=cert
             )
+            resp = http.get(url)
             resp.raise_for_status()
         except Exception as e:
             if send_sc:
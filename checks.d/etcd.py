@@ -73,7 +73,7 @@ class Etcd(AgentCheck):
 
         # Load values from the instance config
         url = instance['url']
-        instance_tags = instance.get('tags', [])
+        instance_tags = list(instance.get('tags', []))
 
         # Load the ssl configuration
         ssl_params = {
@@ -166,7 +166,9 @@ class Etcd(AgentCheck):
             if 'ssl_certfile' in ssl_params and 'ssl_keyfile' in ssl_params:
                 certificate = (ssl_params['ssl_certfile'], ssl_params['ssl_keyfile'])
             verify = ssl_params.get('ssl_ca_certs', True) if ssl_params['ssl_cert_validation'] else False
-            r = requests.get(url, verify=verify, cert=certificate, timeout=timeout, headers=headers(self.agentConfig))
+            http = self.http_client(ssl_params, verify=verify, cert=certificate, timeout=timeout,
+                                    headers=headers(self.agentConfig))
+            r = http.get(url)
         except requests.exceptions.Timeout:
             # If there's a timeout
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL,
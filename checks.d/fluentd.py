@@ -7,9 +7,6 @@
 # stdlib
 import urlparse
 
-# 3rd party
-import requests
-
 # project
 from checks import AgentCheck
 from util import headers
@@ -46,9 +43,7 @@ class Fluentd(AgentCheck):
             service_check_tags = ['fluentd_host:%s' % monitor_agent_host, 'fluentd_port:%s'
                                   % monitor_agent_port]
 
-            r = requests.get(url, headers=headers(self.agentConfig))
-            r.raise_for_status()
-            status = r.json()
+            status = self.http_client(instance, headers=headers(self.agentConfig)).get_json(url)
 
             for p in status['plugins']:
                 tag = "%s:%s" % (tag_by, p.get(tag_by))
@@ -53,7 +53,7 @@ class Gearman(AgentCheck):
             self.warning("Port is not set, assuming 4730")
             port = 4730
 
-        tags = instance.get('tags', [])
+        tags = list(instance.get('tags', []))
 
         return host, port, tags
 
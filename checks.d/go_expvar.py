@@ -7,9 +7,6 @@
 from collections import defaultdict
 import re
 
-# 3rd party
-import requests
-
 # project
 from checks import AgentCheck
 
@@ -64,16 +61,14 @@ class GoExpvar(AgentCheck):
         self._last_gc_count = defaultdict(int)
 
     def _get_data(self, url):
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        return r.json()
+        return self.http_client(url).get_json(url)
 
     def _load(self, instance):
         url = instance.get('expvar_url')
         if not url:
             raise Exception('GoExpvar instance missing "expvar_url" value.')
 
-        tags = instance.get('tags', [])
+        tags = list(instance.get('tags', []))
         tags.append("expvar_url:%s" % url)
         data = self._get_data(url)
         metrics = DEFAULT_METRICS + instance.get("metrics", [])
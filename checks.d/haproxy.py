@@ -7,9 +7,6 @@ from collections import defaultdict
 import re
 import time
 
-# 3rd party
-import requests
-
 # project
 from checks import AgentCheck
 from config import _is_affirmative
@@ -117,7 +114,9 @@ class HAProxy(AgentCheck):
 
         self.log.debug('Processing HAProxy data for %s' % url)
 
-        data = self._fetch_data(url, username, password, verify)
+        http = self.http_client(instance, auth=(username, password), headers=headers(self.agentConfig),
+                                verify=verify)
+        data = self._fetch_data(http, url)
 
         process_events = instance.get('status_check', self.init_config.get('status_check', False))
 
@@ -132,16 +131,15 @@ class HAProxy(AgentCheck):
             count_status_by_service=count_status_by_service,
         )
 
-    def _fetch_data(self, url, username, password, verify):
+    def _fetch_data(self, http, url):
         ''' Hit a given URL and return the parsed json '''
         # Try to fetch data from the stats URL
 
-        auth = (username, password)
         url = "%s%s" % (url, STATS_URL)
 
         self.log.debug("HAProxy Fetching haproxy search data from: %s" % url)
 
-        r = requests.get(url, auth=auth, headers=headers(self.agentConfig), verify=verify)
+        r = http.get(url)
         r.raise_for_status()
 
         return r.content.splitlines()
@@ -22,7 +22,6 @@ hdfs.datanode.num_blocks_failed_to_uncache   The number of failed blocks to remo
 from urlparse import urljoin
 
 # 3rd party
-import requests
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError
 from simplejson import JSONDecodeError
 
@@ -122,7 +121,7 @@ class HDFSDataNode(AgentCheck):
         self.log.debug('Attempting to connect to "%s"' % url)
 
         try:
-            response = requests.get(url)
+            response = self.http_client(address).get(url)
             response.raise_for_status()
             response_json = response.json()
 
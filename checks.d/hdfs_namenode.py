@@ -35,7 +35,6 @@ hdfs.namenode.corrupt_blocks                    Number of corrupt blocks
 from urlparse import urljoin
 
 # 3rd party
-import requests
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError
 from simplejson import JSONDecodeError
 
@@ -168,7 +167,7 @@ class HDFSNameNode(AgentCheck):
         self.log.debug('Attempting to connect to "%s"' % url)
 
         try:
-            response = requests.get(url)
+            response = self.http_client(address).get(url)
             response.raise_for_status()
             response_json = response.json()
 
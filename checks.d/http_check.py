@@ -188,6 +188,9 @@ class HTTPCheck(NetworkCheck):
         config_headers = instance.get('headers', {})
         headers = agent_headers(self.agentConfig)
         headers.update(config_headers)
+        # A new connection for each run unless asked, its setup is part of the response time
+        if not _is_affirmative(instance.get('keep_alive', False)):
+            headers.setdefault('Connection', 'close')
         url = instance.get('url')
         content_match = instance.get('content_match')
         response_time = _is_affirmative(instance.get('collect_response_time', True))
@@ -237,16 +240,16 @@ class HTTPCheck(NetworkCheck):
             if username is not None and password is not None:
                 auth = (username, password)
 
-            sess = requests.Session()
-            sess.trust_env = False
+            http = self.http_client(instance, trust_env=False)
             if weakcipher:
                 base_addr = '{uri.scheme}://{uri.netloc}/'.format(uri=parsed_uri)
-                sess.mount(base_addr, WeakCiphersAdapter())
+                if base_addr not in http.session.adapters:
+                    http.session.mount(base_addr, WeakCiphersAdapter())
                 self.log.debug("Weak Ciphers will be used for {0}. Suppoted Cipherlist: {1}".format(
                     base_addr, WeakCiphersHTTPSConnection.SUPPORTED_CIPHERS))
 
-            r = sess.request('GET', addr, auth=auth, timeout=timeout, headers=headers, proxies=instance_proxy,
-                             verify=False if disable_ssl_validation else instance_ca_certs)
+            r = http.get(addr, auth=auth, timeout=timeout, headers=headers, proxies=instance_proxy,
+                         verify=False if disable_ssl_validation else instance_ca_certs)
 
         except (socket.timeout, requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
             length = int((time.time() - start) * 1000)
@@ -2,7 +2,6 @@
 import urlparse
 
 # 3rd party
-import requests
 import simplejson as json
 
 # project
@@ -38,7 +37,7 @@ class Kong(AgentCheck):
 
         try:
             self.log.debug(u"Querying URL: {0}".format(url))
-            response = requests.get(url, headers=headers(self.agentConfig))
+            response = self.http_client(instance, headers=headers(self.agentConfig)).get(url)
             self.log.debug(u"Kong status `response`: {0}".format(response))
             response.raise_for_status()
         except Exception:
@@ -7,18 +7,14 @@ Collects metrics from cAdvisor instance
 """
 # stdlib
 from collections import defaultdict
-from fnmatch import fnmatch
+from fnmatch import translate
 import numbers
 import re
 import simplejson as json
 
-# 3rd party
-import requests
-
 # project
 from checks import AgentCheck
 from config import _is_affirmative
-from utils.http import retrieve_json
 from utils.kubeutil import KubeUtil
 
 NAMESPACE = "kubernetes"
@@ -46,6 +42,85 @@ FUNC_MAP = {
     RATE: {True: HISTORATE, False: RATE}
 }
 
+GLOB_CHARS = re.compile(r'[*?[]')
+
+
+class MetricNode(object):
+    """A metric name of the stats, with what is published for it"""
+    __slots__ = ('name', 'kind', 'patterns', 'children')
+
+    def __init__(self, name, kind, patterns):
+        self.name = name
+        # RATE, GAUGE or None
+        self.kind = kind
+        # the pattern tree below this name, None when any name below can match
+        self.patterns = patterns
+        # {stats key: MetricNode, or None if no pattern can match below}
+        self.children = {}
+
+
+class MetricSelector(object):
+    """
+    The enabled rates and gauges, compiled in one matcher. The metric names
+    are walked in a tree made of the literal segments of the patterns, their
+    subtrees are only walked below the first segment with a wildcard: a `*`
+    can match dots. The nodes of the names are kept, with their decision.
+    """
+    def __init__(self, rates, gauges):
+        self.rates = rates
+        self.gauges = gauges
+        self._matcher = re.compile('(%s)|(%s)' % (
+            '|'.join('(?:%s)' % translate(pat) for pat in rates) or '(?!)',
+            '|'.join('(?:%s)' % translate(pat) for pat in gauges) or '(?!)'))
+
+        self._patterns = {}
+        for pat in rates + gauges:
+            tree = self._patterns
+            for segment in pat.split('.'):
+                if GLOB_CHARS.search(segment):
+                    tree[None] = True
+                    break
+                tree = tree.setdefault(segment, {})
+        self._roots = {}
+
+    def _kind(self, name):
+        match = self._matcher.match(name)
+        if match is None:
+            return None
+        return RATE if match.start(1) != -1 else GAUGE
+
+    def _walk(self, patterns, key):
+        """The pattern tree below `key`, None if any name can match, False if none"""
+        for segment in key.split('.'):
+            if None in patterns:
+                return None
+            patterns = patterns.get(segment)
+            if patterns is None:
+                return False
+        return None if None in patterns else patterns
+
+    def root(self, name):
+        if name not in self._roots:
+            patterns = self._walk(self._patterns, name)
+            self._roots[name] = MetricNode(name, self._kind(name), patterns) if patterns is not False else None
+        return self._roots[name]
+
+    def child(self, node, key):
+        try:
+            return node.children[key]
+        except KeyError:
+            pass
+
+        key_name = key.lower()
+        patterns = None if node.patterns is None else self._walk(node.patterns, key_name)
+        if patterns is False:
+            child = None
+        else:
+            name = '%s.%s' % (node.name, key_name)
+            child = MetricNode(name, self._kind(name), patterns)
+        node.children[key] = child
+        return child
+
 
 class Kubernetes(AgentCheck):
     """ Collect metrics and events from kubelet """
@@ -59,12 +134,13 @@ class Kubernetes(AgentCheck):
         self.kubeutil = KubeUtil()
         if not self.kubeutil.host:
             raise Exception('Unable to get default router and host parameter is not set')
+        self._selector = None
 
     def _perform_kubelet_checks(self, url):
         service_check_base = NAMESPACE + '.kubelet.check'
         is_ok = True
         try:
-            r = requests.get(url)
+            r = self.kubeutil.session.get(url)
             for line in r.iter_lines():
 
                 # avoid noise; this check is expected to fail since we override the container hostname
@@ -101,6 +177,9 @@ class Kubernetes(AgentCheck):
         self.enabled_gauges = ["{0}.{1}".format(NAMESPACE, x) for x in enabled_gauges]
         enabled_rates = instance.get('enabled_rates', DEFAULT_ENABLED_RATES)
         self.enabled_rates = ["{0}.{1}".format(NAMESPACE, x) for x in enabled_rates]
+        if self._selector is None or (self._selector.rates, self._selector.gauges) != \
+                (self.enabled_rates, self.enabled_gauges):
+            self._selector = MetricSelector(self.enabled_rates, self.enabled_gauges)
 
         self.publish_aliases = _is_affirmative(instance.get('publish_aliases', DEFAULT_PUBLISH_ALIASES))
         self.use_histogram = _is_affirmative(instance.get('use_histogram', DEFAULT_USE_HISTOGRAM))
@@ -113,23 +192,40 @@ class Kubernetes(AgentCheck):
         # kubelet metrics
         self._update_metrics(instance)
 
-    def _publish_raw_metrics(self, metric, dat, tags, depth=0):
+    def _publish_raw_metrics(self, metric, dat, tags):
+        rates, gauges = [], []
+        node = self._selector.root(metric)
+        if node is not None:
+            self._collect_raw_metrics(node, dat, rates, gauges)
+
+        if self.use_histogram:
+            for name, value in rates:
+                self.publish_rate(self, name, value, tags)
+            for name, value in gauges:
+                self.publish_gauge(self, name, value, tags)
+        else:
+            self.rates(rates, tags)
+            self.gauges(gauges, tags)
+
+    def _collect_raw_metrics(self, node, dat, rates, gauges, depth=0):
         if depth >= self.max_depth:
-            self.log.warning('Reached max depth on metric=%s' % metric)
+            self.log.warning('Reached max depth on metric=%s' % node.name)
             return
 
         if isinstance(dat, numbers.Number):
-            if self.enabled_rates and any([fnmatch(metric, pat) for pat in self.enabled_rates]):
-                self.publish_rate(self, metric, float(dat), tags)
-            elif self.enabled_gauges and any([fnmatch(metric, pat) for pat in self.enabled_gauges]):
-                self.publish_gauge(self, metric, float(dat), tags)
+            if node.kind == RATE:
+                rates.append((node.name, float(dat)))
+            elif node.kind == GAUGE:
+                gauges.append((node.name, float(dat)))
 
         elif isinstance(dat, dict):
             for k, v in dat.iteritems():
-                self._publish_raw_metrics(metric + '.%s' % k.lower(), v, tags, depth + 1)
+                child = self._selector.child(node, k)
+                if child is not None:
+                    self._collect_raw_metrics(child, v, rates, gauges, depth + 1)
 
         elif isinstance(dat, list):
-            self._publish_raw_metrics(metric, dat[-1], tags, depth + 1)
+            self._collect_raw_metrics(node, dat[-1], rates, gauges, depth + 1)
 
     @staticmethod
     def _shorten_name(name):
@@ -220,6 +316,8 @@ class Kubernetes(AgentCheck):
             # They are top aggregate views and don't have the previous metadata.
             tags.append("pod_name:no_pod")
 
+        # Normalize the tags once for all the metrics of the container
+        tags = self.tag_set(tags)
 
         stats = subcontainer['stats'][-1]  # take the latest
         self._publish_raw_metrics(NAMESPACE, stats, tags)
@@ -236,7 +334,7 @@ class Kubernetes(AgentCheck):
                               tags)
 
     def _retrieve_metrics(self, url):
-        return retrieve_json(url)
+        return self.kubeutil.retrieve_metrics(url)
 
     def _update_metrics(self, instance):
         pods_list = self.kubeutil.retrieve_pods_list()
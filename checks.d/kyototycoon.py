@@ -71,7 +71,7 @@ class KyotoTycoonCheck(AgentCheck):
 
 
         try:
-            r = requests.get(url)
+            r = self.http_client(instance).get(url)
             r.raise_for_status()
         except requests.exceptions.HTTPError as e:
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL,
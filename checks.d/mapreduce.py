@@ -46,7 +46,6 @@ from urlparse import urlsplit
 from urlparse import urlunsplit
 
 # 3rd party
-import requests
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError
 from simplejson import JSONDecodeError
 
@@ -70,10 +69,16 @@ MAPREDUCE_JOBS_PATH = 'ws/v1/mapreduce/jobs'
 YARN_APPLICATION_TYPES = 'MAPREDUCE'
 YARN_APPLICATION_STATES = 'RUNNING'
 
+# States of the jobs that are over
+JOB_FINISHED_STATES = frozenset(['SUCCEEDED', 'FAILED', 'KILLED', 'ERROR'])
+
 # Metric types
 HISTOGRAM = 'histogram'
 INCREMENT = 'increment'
 
+# Abandon the requests to the REST APIs running for longer (in seconds)
+REQUEST_POOL_TIMEOUT = 60
+
 # Metrics to collect
 MAPREDUCE_JOB_METRICS = {
     'elapsedTime': ('mapreduce.job.elapsed_time', HISTOGRAM),
@@ -123,6 +128,10 @@ class MapReduceCheck(AgentCheck):
         # Parse job specific counters
         self.job_specific_counters = self._parse_job_specific_counters(init_config)
 
+        # The counters and tasks of the finished jobs, they do not change anymore
+        # {rm_address: {(job_id, object): response}}
+        self._finished_job_objects = {}
+
     def check(self, instance):
         # Get properties from conf file
         rm_address = instance.get('resourcemanager_uri')
@@ -158,12 +167,17 @@ class MapReduceCheck(AgentCheck):
         # Get the applications from the application master
         running_jobs = self._mapreduce_job_metrics(running_apps, tags)
 
+        # Forget the finished jobs that are gone
+        finished_objects = self._finished_job_objects.get(rm_address, {})
+        self._finished_job_objects[rm_address] = dict((key, response) for key, response in finished_objects.iteritems()
+                                                      if key[0] in running_jobs)
+
         # # Get job counter metrics
-        self._mapreduce_job_counters_metrics(running_jobs, tags)
+        self._mapreduce_job_counters_metrics(rm_address, running_jobs, tags)
 
         # Get task metrics
         if collect_task_metrics:
-            self._mapreduce_task_metrics(running_jobs, tags)
+            self._mapreduce_task_metrics(rm_address, running_jobs, tags)
 
         # Report success after gathering all metrics from Application Master
         if running_jobs:
@@ -303,16 +317,18 @@ class MapReduceCheck(AgentCheck):
             'job_name': job_name,
             'app_name': app_name,
             'user_name': user_name,
-            'tracking_url': tracking_url
+            'tracking_url': tracking_url,
+            'state': state
         }
         '''
         running_jobs = {}
 
-        for app_id, (app_name, tracking_url) in running_apps.iteritems():
+        apps = running_apps.items()
+        responses = self.concurrent_map(self._rest_request_to_json,
+            [(tracking_url, MAPREDUCE_JOBS_PATH, MAPREDUCE_SERVICE_CHECK) for app_id, (app_name, tracking_url) in apps],
+            timeout=REQUEST_POOL_TIMEOUT)
 
-            metrics_json = self._rest_request_to_json(tracking_url,
-                MAPREDUCE_JOBS_PATH,
-                MAPREDUCE_SERVICE_CHECK)
+        for (app_id, (app_name, tracking_url)), metrics_json in zip(apps, responses):
 
             if metrics_json.get('jobs'):
                 if metrics_json['jobs'].get('job'):
@@ -328,7 +344,8 @@ class MapReduceCheck(AgentCheck):
                             running_jobs[str(job_id)] = {'job_name': str(job_name),
                                                     'app_name': str(app_name),
                                                     'user_name': str(user_name),
-                                                    'tracking_url': self._join_url_dir(tracking_url, MAPREDUCE_JOBS_PATH, job_id)}
+                                                    'tracking_url': self._join_url_dir(tracking_url, MAPREDUCE_JOBS_PATH, job_id),
+                                                    'state': job_json.get('state')}
 
                             tags = ['app_name:' + str(app_name),
                                     'user_name:' + str(user_name),
@@ -340,20 +357,45 @@ class MapReduceCheck(AgentCheck):
 
         return running_jobs
 
-    def _mapreduce_job_counters_metrics(self, running_jobs, addl_tags):
+    def _get_job_objects(self, rm_address, running_jobs, job_ids, object_path):
+        '''
+        Return a dictionary of {job_id: response} for the given object of each job,
+        queried concurrently. The objects of the finished jobs are only queried once.
+        '''
+        finished_objects = self._finished_job_objects.setdefault(rm_address, {})
+        objects = {}
+        for job_id in job_ids:
+            if (job_id, object_path) in finished_objects:
+                objects[job_id] = finished_objects[(job_id, object_path)]
+
+        stale_ids = [job_id for job_id in job_ids if job_id not in objects]
+        responses = self.concurrent_map(self._rest_request_to_json,
+            [(running_jobs[job_id]['tracking_url'], object_path, MAPREDUCE_SERVICE_CHECK) for job_id in stale_ids],
+            timeout=REQUEST_POOL_TIMEOUT)
+
+        for job_id, response in zip(stale_ids, responses):
+            objects[job_id] = response
+            if running_jobs[job_id]['state'] in JOB_FINISHED_STATES:
+                finished_objects[(job_id, object_path)] = response
+
+        return objects
+
+    def _mapreduce_job_counters_metrics(self, rm_address, running_jobs, addl_tags):
         '''
         Get custom metrics specified for each counter
         '''
+        job_ids = [job_id for job_id, job_metrics in running_jobs.iteritems()
+                   if self.general_counters or (job_metrics['job_name'] in self.job_specific_counters)]
+        counters = self._get_job_objects(rm_address, running_jobs, job_ids, 'counters')
+
         for job_id, job_metrics in running_jobs.iteritems():
             job_name = job_metrics['job_name']
 
             # Check if the job_name exist in the custom metrics
-            if self.general_counters or (job_name in self.job_specific_counters):
+            if job_id in counters:
                 job_specific_metrics = self.job_specific_counters.get(job_name)
 
-                metrics_json = self._rest_request_to_json(job_metrics['tracking_url'],
-                    'counters',
-                    MAPREDUCE_SERVICE_CHECK)
+                metrics_json = counters[job_id]
 
                 if metrics_json.get('jobCounters'):
                     if metrics_json['jobCounters'].get('counterGroup'):
@@ -392,16 +434,16 @@ class MapReduceCheck(AgentCheck):
                                                     counter,
                                                     MAPREDUCE_JOB_COUNTER_METRICS)
 
-    def _mapreduce_task_metrics(self, running_jobs, addl_tags):
+    def _mapreduce_task_metrics(self, rm_address, running_jobs, addl_tags):
         '''
         Get metrics for each MapReduce task
         Return a dictionary of {task_id: 'tracking_url'} for each MapReduce task
         '''
+        tasks = self._get_job_objects(rm_address, running_jobs, running_jobs.keys(), 'tasks')
+
         for job_id, job_stats in running_jobs.iteritems():
 
-            metrics_json = self._rest_request_to_json(job_stats['tracking_url'],
-                    'tasks',
-                    MAPREDUCE_SERVICE_CHECK)
+            metrics_json = tasks[job_id]
 
             if metrics_json.get('tasks'):
                 if metrics_json['tasks'].get('task'):
@@ -449,7 +491,7 @@ class MapReduceCheck(AgentCheck):
 
     def _rest_request_to_json(self, address, object_path, service_name, *args, **kwargs):
         '''
-        Query the given URL and return the JSON response
+        Query the given URL and return the JSON response, it may be called by several threads
         '''
         response_json = None
 
@@ -473,7 +515,9 @@ class MapReduceCheck(AgentCheck):
             url = urljoin(url, '?' + query)
 
         try:
-            response = requests.get(url)
+            # The applications are reached through the ResourceManager proxy: as many
+            # connections to it as concurrent requests
+            response = self.http_client(self._get_url_base(address), pool_size=self.io_pool_size()).get(url)
             response.raise_for_status()
             response_json = response.json()
 
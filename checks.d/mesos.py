@@ -5,6 +5,7 @@
 # stdlib
 from hashlib import md5
 import time
+from urlparse import urlparse
 
 # 3rd party
 import requests
@@ -88,7 +89,7 @@ class Mesos(AgentCheck):
         msg = None
         status = None
         try:
-            r = requests.get(url, timeout=timeout)
+            r = self.http_client(urlparse(url).netloc, timeout=timeout).get(url)
             if r.status_code != 200:
                 self.status_code_event(url, r, aggregation_key)
                 status = AgentCheck.CRITICAL
@@ -6,6 +6,9 @@
 
 Collects metrics from mesos master node, only the leader is sending metrics.
 """
+# stdlib
+from urlparse import urlparse
+
 # 3rd party
 import requests
 
@@ -128,7 +131,7 @@ class MesosMaster(AgentCheck):
         msg = None
         status = None
         try:
-            r = requests.get(url, timeout=timeout)
+            r = self.http_client(urlparse(url).netloc, timeout=timeout).get(url)
             if r.status_code != 200:
                 status = AgentCheck.CRITICAL
                 msg = "Got %s when hitting %s" % (r.status_code, url)
@@ -578,7 +578,7 @@ class MongoDb(AgentCheck):
 
         additional_metrics = instance.get('additional_metrics', [])
 
-        tags = instance.get('tags', [])
+        tags = list(instance.get('tags', []))
         tags.append('server:%s' % clean_server_name)
 
         # Get the list of metrics to collect
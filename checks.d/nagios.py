@@ -8,6 +8,7 @@ import re
 
 # project
 from checks import AgentCheck
+from config import _is_affirmative
 from utils.tailfile import TailFile
 
 # fields order for each event type, as named tuples
@@ -68,6 +69,7 @@ class Nagios(AgentCheck):
         AgentCheck.__init__(self, name, init_config, agentConfig, instances)
         self.nagios_tails = {}
         check_freq = init_config.get("check_freq", 15)
+        use_inotify = _is_affirmative(agentConfig.get('tail_use_inotify', False))
         if instances is not None:
             for instance in instances:
                 tailers = []
@@ -105,7 +107,8 @@ class Nagios(AgentCheck):
                         event_func=self.event,
                         gauge_func=self.gauge,
                         freq=check_freq,
-                        passive_checks=instance.get('passive_checks_events', False)))
+                        passive_checks=instance.get('passive_checks_events', False),
+                        use_inotify=use_inotify))
                 if 'host_perfdata_file' in nagios_conf and \
                    'host_perfdata_file_template' in nagios_conf and \
                    instance.get('collect_host_performance_data', False):
@@ -117,7 +120,8 @@ class Nagios(AgentCheck):
                         hostname=self.hostname,
                         event_func=self.event,
                         gauge_func=self.gauge,
-                        freq=check_freq))
+                        freq=check_freq,
+                        use_inotify=use_inotify))
                 if 'service_perfdata_file' in nagios_conf and \
                    'service_perfdata_file_template' in nagios_conf and \
                    instance.get('collect_service_performance_data', False):
@@ -129,7 +133,8 @@ class Nagios(AgentCheck):
                         hostname=self.hostname,
                         event_func=self.event,
                         gauge_func=self.gauge,
-                        freq=check_freq))
+                        freq=check_freq,
+                        use_inotify=use_inotify))
 
                 self.nagios_tails[instance_key] = tailers
 
@@ -179,7 +184,8 @@ class Nagios(AgentCheck):
 
 class NagiosTailer(object):
 
-    def __init__(self, log_path, file_template, logger, hostname, event_func, gauge_func, freq):
+    def __init__(self, log_path, file_template, logger, hostname, event_func, gauge_func, freq,
+                 use_inotify=False):
         '''
         :param log_path: string, path to the file to parse
         :param file_template: string, format of the perfdata file
@@ -188,6 +194,7 @@ class NagiosTailer(object):
         :param event_func: function to create event, should accept dict
         :param gauge_func: function to report a gauge
         :param freq: int, size of bucket to aggregate perfdata metrics
+        :param use_inotify: bool, skip reading the file while inotify reports no change
         '''
         self.log_path = log_path
         self.log = logger
@@ -202,7 +209,7 @@ class NagiosTailer(object):
         if file_template is not None:
             self.compile_file_template(file_template)
 
-        self.tail = TailFile(self.log, self.log_path, self._parse_line)
+        self.tail = TailFile(self.log, self.log_path, self._parse_line, use_inotify=use_inotify)
         self.gen = self.tail.tail(line_by_line=False, move_end=True)
         self.gen.next()
 
@@ -232,7 +239,7 @@ class NagiosTailer(object):
 class NagiosEventLogTailer(NagiosTailer):
 
     def __init__(self, log_path, file_template, logger, hostname, event_func,
-                 gauge_func, freq, passive_checks=False):
+                 gauge_func, freq, passive_checks=False, use_inotify=False):
         '''
         :param log_path: string, path to the file to parse
         :param file_template: string, format of the perfdata file
@@ -242,11 +249,12 @@ class NagiosEventLogTailer(NagiosTailer):
         :param gauge_func: function to report a gauge
         :param freq: int, size of bucket to aggregate perfdata metrics
         :param passive_checks: bool, enable or not passive checks events
+        :param use_inotify: bool, skip reading the file while inotify reports no change
         '''
         self.passive_checks = passive_checks
         super(NagiosEventLogTailer, self).__init__(
             log_path, file_template,
-            logger, hostname, event_func, gauge_func, freq
+            logger, hostname, event_func, gauge_func, freq, use_inotify=use_inotify
         )
 
     def _parse_line(self, line):
@@ -6,6 +6,7 @@
 Collects network metrics.
 """
 # stdlib
+from collections import defaultdict
 import re
 
 # project
@@ -59,9 +60,25 @@ class Network(AgentCheck):
             "LAST_ACK": "closing",
             "LISTEN": "listening",
             "CLOSING": "closing",
+        },
+        # /proc/net/tcp{,6} states (include/net/tcp_states.h)
+        "proc": {
+            "01": "established",
+            "02": "opening",
+            "03": "opening",
+            "04": "closing",
+            "05": "closing",
+            "06": "time_wait",
+            "07": "closing",
+            "08": "closing",
+            "09": "closing",
+            "0A": "listening",
+            "0B": "closing",
         }
     }
 
+    PROC_NET_CHUNK_SIZE = 1024 * 1024
+
     CX_STATE_GAUGE = {
         ('udp4', 'connections') : 'system.net.udp4.connections',
         ('udp6', 'connections') : 'system.net.udp6.connections',
@@ -146,46 +163,14 @@ class Network(AgentCheck):
         proc_location = self.agentConfig.get('procfs_path', '/proc').rstrip('/')
         if self._collect_cx_state:
             try:
-                self.log.debug("Using `ss` to collect connection state")
-                # Try using `ss` for increased performance over `netstat`
-                for ip_version in ['4', '6']:
-                    # Call `ss` for each IP version because there's no built-in way of distinguishing
-                    # between the IP versions in the output
-                    output, _, _ = get_subprocess_output(["ss", "-n", "-u", "-t", "-a", "-{0}".format(ip_version)], self.log)
-                    lines = output.splitlines()
-                    # Netid  State      Recv-Q Send-Q     Local Address:Port       Peer Address:Port
-                    # udp    UNCONN     0      0              127.0.0.1:8125                  *:*
-                    # udp    ESTAB      0      0              127.0.0.1:37036         127.0.0.1:8125
-                    # udp    UNCONN     0      0        fe80::a00:27ff:fe1c:3c4:123          :::*
-                    # tcp    TIME-WAIT  0      0          90.56.111.177:56867        46.105.75.4:143
-                    # tcp    LISTEN     0      0       ::ffff:127.0.0.1:33217  ::ffff:127.0.0.1:7199
-                    # tcp    ESTAB      0      0       ::ffff:127.0.0.1:58975  ::ffff:127.0.0.1:2181
-
-                    metrics = self._parse_linux_cx_state(lines[1:], self.TCP_STATES['ss'], 1, ip_version=ip_version)
-                    # Only send the metrics which match the loop iteration's ip version
-                    for stat, metric in self.CX_STATE_GAUGE.iteritems():
-                        if stat[0].endswith(ip_version):
-                            self.gauge(metric, metrics.get(metric))
-
-            except OSError:
-                self.log.info("`ss` not found: using `netstat` as a fallback")
-                output, _, _ = get_subprocess_output(["netstat", "-n", "-u", "-t", "-a"], self.log)
-                lines = output.splitlines()
-                # Active Internet connections (w/o servers)
-                # Proto Recv-Q Send-Q Local Address           Foreign Address         State
-                # tcp        0      0 46.105.75.4:80          79.220.227.193:2032     SYN_RECV
-                # tcp        0      0 46.105.75.4:143         90.56.111.177:56867     ESTABLISHED
-                # tcp        0      0 46.105.75.4:50468       107.20.207.175:443      TIME_WAIT
-                # tcp6       0      0 46.105.75.4:80          93.15.237.188:58038     FIN_WAIT2
-                # tcp6       0      0 46.105.75.4:80          79.220.227.193:2029     ESTABLISHED
-                # udp        0      0 0.0.0.0:123             0.0.0.0:*
-                # udp6       0      0 :::41458                :::*
-
-                metrics = self._parse_linux_cx_state(lines[2:], self.TCP_STATES['netstat'], 5)
+                self.log.debug("Using /proc/net to collect connection state")
+                metrics = self._get_proc_net_cx_state(proc_location)
+            except IOError as e:
+                self.log.debug("Unable to read /proc/net (%s), using `ss` or `netstat`", e)
+                self._check_linux_cx_state_subprocess()
+            else:
                 for metric, value in metrics.iteritems():
                     self.gauge(metric, value)
-            except SubprocessOutputEmptyError:
-                self.log.exception("Error collecting connection stats.")
 
         proc_dev_path = "{}/net/dev".format(proc_location)
         proc = open(proc_dev_path, 'r')
@@ -276,6 +261,110 @@ class Network(AgentCheck):
             # On Openshift, /proc/net/snmp is only readable by root
             self.log.debug("Unable to read %s.", proc_snmp_path)
 
+    def _check_linux_cx_state_subprocess(self):
+        try:
+            self.log.debug("Using `ss` to collect connection state")
+            # Try using `ss` for increased performance over `netstat`
+            for ip_version in ['4', '6']:
+                # Call `ss` for each IP version because there's no built-in way of distinguishing
+                # between the IP versions in the output
+                output, _, _ = get_subprocess_output(["ss", "-n", "-u", "-t", "-a", "-{0}".format(ip_version)], self.log)
+                lines = output.splitlines()
+                # Netid  State      Recv-Q Send-Q     Local Address:Port       Peer Address:Port
+                # udp    UNCONN     0      0              127.0.0.1:8125                  *:*
+                # udp    ESTAB      0      0              127.0.0.1:37036         127.0.0.1:8125
+                # udp    UNCONN     0      0        fe80::a00:27ff:fe1c:3c4:123          :::*
+                # tcp    TIME-WAIT  0      0          90.56.111.177:56867        46.105.75.4:143
+                # tcp    LISTEN     0      0       ::ffff:127.0.0.1:33217  ::ffff:127.0.0.1:7199
+                # tcp    ESTAB      0      0       ::ffff:127.0.0.1:58975  ::ffff:127.0.0.1:2181
+
+                metrics = self._parse_linux_cx_state(lines[1:], self.TCP_STATES['ss'], 1, ip_version=ip_version)
+                # Only send the metrics which match the loop iteration's ip version
+                for stat, metric in self.CX_STATE_GAUGE.iteritems():
+                    if stat[0].endswith(ip_version):
+                        self.gauge(metric, metrics.get(metric))
+
+        except OSError:
+            self.log.info("`ss` not found: using `netstat` as a fallback")
+            output, _, _ = get_subprocess_output(["netstat", "-n", "-u", "-t", "-a"], self.log)
+            lines = output.splitlines()
+            # Active Internet connections (w/o servers)
+            # Proto Recv-Q Send-Q Local Address           Foreign Address         State
+            # tcp        0      0 46.105.75.4:80          79.220.227.193:2032     SYN_RECV
+            # tcp        0      0 46.105.75.4:143         90.56.111.177:56867     ESTABLISHED
+            # tcp        0      0 46.105.75.4:50468       107.20.207.175:443      TIME_WAIT
+            # tcp6       0      0 46.105.75.4:80          93.15.237.188:58038     FIN_WAIT2
+            # tcp6       0      0 46.105.75.4:80          79.220.227.193:2029     ESTABLISHED
+            # udp        0      0 0.0.0.0:123             0.0.0.0:*
+            # udp6       0      0 :::41458                :::*
+
+            metrics = self._parse_linux_cx_state(lines[2:], self.TCP_STATES['netstat'], 5)
+            for metric, value in metrics.iteritems():
+                self.gauge(metric, value)
+        except SubprocessOutputEmptyError:
+            self.log.exception("Error collecting connection stats.")
+
+    def _count_proc_net_sockets(self, path):
+        """
+        Count the sockets of a /proc/net/{tcp,udp}{,6} file by state (its 4th
+        column), reading it in large chunks and without parsing the sockets
+        any further.
+        """
+        counts = defaultdict(int)
+        with open(path, 'r') as f:
+            # Header line
+            f.readline()
+            pending = ''
+            while True:
+                chunk = f.read(self.PROC_NET_CHUNK_SIZE)
+                if not chunk:
+                    lines = pending.split('\n')
+                else:
+                    # Only count complete lines, the last one is completed by the next chunk
+                    lines = (pending + chunk).split('\n')
+                    pending = lines.pop()
+                for line in lines:
+                    if line:
+                        counts[line.split(None, 4)[3]] += 1
+                if not chunk:
+                    break
+        return counts
+
+    def _get_proc_net_cx_state(self, proc_location):
+        """
+        Count the connections by state from /proc/net, as `ss` would.
+        A missing file (e.g. /proc/net/tcp6 with IPv6 disabled) counts as no
+        connections, IOError is raised only if none can be read.
+        Returns a dict metric_name -> value
+        """
+        metrics = dict.fromkeys(self.CX_STATE_GAUGE.values(), 0)
+        tcp_states = self.TCP_STATES['proc']
+        read = False
+        error = None
+        for ip_version, suffix in [('4', ''), ('6', '6')]:
+            for protocol in ['tcp', 'udp']:
+                path = "{0}/net/{1}{2}".format(proc_location, protocol, suffix)
+                try:
+                    counts = self._count_proc_net_sockets(path)
+                except IOError as e:
+                    # Only this family is missing, e.g. with IPv6 disabled
+                    self.log.debug("Unable to read %s (%s), skipping it", path, e)
+                    error = e
+                    continue
+                read = True
+
+                if protocol == 'tcp':
+                    for state, count in counts.iteritems():
+                        if state in tcp_states:
+                            metrics[self.CX_STATE_GAUGE['tcp' + ip_version, tcp_states[state]]] += count
+                else:
+                    metrics[self.CX_STATE_GAUGE['udp' + ip_version, 'connections']] = sum(counts.itervalues())
+
+        if not read:
+            raise error
+
+        return metrics
+
     # Parse the output of the command that retrieves the connection state (either `ss` or `netstat`)
     # Returns a dict metric_name -> value
     def _parse_linux_cx_state(self, lines, tcp_states, state_col, ip_version=None):
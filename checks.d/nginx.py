@@ -7,7 +7,6 @@ import re
 import urlparse
 
 # 3rd party
-import requests
 import simplejson as json
 
 # project
@@ -72,8 +71,9 @@ class Nginx(AgentCheck):
         service_check_tags = ['host:%s' % nginx_host, 'port:%s' % nginx_port]
         try:
             self.log.debug(u"Querying URL: {0}".format(url))
-            r = requests.get(url, auth=auth, headers=headers(self.agentConfig),
-                             verify=ssl_validation)
+            http = self.http_client(instance, auth=auth, headers=headers(self.agentConfig),
+                                    verify=ssl_validation)
+            r = http.get(url)
             r.raise_for_status()
         except Exception:
             self.service_check(service_check_name, AgentCheck.CRITICAL,
@@ -4,6 +4,7 @@
 
 # stdlib
 from datetime import datetime, timedelta
+import threading
 from urlparse import urljoin
 
 # project
@@ -21,6 +22,8 @@ DEFAULT_NOVA_API_VERSION = 'v2.1'
 DEFAULT_NEUTRON_API_VERSION = 'v2.0'
 
 DEFAULT_API_REQUEST_TIMEOUT = 5 # seconds
+# Abandon the calls running on the I/O pool for longer, a call may renew the token and retry
+REQUEST_POOL_TIMEOUT = 30 # seconds
 
 NOVA_HYPERVISOR_METRICS = [
     'current_workload',
@@ -301,17 +304,13 @@ class KeystoneCatalog(object):
 
 
 class OpenStackCheck(AgentCheck):
+    # Can be overriden with `cache_ttl` in init_config
     CACHE_TTL = {
         "aggregates": 300, # seconds
         "physical_hosts": 300,
-        "hypervisors": 300
-    }
-
-    FETCH_TIME_ACCESSORS = {
-        "aggregates": "_last_aggregate_fetch_time",
-        "physical_hosts": "_last_host_fetch_time",
-        "hypervisors": "_last_hypervisor_fetch_time"
-
+        "hypervisors": 300,
+        "servers": 60,
+        "networks": 300,
     }
 
     HYPERVISOR_STATE_UP = 'up'
@@ -337,22 +336,56 @@ class OpenStackCheck(AgentCheck):
         if not self.keystone_server_url:
             raise IncompleteConfig()
 
+        self.CACHE_TTL = dict(self.CACHE_TTL, **(init_config.get("cache_ttl") or {}))
+
         ### Cache some things between runs for values that change rarely
-        self._aggregate_list = None
+        # {(entry, instance key): value}, when it was fetched, and its refresh running in the background
+        self._cache = {}
+        self._cache_fetch_times = {}
+        self._cache_refreshes = {}
 
         # Mapping of check instances to associated OpenStack project scopes
         self.instance_map = {}
 
+        # The scopes are renewed by one thread at a time, {expired scope: new scope}
+        self._auth_lock = threading.RLock()
+        self._renewed_scopes = {}
+
+        # The scope of the API requests of each thread
+        self._local = threading.local()
+
         # Mapping of Nova-managed servers to tags
         self.external_host_tags = {}
 
+    @property
+    def _current_scope(self):
+        return self._local.scope
+
+    @_current_scope.setter
+    def _current_scope(self, scope):
+        self._local.scope = scope
+
+    def _get_http_client(self):
+        # The requests of all the instances share the connections to the OpenStack APIs
+        return self.http_client(self.init_config, timeout=DEFAULT_API_REQUEST_TIMEOUT,
+                                pool_size=self.io_pool_size())
+
     def _make_request_with_auth_fallback(self, url, headers=None, verify=True, params=None):
         """
         Generic request handler for OpenStack API requests
         Raises specialized Exceptions for commonly encountered error codes
+
+        When the token expired, the request is sent again once the current scope is renewed
         """
+        client = self._get_http_client()
+        resp = client.get(url, headers=headers, verify=verify, params=params)
+        if resp.status_code == 401 and headers and headers.get('X-Auth-Token'):
+            scope = self._renew_current_scope()
+            if scope is not None:
+                headers = dict(headers, **{'X-Auth-Token': scope.auth_token})
+                resp = client.get(url, headers=headers, verify=verify, params=params)
+
         try:
-            resp = requests.get(url, headers=headers, verify=verify, params=params, timeout=DEFAULT_API_REQUEST_TIMEOUT)
             resp.raise_for_status()
         except requests.exceptions.HTTPError:
             if resp.status_code == 401:
@@ -376,10 +409,39 @@ class OpenStackCheck(AgentCheck):
 
     def delete_current_scope(self):
         scope_to_delete = self._current_scope
-        for i_key, scope in self.instance_map.items():
-            if scope is scope_to_delete:
-                self.log.debug("Deleting current scope: %s", i_key)
-                del self.instance_map[i_key]
+        with self._auth_lock:
+            for i_key, scope in self.instance_map.items():
+                if scope is scope_to_delete:
+                    self.log.debug("Deleting current scope: %s", i_key)
+                    del self.instance_map[i_key]
+
+    def _renew_current_scope(self):
+        """
+        Replace the current scope, whose token expired, by a new one and return it, or None
+        when it can't be renewed. A single token is requested: the other threads failing
+        with the same token wait for it.
+        """
+        expired_scope = self._current_scope
+        with self._auth_lock:
+            if expired_scope not in self._renewed_scopes:
+                new_scope = None
+                i_key = next((key for key, scope in self.instance_map.iteritems() if scope is expired_scope), None)
+                instance = next((i for i in self.instances if i_key and i.get('name') == i_key), None)
+                if instance is not None:
+                    self.log.info("Renewing the auth token of instance %s", i_key)
+                    try:
+                        new_scope = OpenStackProjectScope.from_config(self.init_config, instance)
+                    except Exception as e:
+                        self.log.warning("Unable to renew the auth token of instance %s: %s", i_key, e)
+                        del self.instance_map[i_key]
+                    else:
+                        self.instance_map[i_key] = new_scope
+                self._renewed_scopes[expired_scope] = new_scope
+            scope = self._renewed_scopes[expired_scope]
+
+        if scope is not None:
+            self._current_scope = scope
+        return scope
 
     def get_scope_for_instance(self, instance):
         i_key = self._instance_key(instance)
@@ -411,14 +473,15 @@ class OpenStackCheck(AgentCheck):
 
         return self.get_scope_for_instance(instance).service_catalog.neutron_endpoint
 
-    def get_network_stats(self):
+    def get_network_stats(self, i_key=None):
         """
         Collect stats for all reachable networks
         """
 
         # FIXME: (aaditya) Check all networks defaults to true until we can reliably assign agents to networks to monitor
         if self.init_config.get('check_all_networks', True):
-            network_ids = list(set(self.get_all_network_ids()) - set(self.init_config.get('exclude_network_ids', [])))
+            all_network_ids = self._get_cached("networks", i_key, self.get_all_network_ids)
+            network_ids = list(set(all_network_ids) - set(self.init_config.get('exclude_network_ids', [])))
         else:
             network_ids = self.init_config.get('network_ids', [])
 
@@ -426,8 +489,11 @@ class OpenStackCheck(AgentCheck):
             self.warning("Your check is not configured to monitor any networks.\n" +
                          "Please list `network_ids` under your init_config")
 
-        for nid in network_ids:
-            self.get_stats_for_single_network(nid)
+        # The networks are queried concurrently
+        all_net_details = self._concurrent_map_in_scope(self.get_details_for_single_network,
+                                                        [(nid,) for nid in network_ids])
+        for nid, net_details in zip(network_ids, all_net_details):
+            self.get_stats_for_single_network(nid, net_details=net_details)
 
     def get_all_network_ids(self):
         url = '{0}/{1}/networks'.format(self.get_neutron_endpoint(), DEFAULT_NEUTRON_API_VERSION)
@@ -442,10 +508,14 @@ class OpenStackCheck(AgentCheck):
             self.warning('Unable to get the list of all network ids: {0}'.format(str(e)))
         return network_ids
 
-    def get_stats_for_single_network(self, network_id):
+    def get_details_for_single_network(self, network_id):
         url = '{0}/{1}/networks/{2}'.format(self.get_neutron_endpoint(), DEFAULT_NEUTRON_API_VERSION, network_id)
         headers = {'X-Auth-Token': self.get_auth_token()}
-        net_details = self._make_request_with_auth_fallback(url, headers, verify=self._ssl_verify)
+        return self._make_request_with_auth_fallback(url, headers, verify=self._ssl_verify)
+
+    def get_stats_for_single_network(self, network_id, net_details=None):
+        if net_details is None:
+            net_details = self.get_details_for_single_network(network_id)
 
         service_check_tags = ['network:{0}'.format(network_id)]
 
@@ -606,10 +676,7 @@ class OpenStackCheck(AgentCheck):
 
         return server_ids
 
-    def get_stats_for_single_server(self, server_id, tags=None):
-        def _is_valid_metric(label):
-            return label in NOVA_SERVER_METRICS or any(seg in label for seg in NOVA_SERVER_INTERFACE_SEGMENTS)
-
+    def get_diagnostics_for_single_server(self, server_id):
         url = '{0}/servers/{1}/diagnostics'.format(self.get_nova_endpoint(), server_id)
         headers = {'X-Auth-Token': self.get_auth_token()}
         server_stats = {}
@@ -621,6 +688,15 @@ class OpenStackCheck(AgentCheck):
         except Exception as e:
             self.warning("Unknown error when monitoring %s : %s" % (server_id, e))
 
+        return server_stats
+
+    def get_stats_for_single_server(self, server_id, tags=None, server_stats=None):
+        def _is_valid_metric(label):
+            return label in NOVA_SERVER_METRICS or any(seg in label for seg in NOVA_SERVER_INTERFACE_SEGMENTS)
+
+        if server_stats is None:
+            server_stats = self.get_diagnostics_for_single_server(server_id)
+
         if server_stats:
             tags = tags or []
             for st in server_stats:
@@ -648,18 +724,57 @@ class OpenStackCheck(AgentCheck):
     ###
 
     ### Cache util
-    def _is_expired(self, entry):
-        assert entry in ["aggregates", "physical_hosts", "hypervisors"]
+    def _is_expired(self, entry, key=None):
+        assert entry in self.CACHE_TTL
         ttl = self.CACHE_TTL.get(entry)
-        last_fetch_time = getattr(self, self.FETCH_TIME_ACCESSORS.get(entry))
+        last_fetch_time = self._cache_fetch_times.get((entry, key), datetime.min)
         return datetime.now() - last_fetch_time > timedelta(seconds=ttl)
 
+    def _get_cached(self, entry, key, fetch):
+        """
+        Return the value of `fetch()` cached for the entry and the key (of an instance)
+
+        An empty value is fetched again right away. Once expired, the value is still returned
+        while a new one is fetched in the background, on behalf of the current scope: it
+        replaces the value on a later call.
+        """
+        cache_key = (entry, key)
+        refresh = self._cache_refreshes.get(cache_key)
+        if refresh is not None and refresh.ready():
+            del self._cache_refreshes[cache_key]
+            try:
+                self._cache[cache_key] = refresh.get()
+                self._cache_fetch_times[cache_key] = datetime.now()
+            except Exception as e:
+                self.log.warning("Unable to refresh the %s: %s", entry, e)
+
+        if not self._cache.get(cache_key):
+            self._cache[cache_key] = fetch()
+            self._cache_fetch_times[cache_key] = datetime.now()
+        elif self._is_expired(entry, key) and cache_key not in self._cache_refreshes:
+            self.log.debug("Refreshing the %s in the background", entry)
+            self._cache_refreshes[cache_key] = self.apply_async(self._call_in_scope, (self._current_scope, fetch),
+                                                                timeout=REQUEST_POOL_TIMEOUT)
+
+        return self._cache[cache_key]
+
     def _get_and_set_aggregate_list(self):
-        if not self._aggregate_list or self._is_expired("aggregates"):
-            self._aggregate_list = self.get_all_aggregate_hypervisors()
-            self._last_aggregate_fetch_time = datetime.now()
+        return self._get_cached("aggregates", None, self.get_all_aggregate_hypervisors)
+    ###
+
+    ### Concurrency util
+    def _call_in_scope(self, scope, func, *args):
+        self._current_scope = scope
+        return func(*args)
 
-        return self._aggregate_list
+    def _concurrent_map_in_scope(self, func, args_list):
+        """
+        Call `func(*args)` for each tuple of arguments on the I/O pool, on behalf of the current
+        scope, and return their results in the same order
+        """
+        scope = self._current_scope
+        return self.concurrent_map(self._call_in_scope, [(scope, func) + tuple(args) for args in args_list],
+                                   timeout=REQUEST_POOL_TIMEOUT)
     ###
 
     def _send_api_service_checks(self, instance_scope):
@@ -667,14 +782,14 @@ class OpenStackCheck(AgentCheck):
         headers = {"X-Auth-Token": instance_scope.auth_token}
 
         try:
-            requests.get(instance_scope.service_catalog.nova_endpoint, headers=headers, verify=self._ssl_verify, timeout=DEFAULT_API_REQUEST_TIMEOUT)
+            self._get_http_client().get(instance_scope.service_catalog.nova_endpoint, headers=headers, verify=self._ssl_verify)
             self.service_check(self.COMPUTE_API_SC, AgentCheck.OK, tags=["keystone_server:%s" % self.init_config.get("keystone_server_url")])
         except (requests.exceptions.HTTPError, requests.exceptions.Timeout, requests.exceptions.ConnectionError):
             self.service_check(self.COMPUTE_API_SC, AgentCheck.CRITICAL, tags=["keystone_server:%s" % self.init_config.get("keystone_server_url")])
 
         # Neutron
         try:
-            requests.get(instance_scope.service_catalog.neutron_endpoint, headers=headers, verify=self._ssl_verify, timeout=DEFAULT_API_REQUEST_TIMEOUT)
+            self._get_http_client().get(instance_scope.service_catalog.neutron_endpoint, headers=headers, verify=self._ssl_verify)
             self.service_check(self.NETWORK_API_SC, AgentCheck.OK, tags=["keystone_server:%s" % self.init_config.get("keystone_server_url")])
         except (requests.exceptions.HTTPError, requests.exceptions.Timeout, requests.exceptions.ConnectionError):
             self.service_check(self.NETWORK_API_SC, AgentCheck.CRITICAL, tags=["keystone_server:%s" % self.init_config.get("keystone_server_url")])
@@ -728,6 +843,10 @@ class OpenStackCheck(AgentCheck):
             self._send_api_service_checks(instance_scope)
             # Store the scope on the object so we don't have to keep passing it around
             self._current_scope = instance_scope
+            # The scopes renewed during the previous runs are no longer in use
+            with self._auth_lock:
+                self._renewed_scopes.clear()
+            i_key = self._instance_key(instance)
 
             self.log.debug("Running check with credentials: \n")
             self.log.debug("Nova Url: %s", self.get_nova_endpoint())
@@ -737,24 +856,27 @@ class OpenStackCheck(AgentCheck):
             # Restrict monitoring to this (host, hypervisor, project)
             # and it's guest servers
 
-            hyp = self.get_local_hypervisor()
+            hyp = self._get_cached("hypervisors", i_key, self.get_local_hypervisor)
             project = self.get_scoped_project(instance)
 
             # Restrict monitoring to non-excluded servers
             excluded_server_ids = self.init_config.get("exclude_server_ids", [])
             servers = list(
-                set(self.get_servers_managed_by_hypervisor()) - set(excluded_server_ids)
+                set(self._get_cached("servers", i_key, self.get_servers_managed_by_hypervisor)) - set(excluded_server_ids)
             )
 
             host_tags = self._get_tags_for_host()
 
-            for sid in servers:
+            # The servers are queried concurrently
+            all_server_stats = self._concurrent_map_in_scope(self.get_diagnostics_for_single_server,
+                                                             [(sid,) for sid in servers])
+            for sid, server_stats in zip(servers, all_server_stats):
                 server_tags = ["nova_managed_server"]
                 if instance_scope.tenant_id:
                     server_tags.append("tenant_id:%s" % instance_scope.tenant_id)
 
                 self.external_host_tags[sid] = host_tags
-                self.get_stats_for_single_server(sid, tags=server_tags)
+                self.get_stats_for_single_server(sid, tags=server_tags, server_stats=server_stats)
 
             if hyp:
                 self.get_stats_for_single_hypervisor(hyp, host_tags=host_tags)
@@ -765,7 +887,7 @@ class OpenStackCheck(AgentCheck):
                 self.get_stats_for_single_project(project)
 
             # For now, monitor all networks
-            self.get_network_stats()
+            self.get_network_stats(i_key)
 
         except IncompleteConfig as e:
             if isinstance(e, IncompleteAuthScope):
@@ -838,11 +960,12 @@ class OpenStackCheck(AgentCheck):
         hostname = self.get_my_hostname()
 
         tags = []
-        if hostname in self._get_and_set_aggregate_list():
-            tags.append('aggregate:{0}'.format(self._aggregate_list[hostname]['aggregate']))
+        aggregate_list = self._get_and_set_aggregate_list()
+        if hostname in aggregate_list:
+            tags.append('aggregate:{0}'.format(aggregate_list[hostname]['aggregate']))
             # Need to check if there is a value for availability_zone because it is possible to have an aggregate without an AZ
-            if self._aggregate_list[hostname]['availability_zone']:
-                tags.append('availability_zone:{0}'.format(self._aggregate_list[hostname]['availability_zone']))
+            if aggregate_list[hostname]['availability_zone']:
+                tags.append('availability_zone:{0}'.format(aggregate_list[hostname]['availability_zone']))
         else:
             self.log.info('Unable to find hostname %s in aggregate list. Assuming this host is unaggregated', hostname)
 
@@ -2,9 +2,6 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 
-# 3p
-import requests
-
 # project
 from checks import AgentCheck
 from util import headers
@@ -49,30 +46,30 @@ class PHPFPMCheck(AgentCheck):
         if status_url is None and ping_url is None:
             raise Exception("No status_url or ping_url specified for this instance")
 
+        http = self.http_client(instance, auth=auth, headers=headers(self.agentConfig))
+
         pool = None
         status_exception = None
         if status_url is not None:
             try:
-                pool = self._process_status(status_url, auth, tags)
+                pool = self._process_status(status_url, http, tags)
             except Exception as e:
                 status_exception = e
                 pass
 
         if ping_url is not None:
-            self._process_ping(ping_url, ping_reply, auth, tags, pool)
+            self._process_ping(ping_url, ping_reply, http, tags, pool)
 
         # pylint doesn't understand that we are raising this only if it's here
         if status_exception is not None:
             raise status_exception  # pylint: disable=E0702
 
-    def _process_status(self, status_url, auth, tags):
+    def _process_status(self, status_url, http, tags):
         data = {}
         try:
             # TODO: adding the 'full' parameter gets you per-process detailed
             # informations, which could be nice to parse and output as metrics
-            resp = requests.get(status_url, auth=auth,
-                                headers=headers(self.agentConfig),
-                                params={'json': True})
+            resp = http.get(status_url, params={'json': True})
             resp.raise_for_status()
 
             data = resp.json()
@@ -98,7 +95,7 @@ class PHPFPMCheck(AgentCheck):
         # return pool, to tag the service check with it if we have one
         return pool_name
 
-    def _process_ping(self, ping_url, ping_reply, auth, tags, pool_name):
+    def _process_ping(self, ping_url, ping_reply, http, tags, pool_name):
         if ping_reply is None:
             ping_reply = 'pong'
 
@@ -107,8 +104,7 @@ class PHPFPMCheck(AgentCheck):
         try:
             # TODO: adding the 'full' parameter gets you per-process detailed
             # informations, which could be nice to parse and output as metrics
-            resp = requests.get(ping_url, auth=auth,
-                                headers=headers(self.agentConfig))
+            resp = http.get(ping_url)
             resp.raise_for_status()
 
             if ping_reply not in resp.text:
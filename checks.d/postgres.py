@@ -16,6 +16,7 @@ from pg8000 import InterfaceError, ProgrammingError
 # project
 from checks import AgentCheck, CheckException
 from config import _is_affirmative
+from utils.containers import thaw
 
 MAX_CUSTOM_RESULTS = 100
 TABLE_COUNT_LIMIT = 200
@@ -608,6 +609,8 @@ SELECT s.schemaname,
             return self.custom_metrics[key]
 
         # Otherwise pre-process custom metrics and verify definition
+        # on a copy: the collector methods replace their names, and the instance is read-only
+        custom_metrics = thaw(custom_metrics)
         required_parameters = ("descriptors", "metrics", "query", "relation")
 
         for m in custom_metrics:
@@ -4,9 +4,6 @@ from collections import namedtuple
 # Datadog
 from checks import AgentCheck
 
-# 3p
-import requests
-
 
 class PowerDNSRecursorCheck(AgentCheck):
     # See https://doc.powerdns.com/md/recursor/stats/ for metrics explanation
@@ -66,7 +63,7 @@ class PowerDNSRecursorCheck(AgentCheck):
         service_check_tags = ['recursor_host:{}'.format(config.host), 'recursor_port:{}'.format(config.port)]
         headers = {"X-API-Key": config.api_key}
         try:
-            request = requests.get(url, headers=headers)
+            request = self.http_client(config, headers=headers).get(url)
             request.raise_for_status()
         except Exception:
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL,
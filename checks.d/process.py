@@ -5,6 +5,7 @@
 
 # stdlib
 from collections import defaultdict
+import os
 import time
 
 # 3p
@@ -14,6 +15,7 @@ import psutil
 from checks import AgentCheck
 from config import _is_affirmative
 from utils.platform import Platform
+from utils.procfs import ProcSnapshotter
 
 
 DEFAULT_AD_CACHE_DURATION = 120
@@ -44,6 +46,62 @@ ATTR_TO_METRIC_RATE = {
 }
 
 
+# Longest process name in /proc/<pid>/stat
+COMM_LENGTH = 15
+
+
+def get_process_name(process):
+    """
+    Name of a process of a snapshot, as given by psutil: the kernel truncates
+    it, the full one is then the name of its executable.
+    """
+    name = process.name
+    if len(name) >= COMM_LENGTH and process.cmdline:
+        extended_name = os.path.basename(process.cmdline[0])
+        if extended_name.startswith(name):
+            return extended_name
+    return name
+
+
+class ProcessTable(object):
+    """
+    Snapshot of the process table, shared by all the instances of a run:
+    indexed by exact process name, searchable by command line substring,
+    and keeping the metrics of its processes once they're read.
+    """
+
+    def __init__(self, processes, timestamp, previous=None):
+        self.timestamp = timestamp
+        self.processes = dict((p.pid, p) for p in processes)
+        # Instances which matched against this snapshot
+        self.instances = set()
+        # pid -> metrics
+        self.metrics = {}
+
+        self._by_name = defaultdict(set)
+        self._cmdlines = []
+        self._searches = {}
+        for p in processes:
+            self._by_name[get_process_name(p)].add(p.pid)
+            self._cmdlines.append((p.pid, ' '.join(p.cmdline)))
+
+        # What the CPU usage is computed against
+        self.previous_timestamp = None
+        self.previous_starttimes = {}
+        if previous is not None:
+            self.previous_timestamp = previous.timestamp
+            self.previous_starttimes = dict((pid, p.starttime) for pid, p in previous.processes.iteritems())
+
+    def find(self, string, exact_match):
+        if exact_match:
+            return self._by_name.get(string, set())
+        pids = self._searches.get(string)
+        if pids is None:
+            pids = set(pid for pid, cmdline in self._cmdlines if string in cmdline)
+            self._searches[string] = pids
+        return pids
+
+
 class ProcessCheck(AgentCheck):
     def __init__(self, name, init_config, agentConfig, instances=None):
         AgentCheck.__init__(self, name, init_config, agentConfig, instances)
@@ -74,12 +132,18 @@ class ProcessCheck(AgentCheck):
             )
         )
 
+        # On Linux, the process table is read from /proc once per run for all
+        # the instances, instead of with psutil for each of them
+        self._snapshotter = None
+        self._process_table = None
         if Platform.is_linux():
             procfs_path = init_config.get('procfs_path')
             if not procfs_path:
                 procfs_path = self.agentConfig.get('procfs_path', '/proc').rstrip('/')
 
             psutil.PROCFS_PATH = procfs_path
+            if os.path.isdir(procfs_path):
+                self._snapshotter = ProcSnapshotter(procfs_path)
 
         # Process cache, indexed by instance
         self.process_cache = defaultdict(dict)
@@ -92,6 +156,20 @@ class ProcessCheck(AgentCheck):
         now = time.time()
         return now - self.last_pid_cache_ts.get(name, 0) > self.pid_cache_duration
 
+    def _get_process_table(self, name):
+        """
+        Snapshot of the process table for the instance `name`. It's taken again
+        when an instance comes back to it, i.e. once per run. None if /proc
+        can't be read, psutil is then used instead.
+        """
+        if self._snapshotter is None:
+            return None
+        table = self._process_table
+        if table is None or name in table.instances:
+            table = ProcessTable(self._snapshotter.snapshot(), time.time(), previous=table)
+        table.instances.add(name)
+        return table
+
     def find_pids(self, name, search_string, exact_match, ignore_ad=True):
         """
         Create a set of pids of selected processes.
@@ -100,6 +178,19 @@ class ProcessCheck(AgentCheck):
         if not self.should_refresh_pid_cache(name):
             return self.pid_cache[name]
 
+        if self._process_table is not None:
+            matching_pids = set()
+            for string in search_string:
+                # FIXME 6.x: All has been deprecated from the doc, should be removed
+                if string == 'All':
+                    matching_pids = set(self._process_table.processes)
+                    break
+                matching_pids.update(self._process_table.find(string, exact_match))
+
+            self.pid_cache[name] = matching_pids
+            self.last_pid_cache_ts[name] = time.time()
+            return matching_pids
+
         ad_error_logger = self.log.debug
         if not ignore_ad:
             ad_error_logger = self.log.error
@@ -190,7 +281,93 @@ class ProcessCheck(AgentCheck):
 
         return result
 
+    def _read_proc_file(self, pid, filename):
+        with open(os.path.join(self._snapshotter.procfs_path, str(pid), filename)) as f:
+            return f.read()
+
+    def _read_process_metrics(self, pid, process):
+        """
+        Metrics of a process of the snapshot: what its stat file has, completed
+        by its statm, status and io files and its file descriptors.
+        """
+        table = self._process_table
+        metrics = {
+            'thr': process.num_threads,
+            'rss': process.rss,
+            'vms': process.vsize,
+            'minflt': process.minflt,
+            'cminflt': process.cminflt,
+            'majflt': process.majflt,
+            'cmajflt': process.cmajflt,
+        }
+
+        # psutil returns no `cpu_percent` the first time it sees a process, neither do we
+        elapsed = table.timestamp - (table.previous_timestamp or table.timestamp)
+        if elapsed > 0 and table.previous_starttimes.get(pid) == process.starttime:
+            metrics['cpu'] = 100.0 * process.recent_cpu / self._snapshotter.clock_ticks / elapsed
+
+        try:
+            shared = int(self._read_proc_file(pid, 'statm').split()[2]) * self._snapshotter.page_size
+            metrics['real'] = process.rss - shared
+        except (IOError, OSError, IndexError, ValueError):
+            self.log.debug("Unable to read the shared memory of process %s", pid)
+
+        try:
+            for line in self._read_proc_file(pid, 'status').splitlines():
+                if line.startswith('voluntary_ctxt_switches:'):
+                    metrics['ctx_swtch_vol'] = int(line.split()[1])
+                elif line.startswith('nonvoluntary_ctxt_switches:'):
+                    metrics['ctx_swtch_invol'] = int(line.split()[1])
+        except (IOError, OSError, IndexError, ValueError):
+            self.log.debug("Unable to read the context switches of process %s", pid)
+
+        try:
+            metrics['open_fd'] = len(os.listdir(
+                os.path.join(self._snapshotter.procfs_path, str(pid), 'fd')))
+        except OSError:
+            self.log.debug("Unable to list the file descriptors of process %s", pid)
+
+        try:
+            io = dict(line.split(': ', 1) for line in self._read_proc_file(pid, 'io').splitlines() if ': ' in line)
+            metrics['r_count'] = int(io['syscr'])
+            metrics['w_count'] = int(io['syscw'])
+            metrics['r_bytes'] = int(io['read_bytes'])
+            metrics['w_bytes'] = int(io['write_bytes'])
+        except (IOError, OSError, KeyError, ValueError):
+            self.log.debug("Unable to read the IO counters of process %s", pid)
+
+        return metrics
+
+    def _get_snapshot_state(self, name, pids):
+        """
+        Same as `get_process_state`, from the snapshot: the metrics of a process
+        are only read once per run, whatever the number of instances matching it.
+        """
+        st = defaultdict(list)
+        table = self._process_table
+        for pid in pids:
+            st['pids'].append(pid)
+
+            metrics = table.metrics.get(pid)
+            if metrics is None:
+                process = table.processes.get(pid)
+                if process is None:
+                    self.warning('Process %s disappeared while scanning' % pid)
+                    # reset the PID cache now, something changed
+                    self.last_pid_cache_ts[name] = 0
+                    continue
+                metrics = self._read_process_metrics(pid, process)
+                table.metrics[pid] = metrics
+
+            for attr in ATTR_TO_METRIC.keys() + ATTR_TO_METRIC_RATE.keys():
+                st[attr].append(metrics.get(attr))
+
+        return st
+
     def get_process_state(self, name, pids):
+        if self._process_table is not None:
+            return self._get_snapshot_state(name, pids)
+
         st = defaultdict(list)
 
         # Remove from cache the processes that are not in `pids`
@@ -285,7 +462,7 @@ class ProcessCheck(AgentCheck):
 
     def check(self, instance):
         name = instance.get('name', None)
-        tags = instance.get('tags', [])
+        tags = list(instance.get('tags', []))
         exact_match = _is_affirmative(instance.get('exact_match', True))
         search_string = instance.get('search_string', None)
         ignore_ad = _is_affirmative(instance.get('ignore_denied_access', True))
@@ -304,6 +481,8 @@ class ProcessCheck(AgentCheck):
         if name is None:
             raise KeyError('The "name" of process groups is mandatory')
 
+        self._process_table = self._get_process_table(name)
+
         if search_string is not None:
             pids = self.find_pids(
                 name,
@@ -152,7 +152,7 @@ class RabbitMQ(AgentCheck):
 
     def _get_data(self, url, auth=None):
         try:
-            r = requests.get(url, auth=auth)
+            r = self.http_client(urlparse.urlparse(url).netloc, auth=auth).get(url)
             r.raise_for_status()
             data = r.json()
         except requests.exceptions.HTTPError as e:
@@ -129,11 +129,11 @@ class Redis(AgentCheck):
                 list_params = ['host', 'port', 'db', 'password', 'socket_timeout',
                                'connection_pool', 'charset', 'errors', 'unix_socket_path']
 
-                # Set a default timeout (in seconds) if no timeout is specified in the instance config
-                instance['socket_timeout'] = instance.get('socket_timeout', 5)
-
                 connection_params = dict((k, instance[k]) for k in list_params if k in instance)
 
+                # Set a default timeout (in seconds) if no timeout is specified in the instance config
+                connection_params['socket_timeout'] = instance.get('socket_timeout', 5)
+
                 self.connections[key] = redis.Redis(**connection_params)
 
             except TypeError:
@@ -3,12 +3,8 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 
-# stdlib
-import socket
-
 # 3rd party
-from httplib2 import Http, HttpLib2Error
-import simplejson as json
+import requests
 
 # project
 from checks import AgentCheck
@@ -86,21 +82,20 @@ class Riak(AgentCheck):
         service_check_tags = tags + ['url:%s' % url]
 
         try:
-            h = Http(timeout=timeout)
-            resp, content = h.request(url, "GET")
-        except (socket.timeout, socket.error, HttpLib2Error) as e:
+            r = self.http_client(instance, timeout=timeout).get(url)
+        except requests.exceptions.RequestException as e:
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL,
                                message="Unable to fetch Riak stats: %s" % str(e),
                                tags=service_check_tags)
             raise
 
-        if resp.status != 200:
+        if r.status_code != 200:
             self.service_check(self.SERVICE_CHECK_NAME, AgentCheck.CRITICAL,
                                tags=service_check_tags,
                                message="Unexpected status of %s when fetching Riak stats, "
-                               "response: %s" % (resp.status, content))
+                               "response: %s" % (r.status_code, r.content))
 
-        stats = json.loads(content)
+        stats = r.json()
         self.service_check(
             self.SERVICE_CHECK_NAME, AgentCheck.OK, tags=service_check_tags)
 
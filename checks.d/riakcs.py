@@ -85,7 +85,7 @@ class RiakCs(AgentCheck):
                 message=str(e))
             raise
 
-        tags = instance.get("tags", [])
+        tags = list(instance.get("tags", []))
         tags.append("aggregation_key:{0}".format(aggregation_key))
 
         return s3, aggregation_key, tags
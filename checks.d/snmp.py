@@ -49,6 +49,8 @@ def reply_invalid(oid):
 class SnmpCheck(NetworkCheck):
 
     SOURCE_TYPE_NAME = 'system'
+    # Service check errors are stored in the instance
+    MUTATES_INSTANCES = True
     # pysnmp default values
     DEFAULT_RETRIES = 5
     DEFAULT_TIMEOUT = 1
@@ -74,7 +74,6 @@ spark.rdd.disk_used
 from urlparse import urljoin, urlsplit, urlunsplit
 
 # 3rd party
-import requests
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError
 from simplejson import JSONDecodeError
 
@@ -96,6 +95,9 @@ YARN_APPLICATION_STATES = 'RUNNING'
 # Metric types
 INCREMENT = 'increment'
 
+# Abandon the requests to the REST APIs running for longer (in seconds)
+REQUEST_POOL_TIMEOUT = 60
+
 # Metrics to collect
 SPARK_JOB_METRICS = {
     'numTasks': ('spark.job.num_tasks', INCREMENT),
@@ -166,6 +168,13 @@ SPARK_RDD_METRICS = {
 
 class SparkCheck(AgentCheck):
 
+    def __init__(self, name, init_config, agentConfig, instances=None):
+        AgentCheck.__init__(self, name, init_config, agentConfig, instances)
+        # {rm_address: {yarn_app_id: {spark_app_id: app_name}}}
+        self._spark_app_ids = {}
+        # {rm_address: {spark_app_id: (jobs, stages)}}
+        self._spark_stages = {}
+
     def check(self, instance):
         # Get properties from conf file
         rm_address = instance.get('resourcemanager_uri')
@@ -196,19 +205,24 @@ class SparkCheck(AgentCheck):
             message='Connection to ResourceManager "%s" was successful' % rm_address)
 
         # Get the ids of the running spark applications
-        spark_apps = self._get_spark_app_ids(running_apps)
+        spark_apps = self._get_spark_app_ids(rm_address, running_apps)
+
+        # Get the jobs of all the applications, then their stages, executors and rdds
+        jobs = self._spark_requests(spark_apps, ['jobs'])['jobs']
+        stages = self._get_spark_stages(rm_address, spark_apps, jobs)
+        responses = self._spark_requests(spark_apps, ['executors', 'storage/rdd'])
 
         # Get the job metrics
-        self._spark_job_metrics(spark_apps, tags)
+        self._spark_job_metrics(spark_apps, jobs, tags)
 
         # Get the stage metrics
-        self._spark_stage_metrics(spark_apps, tags)
+        self._spark_stage_metrics(spark_apps, stages, tags)
 
         # Get the executor metrics
-        self._spark_executor_metrics(spark_apps, tags)
+        self._spark_executor_metrics(spark_apps, responses['executors'], tags)
 
         # Get the rdd metrics
-        self._spark_rdd_metrics(spark_apps, tags)
+        self._spark_rdd_metrics(spark_apps, responses['storage/rdd'], tags)
 
         # Report success after gathering all metrics from the ApplicationMaster
         if running_apps:
@@ -245,34 +259,88 @@ class SparkCheck(AgentCheck):
 
         return running_apps
 
-    def _get_spark_app_ids(self, running_apps):
+    def _get_spark_app_ids(self, rm_address, running_apps):
         '''
         Return a dictionary of {app_id: (app_name, tracking_url)} for Spark applications
+
+        The Spark applications of a YARN application do not change while it runs, they are
+        only queried until some are found.
         '''
-        spark_apps = {}
-        for app_id, (app_name, tracking_url) in running_apps.iteritems():
-            response = self._rest_request_to_json(tracking_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK)
+        known_ids = self._spark_app_ids.get(rm_address, {})
+        app_ids = dict((yarn_app_id, known_ids[yarn_app_id]) for yarn_app_id in running_apps
+                       if known_ids.get(yarn_app_id))
+
+        new_apps = [(app_id, tracking_url) for app_id, (app_name, tracking_url) in running_apps.iteritems()
+                    if app_id not in app_ids]
+        responses = self.concurrent_map(self._rest_request_to_json,
+            [(tracking_url, SPARK_APPS_PATH, SPARK_SERVICE_CHECK) for app_id, tracking_url in new_apps],
+            timeout=REQUEST_POOL_TIMEOUT)
+
+        for (yarn_app_id, tracking_url), response in zip(new_apps, responses):
+            app_ids[yarn_app_id] = {}
             for app in response:
                 app_id = app.get('id')
                 app_name = app.get('name')
 
                 if app_id and app_name:
-                    spark_apps[app_id] = (app_name, tracking_url)
+                    app_ids[yarn_app_id][app_id] = app_name
+        self._spark_app_ids[rm_address] = app_ids
+
+        spark_apps = {}
+        for yarn_app_id, (yarn_app_name, tracking_url) in running_apps.iteritems():
+            for app_id, app_name in app_ids[yarn_app_id].iteritems():
+                spark_apps[app_id] = (app_name, tracking_url)
 
         return spark_apps
 
-    def _spark_job_metrics(self, running_apps, addl_tags):
+    def _spark_requests(self, running_apps, objects, app_ids=None):
+        '''
+        Query the given objects of the Spark applications concurrently.
+        Return a dictionary of {object: {app_id: response}}
+        '''
+        if app_ids is None:
+            app_ids = running_apps.keys()
+        queries = [(app_id, obj) for obj in objects for app_id in app_ids]
+
+        responses = self.concurrent_map(self._rest_request_to_json,
+            [(running_apps[app_id][1], SPARK_APPS_PATH, SPARK_SERVICE_CHECK, app_id, obj)
+             for app_id, obj in queries],
+            timeout=REQUEST_POOL_TIMEOUT)
+
+        objects_by_app = dict((obj, {}) for obj in objects)
+        for (app_id, obj), response in zip(queries, responses):
+            objects_by_app[obj][app_id] = response
+
+        return objects_by_app
+
+    def _get_spark_stages(self, rm_address, running_apps, jobs):
+        '''
+        Return a dictionary of {app_id: stages} for Spark applications
+
+        The stages of an application with no running job are those of the previous run when
+        its jobs did not change since then, they are only queried for the other applications.
+        '''
+        cached = self._spark_stages.get(rm_address, {})
+        stages = {}
+        for app_id, app_jobs in jobs.iteritems():
+            if app_id in cached and cached[app_id][0] == app_jobs and \
+                    not any(job.get('status') == 'RUNNING' for job in app_jobs):
+                stages[app_id] = cached[app_id][1]
+
+        stale_ids = [app_id for app_id in running_apps if app_id not in stages]
+        stages.update(self._spark_requests(running_apps, ['stages'], stale_ids)['stages'])
+
+        self._spark_stages[rm_address] = dict((app_id, (jobs[app_id], stages[app_id])) for app_id in running_apps)
+
+        return stages
+
+    def _spark_job_metrics(self, running_apps, jobs, addl_tags):
         '''
         Get metrics for each Spark job.
-        Return a map from Stage IDs to Job IDs
         '''
         for app_id, (app_name, tracking_url) in running_apps.iteritems():
 
-            response = self._rest_request_to_json(tracking_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, app_id, 'jobs')
+            response = jobs[app_id]
 
             for job in response:
 
@@ -285,15 +353,13 @@ class SparkCheck(AgentCheck):
                 self._set_metrics_from_json(tags, job, SPARK_JOB_METRICS)
                 self._set_metric('spark.job.count', INCREMENT, 1, tags)
 
-    def _spark_stage_metrics(self, running_apps, addl_tags):
+    def _spark_stage_metrics(self, running_apps, stages, addl_tags):
         '''
         Get metrics for each Spark stage.
         '''
         for app_id, (app_name, tracking_url) in running_apps.iteritems():
 
-            response = self._rest_request_to_json(tracking_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, app_id, 'stages')
+            response = stages[app_id]
 
             for stage in response:
 
@@ -306,15 +372,13 @@ class SparkCheck(AgentCheck):
                 self._set_metrics_from_json(tags, stage, SPARK_STAGE_METRICS)
                 self._set_metric('spark.stage.count', INCREMENT, 1, tags)
 
-    def _spark_executor_metrics(self, running_apps, addl_tags):
+    def _spark_executor_metrics(self, running_apps, executors, addl_tags):
         '''
         Get metrics for each Spark executor.
         '''
         for app_id, (app_name, tracking_url) in running_apps.iteritems():
 
-            response = self._rest_request_to_json(tracking_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, app_id, 'executors')
+            response = executors[app_id]
 
             tags = ['app_name:%s' % str(app_name)]
             tags.extend(addl_tags)
@@ -328,15 +392,13 @@ class SparkCheck(AgentCheck):
             if len(response):
                 self._set_metric('spark.executor.count', INCREMENT, len(response), tags)
 
-    def _spark_rdd_metrics(self, running_apps, addl_tags):
+    def _spark_rdd_metrics(self, running_apps, rdds, addl_tags):
         '''
         Get metrics for each Spark RDD.
         '''
         for app_id, (app_name, tracking_url) in running_apps.iteritems():
 
-            response = self._rest_request_to_json(tracking_url,
-                SPARK_APPS_PATH,
-                SPARK_SERVICE_CHECK, app_id, 'storage/rdd')
+            response = rdds[app_id]
 
             tags = ['app_name:%s' % str(app_name)]
             tags.extend(addl_tags)
@@ -371,7 +433,7 @@ class SparkCheck(AgentCheck):
 
     def _rest_request_to_json(self, address, object_path, service_name, *args, **kwargs):
         '''
-        Query the given URL and return the JSON response
+        Query the given URL and return the JSON response, it may be called by several threads
         '''
         response_json = None
 
@@ -395,7 +457,9 @@ class SparkCheck(AgentCheck):
             url = urljoin(url, '?' + query)
 
         try:
-            response = requests.get(url)
+            # The applications are reached through the ResourceManager proxy: as many
+            # connections to it as concurrent requests
+            response = self.http_client(self._get_url_base(address), pool_size=self.io_pool_size()).get(url)
             response.raise_for_status()
             response_json = response.json()
 
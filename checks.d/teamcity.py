@@ -47,7 +47,9 @@ class TeamCityCheck(AgentCheck):
                 build_conf=build_conf
             )
         try:
-            resp = requests.get(build_url, timeout=self.DEFAULT_TIMEOUT, headers=self.HEADERS, verify=ssl_validation)
+            http = self.http_client(instance_name, timeout=self.DEFAULT_TIMEOUT, headers=self.HEADERS,
+                                    verify=ssl_validation)
+            resp = http.get(build_url)
             resp.raise_for_status()
 
             last_build_id = resp.json().get('build')[0].get('id')
@@ -138,7 +140,9 @@ class TeamCityCheck(AgentCheck):
             )
 
         try:
-            resp = requests.get(new_build_url, timeout=self.DEFAULT_TIMEOUT, headers=self.HEADERS, verify=ssl_validation)
+            http = self.http_client(instance_name, timeout=self.DEFAULT_TIMEOUT, headers=self.HEADERS,
+                                    verify=ssl_validation)
+            resp = http.get(new_build_url)
             resp.raise_for_status()
 
             new_builds = resp.json()
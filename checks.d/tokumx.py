@@ -279,7 +279,7 @@ class TokuMX(AgentCheck):
 
         ssl_params = self._get_ssl_params(instance)
 
-        tags = instance.get('tags', [])
+        tags = list(instance.get('tags', []))
         tags.append('server:%s' % server)
         # de-dupe tags to avoid a memory leak
         tags = list(set(tags))
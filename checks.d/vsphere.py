@@ -3,6 +3,7 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 # stdlib
+from collections import defaultdict
 from datetime import datetime, timedelta
 from hashlib import md5
 from Queue import Empty, Queue
@@ -844,6 +845,8 @@ class VSphereCheck(AgentCheck):
                                                  format='normal')
         results = perfManager.QueryPerf(querySpec=[query])
         if results:
+            # Points are grouped by (metric type, instance) and submitted in bulk
+            points = defaultdict(list)
             for result in results[0].value:
                 if result.id.counterId not in self.metrics_metadata[i_key]:
                     self.log.debug("Skipping this metric value, because there is no metadata about it")
@@ -858,14 +861,13 @@ class VSphereCheck(AgentCheck):
                     self.log.debug(u"Skipping unknown `%s` metric.", metric_name)
                     continue
 
-                if ALL_METRICS[metric_name]['s_type'] == 'rate':
-                    record_metric = self.rate
-                else:
-                    record_metric = self.gauge
+                is_rate = ALL_METRICS[metric_name]['s_type'] == 'rate'
+                points[(is_rate, instance_name)].append(("vsphere.%s" % metric_name, value))
 
-                record_metric(
-                    "vsphere.%s" % metric_name,
-                    value,
+            for (is_rate, instance_name), metric_points in points.iteritems():
+                record_metrics = self.rates if is_rate else self.gauges
+                record_metrics(
+                    metric_points,
                     hostname=mor['hostname'],
                     tags=['instance:%s' % instance_name]
                 )
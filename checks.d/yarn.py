@@ -56,7 +56,6 @@ from urlparse import urljoin, urlsplit, urlunsplit
 
 # 3rd party
 from requests.exceptions import Timeout, HTTPError, InvalidURL, ConnectionError
-import requests
 
 # Project
 from checks import AgentCheck
@@ -66,6 +65,9 @@ DEFAULT_RM_URI = 'http://localhost:8088'
 DEFAULT_TIMEOUT = 5
 DEFAULT_CUSTER_NAME = 'default_cluster'
 
+# Abandon the requests to the REST API running for longer (in seconds)
+REQUEST_POOL_TIMEOUT = 60
+
 # Path to retrieve cluster metrics
 YARN_CLUSTER_METRICS_PATH = '/ws/v1/cluster/metrics'
 
@@ -164,17 +166,24 @@ class YarnCheck(AgentCheck):
 
         tags.append('cluster_name:%s' % cluster_name)
 
-        # Get metrics from the Resource Manager
-        self._yarn_cluster_metrics(rm_address, tags)
-        self._yarn_app_metrics(rm_address, tags)
-        self._yarn_node_metrics(rm_address, tags)
+        # Get metrics from the Resource Manager, its endpoints are queried concurrently
+        def request(object_path, params):
+            return self._rest_request_to_json(rm_address, object_path, **params)
+
+        cluster_json, apps_json, nodes_json = self.concurrent_map(request, [
+            (YARN_CLUSTER_METRICS_PATH, {}),
+            (YARN_APPS_PATH, {'states': YARN_APPLICATION_STATES}),
+            (YARN_NODES_PATH, {}),
+        ], timeout=REQUEST_POOL_TIMEOUT)
+
+        self._yarn_cluster_metrics(cluster_json, tags)
+        self._yarn_app_metrics(apps_json, tags)
+        self._yarn_node_metrics(nodes_json, tags)
 
-    def _yarn_cluster_metrics(self, rm_address, addl_tags):
+    def _yarn_cluster_metrics(self, metrics_json, addl_tags):
         '''
         Get metrics related to YARN cluster
         '''
-        metrics_json = self._rest_request_to_json(rm_address, YARN_CLUSTER_METRICS_PATH)
-
         if metrics_json:
 
             yarn_metrics = metrics_json[YARN_CLUSTER_METRICS_ELEMENT]
@@ -182,14 +191,10 @@ class YarnCheck(AgentCheck):
             if yarn_metrics is not None:
                 self._set_yarn_metrics_from_json(addl_tags, yarn_metrics, YARN_CLUSTER_METRICS)
 
-    def _yarn_app_metrics(self, rm_address, addl_tags):
+    def _yarn_app_metrics(self, metrics_json, addl_tags):
         '''
         Get metrics for running applications
         '''
-        metrics_json = self._rest_request_to_json(rm_address,
-            YARN_APPS_PATH,
-            states=YARN_APPLICATION_STATES)
-
         if metrics_json:
             if metrics_json['apps'] is not None:
                 if metrics_json['apps']['app'] is not None:
@@ -203,12 +208,10 @@ class YarnCheck(AgentCheck):
 
                         self._set_yarn_metrics_from_json(tags, app_json, YARN_APP_METRICS)
 
-    def _yarn_node_metrics(self, rm_address, addl_tags):
+    def _yarn_node_metrics(self, metrics_json, addl_tags):
         '''
         Get metrics related to YARN nodes
         '''
-        metrics_json = self._rest_request_to_json(rm_address, YARN_NODES_PATH)
-
         if metrics_json:
             if metrics_json['nodes'] is not None:
                 if metrics_json['nodes']['node'] is not None:
@@ -247,7 +250,7 @@ class YarnCheck(AgentCheck):
 
     def _rest_request_to_json(self, address, object_path, *args, **kwargs):
         '''
-        Query the given URL and return the JSON response
+        Query the given URL and return the JSON response, it may be called by several threads
         '''
         response_json = None
 
@@ -271,7 +274,7 @@ class YarnCheck(AgentCheck):
             url = urljoin(url, '?' + query)
 
         try:
-            response = requests.get(url)
+            response = self.http_client(self._get_url_base(address), pool_size=self.io_pool_size()).get(url)
             response.raise_for_status()
             response_json = response.json()
 
@@ -9,11 +9,11 @@ The Check class is being deprecated so don't write new checks with it.
 """
 # stdlib
 from collections import defaultdict
-import copy
 import logging
 import numbers
 import os
 import re
+import sys
 import time
 import timeit
 import traceback
@@ -30,8 +30,10 @@ import yaml
 # project
 from checks import check_status
 from util import get_hostname, get_next_id, yLoader
+from utils.containers import freeze_read_only, hash_mutable, thaw
+from utils.http import HTTPClient
 from utils.platform import Platform
-from utils.profile import pretty_statistics
+from utils.profile import pretty_statistics, process_cpu_time
 if Platform.is_windows():
     from utils.debug import run_check  # noqa - windows debug purpose
 
@@ -291,12 +293,24 @@ class Check(object):
 
 
 class AgentCheck(object):
+    """
+    Base class for the checks loaded from `checks.d`.
+
+    Each instance is passed to `check` as a read-only structure: a check that
+    writes to its instance (`instance['tags'].append(...)`, `instance.pop(...)`,
+    ...) fails with a TypeError unless it sets `MUTATES_INSTANCES = True`, in
+    which case it gets a private, mutable copy of the instance on each run.
+    """
     OK, WARNING, CRITICAL, UNKNOWN = (0, 1, 2, 3)
 
     SOURCE_TYPE_NAME = None
 
     DEFAULT_MIN_COLLECTION_INTERVAL = 0
 
+    # Instances are passed to `check` as read-only structures. Checks that modify
+    # their instance must set this to True to get a private, mutable copy on each run.
+    MUTATES_INSTANCES = False
+
     _enabled_checks = []
 
     @classmethod
@@ -340,12 +354,120 @@ class AgentCheck(object):
         self.events = []
         self.service_checks = []
         self.instances = instances or []
+        self._frozen_instances = None
         self.warnings = []
         self.library_versions = None
         self.last_collection_time = defaultdict(int)
         self._instance_metadata = []
         self.svc_metadata = []
         self.historate_dict = {}
+        self._http_clients = {}
+        self._io_pool = None
+        self._io_pool_size = None
+
+    def http_client(self, instance, **options):
+        """
+        Return the HTTP client of an instance, see `utils.http.HTTPClient`. It's
+        kept across runs so that its connections are reused, and the time spent
+        in its requests is part of the run statistics of the instance.
+
+        :param instance: The instance making the requests, or any value identifying it
+        :param options: The options of the client, used when it's created
+        """
+        key = (hash_mutable(instance), hash_mutable(options))
+        client = self._http_clients.get(key)
+        if client is None:
+            # it may be created by several threads at once, only one is kept
+            client = self._http_clients.setdefault(key, HTTPClient(**options))
+        return client
+
+    def io_pool_size(self):
+        """
+        Return the maximum number of calls of `concurrent_map` running at once
+        """
+        self._get_io_pool()
+        return self._io_pool_size
+
+    def _get_io_pool(self):
+        if self._io_pool is None:
+            from checks.network_checks import get_shared_pool
+            self._io_pool = get_shared_pool(self.agentConfig)
+            quota = self.init_config.get('max_concurrent_requests')
+            self._io_pool.register(self, label=self.name, quota=quota)
+            self._io_pool_size = min(int(quota or self._io_pool.nworkers), self._io_pool.nworkers)
+        return self._io_pool
+
+    def apply_async(self, func, args=(), timeout=None):
+        """
+        Call `func(*args)` on the I/O pool shared with the network checks, and return
+        its ApplyResult. It counts in the `max_concurrent_requests` of the check.
+
+        :param func: The function to call, it must be thread-safe
+        :param timeout: (optional) Abandon the call if it runs for more than `timeout`
+        seconds, it fails with a TimeoutError
+        """
+        return self._get_io_pool().apply_async(self, func, args, timeout=timeout)
+
+    def concurrent_map(self, func, args_list, timeout=None):
+        """
+        Call `func(*args)` for each tuple of arguments of `args_list` on the I/O pool
+        shared with the network checks, and return their results in the same order.
+        At most `max_concurrent_requests` (init_config) calls of the check run at once,
+        a fair share of the pool by default.
+
+        Once all the calls returned, raise the exception of the first one that failed.
+
+        :param func: The function to call, it must be thread-safe
+        :param args_list: A list of tuples of arguments
+        :param timeout: (optional) Abandon a call running for more than `timeout`
+        seconds, it fails with a TimeoutError
+        """
+        if len(args_list) < 2:
+            return [func(*args) for args in args_list]
+
+        pool = self._get_io_pool()
+        results = [self.apply_async(func, args, timeout=timeout) for args in args_list]
+        values, error = [], None
+        for result in results:
+            if timeout is not None:
+                while not result.wait(1):
+                    pool.reap()
+            try:
+                values.append(result.get())
+            except Exception:
+                values.append(None)
+                error = error or sys.exc_info()
+        if error is not None:
+            raise error[0], error[1], error[2]
+        return values
+
+    def _pop_http_stats(self, instance=None):
+        """
+        Return the number of HTTP requests and the time spent in them since the
+        last call, or None when there were none. Only those of the clients of
+        `instance` when it's given.
+        """
+        instance_key = hash_mutable(instance) if instance is not None else None
+        total = None
+        for (client_instance, _), client in self._http_clients.items():
+            if instance_key is not None and client_instance != instance_key:
+                continue
+            stats = client.pop_stats()
+            if stats is None:
+                continue
+            if total is None:
+                total = stats
+            else:
+                total['http_requests'] += stats['http_requests']
+                total['http_time'] += stats['http_time']
+        return total
+
+    def _pop_instance_http_stats(self, instance):
+        """
+        Return the HTTP statistics of a run of `instance`: the requests are sent
+        while it runs, so all of those since the previous run.
+        """
+        return self._pop_http_stats()
 
     def instance_count(self):
         """ Return the number of instances that are configured for this check. """
@@ -365,6 +487,39 @@ class AgentCheck(object):
         """
         self.aggregator.gauge(metric, value, tags, hostname, device_name, timestamp)
 
+    def tag_set(self, tags):
+        """
+        Normalize a list of tags once, so that it can be reused cheaply for many metrics.
+        Checks submitting lots of metrics for the same entity (container, VM...) should
+        build their tag set with this method and pass it as `tags` to all these metrics.
+
+        :param tags: A list of tags
+        """
+        return self.aggregator.tag_set(tags)
+
+    def gauges(self, metrics, tags=None, hostname=None, device_name=None, timestamp=None):
+        """
+        Record many gauges sharing the same tags, hostname and device name at once.
+
+        :param metrics: A dictionary or an iterable of (metric name, value) tuples
+        :param tags: (optional) A list of tags, or a tag set, for these metrics
+        :param hostname: (optional) A hostname for these metrics. Defaults to the current hostname.
+        :param device_name: (optional) The device name for these metrics
+        :param timestamp: (optional) The timestamp for these metric values
+        """
+        self.aggregator.submit_metrics(metrics, 'g', tags, hostname, device_name, timestamp)
+
+    def rates(self, metrics, tags=None, hostname=None, device_name=None):
+        """
+        Submit points for many rates sharing the same tags, hostname and device name at once.
+
+        :param metrics: A dictionary or an iterable of (metric name, value) tuples
+        :param tags: (optional) A list of tags, or a tag set, for these metrics
+        :param hostname: (optional) A hostname for these metrics. Defaults to the current hostname.
+        :param device_name: (optional) The device name for these metrics
+        """
+        self.aggregator.submit_metrics(metrics, '_dd-r', tags, hostname, device_name)
+
     def increment(self, metric, value=1, tags=None, hostname=None, device_name=None):
         """
         Increment a counter with optional tags, hostname and device name.
@@ -713,6 +868,17 @@ class AgentCheck(object):
         self._internal_profiling_stats = None
         return stats
 
+    def _get_frozen_instances(self):
+        """
+        Return the read-only version of the instances. They're only frozen once, on the
+        first run (i.e. after the check has been initialized) or when they're replaced.
+        """
+        source, frozen = self._frozen_instances or (None, None)
+        if source is not self.instances or len(frozen) != len(self.instances):
+            frozen = [freeze_read_only(i) for i in self.instances]
+            self._frozen_instances = (self.instances, frozen)
+        return frozen
+
     def run(self):
         """ Run all instances. """
 
@@ -725,7 +891,7 @@ class AgentCheck(object):
                 self.log.debug("Failed to collect Agent Stats before check {0}".format(self.name))
 
         instance_statuses = []
-        for i, instance in enumerate(self.instances):
+        for i, instance in enumerate(self._get_frozen_instances()):
             try:
                 min_collection_interval = instance.get(
                     'min_collection_interval', self.init_config.get(
@@ -740,23 +906,33 @@ class AgentCheck(object):
 
                 self.last_collection_time[i] = now
 
-                check_start_time = None
-                if self.in_developer_mode:
-                    check_start_time = timeit.default_timer()
-                self.check(copy.deepcopy(instance))
+                # Cheap per-instance telemetry: wall time, CPU time and submitted points
+                check_start_time = timeit.default_timer()
+                check_start_cpu = process_cpu_time()
+                check_start_points = self.aggregator.submitted_points
+                if self.MUTATES_INSTANCES:
+                    self.check(thaw(instance))
+                else:
+                    self.check(instance)
 
-                instance_check_stats = None
-                if check_start_time is not None:
-                    instance_check_stats = {'run_time': timeit.default_timer() - check_start_time}
+                instance_check_stats = {
+                    'run_time': timeit.default_timer() - check_start_time,
+                    'cpu_time': process_cpu_time() - check_start_cpu,
+                }
+                http_stats = self._pop_instance_http_stats(instance)
+                if http_stats is not None:
+                    instance_check_stats.update(http_stats)
+                instance_metric_count = self.aggregator.submitted_points - check_start_points
 
                 if self.has_warnings():
                     instance_status = check_status.InstanceStatus(
                         i, check_status.STATUS_WARNING,
-                        warnings=self.get_warnings(), instance_check_stats=instance_check_stats
+                        warnings=self.get_warnings(), metric_count=instance_metric_count,
+                        instance_check_stats=instance_check_stats
                     )
                 else:
                     instance_status = check_status.InstanceStatus(
-                        i, check_status.STATUS_OK,
+                        i, check_status.STATUS_OK, metric_count=instance_metric_count,
                         instance_check_stats=instance_check_stats
                     )
             except Exception as e:
@@ -793,7 +969,10 @@ class AgentCheck(object):
         """
         To be executed when the agent is being stopped to clean ressources
         """
-        pass
+        if self._io_pool is not None:
+            self._io_pool.unregister(self)
+            self._io_pool = None
+        self._io_pool_size = None
 
     @classmethod
     def from_yaml(cls, path_to_yaml=None, agentConfig=None, yaml_text=None, check_name=None):
@@ -29,7 +29,11 @@ from utils.jmx import JMXFiles
 from utils.ntp import NTPUtil
 from utils.pidfile import PidFile
 from utils.platform import Platform
-from utils.profile import pretty_statistics
+from utils.profile import (
+    pretty_instance_check_stats,
+    pretty_run_stats,
+    pretty_statistics,
+)
 
 
 STATUS_OK = 'OK'
@@ -301,7 +305,7 @@ class CheckStatus(object):
                  event_count=None, service_check_count=None, service_metadata=[],
                  init_failed_error=None, init_failed_traceback=None,
                  library_versions=None, source_type_name=None,
-                 check_stats=None):
+                 check_stats=None, run_stats=None):
         self.name = check_name
         self.source_type_name = source_type_name
         self.instance_statuses = instance_statuses
@@ -312,6 +316,7 @@ class CheckStatus(object):
         self.init_failed_traceback = init_failed_traceback
         self.library_versions = library_versions
         self.check_stats = check_stats
+        self.run_stats = run_stats
         self.service_metadata = service_metadata
 
     @property
@@ -329,11 +334,12 @@ class CheckStatus(object):
 
 class EmitterStatus(object):
 
-    def __init__(self, name, error=None):
+    def __init__(self, name, error=None, stats=None):
         self.name = name
         self.error = None
         if error:
             self.error = repr(error)
+        self.stats = stats
 
     @property
     def status(self):
@@ -393,7 +399,7 @@ class CollectorStatus(AgentStatus):
                 if s.metric_count is not None:
                     line += " collected %s metrics" % s.metric_count
                 if s.instance_check_stats is not None:
-                    line += " Last run duration: %s" % s.instance_check_stats.get('run_time')
+                    line += " Last run duration: %s" % pretty_instance_check_stats(s.instance_check_stats)
 
                 check_lines.append(line)
 
@@ -417,6 +423,11 @@ class CollectorStatus(AgentStatus):
                     cs.service_check_count, plural(cs.service_check_count)),
             ]
 
+            if cs.run_stats is not None:
+                check_lines += [
+                    "    - Run stats: %s" % pretty_run_stats(cs.run_stats)
+                ]
+
             if cs.check_stats is not None:
                 check_lines += [
                     "    - Stats: %s" % pretty_statistics(cs.check_stats)
@@ -538,7 +549,7 @@ class CollectorStatus(AgentStatus):
                         if s.metric_count is not None:
                             line += " collected %s metrics" % s.metric_count
                         if s.instance_check_stats is not None:
-                            line += " Last run duration: %s" % s.instance_check_stats.get('run_time')
+                            line += " Last run duration: %s" % pretty_instance_check_stats(s.instance_check_stats)
 
                         check_lines.append(line)
 
@@ -562,6 +573,11 @@ class CollectorStatus(AgentStatus):
                             cs.service_check_count, plural(cs.service_check_count)),
                     ]
 
+                    if cs.run_stats is not None:
+                        check_lines += [
+                            "    - Run stats: %s" % pretty_run_stats(cs.run_stats)
+                        ]
+
                     if cs.check_stats is not None:
                         check_lines += [
                             "    - Stats: %s" % pretty_statistics(cs.check_stats)
@@ -630,6 +646,10 @@ class CollectorStatus(AgentStatus):
                 line = "  - %s [%s]" % (es.name, style(es.status, c))
                 if es.status != STATUS_OK:
                     line += ": %s" % es.error
+                elif es.stats:
+                    line += ": serialization %.3fs, compression %.3fs, %s bytes sent" % (
+                        es.stats['serialization_time'], es.stats['compression_time'],
+                        es.stats['compressed_size'])
                 lines.append(line)
 
         return lines
@@ -674,9 +694,13 @@ class CollectorStatus(AgentStatus):
                         status_info['checks'][cs.name]['instances'][s.instance_id]['error'] = s.error
                     if s.has_warnings():
                         status_info['checks'][cs.name]['instances'][s.instance_id]['warnings'] = s.warnings
+                    if s.instance_check_stats is not None:
+                        status_info['checks'][cs.name]['instances'][s.instance_id]['stats'] = s.instance_check_stats
                 status_info['checks'][cs.name]['metric_count'] = cs.metric_count
                 status_info['checks'][cs.name]['event_count'] = cs.event_count
                 status_info['checks'][cs.name]['service_check_count'] = cs.service_check_count
+                if cs.run_stats is not None:
+                    status_info['checks'][cs.name]['run_stats'] = cs.run_stats
 
         # Emitter status
         status_info['emitter'] = []
@@ -688,6 +712,8 @@ class CollectorStatus(AgentStatus):
             }
             if es.has_error():
                 check_status['error'] = es.error
+            if es.stats:
+                check_status['stats'] = es.stats
             status_info['emitter'].append(check_status)
 
         osname = config.get_os()
@@ -24,6 +24,7 @@ from checks.check_status import (
 )
 from checks.datadog import Dogstreams
 from checks.ganglia import Ganglia
+from checks.network_checks import get_shared_pool
 from config import get_system_stats, get_version
 import checks.system.unix as u
 import checks.system.win32 as w32
@@ -35,9 +36,11 @@ from util import (
     get_uuid,
     Timer,
 )
+from utils.host_metadata import MetadataRefresher
 from utils.logger import log_exceptions
 from utils.jmx import JMXFiles
 from utils.platform import Platform
+from utils.profile import process_cpu_time
 from utils.subprocess_output import get_subprocess_output
 
 log = logging.getLogger(__name__)
@@ -133,7 +136,8 @@ class AgentPayload(collections.MutableMapping):
                 name = emitter.__name__
                 emitter_status = EmitterStatus(name)
                 try:
-                    emitter(payload, log, config, endpoint)
+                    emitter_stats = emitter(payload, log, config, endpoint)
+                    emitter_status = EmitterStatus(name, stats=emitter_stats)
                 except Exception as e:
                     log.exception("Error running emitter: %s"
                                   % emitter.__name__)
@@ -185,9 +189,12 @@ class Collector(object):
             }
         }
         socket.setdefaulttimeout(15)
+        self.last_emitter_statuses = []
         self.run_count = 0
         self.continue_running = True
         self.hostname_metadata_cache = None
+        self._host_metadata_pending = False
+        self._gohai_processes_timestamp = None
         self.initialized_checks_d = []
         self.init_failed_checks_d = {}
 
@@ -211,6 +218,24 @@ class Collector(object):
             'system': w32.System(log)
         }
 
+        # Host metadata sources are refreshed in the background, payloads only
+        # get their latest snapshot
+        self._metadata_refresher = MetadataRefresher(cache_key=self.hostname)
+        self._host_metadata_sources = {
+            'gohai': self._run_gohai_metadata,
+            'system_stats': self._get_system_stats,
+            'hostname': self._get_hostname_metadata,
+            'gce_tags': lambda: GCE.get_tags(self.agentConfig),
+        }
+        if self.agentConfig.get('collect_ec2_tags'):
+            self._host_metadata_sources['ec2_tags'] = lambda: EC2.get_tags(self.agentConfig)
+        for name, func in self._host_metadata_sources.iteritems():
+            self._metadata_refresher.register(name, func, self.push_times['host_metadata']['interval'])
+        if not Platform.is_windows():
+            self._metadata_refresher.register('gohai_processes', self._run_gohai_processes,
+                                              self.push_times['processes']['interval'],
+                                              persist=False)
+
         # Old-style metric checks
         self._ganglia = Ganglia(log) if self.agentConfig.get('ganglia_host', '') != '' else None
         self._dogstream = None if self.agentConfig.get('dogstreams') is None else Dogstreams.init(log, self.agentConfig)
@@ -242,6 +267,9 @@ class Collector(object):
         # in which case we'll get a misleading error in the logs.
         # Best to not even try.
         self.continue_running = False
+        self._metadata_refresher.stop()
+        if self._dogstream is not None:
+            self._dogstream.stop()
         for check in self.initialized_checks_d:
             check.stop()
 
@@ -260,6 +288,7 @@ class Collector(object):
             cpu_clock = time.clock()
         self.run_count += 1
         log.debug("Starting collection run #%s" % self.run_count)
+        self._metadata_refresher.start()
 
         if checksd:
             self.initialized_checks_d = checksd['initialized_checks']  # is a list of AgentCheck instances
@@ -352,10 +381,14 @@ class Collector(object):
                 del dogstreamData['dogstreamEvents']
 
             payload.update(dogstreamData)
+            metrics.extend(self._dogstream.get_backlog_metrics())
 
         # process collector of gohai (compliant with payload of legacy "resources checks")
-        if not Platform.is_windows() and self._should_send_additional_data('processes'):
-            gohai_processes = self._run_gohai_processes()
+        gohai_processes_timestamp = self._metadata_refresher.get_timestamp('gohai_processes')
+        if gohai_processes_timestamp not in (None, self._gohai_processes_timestamp) \
+                and self._should_send_additional_data('processes'):
+            self._gohai_processes_timestamp = gohai_processes_timestamp
+            gohai_processes = self._metadata_refresher.get('gohai_processes')
             if gohai_processes:
                 try:
                     gohai_processes_json = json.loads(gohai_processes)
@@ -391,14 +424,25 @@ class Collector(object):
             event_count = 0
             service_check_count = 0
             check_start_time = time.time()
+            check_start_cpu = process_cpu_time()
             check_stats = None
+            run_stats = None
 
             try:
                 # Run the check.
                 instance_statuses = check.run()
+                check_cpu_time = process_cpu_time() - check_start_cpu
 
                 # Collect the metrics and events.
+                context_count = len(check.aggregator.metrics)
+                flush_start_time = time.time()
                 current_check_metrics = check.get_metrics()
+                run_stats = {
+                    'run_time': flush_start_time - check_start_time,
+                    'cpu_time': check_cpu_time,
+                    'flush_time': time.time() - flush_start_time,
+                    'context_count': context_count,
+                }
                 current_check_events = check.get_events()
                 check_stats = check._get_internal_profiling_stats()
 
@@ -425,7 +469,7 @@ class Collector(object):
                 event_count, service_check_count, service_metadata=current_check_metadata,
                 library_versions=check.get_library_info(),
                 source_type_name=check.SOURCE_TYPE_NAME or check.name,
-                check_stats=check_stats
+                check_stats=check_stats, run_stats=run_stats
             )
 
             # Service check for Agent checks failures
@@ -451,9 +495,7 @@ class Collector(object):
 
             # Intrument check run timings if enabled.
             if self.check_timings:
-                metric = 'datadog.agent.check_run_time'
-                meta = {'tags': ["check:%s" % check.name]}
-                metrics.append((metric, time.time(), check_run_time, meta))
+                metrics.extend(self._get_check_telemetry_metrics(check_status, check_run_time))
 
         for check_name, info in self.init_failed_checks_d.iteritems():
             if not self.continue_running:
@@ -467,6 +509,14 @@ class Collector(object):
         service_checks.append(create_service_check('datadog.agent.up', AgentCheck.OK,
                               hostname=self.hostname))
 
+        # Serialization and compression stats are only known after the emit,
+        # report the ones of the previous run.
+        if self.check_timings:
+            metrics.extend(self._get_emitter_telemetry_metrics(self.last_emitter_statuses))
+
+        # Saturation, queue wait time and latency of the network checks' I/O pool
+        metrics.extend(self._get_io_pool_metrics(get_shared_pool()))
+
         # Store the metrics and events in the payload.
         payload['metrics'] = metrics
         payload['events'] = events
@@ -500,6 +550,7 @@ class Collector(object):
         emitter_statuses = payload.emit(log, self.agentConfig, self.emitters,
                                         self.continue_running)
         self.emit_duration = timer.step()
+        self.last_emitter_statuses = emitter_statuses
 
         # Persist the status of the collection run.
         try:
@@ -520,6 +571,84 @@ class Collector(object):
 
         return payload
 
+    @staticmethod
+    def _get_check_telemetry_metrics(check_status, check_run_time):
+        """
+        Build the `datadog.agent.check*` telemetry metrics of a check run.
+        The CPU times are those of the process, see `process_cpu_time`.
+        """
+        now = time.time()
+        check_tags = ["check:%s" % check_status.name]
+        telemetry = [
+            ('datadog.agent.check_run_time', now, check_run_time, {'tags': check_tags})
+        ]
+
+        run_stats = check_status.run_stats
+        if run_stats is not None:
+            for stat in ['cpu_time', 'flush_time', 'context_count']:
+                telemetry.append(
+                    ('datadog.agent.check_%s' % stat, now, run_stats[stat], {'tags': check_tags})
+                )
+            telemetry.append(
+                ('datadog.agent.check_metric_count', now, check_status.metric_count, {'tags': check_tags})
+            )
+
+        for instance_status in check_status.instance_statuses or []:
+            stats = instance_status.instance_check_stats
+            if stats is None:
+                continue
+            instance_tags = check_tags + ["instance:%s" % instance_status.instance_id]
+            for stat in ['run_time', 'cpu_time', 'http_time']:
+                if stat not in stats:
+                    continue
+                telemetry.append(
+                    ('datadog.agent.check_instance_%s' % stat, now, stats[stat], {'tags': instance_tags})
+                )
+            if instance_status.metric_count is not None:
+                telemetry.append(
+                    ('datadog.agent.check_instance_metric_count', now,
+                     instance_status.metric_count, {'tags': instance_tags})
+                )
+
+        return telemetry
+
+    @staticmethod
+    def _get_emitter_telemetry_metrics(emitter_statuses):
+        """
+        Build the `datadog.agent.emitter.*` telemetry metrics from the emitter statuses.
+        """
+        now = time.time()
+        telemetry = []
+        for emitter_status in emitter_statuses:
+            if not emitter_status.stats:
+                continue
+            tags = ["emitter:%s" % emitter_status.name]
+            for stat, value in emitter_status.stats.iteritems():
+                telemetry.append(('datadog.agent.emitter.%s' % stat, now, value, {'tags': tags}))
+
+        return telemetry
+
+    @staticmethod
+    def _get_io_pool_metrics(pool):
+        """
+        Build the `datadog.agent.io_pool.*` metrics of the I/O pool shared by the network checks.
+        """
+        if pool is None:
+            return []
+
+        now = time.time()
+        stats = pool.stats()
+        telemetry = []
+        for stat in ['workers', 'busy_workers', 'abandoned_workers', 'queued_jobs', 'saturation']:
+            telemetry.append(('datadog.agent.io_pool.%s' % stat, now, stats[stat], {}))
+
+        for label, client_stats in stats['clients'].iteritems():
+            tags = ["check:%s" % label]
+            for stat, value in client_stats.iteritems():
+                telemetry.append(('datadog.agent.io_pool.%s' % stat, now, value, {'tags': tags}))
+
+        return telemetry
+
     @staticmethod
     def run_single_check(check, verbose=True):
         log.info("Running check %s" % check.name)
@@ -622,50 +751,14 @@ class Collector(object):
                 'msg_text': 'Version %s' % get_version()
             }]
 
-        # Periodically send the host metadata.
-        if self._should_send_additional_data('host_metadata'):
-            # gather metadata with gohai
-            gohai_metadata = self._run_gohai_metadata()
-            if gohai_metadata:
-                payload['gohai'] = gohai_metadata
-
-            payload['systemStats'] = get_system_stats(
-                proc_path=self.agentConfig.get('procfs_path', '/proc').rstrip('/')
-            )
-            payload['meta'] = self._get_hostname_metadata()
-
-            self.hostname_metadata_cache = payload['meta']
-            # Add static tags from the configuration file
-            host_tags = []
-            if self.agentConfig['tags'] is not None:
-                host_tags.extend([unicode(tag.strip())
-                                 for tag in self.agentConfig['tags'].split(",")])
-
-            if self.agentConfig['collect_ec2_tags']:
-                host_tags.extend(EC2.get_tags(self.agentConfig))
-
-            if host_tags:
-                payload['host-tags']['system'] = host_tags
-
-            # If required by the user, let's create the dd_check:xxx host tags
-            if self.agentConfig['create_dd_check_tags']:
-                app_tags_list = [DD_CHECK_TAG.format(c.name) for c in self.initialized_checks_d]
-                app_tags_list.extend([DD_CHECK_TAG.format(cname) for cname
-                                      in JMXFiles.get_jmx_appnames()])
-
-                if 'system' not in payload['host-tags']:
-                    payload['host-tags']['system'] = []
-
-                payload['host-tags']['system'].extend(app_tags_list)
-
-            GCE_tags = GCE.get_tags(self.agentConfig)
-            if GCE_tags is not None:
-                payload['host-tags'][GCE.SOURCE_TYPE_NAME] = GCE_tags
-
-            # Log the metadata on the first run
-            if self._is_first_run():
-                log.info("Hostnames: %s, tags: %s" %
-                         (repr(self.hostname_metadata_cache), payload['host-tags']))
+        # Periodically send the host metadata, from the latest snapshot of its sources.
+        if self._should_send_additional_data('host_metadata') or self._host_metadata_pending:
+            if self._metadata_refresher.is_ready(*self._host_metadata_sources):
+                self._host_metadata_pending = False
+                self._add_host_metadata(payload)
+            else:
+                log.debug("Host metadata not collected yet, it will be sent with the next payload")
+                self._host_metadata_pending = True
 
         # Periodically send extra hosts metadata (vsphere)
         # Metadata of hosts that are not the host where the agent runs, not all the checks use
@@ -712,6 +805,54 @@ class Collector(object):
             payload['agent_checks'] = agent_checks
             payload['meta'] = self.hostname_metadata_cache  # add hostname metadata
 
+    def _add_host_metadata(self, payload):
+        refresher = self._metadata_refresher
+        gohai_metadata = refresher.get('gohai')
+        if gohai_metadata:
+            payload['gohai'] = gohai_metadata
+
+        payload['systemStats'] = refresher.get('system_stats', self.agentConfig.get('system_stats', {}))
+        payload['meta'] = refresher.get('hostname', {})
+
+        first_metadata = self.hostname_metadata_cache is None
+        self.hostname_metadata_cache = payload['meta']
+        # Add static tags from the configuration file
+        host_tags = []
+        if self.agentConfig['tags'] is not None:
+            host_tags.extend([unicode(tag.strip())
+                             for tag in self.agentConfig['tags'].split(",")])
+
+        if self.agentConfig['collect_ec2_tags']:
+            host_tags.extend(refresher.get('ec2_tags', []))
+
+        if host_tags:
+            payload['host-tags']['system'] = host_tags
+
+        # If required by the user, let's create the dd_check:xxx host tags
+        if self.agentConfig['create_dd_check_tags']:
+            app_tags_list = [DD_CHECK_TAG.format(c.name) for c in self.initialized_checks_d]
+            app_tags_list.extend([DD_CHECK_TAG.format(cname) for cname
+                                  in JMXFiles.get_jmx_appnames()])
+
+            if 'system' not in payload['host-tags']:
+                payload['host-tags']['system'] = []
+
+            payload['host-tags']['system'].extend(app_tags_list)
+
+        GCE_tags = refresher.get('gce_tags')
+        if GCE_tags is not None:
+            payload['host-tags'][GCE.SOURCE_TYPE_NAME] = GCE_tags
+
+        # Log the metadata the first time it's sent
+        if first_metadata:
+            log.info("Hostnames: %s, tags: %s" %
+                     (repr(self.hostname_metadata_cache), payload['host-tags']))
+
+    def _get_system_stats(self):
+        return get_system_stats(
+            proc_path=self.agentConfig.get('procfs_path', '/proc').rstrip('/')
+        )
+
     def _get_hostname_metadata(self):
         """
         Returns a dictionnary that contains hostname metadata.
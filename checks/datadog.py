@@ -5,16 +5,31 @@
 # stdlib
 from datetime import datetime
 import glob
-from itertools import groupby
 import os
+import tempfile
 import time
 import traceback
 
+# 3p
+import simplejson as json
+
 # project
+from checks.libs.thread_pool import Pool
+from config import _is_affirmative
+from dogstream.rules import RuleSet
 import modules
 from util import windows_friendly_colon_split
+from utils.pidfile import PidFile
 from utils.tailfile import TailFile
 
+# Default per run budget of each log file, the backlog is read by the next runs
+DEFAULT_MAX_BYTES_PER_RUN = 10 * 1024 * 1024
+# Seconds between two expansions of the globbed log paths
+DEFAULT_RESCAN_INTERVAL = 60
+# Threads reading the log files concurrently
+DEFAULT_WORKERS = 4
+STATE_FILE_NAME = 'dogstreams.json'
+
 
 def partition(s, sep):
     pos = s.find(sep)
@@ -24,11 +39,6 @@ def partition(s, sep):
         return s[0:pos], sep, s[pos + len(sep):]
 
 
-def point_sorter(p):
-    # Sort and group by timestamp, metric name, host_name, device_name
-    return (p[1], p[0], p[3].get('host_name', None), p[3].get('device_name', None))
-
-
 class EventDefaults(object):
     EVENT_TYPE = 'dogstream_event'
     EVENT_OBJECT = 'dogstream_event:default'
@@ -37,22 +47,66 @@ class EventDefaults(object):
 class Dogstreams(object):
     @classmethod
     def init(cls, logger, config):
+        state_path = cls._get_state_path()
         dogstreams_config = config.get('dogstreams', None)
         if dogstreams_config:
-            dogstreams = cls._instantiate_dogstreams(logger, config, dogstreams_config)
+            states = cls._load_states(logger, state_path)
+            specs = cls._parse_dogstreams_config(logger, dogstreams_config)
+            dogstreams = cls._instantiate_dogstreams(logger, config, specs, states)
         else:
+            specs = []
             dogstreams = []
 
         logger.info("Dogstream parsers: %s" % repr(dogstreams))
 
-        return cls(logger, dogstreams)
+        return cls(logger, dogstreams, state_path, specs=specs, config=config)
 
-    def __init__(self, logger, dogstreams):
+    def __init__(self, logger, dogstreams, state_path=None, specs=None, config=None):
         self.logger = logger
         self.dogstreams = dogstreams
+        self.state_path = state_path
+        self._specs = specs or []
+        self._config = config
+        self._last_scan = time.time()
+        self._pool = None
+
+    @staticmethod
+    def _get_state_path():
+        return os.path.join(PidFile.get_dir(), STATE_FILE_NAME)
 
     @classmethod
-    def _instantiate_dogstreams(cls, logger, config, dogstreams_config):
+    def _load_states(cls, logger, state_path):
+        """
+        Load the positions in the log files checkpointed by the last run
+        """
+        try:
+            with open(state_path) as f:
+                return json.load(f)
+        except IOError:
+            return {}
+        except Exception:
+            logger.warning("Unable to load the dogstreams state from %s" % state_path, exc_info=True)
+            return {}
+
+    def _save_states(self):
+        states = {}
+        for dogstream in self.dogstreams:
+            state = dogstream.get_state()
+            if state is not None:
+                states[dogstream.log_path] = state
+
+        try:
+            # Write to a temporary file first, so that a partial state is never loaded
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.state_path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump(states, f)
+            os.rename(tmp_path, self.state_path)
+        except Exception:
+            self.logger.warning("Unable to persist the dogstreams state to %s" % self.state_path,
+                                exc_info=True)
+
+    @classmethod
+    def _parse_dogstreams_config(cls, logger, dogstreams_config):
         """
         Expecting dogstreams config value to look like:
            <dogstream value>, <dog stream value>, ...
@@ -60,31 +114,61 @@ class Dogstreams(object):
            <log path>
         or
            <log path>:<module>:<parser function>
+
+        Return the (log path, parser spec, parser args) of each of them.
         """
-        dogstreams = []
-        # Create a Dogstream object for each <dogstream value>
+        specs = []
         for config_item in dogstreams_config.split(','):
-            try:
-                config_item = config_item.strip()
-                parts = windows_friendly_colon_split(config_item)
+            config_item = config_item.strip()
+            parts = windows_friendly_colon_split(config_item)
 
-                if len(parts) == 2:
-                    logger.warn("Invalid dogstream: %s" % ':'.join(parts))
-                    continue
+            if len(parts) == 2:
+                logger.warn("Invalid dogstream: %s" % ':'.join(parts))
+                continue
+            if not parts:
+                continue
 
-                log_path = cls._get_dogstream_log_paths(parts[0]) if len(parts) else []
-                parser_spec = ':'.join(parts[1:3]) if len(parts) >= 3 else None
-                parser_args = parts[3:] if len(parts) >= 3 else None
+            parser_spec = ':'.join(parts[1:3]) if len(parts) >= 3 else None
+            parser_args = tuple(parts[3:]) if len(parts) >= 3 else None
+            specs.append((parts[0], parser_spec, parser_args))
+
+        return specs
+
+    @classmethod
+    def _instantiate_dogstreams(cls, logger, config, specs, states=None, followed=None, from_start=False):
+        """
+        Create a Dogstream object for each log path matching the specs.
+        The ones in `followed`, by (spec, path), are kept instead of being created again.
+        """
+        states = states or {}
+        followed = followed or {}
+        dogstreams = []
+        for spec in specs:
+            pattern, parser_spec, parser_args = spec
+            try:
+                log_paths = cls._get_dogstream_log_paths(pattern)
+            except Exception:
+                logger.exception("Cannot list the logs matching %s" % pattern)
+                continue
 
-                for path in log_path:
-                    dogstreams.append(Dogstream.init(
+            for path in log_paths:
+                dogstream = followed.get((spec, path))
+                if dogstream is not None:
+                    dogstreams.append(dogstream)
+                    continue
+                try:
+                    dogstream = Dogstream.init(
                         logger,
                         log_path=path,
                         parser_spec=parser_spec,
                         parser_args=parser_args,
-                        config=config))
-            except Exception:
-                logger.exception("Cannot build dogstream")
+                        config=config,
+                        state=states.get(path),
+                        from_start=from_start)
+                    dogstream.spec = spec
+                    dogstreams.append(dogstream)
+                except Exception:
+                    logger.exception("Cannot build dogstream")
 
         return dogstreams
 
@@ -93,18 +177,63 @@ class Dogstreams(object):
         """
         Paths may include wildcard *'s and ?'s.
         """
-        if '*' not in path:
+        if '*' not in path and '?' not in path:
             return [path]
         return glob.glob(path)
 
+    def rescan(self):
+        """
+        Follow the log files newly matching the globbed paths, and stop
+        following the ones which don't match anymore.
+        """
+        followed = dict(((dogstream.spec, dogstream.log_path), dogstream) for dogstream in self.dogstreams)
+        # Files appearing while the agent runs are read from their start
+        dogstreams = self._instantiate_dogstreams(self.logger, self._config, self._specs,
+                                                  followed=followed, from_start=True)
+
+        previous, current = set(self.dogstreams), set(dogstreams)
+        for dogstream in previous - current:
+            self.logger.info("dogstream: %s doesn't match anymore, not following it" % dogstream.log_path)
+            dogstream.close()
+        for dogstream in current - previous:
+            self.logger.info("dogstream: following new log %s" % dogstream.log_path)
+
+        self.dogstreams = dogstreams
+        self._last_scan = time.time()
+
+    def _check_dogstream(self, dogstream, agentConfig, move_end):
+        try:
+            return dogstream.check(agentConfig, move_end)
+        except Exception:
+            self.logger.exception("Error in parsing %s" % (dogstream.log_path))
+            return {}
+
+    def _get_pool(self, workers):
+        if self._pool is None:
+            self._pool = Pool(workers, name="Dogstreams")
+        return self._pool
+
     def check(self, agentConfig, move_end=True):
+        rescan_interval = int(agentConfig.get('dogstream_rescan_interval', DEFAULT_RESCAN_INTERVAL))
+        if self._specs and rescan_interval > 0 and time.time() - self._last_scan >= rescan_interval:
+            self.rescan()
+
         if not self.dogstreams:
             return {}
 
+        # Independent log files are read and parsed concurrently
+        workers = int(agentConfig.get('dogstream_workers') or DEFAULT_WORKERS)
+        if workers > 1 and len(self.dogstreams) > 1:
+            results = self._get_pool(workers).map(
+                lambda dogstream: self._check_dogstream(dogstream, agentConfig, move_end),
+                self.dogstreams)
+        else:
+            results = [self._check_dogstream(dogstream, agentConfig, move_end)
+                       for dogstream in self.dogstreams]
+
         output = {}
-        for dogstream in self.dogstreams:
+        for dogstream, result in zip(self.dogstreams, results):
             try:
-                result = dogstream.check(agentConfig, move_end)
                 # result may contain {"dogstream": [new]}.
                 # If output contains {"dogstream": [old]}, that old value will get concatenated with the new value
                 assert type(result) == type(output), "dogstream.check must return a dictionary"
@@ -115,13 +244,34 @@ class Dogstreams(object):
                         output[k] = result[k]
             except Exception:
                 self.logger.exception("Error in parsing %s" % (dogstream.log_path))
+
+        if self.state_path:
+            self._save_states()
+
         return output
 
+    def get_backlog_metrics(self):
+        """
+        Bytes of each log file left to be read by the next runs
+        """
+        now = time.time()
+        return [
+            ('datadog.agent.dogstream.backlog_bytes', now, dogstream.get_backlog(),
+             {'tags': ['log_path:%s' % dogstream.log_path]})
+            for dogstream in self.dogstreams
+        ]
+
+    def stop(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
 
 class Dogstream(object):
 
     @classmethod
-    def init(cls, logger, log_path, parser_spec=None, parser_args=None, config=None):
+    def init(cls, logger, log_path, parser_spec=None, parser_args=None, config=None, state=None,
+             from_start=False):
         class_based = False
         parse_func = None
         parse_args = tuple(parser_args or ())
@@ -151,9 +301,11 @@ class Dogstream(object):
         else:
             logger.info("dogstream: parsing %s with default parser" % log_path)
 
-        return cls(logger, log_path, parse_func, parse_args, class_based=class_based)
+        return cls(logger, log_path, parse_func, parse_args, class_based=class_based, state=state,
+                   from_start=from_start)
 
-    def __init__(self, logger, log_path, parse_func=None, parse_args=(), class_based=False):
+    def __init__(self, logger, log_path, parse_func=None, parse_args=(), class_based=False, state=None,
+                 from_start=False):
         self.logger = logger
         self.class_based = class_based
 
@@ -161,8 +313,20 @@ class Dogstream(object):
         self.parse_func = parse_func or self._default_line_parser
         self.parse_args = parse_args
 
+        self._tail = None
         self._gen = None
-        self._values = None
+        # Position to resume from, checkpointed by a previous run of the agent
+        self._state = state
+        # Read the file from its start instead of its end, when there is no checkpoint
+        self._from_start = from_start
+        # Config entry the log path comes from, see Dogstreams
+        self.spec = None
+        # Running aggregates of the points of the run, by series:
+        # (timestamp, metric, host_name, device_name[, tags]) -> [last, sum, attributes]
+        self._aggregates = None
+        # The points of the rules differ by their tags, the other parsers keep their series
+        self._aggregate_tags = isinstance(self.parse_func, RuleSet)
+        self._point_count = 0
         self._freq = 15 # Will get updated on each check()
         self._error_count = 0L
         self._line_count = 0L
@@ -171,23 +335,31 @@ class Dogstream(object):
     def check(self, agentConfig, move_end=True):
         if self.log_path:
             self._freq = int(agentConfig.get('check_freq', 15))
-            self._values = []
+            self._aggregates = {}
+            self._point_count = 0
             self._events = []
 
             # Build our tail -f
             if self._gen is None:
-                self._gen = TailFile(self.logger, self.log_path, self._line_parser).tail(line_by_line=False, move_end=move_end)
-
-            # read until the end of file
+                use_inotify = _is_affirmative(agentConfig.get('tail_use_inotify', False))
+                max_bytes = int(agentConfig.get('dogstream_max_bytes_per_run') or DEFAULT_MAX_BYTES_PER_RUN)
+                max_lines = int(agentConfig.get('dogstream_max_lines_per_run') or 0)
+                self._tail = TailFile(self.logger, self.log_path, self._line_parser,
+                                      use_inotify=use_inotify)
+                self._gen = self._tail.tail(line_by_line=False, move_end=move_end and not self._from_start,
+                                            state=self._state,
+                                            max_bytes=max_bytes, max_lines=max_lines)
+
+            # read until the end of file, or of the budget of the run
             try:
                 self._gen.next()
                 self.logger.debug("Done dogstream check for file {0}".format(self.log_path))
-                self.logger.debug("Found {0} metric points".format(len(self._values)))
+                self.logger.debug("Found {0} metric points".format(self._point_count))
             except StopIteration as e:
                 self.logger.exception(e)
                 self.logger.warn("Can't tail %s file" % self.log_path)
 
-            check_output = self._aggregate(self._values)
+            check_output = self._flush_aggregates()
             if self._events:
                 check_output.update({"dogstreamEvents": self._events})
                 self.logger.debug("Found {0} events".format(len(self._events)))
@@ -195,6 +367,27 @@ class Dogstream(object):
         else:
             return {}
 
+    def get_state(self):
+        """
+        Position in the log file to resume from
+        """
+        if self._tail is not None:
+            state = self._tail.get_state()
+            if state is not None:
+                self._state = state
+        return self._state
+
+    def get_backlog(self):
+        if self._tail is None:
+            return 0
+        return self._tail.get_backlog()
+
+    def close(self):
+        if self._tail is not None:
+            self._tail.close()
+        self._tail = None
+        self._gen = None
+
     def _line_parser(self, line):
         try:
             # alq - Allow parser state to be kept between invocations
@@ -269,7 +462,7 @@ class Dogstream(object):
                     self.logger.debug('Invalid parsed values %s (%s): "%s"',
                         repr(datum), ', '.join(invalid_reasons), line)
                 else:
-                    self._values.append((metric, ts, value, attrs))
+                    self._aggregate(metric, ts, value, attrs)
         except Exception:
             self.logger.debug("Error while parsing line %s" % line, exc_info=True)
             self._error_count += 1
@@ -292,43 +485,39 @@ class Dogstream(object):
 
         return metric, timestamp, value, attributes
 
-    def _aggregate(self, values):
-        """ Aggregate values down to the second and store as:
+    def _aggregate(self, metric, timestamp, value, attributes):
+        """ Fold a point into the running aggregate of its series, points
+            being bucketed by timestamp, metric, host_name, device_name, and
+            tags for the rules
+        """
+        self._point_count += 1
+        key = (timestamp, metric, attributes.get('host_name'), attributes.get('device_name'))
+        if self._aggregate_tags:
+            key += (tuple(attributes.get('tags') or ()),)
+        aggregate = self._aggregates.get(key)
+        if aggregate is None:
+            self._aggregates[key] = [value, value, dict(attributes)]
+        else:
+            aggregate[0] = value
+            aggregate[1] += value
+            aggregate[2].update(attributes)
+
+    def _flush_aggregates(self):
+        """ Output the values aggregated down to the bucket and store as:
             {
                 "dogstream": [(metric, timestamp, value, {key: val})]
             }
-            If there are many values per second for a metric, take the median
+            If there are many values per bucket for a metric, take the last
+            one, or their sum for counters
         """
         output = []
-
-        values.sort(key=point_sorter)
-
-        for (timestamp, metric, host_name, device_name), val_attrs in groupby(values, key=point_sorter):
-            attributes = {}
-            vals = []
-            for _metric, _timestamp, v, a in val_attrs:
-                try:
-                    v = float(v)
-                    vals.append(v)
-                    attributes.update(a)
-                except Exception:
-                    self.logger.debug("Could not convert %s into a float", v)
-
-            if len(vals) == 1:
-                val = vals[0]
-            elif len(vals) > 1:
-                val = vals[-1]
-            else: # len(vals) == 0
-                continue
-
+        for key, (last, total, attributes) in sorted(self._aggregates.iteritems()):
+            timestamp, metric = key[:2]
             metric_type = str(attributes.get('metric_type', '')).lower()
-            if metric_type == 'gauge':
-                val = float(val)
-            elif metric_type == 'counter':
-                val = sum(vals)
-
+            val = total if metric_type == 'counter' else last
             output.append((metric, timestamp, val, attributes))
 
+        self._aggregates = {}
         if output:
             return {"dogstream": output}
         else:
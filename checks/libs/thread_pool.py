@@ -20,9 +20,11 @@
 # The methods of a Pool object use all these concepts and expose
 # them to their caller in a very simple way.
 # stdlib
+import collections
 import Queue
 import sys
 import threading
+import time
 import traceback
 
 
@@ -388,13 +390,13 @@ class ApplyResult(object):
             except:
                 traceback.print_exc()
 
-    def _set_exception(self):
+    def _set_exception(self, exc_info=None):
         """Called by a Job object to tell that an exception occured
         during the processing of the function. The object will become
         ready but not successful. The collector's notify_ready()
         method will be called, but NOT the callback method"""
         assert not self.ready()
-        self._data = sys.exc_info()
+        self._data = exc_info or sys.exc_info()
         self._success = False
         self._event.set()
         if self._collector is not None:
@@ -628,6 +630,297 @@ class OrderedResultCollector(AbstractResultCollector):
                     self._to_notify._set_value(lst)
 
 
+class SharedJob(Job):
+    """A Job submitted to a SharedPool on behalf of one of its clients"""
+    def __init__(self, client, func, args, kwds, apply_result, timeout=None):
+        Job.__init__(self, func, args, kwds, apply_result)
+        self.client = client
+        self.timeout = timeout
+        self.enqueued_at = time.time()
+        self.started_at = None
+        self.worker = None
+        self.abandoned = False
+
+    def run(self):
+        """
+        Call the function and return a (success, value or exc_info)
+        tuple: the pool decides whether the result is still wanted
+        """
+        try:
+            return True, self._func(*self._args, **self._kwds)
+        except:
+            return False, sys.exc_info()
+
+
+class SharedPool(object):
+    """
+    Bounded pool of worker threads shared by several clients.
+
+    Jobs are queued per client and dispatched round-robin. A client never
+    runs more jobs at once than its quota, which is either the one it
+    registered with or, by default, a fair share of the workers between
+    the clients having work to do. Workers left idle by the fair shares
+    are lent to the clients without an explicit quota.
+
+    A job running for longer than its timeout is abandoned: its result is
+    set to a TimeoutError and its worker is replaced, without affecting
+    the other jobs. The abandoned worker exits once the job returns.
+    """
+
+    def __init__(self, nworkers, name="SharedPool"):
+        """
+        \param nworkers (integer) maximum number of worker threads
+        \param name (string) prefix for the worker threads' name
+        """
+        self.nworkers = nworkers
+        self._name = name
+        self._cond = threading.Condition()
+        self._clients = []
+        self._labels = {}
+        self._quotas = {}
+        self._queues = {}
+        self._running = {}
+        self._rr_index = 0
+
+        self._workers = set()
+        self._abandoned_workers = set()
+        self._idle_workers = 0
+        self._worker_count = 0
+        self._running_jobs = set()
+
+        self._stats_since = time.time()
+        self._busy_time = 0
+        self._client_stats = {}
+
+    def register(self, client, label=None, quota=None):
+        """
+        Register a client of the pool.
+        \param label (string) name of the client in the stats
+        \param quota (integer) maximum number of jobs of the client
+        running at once, defaults to a fair share of the workers
+        """
+        with self._cond:
+            if client not in self._queues:
+                self._clients.append(client)
+                self._queues[client] = collections.deque()
+                self._running[client] = 0
+            self._labels[client] = label or str(client)
+            if quota:
+                self._quotas[client] = min(int(quota), self.nworkers)
+            else:
+                self._quotas.pop(client, None)
+
+    def unregister(self, client):
+        """
+        Unregister a client, discarding its queued jobs. Its running jobs
+        are left to complete.
+        """
+        with self._cond:
+            if client not in self._queues:
+                return
+            self._clients.remove(client)
+            del self._queues[client]
+            del self._running[client]
+            self._quotas.pop(client, None)
+            self._labels.pop(client, None)
+            for job in self._running_jobs:
+                if job.client is client:
+                    job.client = None
+
+    def apply_async(self, client, func, args=(), kwds=dict(), timeout=None):
+        """
+        Queue a call of func on behalf of client, and return its
+        ApplyResult. The job is abandoned if it runs for longer than
+        timeout seconds.
+        """
+        apply_result = ApplyResult()
+        job = SharedJob(client, func, args, kwds, apply_result, timeout)
+        with self._cond:
+            if client not in self._queues:
+                raise ValueError("Unknown client %s" % client)
+            self._reap()
+            self._queues[client].append(job)
+            queued = sum(len(q) for q in self._queues.itervalues())
+            if queued > self._idle_workers and len(self._workers) < self.nworkers:
+                self._start_worker()
+            self._cond.notify()
+
+        return apply_result
+
+    def reap(self):
+        """Abandon the jobs running for longer than their timeout"""
+        with self._cond:
+            self._reap()
+
+    def get_nworkers(self):
+        return len(self._workers)
+
+    def stats(self):
+        """
+        Return the stats of the pool, and reset the ones aggregated over
+        time: the saturation (the fraction of the worker time spent
+        running jobs), and for each client the number of jobs, of
+        timeouts, and the average and maximum queue wait time and latency.
+        """
+        with self._cond:
+            self._reap()
+            now = time.time()
+            busy_time = self._busy_time
+            for job in self._running_jobs:
+                busy_time += now - max(job.started_at, self._stats_since)
+            elapsed = now - self._stats_since
+            saturation = busy_time / (elapsed * self.nworkers) if elapsed > 0 else 0
+
+            stats = {
+                'workers': len(self._workers),
+                'busy_workers': len(self._running_jobs),
+                'abandoned_workers': len(self._abandoned_workers),
+                'queued_jobs': sum(len(q) for q in self._queues.itervalues()),
+                'saturation': min(saturation, 1.0),
+                'clients': {},
+            }
+            for label, client_stats in self._client_stats.iteritems():
+                jobs = client_stats['jobs']
+                stats['clients'][label] = {
+                    'jobs': jobs,
+                    'timeouts': client_stats['timeouts'],
+                    'queue_wait_time.avg': client_stats['queue_wait_time'] / jobs if jobs else 0,
+                    'queue_wait_time.max': client_stats['queue_wait_time.max'],
+                    'job_latency.avg': client_stats['job_latency'] / jobs if jobs else 0,
+                    'job_latency.max': client_stats['job_latency.max'],
+                }
+
+            self._stats_since = now
+            self._busy_time = 0
+            self._client_stats = {}
+
+        return stats
+
+    def _get_client_stats(self, client):
+        label = self._labels[client]
+        if label not in self._client_stats:
+            self._client_stats[label] = {
+                'jobs': 0,
+                'timeouts': 0,
+                'queue_wait_time': 0,
+                'queue_wait_time.max': 0,
+                'job_latency': 0,
+                'job_latency.max': 0,
+            }
+        return self._client_stats[label]
+
+    def _start_worker(self):
+        self._worker_count += 1
+        thr = threading.Thread(target=self._work,
+                               name="Worker-%s-%d" % (self._name, self._worker_count))
+        thr.daemon = True
+        self._workers.add(thr)
+        thr.start()
+
+    def _next_job(self):
+        """Pop the next job to run, round-robin over the clients within their quota"""
+        nclients = len(self._clients)
+        if not nclients:
+            return None
+
+        active = [c for c in self._clients if self._queues[c] or self._running[c]]
+        fair_share = max(1, self.nworkers // max(len(active), 1))
+
+        # First pass: clients under their quota. Second pass: clients
+        # without an explicit quota may borrow the remaining workers.
+        for lend in (False, True):
+            for i in xrange(nclients):
+                client = self._clients[(self._rr_index + i) % nclients]
+                if not self._queues[client]:
+                    continue
+                quota = self._quotas.get(client)
+                if lend:
+                    if quota is not None:
+                        continue
+                elif self._running[client] >= (quota or fair_share):
+                    continue
+
+                self._rr_index = (self._rr_index + i + 1) % nclients
+                return self._queues[client].popleft()
+
+        return None
+
+    def _work(self):
+        worker = threading.current_thread()
+        while True:
+            with self._cond:
+                job = self._next_job()
+                while job is None:
+                    if worker not in self._workers:
+                        return
+                    self._idle_workers += 1
+                    self._cond.wait()
+                    self._idle_workers -= 1
+                    job = self._next_job()
+
+                # Hand the remaining jobs over to another idle worker
+                if any(self._queues.itervalues()):
+                    self._cond.notify()
+
+                job.started_at = time.time()
+                job.worker = worker
+                self._running[job.client] += 1
+                self._running_jobs.add(job)
+                client_stats = self._get_client_stats(job.client)
+                wait_time = job.started_at - job.enqueued_at
+                client_stats['queue_wait_time'] += wait_time
+                client_stats['queue_wait_time.max'] = max(client_stats['queue_wait_time.max'], wait_time)
+
+            success, value = job.run()
+
+            with self._cond:
+                if job.abandoned:
+                    self._abandoned_workers.discard(worker)
+                    return
+
+                now = time.time()
+                self._running_jobs.discard(job)
+                self._busy_time += now - max(job.started_at, self._stats_since)
+                if job.client is not None:
+                    self._running[job.client] -= 1
+                    client_stats = self._get_client_stats(job.client)
+                    client_stats['jobs'] += 1
+                    latency = now - job.enqueued_at
+                    client_stats['job_latency'] += latency
+                    client_stats['job_latency.max'] = max(client_stats['job_latency.max'], latency)
+
+                if success:
+                    job._result._set_value(value)
+                else:
+                    job._result._set_exception(value)
+                # Quotas changed, another waiting worker may be able to run a job
+                self._cond.notify()
+
+    def _reap(self):
+        now = time.time()
+        for job in list(self._running_jobs):
+            if job.timeout is None or now - job.started_at <= job.timeout:
+                continue
+
+            job.abandoned = True
+            self._running_jobs.discard(job)
+            self._busy_time += now - max(job.started_at, self._stats_since)
+            if job.client is not None:
+                self._running[job.client] -= 1
+                self._get_client_stats(job.client)['timeouts'] += 1
+            try:
+                raise TimeoutError("Job abandoned after running for more than %ss" % job.timeout)
+            except TimeoutError:
+                job._result._set_exception()
+
+            # Replace the worker, unless too many are still stuck
+            self._workers.discard(job.worker)
+            self._abandoned_workers.add(job.worker)
+            if len(self._abandoned_workers) < self.nworkers:
+                self._start_worker()
+            self._cond.notify()
+
+
 def _test():
     """Some tests"""
     import thread
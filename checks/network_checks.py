@@ -10,14 +10,31 @@ import time
 
 # project
 from checks import AgentCheck
-from checks.libs.thread_pool import Pool
+from checks.libs.thread_pool import SharedPool, TimeoutError
 from config import _is_affirmative
 
 TIMEOUT = 180
-DEFAULT_SIZE_POOL = 6
+DEFAULT_SIZE_POOL = 16
 MAX_LOOP_ITERATIONS = 1000
 FAILURE = "FAILURE"
 
+# I/O pool shared by all the network checks of the agent
+_shared_pool = None
+_shared_pool_lock = threading.Lock()
+
+
+def get_shared_pool(agentConfig=None):
+    """
+    Return the I/O pool shared by the network checks, creating it if needed
+    with `network_checks_pool_size` workers.
+    """
+    global _shared_pool
+    with _shared_pool_lock:
+        if _shared_pool is None and agentConfig is not None:
+            size = int(agentConfig.get('network_checks_pool_size') or DEFAULT_SIZE_POOL)
+            _shared_pool = SharedPool(size, name="NetworkChecks")
+        return _shared_pool
+
 
 class Status:
     DOWN = "DOWN"
@@ -50,7 +67,10 @@ class NetworkCheck(AgentCheck):
         The main agent loop will call the check function for each instance for
         each iteration of the loop.
         The check method will make an asynchronous call to the _process method in
-        one of the thread initiated in the thread pool created in this class constructor.
+        one of the threads of the I/O pool shared by all the network checks.
+        A check runs at most `threads_count` (init_config) jobs at once, or a
+        fair share of the pool by default; a job running for more than
+        TIMEOUT seconds is abandoned without affecting the other ones.
         The _process method will call the _check method of the inherited class
         which will perform the actual check.
 
@@ -67,7 +87,6 @@ class NetworkCheck(AgentCheck):
         # A dictionary to keep track of service statuses
         self.statuses = {}
         self.notified = {}
-        self.nb_failures = 0
         self.pool_started = False
 
         # Make sure every instance has a name that we use as a unique key
@@ -87,14 +106,13 @@ class NetworkCheck(AgentCheck):
         self.pool_started = False
 
     def start_pool(self):
-        # The pool size should be the minimum between the number of instances
-        # and the DEFAULT_SIZE_POOL. It can also be overridden by the 'threads_count'
-        # parameter in the init_config of the check
-        self.log.info("Starting Thread Pool")
-        default_size = min(self.instance_count(), DEFAULT_SIZE_POOL)
-        self.pool_size = int(self.init_config.get('threads_count', default_size))
-
-        self.pool = Pool(self.pool_size)
+        # Register to the shared pool. The number of jobs of the check running
+        # at once can be capped with the 'threads_count' parameter in the
+        # init_config of the check, it defaults to a fair share of the pool.
+        self.log.info("Registering to the shared I/O pool")
+        self.pool = get_shared_pool(self.agentConfig)
+        self.pool_size = self.init_config.get('threads_count')
+        self.pool.register(self, label=self.name, quota=self.pool_size)
 
         self.resultsq = Queue()
         self.jobs_status = {}
@@ -102,12 +120,11 @@ class NetworkCheck(AgentCheck):
         self.pool_started = True
 
     def stop_pool(self):
-        self.log.info("Stopping Thread Pool")
+        self.log.info("Unregistering from the shared I/O pool")
         if self.pool_started:
-            self.pool.terminate()
-            self.pool.join()
+            self.pool.unregister(self)
             self.jobs_status.clear()
-            assert self.pool.get_nworkers() == 0
+            self.jobs_results.clear()
 
     def restart_pool(self):
         self.stop_pool()
@@ -116,8 +133,6 @@ class NetworkCheck(AgentCheck):
     def check(self, instance):
         if not self.pool_started:
             self.start_pool()
-        if threading.activeCount() > 5 * self.pool_size + 5: # On Windows the agent runs on multiple threads so we need to have an offset of 5 in case the pool_size is 1
-            raise Exception("Thread number (%s) is exploding. Skipping this check" % threading.activeCount())
         self._process_results()
         self._clean()
         name = instance.get('name', None)
@@ -128,7 +143,8 @@ class NetworkCheck(AgentCheck):
         if name not in self.jobs_status:
             # A given instance should be processed one at a time
             self.jobs_status[name] = time.time()
-            self.jobs_results[name] = self.pool.apply_async(self._process, args=(instance,))
+            self.jobs_results[name] = self.pool.apply_async(self, self._process, args=(instance,),
+                                                            timeout=TIMEOUT)
         else:
             self.log.error("Instance: %s skipped because it's already running." % name)
 
@@ -160,11 +176,6 @@ class NetworkCheck(AgentCheck):
 
             instance_name = instance['name']
             if status == FAILURE:
-                self.nb_failures += 1
-                if self.nb_failures >= self.pool_size - 1:
-                    self.nb_failures = 0
-                    self.restart_pool()
-
                 # clean failed job
                 self._clean_job(instance_name)
                 continue
@@ -220,11 +231,16 @@ class NetworkCheck(AgentCheck):
         # if an exception happened, log it
         if instance_name in self.jobs_results:
             self.log.debug("Instance: %s cleaned from jobs results." % instance_name)
-            ret = self.jobs_results[instance_name].get()
-            if isinstance(ret, Exception):
-                self.log.exception("Exception in worker thread: {0}".format(ret))
-            del self.jobs_results[instance_name]
+            result = self.jobs_results.pop(instance_name)
+            if result.ready() and result.successful():
+                ret = result.get()
+                if isinstance(ret, Exception):
+                    self.log.exception("Exception in worker thread: {0}".format(ret))
 
+    def _pop_instance_http_stats(self, instance):
+        # The requests are sent on the pool once `check` returned, while other
+        # instances run: only count those of the clients of this instance
+        return self._pop_http_stats(instance)
 
     def _check(self, instance):
         """This function should be implemented by inherited classes"""
@@ -232,9 +248,15 @@ class NetworkCheck(AgentCheck):
 
 
     def _clean(self):
-        now = time.time()
-        for name, start_time in self.jobs_status.iteritems():
-            if now - start_time > TIMEOUT:
-                self.log.critical("Restarting Pool. One check is stuck: %s" % name)
-                self.restart_pool()
-                break
+        self.pool.reap()
+        for name, result in self.jobs_results.items():
+            if not result.ready() or result.successful():
+                continue
+            try:
+                result.get()
+            except TimeoutError:
+                self.log.critical("Instance: %s abandoned, its check is stuck for more than %ss."
+                                  % (name, TIMEOUT))
+            except Exception:
+                self.log.exception("Exception in worker thread for instance: %s" % name)
+            self._clean_job(name)
@@ -7,6 +7,7 @@ Unix system checks.
 """
 # stdlib
 import operator
+import os
 import platform
 import re
 import sys
@@ -21,8 +22,10 @@ except ImportError:
 
 # project
 from checks import Check
+from config import _is_affirmative
 from util import get_hostname
 from utils.platform import Platform
+from utils.procfs import ProcSnapshotter
 from utils.subprocess_output import get_subprocess_output
 
 
@@ -37,6 +40,91 @@ class IO(Check):
         self.header_re = re.compile(r'([%\\/\-_a-zA-Z0-9]+)[\s+]?')
         self.item_re = re.compile(r'^([\-a-zA-Z0-9\/]+)')
         self.value_re = re.compile(r'\d+\.\d+')
+        # Counters of /proc/diskstats at the previous run
+        self._last_diskstats = None
+        self._last_diskstats_ts = None
+
+    @staticmethod
+    def _parse_diskstats(content):
+        """
+        Return the first 11 counters of each device of /proc/diskstats:
+        reads, reads merged, sectors read, ms reading, writes, writes merged,
+        sectors written, ms writing, I/Os in progress, ms doing I/O and
+        weighted ms doing I/O.
+        """
+        diskstats = {}
+        for line in content.splitlines():
+            fields = line.split()
+            if len(fields) < 14:
+                continue
+            diskstats[fields[2]] = [int(f) for f in fields[3:14]]
+        return diskstats
+
+    @staticmethod
+    def _get_block_devices():
+        """
+        Names of the whole disks, not their partitions, None if unknown
+        """
+        try:
+            return set(name.replace('!', '/') for name in os.listdir('/sys/block'))
+        except OSError:
+            return None
+
+    def _compute_linux_io(self, previous, current, interval):
+        """
+        Compute the `iostat -d -x -k` metrics of each device from the
+        difference between two snapshots of /proc/diskstats.
+        """
+        block_devices = self._get_block_devices()
+        io = {}
+        for device, counters in current.iteritems():
+            if device not in previous:
+                continue
+            if block_devices is not None and device not in block_devices:
+                continue
+            # Like iostat, skip the devices which were never used
+            if counters[0] == 0 and counters[4] == 0:
+                continue
+
+            rd_ios, rd_merges, rd_sec, rd_ticks, wr_ios, wr_merges, wr_sec, wr_ticks, _, tot_ticks, rq_ticks = \
+                [max(c - p, 0) for c, p in zip(counters, previous[device])]
+            nr_ios = rd_ios + wr_ios
+
+            stats = {
+                'rrqm/s': rd_merges / interval,
+                'wrqm/s': wr_merges / interval,
+                'r/s': rd_ios / interval,
+                'w/s': wr_ios / interval,
+                # Sectors are 512 bytes
+                'rkB/s': rd_sec / 2.0 / interval,
+                'wkB/s': wr_sec / 2.0 / interval,
+                'avgrq-sz': float(rd_sec + wr_sec) / nr_ios if nr_ios else 0.0,
+                'avgqu-sz': rq_ticks / interval / 1000.0,
+                'await': float(rd_ticks + wr_ticks) / nr_ios if nr_ios else 0.0,
+                'r_await': float(rd_ticks) / rd_ios if rd_ios else 0.0,
+                'w_await': float(wr_ticks) / wr_ios if wr_ios else 0.0,
+                'svctm': float(tot_ticks) / nr_ios if nr_ios else 0.0,
+                '%util': min(tot_ticks / interval / 10.0, 100.0),
+            }
+            # Formatted as iostat does
+            io[device] = dict((name, '%.2f' % value) for name, value in stats.iteritems())
+
+        return io
+
+    def _check_linux_proc(self, diskstats_path):
+        """
+        IO stats since the previous run, nothing on the first one.
+        """
+        with open(diskstats_path) as f:
+            diskstats = self._parse_diskstats(f.read())
+        now = time.time()
+
+        io = {}
+        if self._last_diskstats is not None and now > self._last_diskstats_ts:
+            io = self._compute_linux_io(self._last_diskstats, diskstats, now - self._last_diskstats_ts)
+        self._last_diskstats = diskstats
+        self._last_diskstats_ts = now
+        return io
 
     def _parse_linux2(self, output):
         recentStats = output.split('Device:')[2].split('\n')
@@ -118,7 +206,12 @@ class IO(Check):
         """
         io = {}
         try:
-            if Platform.is_linux():
+            proc_location = agentConfig.get('procfs_path', '/proc').rstrip('/')
+            diskstats_path = os.path.join(proc_location, 'diskstats')
+            if Platform.is_linux() and os.path.exists(diskstats_path):
+                io.update(self._check_linux_proc(diskstats_path))
+
+            elif Platform.is_linux():
                 stdout, _, _ = get_subprocess_output(['iostat', '-d', '1', '2', '-x', '-k'], self.logger)
 
                 #                 Linux 2.6.32-343-ec2 (ip-10-35-95-10)   12/11/2012      _x86_64_        (2 CPU)
@@ -550,7 +643,119 @@ class Memory(Check):
 
 class Processes(Check):
 
+    def __init__(self, logger):
+        Check.__init__(self, logger)
+        self._snapshotter = None
+
+    @staticmethod
+    def _format_tty(tty_nr):
+        if tty_nr == 0:
+            return '?'
+        major = (tty_nr >> 8) & 0xfff
+        minor = (tty_nr & 0xff) | ((tty_nr >> 12) & 0xfff00)
+        if 136 <= major <= 143:
+            return 'pts/%s' % ((major - 136) * 256 + minor)
+        if major == 4:
+            return 'tty%s' % minor if minor < 64 else 'ttyS%s' % (minor - 64)
+        return '?'
+
+    @staticmethod
+    def _format_stat(proc):
+        stat = proc.state
+        if proc.nice < 0:
+            stat += '<'
+        elif proc.nice > 0:
+            stat += 'N'
+        if proc.pid == proc.session:
+            stat += 's'
+        if proc.num_threads > 1:
+            stat += 'l'
+        if proc.tpgid == proc.pgrp:
+            stat += '+'
+        return stat
+
+    @staticmethod
+    def _format_start(start, now):
+        if now - start < 24 * 3600:
+            return time.strftime('%H:%M', time.localtime(start))
+        if now - start < 365 * 24 * 3600:
+            return time.strftime('%b%d', time.localtime(start))
+        return time.strftime('%Y', time.localtime(start))
+
+    def _format_process(self, proc, snapshotter, boot_time, uptime, mem_total, now, exclude_args):
+        """
+        The columns of `ps aux` for a process
+        """
+        hz = float(snapshotter.clock_ticks)
+        cpu_time = (proc.utime + proc.stime) / hz
+        elapsed = uptime - proc.starttime / hz
+        # Tenths of percent, truncated like ps does
+        pcpu = int(1000 * cpu_time / elapsed) if elapsed > 0 else 0
+        rss_kb = proc.rss / 1024
+        pmem = 1000 * rss_kb / mem_total if mem_total else 0
+
+        if not proc.cmdline:
+            command = '[%s]' % proc.name
+        elif exclude_args:
+            command = proc.cmdline[0]
+        else:
+            command = ' '.join(proc.cmdline)
+
+        return [
+            proc.user,
+            str(proc.pid),
+            '%d.%d' % divmod(pcpu, 10),
+            '%d.%d' % divmod(pmem, 10),
+            str(proc.vsize / 1024),
+            str(rss_kb),
+            self._format_tty(proc.tty_nr),
+            self._format_stat(proc),
+            self._format_start(boot_time + proc.starttime / hz, now),
+            '%d:%02d' % divmod(int(cpu_time), 60),
+            command,
+        ]
+
+    @staticmethod
+    def _top_processes(processes, top_n):
+        """
+        Keep the `top_n` processes using the most CPU since the previous
+        run, and the `top_n` using the most memory
+        """
+        by_cpu = sorted(processes, key=lambda p: p.recent_cpu, reverse=True)[:top_n]
+        by_rss = sorted(processes, key=lambda p: p.rss, reverse=True)[:top_n]
+        top = set(p.pid for p in by_cpu) | set(p.pid for p in by_rss)
+        return [p for p in processes if p.pid in top]
+
+    def _check_linux_proc(self, agentConfig, proc_location):
+        if self._snapshotter is None or self._snapshotter.procfs_path != proc_location:
+            self._snapshotter = ProcSnapshotter(proc_location)
+        snapshotter = self._snapshotter
+
+        processes = snapshotter.snapshot()
+        top_n = int(agentConfig.get('processes_top_n') or 0)
+        if top_n > 0:
+            processes = self._top_processes(processes, top_n)
+
+        exclude_args = _is_affirmative(agentConfig.get('exclude_process_args', False))
+        boot_time = snapshotter.get_boot_time()
+        uptime = snapshotter.get_uptime()
+        mem_total = snapshotter.get_mem_total()
+        now = time.time()
+        return [self._format_process(proc, snapshotter, boot_time, uptime, mem_total, now, exclude_args)
+                for proc in processes]
+
     def check(self, agentConfig):
+        proc_location = agentConfig.get('procfs_path', '/proc').rstrip('/')
+        if Platform.is_linux() and os.path.isdir(proc_location):
+            try:
+                processes = self._check_linux_proc(agentConfig, proc_location)
+            except Exception:
+                self.logger.exception('getProcesses')
+                return False
+            return {'processes':   processes,
+                    'apiKey':      agentConfig['api_key'],
+                    'host':        get_hostname(agentConfig)}
+
         process_exclude_args = agentConfig.get('exclude_process_args', False)
         if process_exclude_args:
             ps_arg = 'aux'
@@ -579,6 +784,67 @@ class Processes(Check):
 
 class Cpu(Check):
 
+    def __init__(self, logger):
+        Check.__init__(self, logger)
+        # Aggregated CPU times of /proc/stat at the previous run
+        self._last_cpu_times = None
+
+    @staticmethod
+    def _parse_proc_stat(content):
+        """
+        Return the CPU times of all the CPUs from /proc/stat: user, nice,
+        system, idle, iowait, irq, softirq, steal, guest and guest_nice
+        (the ones missing from older kernels are 0).
+        """
+        for line in content.splitlines():
+            if line.startswith('cpu '):
+                times = [int(f) for f in line.split()[1:11]]
+                return times + [0] * (10 - len(times))
+        return None
+
+    @staticmethod
+    def _compute_linux_cpu(previous, current):
+        """
+        Compute the `mpstat` percentages from the difference between two
+        snapshots of the CPU times, None if no time elapsed.
+        """
+        user, nice, system, idle, iowait, irq, softirq, steal, guest, guest_nice = \
+            [max(c - p, 0) for c, p in zip(current, previous)]
+        # The time spent running guests is already counted in user and nice
+        total = user + nice + system + idle + iowait + irq + softirq + steal
+        if total == 0:
+            return None
+
+        def pct(value):
+            return 100.0 * value / total
+
+        return {
+            '%usr': pct(max(user - guest, 0)),
+            '%nice': pct(max(nice - guest_nice, 0)),
+            '%sys': pct(system),
+            '%iowait': pct(iowait),
+            '%irq': pct(irq),
+            '%soft': pct(softirq),
+            '%steal': pct(steal),
+            '%guest': pct(guest),
+            '%idle': pct(idle),
+        }
+
+    def _check_linux_proc(self, stat_path):
+        """
+        CPU percentages since the previous run, None on the first one.
+        """
+        with open(stat_path) as f:
+            cpu_times = self._parse_proc_stat(f.read())
+        if cpu_times is None:
+            return None
+
+        cpu_metrics = None
+        if self._last_cpu_times is not None:
+            cpu_metrics = self._compute_linux_cpu(self._last_cpu_times, cpu_times)
+        self._last_cpu_times = cpu_times
+        return cpu_metrics
+
     def check(self, agentConfig):
         """Return an aggregate of CPU stats across all CPUs
         When figures are not available, False is sent back.
@@ -601,7 +867,21 @@ class Cpu(Check):
                 self.logger.debug("Cannot extract cpu value %s from %s (%s)" % (name, data, legend))
                 return 0.0
         try:
-            if Platform.is_linux():
+            proc_location = agentConfig.get('procfs_path', '/proc').rstrip('/')
+            stat_path = os.path.join(proc_location, 'stat')
+            if Platform.is_linux() and os.path.exists(stat_path):
+                cpu_metrics = self._check_linux_proc(stat_path)
+                if cpu_metrics is None:
+                    return False
+
+                return format_results(cpu_metrics['%usr'] + cpu_metrics['%nice'],
+                                      cpu_metrics['%sys'] + cpu_metrics['%irq'] + cpu_metrics['%soft'],
+                                      cpu_metrics['%iowait'],
+                                      cpu_metrics['%idle'],
+                                      cpu_metrics['%steal'],
+                                      cpu_metrics['%guest'])
+
+            elif Platform.is_linux():
                 output, _, _ = get_subprocess_output(['mpstat', '1', '3'], self.logger)
                 mpstat = output.splitlines()
                 # topdog@ip:~$ mpstat 1 3
@@ -999,10 +999,10 @@ def load_check_from_places(check_config, check_name, checks_places, agentConfig)
     return load_success, load_failure
 
 
-def load_check_directory(agentConfig, hostname):
+def load_check_directory(agentConfig, hostname, check_names=None):
     ''' Return the initialized checks from checks.d, and a mapping of checks that failed to
     initialize. Only checks that have a configuration
-    file in conf.d will be returned. '''
+    file in conf.d will be returned. When `check_names` is given, only these checks are loaded. '''
     from checks import AGENT_METRICS_CHECK_NAME
 
     initialized_checks = {}
@@ -1025,6 +1025,8 @@ def load_check_directory(agentConfig, hostname):
     for config_path in _file_configs_paths(osname, agentConfig):
         # '/etc/dd-agent/checks.d/my_check.py' -> 'my_check'
         check_name = _conf_path_to_check_name(config_path)
+        if check_names is not None and check_name not in check_names:
+            continue
 
         conf_is_valid, check_config, invalid_check = _load_file_config(config_path, check_name, agentConfig)
         init_failed_checks.update(invalid_check)
@@ -1044,6 +1046,8 @@ def load_check_directory(agentConfig, hostname):
         # ignore this config from service disco if the check has been loaded through a file config
         if check_name in initialized_checks or check_name in init_failed_checks:
             continue
+        if check_names is not None and check_name not in check_names:
+            continue
 
         # if TRACE_CONFIG is set, service_disco_check_config looks like:
         # (config_src, (sd_init_config, sd_instances)) instead of
@@ -0,0 +1,289 @@
+# (C) Datadog, Inc. 2010-2016
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+"""
+Declarative log-to-metric rules for dogstreams, instead of a custom parser.
+
+Add to datadog.conf as follows:
+
+dogstreams: /var/log/app.log:dogstream.rules:RuleParser:/etc/dd-agent/dogstream/app.yaml
+
+where app.yaml lists the rules of the log:
+
+rules:
+  - pattern: '^(?P<date>\S+ \S+) INFO request (?P<method>[A-Z]+) (?P<status>\d{3}) (?P<duration>\d+)ms'
+    timestamp: date                           # optional, the current time otherwise
+    timestamp_format: '%Y-%m-%d %H:%M:%S'     # optional, a unix timestamp otherwise
+    timestamp_timezone: utc                   # optional, utc or local (the agent's), default utc
+    tags: [method, status]                    # optional, tagged as method:GET, ...
+    metrics:
+      - name: app.request.duration
+        value: duration
+        type: gauge
+      - name: app.request.count               # value defaults to 1
+        type: counter
+
+  - pattern: 'ERROR'
+    metric: app.errors                        # short form for a single metric
+    type: counter
+
+A line is matched by a single rule: if several match it, the one whose match
+starts first. All the rules of a log are compiled into a single regex, and
+lines which don't contain the literal text required by any rule are skipped
+without running it. The rules with inline flags (e.g. `(?i)`, they would apply
+to all the rules) or group references (`\1`, `(?P=name)`, `(?(1)...)`) are
+compiled on their own, and tried after the rules before them.
+"""
+# stdlib
+import calendar
+from datetime import datetime
+import re
+import sre_constants
+import sre_parse
+import time
+
+# 3p
+import yaml
+
+# project
+from util import yLoader
+
+METRIC_TYPES = ('gauge', 'counter')
+TIMEZONES = ('utc', 'local')
+# Python 2 regexes support at most 100 groups, including the whole match
+MAX_GROUPS = 99
+# Shorter literals don't filter out enough lines to be worth checking
+MIN_LITERAL_LENGTH = 3
+
+# Group definitions, references and conditionals on groups, by name
+GROUP_REFERENCE_RE = re.compile(r'\((\?P[<=]|\?\()([A-Za-z_]\w*)')
+INLINE_FLAGS = (sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_LOCALE |
+                sre_constants.SRE_FLAG_MULTILINE | sre_constants.SRE_FLAG_DOTALL |
+                sre_constants.SRE_FLAG_UNICODE | sre_constants.SRE_FLAG_VERBOSE)
+
+
+class RuleError(Exception):
+    pass
+
+
+def required_literal(pattern):
+    """
+    Longest literal text that any line matched by `pattern` contains,
+    None if there is none (or only a too short one).
+    """
+    parsed = sre_parse.parse(pattern)
+    if parsed.pattern.flags & (sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_VERBOSE):
+        return None
+
+    literals = ['']
+
+    def walk(items):
+        for op, av in items:
+            if op == sre_constants.LITERAL and av < 256:
+                literals[-1] += chr(av)
+            elif op == sre_constants.SUBPATTERN:
+                # A group is as mandatory as its surroundings, its literal text continues them
+                walk(av[-1])
+            else:
+                literals.append('')
+
+    walk(parsed)
+    literal = max(literals, key=len)
+    if len(literal) < MIN_LITERAL_LENGTH:
+        return None
+    return literal
+
+
+def _uses_group_references(items):
+    """
+    Whether a parsed pattern refers to its groups, which can't be renumbered
+    """
+    for op, av in items:
+        if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+            return True
+        for value in (av if isinstance(av, (tuple, list)) else [av]):
+            if isinstance(value, sre_parse.SubPattern) and _uses_group_references(value):
+                return True
+            if isinstance(value, list) and \
+                    any(isinstance(v, sre_parse.SubPattern) and _uses_group_references(v) for v in value):
+                return True
+    return False
+
+
+class Rule(object):
+    """
+    A compiled rule, emitting the points of the lines it matches.
+    Its groups are prefixed so that it can be combined with other rules,
+    unless it's `standalone`.
+    """
+
+    def __init__(self, index, config):
+        if not isinstance(config, dict) or 'pattern' not in config:
+            raise RuleError("Rule #%s has no pattern" % index)
+        self.pattern = config['pattern']
+        try:
+            regex = re.compile(self.pattern)
+        except re.error as e:
+            raise RuleError("Invalid pattern of rule #%s: %s" % (index, e))
+        groups = regex.groupindex
+
+        self.group = '_r%s' % index
+        self._prefix = 'r%s_' % index
+        self.literal = required_literal(self.pattern)
+        self.group_count = regex.groups + 1
+        parsed = sre_parse.parse(self.pattern)
+        self.standalone = bool(parsed.pattern.flags & INLINE_FLAGS) or _uses_group_references(parsed)
+
+        def group(name, key):
+            if name not in groups:
+                raise RuleError("Rule #%s: no group %s in the pattern, for its %s" % (index, name, key))
+            return self._prefix + name
+
+        self._timestamp_group = None
+        if config.get('timestamp'):
+            self._timestamp_group = group(config['timestamp'], 'timestamp')
+        self._timestamp_format = config.get('timestamp_format')
+        timezone = str(config.get('timestamp_timezone', 'utc')).lower()
+        if timezone not in TIMEZONES:
+            raise RuleError("Rule #%s: invalid timestamp timezone %s" % (index, timezone))
+        # Parsed timestamps are in UTC, or in the local time of the agent
+        self._timegm = calendar.timegm if timezone == 'utc' else time.mktime
+        self._last_timestamp = (None, None)
+
+        self._tags = [(tag, group(tag, 'tags')) for tag in config.get('tags') or []]
+
+        metrics = config.get('metrics')
+        if metrics is None:
+            metrics = [config]
+        self._metrics = []
+        for metric in metrics:
+            name = metric.get('name', metric.get('metric'))
+            if not name:
+                raise RuleError("Rule #%s: missing metric name" % index)
+            metric_type = str(metric.get('type', 'gauge')).lower()
+            if metric_type not in METRIC_TYPES:
+                raise RuleError("Rule #%s: invalid metric type %s" % (index, metric_type))
+            value = metric.get('value', 1)
+            if isinstance(value, basestring):
+                value_group, value = group(value, 'value'), None
+            else:
+                value_group, value = None, float(value)
+            self._metrics.append((name, metric_type, value_group, value))
+
+    def get_pattern(self):
+        """
+        The pattern with its groups renamed
+        """
+        return GROUP_REFERENCE_RE.sub(
+            lambda m: '(%s%s%s' % (m.group(1), self._prefix, m.group(2)), self.pattern)
+
+    def get_combined_pattern(self):
+        """
+        The pattern wrapped into the group of the rule, with its groups renamed
+        """
+        return '(?P<%s>%s)' % (self.group, self.get_pattern())
+
+    def _get_timestamp(self, match):
+        if self._timestamp_group is None:
+            return time.time()
+        value = match.group(self._timestamp_group)
+        if self._timestamp_format is None:
+            return value
+        # Consecutive lines are often logged at the same time, parse it once
+        last_value, last_timestamp = self._last_timestamp
+        if value != last_value:
+            dt = datetime.strptime(value, self._timestamp_format)
+            last_timestamp = self._timegm(dt.timetuple())
+            self._last_timestamp = (value, last_timestamp)
+        return last_timestamp
+
+    def get_points(self, match):
+        timestamp = self._get_timestamp(match)
+        tags = ['%s:%s' % (tag, match.group(group)) for tag, group in self._tags
+                if match.group(group) is not None]
+
+        points = []
+        for name, metric_type, value_group, value in self._metrics:
+            if value_group is not None:
+                value = match.group(value_group)
+                if value is None:
+                    continue
+            attributes = {'metric_type': metric_type}
+            if tags:
+                attributes['tags'] = tags
+            points.append((name, timestamp, value, attributes))
+        return points
+
+
+class RuleSet(object):
+    """
+    Rules compiled into as few regexes as possible, and the literals
+    prefiltering the lines they can match.
+    """
+
+    def __init__(self, rules_config):
+        if not rules_config:
+            raise RuleError("No rules")
+        self._rules = {}
+        rules = []
+        for index, config in enumerate(rules_config):
+            rule = Rule(index, config)
+            self._rules[rule.group] = rule
+            rules.append(rule)
+
+        # The literals are only worth checking if every rule requires one
+        self._literals = None
+        if all(rule.literal for rule in rules):
+            self._literals = sorted(set(rule.literal for rule in rules))
+
+        # [(regex, its rule if it's a standalone one)], in the order of the rules
+        self._regexes = []
+        chunk, group_count = [], 0
+        for rule in rules:
+            if chunk and (rule.standalone or group_count + rule.group_count > MAX_GROUPS):
+                self._regexes.append((self._compile(chunk), None))
+                chunk, group_count = [], 0
+            if rule.standalone:
+                self._regexes.append((re.compile(rule.get_pattern()), rule))
+                continue
+            chunk.append(rule)
+            group_count += rule.group_count
+        if chunk:
+            self._regexes.append((self._compile(chunk), None))
+
+    @staticmethod
+    def _compile(rules):
+        return re.compile('|'.join(rule.get_combined_pattern() for rule in rules))
+
+    def parse_line(self, line):
+        if self._literals is not None:
+            for literal in self._literals:
+                if literal in line:
+                    break
+            else:
+                return None
+
+        for regex, rule in self._regexes:
+            match = regex.search(line)
+            if match is not None:
+                rule = rule or self._rules[match.lastgroup]
+                return rule.get_points(match)
+        return None
+
+
+class RuleParser(RuleSet):
+    """
+    Class-based dogstream parser, following the rules of the YAML file
+    given as its argument.
+    """
+
+    def __init__(self, user_args=(), logger=None, log_path=None, **kwargs):
+        if not user_args:
+            raise RuleError("No rules file given for %s" % log_path)
+        rules_path = user_args[0]
+        with open(rules_path) as f:
+            config = yaml.load(f.read(), Loader=yLoader) or {}
+        RuleSet.__init__(self, config.get('rules'))
+        if logger is not None:
+            logger.info("dogstream: following the rules of %s for %s", rules_path, log_path)
@@ -6,6 +6,7 @@
 from hashlib import md5
 import logging
 import re
+import timeit
 import zlib
 
 # 3p
@@ -33,19 +34,33 @@ def remove_control_chars(s):
 
 
 def http_emitter(message, log, agentConfig, endpoint):
-    "Send payload"
+    """
+    Send payload
+
+    Returns serialization/compression statistics, reported by the collector.
+    """
     url = agentConfig['dd_url']
 
     log.debug('http_emitter: attempting postback to ' + url)
 
     # Post back the data
+    serialization_start = timeit.default_timer()
     try:
         payload = json.dumps(message)
     except UnicodeDecodeError:
         message = remove_control_chars(message)
         payload = json.dumps(message)
 
+    compression_start = timeit.default_timer()
     zipped = zlib.compress(payload)
+    compression_end = timeit.default_timer()
+
+    stats = {
+        'serialization_time': compression_start - serialization_start,
+        'compression_time': compression_end - compression_start,
+        'payload_size': len(payload),
+        'compressed_size': len(zipped),
+    }
 
     log.debug("payload_size=%d, compressed_size=%d, compression_ratio=%.3f"
               % (len(payload), len(zipped), float(len(payload))/float(len(zipped))))
@@ -72,6 +87,8 @@ def http_emitter(message, log, agentConfig, endpoint):
         except Exception:
             pass
 
+    return stats
+
 
 def post_headers(agentConfig, payload):
     return {
@@ -3,7 +3,6 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 # stdlib
-import copy
 import inspect
 from itertools import product
 import imp
@@ -19,6 +18,7 @@ import unittest
 from checks import AgentCheck
 from config import get_checksd_path
 from util import get_hostname, get_os
+from utils.containers import freeze_read_only, thaw
 from utils.debug import get_check  # noqa -  FIXME 5.5.0 AgentCheck tests should not use this
 
 log = logging.getLogger('tests')
@@ -188,10 +188,10 @@ class AgentCheckTest(unittest.TestCase):
         error = None
         for instance in self.check.instances:
             try:
-                # Deepcopy needed to avoid weird duplicate tagging situations
-                # ie the check edits the tags of the instance, problematic if
-                # run twice
-                self.check.check(copy.deepcopy(instance))
+                # The instance is read-only, as in `AgentCheck.run`: writes to
+                # it fail the test unless the check declares MUTATES_INSTANCES
+                instance = freeze_read_only(instance)
+                self.check.check(thaw(instance) if self.check.MUTATES_INSTANCES else instance)
                 # FIXME: This should be called within the `run` method only
                 self.check._roll_up_instance_metadata()
             except Exception as e:
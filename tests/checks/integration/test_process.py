@@ -8,10 +8,13 @@ import os
 
 # 3p
 from mock import patch, MagicMock
+from nose.plugins.skip import SkipTest
 import psutil
 
 # project
 from tests.checks.common import AgentCheckTest
+from tests.core.test_utils_procfs import FakeProc, SYSCONF
+from utils.platform import Platform
 
 
 # cross-platform switches
@@ -37,6 +40,9 @@ class MockProcess(object):
 def noop_get_pagefault_stats(pid):
     return None
 
+def no_process_table(name):
+    return None
+
 class ProcessCheckTest(AgentCheckTest):
     CHECK_NAME = 'process'
 
@@ -212,13 +218,19 @@ class ProcessCheckTest(AgentCheckTest):
         def deny_name(obj):
             raise psutil.AccessDenied()
 
+        # Processes are only denied to psutil
+        mocks = {
+            'get_pagefault_stats': noop_get_pagefault_stats,
+            '_get_process_table': no_process_table,
+        }
+
         with patch.object(psutil.Process, 'name', deny_name):
-            self.assertRaises(psutil.AccessDenied, self.run_check, config)
+            self.assertRaises(psutil.AccessDenied, self.run_check, config, mocks=mocks)
 
         self.assertTrue(len(self.check.ad_cache) > 0)
 
         # The next run shoudn't throw an exception
-        self.run_check(config, mocks={'get_pagefault_stats': noop_get_pagefault_stats})
+        self.run_check(config, mocks=mocks)
         # The ad cache should still be valid
         self.assertFalse(self.check.should_refresh_ad_cache('python'))
 
@@ -226,7 +238,7 @@ class ProcessCheckTest(AgentCheckTest):
         self.check.last_ad_cache_ts = {}
         self.check.last_pid_cache_ts = {}
         # Shouldn't throw an exception
-        self.run_check(config, mocks={'get_pagefault_stats': noop_get_pagefault_stats})
+        self.run_check(config, mocks=mocks)
 
     def mock_find_pids(self, name, search_string, exact_match=True, ignore_ad=True,
                        refresh_ad_cache=True):
@@ -262,6 +274,7 @@ class ProcessCheckTest(AgentCheckTest):
             'find_pids': self.mock_find_pids,
             'psutil_wrapper': self.mock_psutil_wrapper,
             'get_pagefault_stats': mock_get_pagefault_stats,
+            '_get_process_table': no_process_table,
         }
 
         config = {
@@ -363,6 +376,83 @@ class ProcessCheckTest(AgentCheckTest):
         self.run_check(config, mocks={'get_pagefault_stats': noop_get_pagefault_stats})
         self.assertMetric('system.processes.cpu.pct', count=1, tags=expected_tags)
 
+    def _fake_process(self, proc, pid, name, cmdline, utime=250):
+        proc.add(pid, name, cmdline, utime=utime)
+        proc.add_file(pid, 'statm', "25600 2560 512 1 0 100 0\n")
+        proc.add_file(pid, 'status', "Name:\t%s\nvoluntary_ctxt_switches:\t10\n"
+                      "nonvoluntary_ctxt_switches:\t2\n" % name)
+        proc.add_file(pid, 'io', "rchar: 100\nwchar: 100\nsyscr: 5\nsyscw: 3\n"
+                      "read_bytes: 4096\nwrite_bytes: 8192\ncancelled_write_bytes: 0\n")
+        os.mkdir(os.path.join(proc.path, str(pid), 'fd'))
+        for fd in range(4):
+            os.symlink('/dev/null', os.path.join(proc.path, str(pid), 'fd', str(fd)))
+
+    def test_process_table(self):
+        if not Platform.is_linux():
+            raise SkipTest("The process table is read from /proc on Linux only")
+
+        proc = FakeProc(1448632481)
+        self._fake_process(proc, 10, 'nginx', ['nginx: master process'])
+        self._fake_process(proc, 11, 'nginx', ['nginx: worker process'])
+        self._fake_process(proc, 12, 'python', ['/usr/bin/python', 'app.py'])
+        self._fake_process(proc, 13, 'very-long-proce', ['/usr/sbin/very-long-process-name', '-d'])
+
+        config = {
+            'init_config': {'procfs_path': proc.path},
+            'instances': [
+                {'name': 'nginx', 'search_string': ['nginx']},
+                {'name': 'nginx_cmdline', 'search_string': ['nginx:'], 'exact_match': False},
+                {'name': 'app', 'search_string': ['app.py', 'nginx: master'], 'exact_match': False},
+                {'name': 'long', 'search_string': ['very-long-process-name']},
+            ]
+        }
+        expected_pids = {'nginx': 2, 'nginx_cmdline': 2, 'app': 2, 'long': 1}
+
+        try:
+            with patch('utils.procfs.os.sysconf', side_effect=SYSCONF.get):
+                self.run_check(config)
+                snapshot = MagicMock(side_effect=self.check._snapshotter.snapshot)
+                self.check._snapshotter.snapshot = snapshot
+                read_metrics = MagicMock(side_effect=self.check._read_process_metrics)
+                self.check._read_process_metrics = read_metrics
+                proc.add(12, 'python', ['/usr/bin/python', 'app.py'], utime=350)
+                self.run_check(config)
+        finally:
+            proc.close()
+
+        # A single snapshot for all the instances, each process read once
+        self.assertEquals(snapshot.call_count, 1)
+        self.assertEquals(read_metrics.call_count, 4)
+
+        for instance in config['instances']:
+            tags = self.generate_expected_tags(instance)
+            count = expected_pids[instance['name']]
+            self.assertMetric('system.processes.number', value=count, tags=tags)
+            self.assertMetric('system.processes.threads', value=3 * count, tags=tags)
+            self.assertMetric('system.processes.mem.rss', value=2560 * 4096 * count, tags=tags)
+            self.assertMetric('system.processes.mem.vms', value=104857600 * count, tags=tags)
+            self.assertMetric('system.processes.mem.real', value=(2560 - 512) * 4096 * count, tags=tags)
+            self.assertMetric('system.processes.open_file_descriptors', value=4 * count, tags=tags)
+            self.assertMetric('system.processes.voluntary_ctx_switches', value=10 * count, tags=tags)
+            self.assertMetric('system.processes.involuntary_ctx_switches', value=2 * count, tags=tags)
+            self.assertMetric('system.processes.ioread_count', value=5 * count, tags=tags)
+            self.assertMetric('system.processes.iowrite_count', value=3 * count, tags=tags)
+            self.assertMetric('system.processes.ioread_bytes', value=4096 * count, tags=tags)
+            self.assertMetric('system.processes.iowrite_bytes', value=8192 * count, tags=tags)
+            self.assertServiceCheckOK('process.up', tags=['process:%s' % instance['name']])
+
+        # Only the python process used CPU since the first run
+        for instance in config['instances']:
+            tags = self.generate_expected_tags(instance)
+            if instance['name'] == 'app':
+                self.assertMetric('system.processes.cpu.pct', tags=tags, at_least=1)
+            else:
+                self.assertMetric('system.processes.cpu.pct', tags=tags, value=0)
+        for stat_name in self.PAGEFAULT_STAT:
+            self.assertMetric('system.processes.mem.page_faults.' + stat_name, at_least=0)
+
+        self.coverage_report()
+
     def test_relocated_procfs(self):
         from utils.platform import Platform
         import tempfile
@@ -466,5 +556,8 @@ class ProcessCheckTest(AgentCheckTest):
         self.assertServiceCheckOK('process.up', count=1, tags=['process:moved_procfs'])
 
         self.assertMetric('system.processes.number', at_least=1, tags=expected_tags)
+        # What the stat file of the process has
+        for mname in ['threads', 'mem.rss', 'mem.vms']:
+            self.assertMetric('system.processes.%s' % mname, at_least=1, tags=expected_tags)
 
         self.coverage_report()
@@ -1,8 +1,6 @@
-# stdlib
-import socket
-
 # 3p
 from nose.plugins.attrib import attr
+import requests
 
 # project
 from tests.checks.common import AgentCheckTest
@@ -95,7 +93,7 @@ class RiakTestCase(AgentCheckTest):
 
     def test_bad_config(self):
         self.assertRaises(
-            socket.error,
+            requests.exceptions.ConnectionError,
             lambda: self.run_check({"instances": [{"url": "http://localhost:5985"}]})
         )
         sc_tags = ['url:http://localhost:5985']
@@ -1,8 +1,13 @@
 # stdlib
-from itertools import product
+from itertools import count, product
 import os
 import shutil
 import tempfile
+import time
+
+# 3p
+import mock
+from scandir import scandir
 
 # project
 from tests.checks.common import AgentCheckTest
@@ -171,3 +176,113 @@ class DirectoryTestCase(AgentCheckTest):
 
         # Raises when coverage < 100%
         self.coverage_report()
+
+    def _age_directories(self):
+        """
+        Make the directories old enough for their mtime to be trusted
+        """
+        past = time.time() - 60
+        for path in [self.temp_dir, self.temp_dir + "/subfolder"]:
+            os.utime(path, (past, past))
+
+    def test_incremental_directory_metrics(self):
+        """
+        Incremental scans report the same metrics, and only list the directories which changed
+        """
+        self._age_directories()
+        config_stubs = self.get_config_stubs(self.temp_dir)
+        for stub in config_stubs:
+            stub['incremental'] = True
+        config = {
+            'instances': config_stubs
+        }
+
+        self.run_check(config)
+        for config_stub in config_stubs:
+            dir_tags = [config_stub.get('dirtagname', "name") + ":%s" % config_stub.get('name', self.temp_dir)]
+            for mname in (self.DIRECTORY_METRICS + self.COMMON_METRICS):
+                self.assertMetric(mname, tags=dir_tags, count=1)
+            if config_stub.get('pattern'):
+                expected = 2
+            elif config_stub.get('recursive'):
+                expected = 17
+            else:
+                expected = 12
+            self.assertMetric("system.disk.directory.files", tags=dir_tags, count=1, value=expected)
+        self.coverage_report()
+
+        # Nothing changed: nothing listed
+        with mock.patch('directory.scandir', side_effect=scandir) as mock_scandir:
+            self.run_check(config)
+        self.assertEquals(mock_scandir.call_count, 0)
+        self.assertMetric("system.disk.directory.files", tags=["recursive_check:%s" % self.temp_dir], value=17)
+
+        # A new file in the subfolder: only the subfolder is listed
+        with open(self.temp_dir + "/subfolder/file_5", 'w') as f:
+            f.write("12345")
+        with mock.patch('directory.scandir', side_effect=scandir) as mock_scandir:
+            self.run_check(config)
+        self.assertEquals([c[0][0] for c in mock_scandir.call_args_list], [self.temp_dir + "/subfolder"])
+        self.assertMetric("system.disk.directory.files", tags=["recursive_check:%s" % self.temp_dir], value=18)
+        self.assertMetric("system.disk.directory.bytes", tags=["recursive_check:%s" % self.temp_dir], value=5)
+
+    def test_incremental_max_scan_time(self):
+        """
+        A scan out of time continues at the next run, the last complete scan is reported meanwhile
+        """
+        config = {
+            'instances': [{
+                'directory': self.temp_dir,
+                'recursive': True,
+                'countonly': True,
+                'incremental': True,
+                'max_scan_time': 0.000001,
+            }]
+        }
+        tags = ["name:%s" % self.temp_dir]
+
+        # Time flies
+        with mock.patch('directory.time.time', side_effect=count(0, 10).next):
+            # The top directory is visited and the time is out, no scan to report yet
+            self.run_check(config)
+            self.assertEquals(self.metrics, [])
+            # The subfolder is visited, the scan is complete
+            self.run_check(config)
+            self.assertMetric("system.disk.directory.files", tags=tags, count=1, value=17)
+
+            # The new file is listed with the top directory, the next scan isn't complete
+            with open(self.temp_dir + "/file_10", 'w') as f:
+                f.write("12345")
+            self.run_check(config)
+            self.assertMetric("system.disk.directory.files", tags=tags, count=1, value=17)
+
+            self.run_check(config)
+            self.assertMetric("system.disk.directory.files", tags=tags, count=1, value=18)
+        self.coverage_report()
+
+    def test_pattern_case(self):
+        """
+        Patterns follow the case sensitivity of the platform, as with `fnmatch`
+        """
+        config = {
+            'instances': [{
+                'directory': self.temp_dir,
+                'name': name,
+                'pattern': "*.LOG",
+                'incremental': incremental,
+                'countonly': True,
+            } for name, incremental in (("walk", False), ("incremental", True))]
+        }
+
+        # Case sensitive, like posixpath
+        self.run_check(config)
+        for name in ("walk", "incremental"):
+            self.assertMetric("system.disk.directory.files", tags=["name:" + name], count=1, value=0)
+
+        # Case insensitive, like ntpath: start over the incremental scan to compile its pattern again
+        self.check._scans.clear()
+        with mock.patch('directory.normcase', side_effect=lambda s: s.lower()):
+            self.run_check(config)
+        for name in ("walk", "incremental"):
+            self.assertMetric("system.disk.directory.files", tags=["name:" + name], count=1, value=2)
+        self.coverage_report()
@@ -2,10 +2,31 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 # stdlib
+import BaseHTTPServer
+import json
 import mock
+import os
+import Queue
+import shutil
+import socket
+import SocketServer
+import tempfile
+import threading
+import time
 import unittest
+import urlparse
 
-from utils.dockerutil import DockerUtil
+from utils.dockerutil import ContainerInventory, ContainerPidIndex, DockerUtil
+
+CONTAINER_A = 'a' * 64
+CONTAINER_B = 'b' * 64
+
+CGROUP = (
+    "11:memory:/docker/{id}\n"
+    "4:cpu,cpuacct:/docker/{id}\n"
+    "1:name=systemd:/docker/{id}\n"
+)
+HOST_CGROUP = "4:cpu,cpuacct:/\n1:name=systemd:/init.scope\n"
 
 
 class TestDockerutil(unittest.TestCase):
@@ -24,3 +45,313 @@ class TestDockerutil(unittest.TestCase):
         mocked_client.events.return_value = [u'an error from Docker API here']
         events_generator, _ = self.dockerutil.get_events()
         self.assertEqual(len(list(events_generator)), 0)
+
+
+class TestContainerPidIndex(unittest.TestCase):
+    def setUp(self):
+        self.proc_path = tempfile.mkdtemp()
+        self.add_process(1, HOST_CGROUP)
+        self.add_process(100, CGROUP.format(id=CONTAINER_A))
+        self.add_process(101, CGROUP.format(id=CONTAINER_A))
+        self.add_process(200, CGROUP.format(id=CONTAINER_B))
+        self.index = ContainerPidIndex(self.proc_path)
+
+    def tearDown(self):
+        shutil.rmtree(self.proc_path)
+
+    def add_process(self, pid, cgroup):
+        os.mkdir(os.path.join(self.proc_path, str(pid)))
+        with open(os.path.join(self.proc_path, str(pid), 'cgroup'), 'w') as f:
+            f.write(cgroup)
+
+    def test_crawl(self):
+        pids = self.index.update([CONTAINER_A, CONTAINER_B])
+        self.assertIn(pids[CONTAINER_A], ['100', '101'])
+        self.assertEquals(pids[CONTAINER_B], '200')
+        self.assertFalse(self.index.empty_proc)
+
+        # Known pids are only checked to still be in their container, without a crawl
+        read_container_id = mock.Mock(side_effect=self.index._read_container_id)
+        self.index._read_container_id = read_container_id
+        with mock.patch.object(self.index, '_crawl') as mock_crawl:
+            self.assertEquals(self.index.update([CONTAINER_A, CONTAINER_B]), pids)
+        self.assertFalse(mock_crawl.called)
+        self.assertEquals(sorted(c[0][0] for c in read_container_id.call_args_list),
+                          sorted([pids[CONTAINER_A], '200']))
+
+    def test_reused_pid(self):
+        pids = self.index.update([CONTAINER_B], lambda container_id: 200)
+        self.assertEquals(pids, {CONTAINER_B: '200'})
+
+        # B restarted, and its former pid is now a process of the host
+        shutil.rmtree(os.path.join(self.proc_path, '200'))
+        self.add_process(200, HOST_CGROUP)
+        self.add_process(300, CGROUP.format(id=CONTAINER_B))
+        self.assertEquals(self.index.update([CONTAINER_B], lambda container_id: 200), {CONTAINER_B: '300'})
+
+        # Crawled, then reused by a process of another container
+        shutil.rmtree(os.path.join(self.proc_path, '300'))
+        self.add_process(300, CGROUP.format(id=CONTAINER_A))
+        self.add_process(301, CGROUP.format(id=CONTAINER_B))
+        self.assertEquals(self.index.update([CONTAINER_B]), {CONTAINER_B: '301'})
+
+    def test_incremental_crawl(self):
+        pid_a = self.index.update([CONTAINER_A])[CONTAINER_A]
+
+        # Container B restarted: its new process is the only one crawled, and
+        # the known pid of A is checked to still be in A
+        shutil.rmtree(os.path.join(self.proc_path, '200'))
+        self.add_process(300, CGROUP.format(id=CONTAINER_B))
+        read_container_id = mock.Mock(side_effect=self.index._read_container_id)
+        self.index._read_container_id = read_container_id
+        pids = self.index.update([CONTAINER_A, CONTAINER_B])
+
+        self.assertEquals(pids[CONTAINER_B], '300')
+        self.assertEquals(sorted(c[0][0] for c in read_container_id.call_args_list), sorted([pid_a, '300']))
+        self.assertNotIn('200', self.index._pid_containers)
+
+    def test_docker_api_pid(self):
+        get_pid = mock.Mock(side_effect=lambda container_id: {CONTAINER_A: 101, CONTAINER_B: 0}[container_id])
+        with mock.patch.object(self.index, '_crawl', side_effect=self.index._crawl) as mock_crawl:
+            pids = self.index.update([CONTAINER_A], get_pid)
+            self.assertEquals(pids, {CONTAINER_A: '101'})
+            self.assertFalse(mock_crawl.called)
+
+            # The Docker API doesn't know the pid of B, /proc is crawled
+            pids = self.index.update([CONTAINER_A, CONTAINER_B], get_pid)
+            self.assertEquals(pids, {CONTAINER_A: '101', CONTAINER_B: '200'})
+            self.assertEquals(mock_crawl.call_count, 1)
+
+        # Stopped containers are forgotten
+        self.assertEquals(self.index.update([CONTAINER_B], get_pid), {CONTAINER_B: '200'})
+
+    def test_docker_api_pid_not_in_proc(self):
+        # A pid of another namespace
+        get_pid = mock.Mock(return_value=4242)
+        pids = self.index.update([CONTAINER_A, CONTAINER_B], get_pid)
+        self.assertIn(pids[CONTAINER_A], ['100', '101'])
+        self.assertEquals(pids[CONTAINER_B], '200')
+        self.assertEquals(get_pid.call_count, 2)
+
+        # The pids crawled are used, the Docker API isn't asked again
+        shutil.rmtree(os.path.join(self.proc_path, '200'))
+        self.add_process(300, CGROUP.format(id=CONTAINER_B))
+        pids = self.index.update([CONTAINER_A, CONTAINER_B], get_pid)
+        self.assertEquals(pids[CONTAINER_B], '300')
+        self.assertEquals(get_pid.call_count, 2)
+
+        # Until the container is gone
+        self.index.update([CONTAINER_A], get_pid)
+        self.index.update([CONTAINER_A, CONTAINER_B], get_pid)
+        self.assertEquals(get_pid.call_count, 3)
+        get_pid.assert_called_with(CONTAINER_B)
+
+    def test_empty_proc(self):
+        empty = tempfile.mkdtemp()
+        try:
+            index = ContainerPidIndex(empty)
+            self.assertEquals(index.update([CONTAINER_A]), {})
+            self.assertTrue(index.empty_proc)
+        finally:
+            shutil.rmtree(empty)
+
+
+class FakeDockerAPIHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """The container listing, inspect and events endpoints of the Docker API"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, content, status=200):
+        body = json.dumps(content)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        path = url.path.split('/', 2)[-1]
+        query = urlparse.parse_qs(url.query)
+        api = self.server.api
+        api.requests.append(path)
+
+        if path == 'containers/json':
+            containers = api.containers.values()
+            if 'filters' in query:
+                ids = json.loads(query['filters'][0]).get('id', [])
+                containers = [c for c in containers if any(c['Id'].startswith(i) for i in ids)]
+            self._send_json(containers)
+        elif path.startswith('containers/') and path.endswith('/json'):
+            container_id = path.split('/')[1]
+            if container_id not in api.containers:
+                self._send_json({'message': 'No such container'}, status=404)
+            else:
+                self._send_json({'Id': container_id, 'State': {'Pid': api.pids.get(container_id)}})
+        elif path == 'events':
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            try:
+                while not api.closing:
+                    try:
+                        event = json.dumps(api.events.get(timeout=0.05))
+                    except Queue.Empty:
+                        continue
+                    self.wfile.write('%x\r\n%s\r\n' % (len(event), event))
+                    self.wfile.flush()
+                self.wfile.write('0\r\n\r\n')
+            except socket.error:
+                pass
+        else:
+            self._send_json({'message': 'page not found'}, status=404)
+
+
+class FakeDockerServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    handlers = 0
+
+    def process_request_thread(self, request, client_address):
+        self.handlers += 1
+        try:
+            SocketServer.ThreadingMixIn.process_request_thread(self, request, client_address)
+        finally:
+            self.handlers -= 1
+
+    def handle_error(self, request, client_address):
+        # The clients' connections are cut when the test ends
+        pass
+
+
+class FakeDockerAPI(object):
+    def __init__(self):
+        self.containers = {}
+        self.pids = {}
+        self.events = Queue.Queue()
+        self.requests = []
+        self.closing = False
+
+        self.server = FakeDockerServer(('127.0.0.1', 0), FakeDockerAPIHandler)
+        self.server.api = self
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.settings = {
+            'base_url': 'http://127.0.0.1:%s' % self.server.server_address[1],
+            'version': '1.22',
+            'timeout': 5,
+        }
+
+    def add_container(self, container_id, status='Up 2 minutes', pid=None, **kwargs):
+        self.containers[container_id] = dict(Id=container_id, Status=status, Names=['/' + container_id[:4]],
+                                             Image='redis:latest', Labels={}, **kwargs)
+        if pid is not None:
+            self.pids[container_id] = pid
+
+    def send_event(self, container_id, status):
+        self.events.put({'id': container_id, 'status': status, 'from': 'redis:latest', 'time': int(time.time())})
+
+    def count(self, path):
+        return self.requests.count(path)
+
+    def close(self):
+        self.closing = True
+        self.server.shutdown()
+        self.server.server_close()
+        # Let the connections end
+        deadline = time.time() + 1
+        while self.server.handlers and time.time() < deadline:
+            time.sleep(0.01)
+
+
+class TestContainerInventory(unittest.TestCase):
+    def setUp(self):
+        self.api = FakeDockerAPI()
+        self.api.add_container(CONTAINER_A, pid=100)
+        self.api.add_container(CONTAINER_B, status='Exited (0) 3 minutes ago')
+        self.inventory = ContainerInventory(self.api.settings)
+
+    def tearDown(self):
+        self.inventory.stop()
+        self.api.close()
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition():
+            if time.time() > deadline:
+                self.fail("Timed out waiting for the inventory")
+            time.sleep(0.01)
+
+    def ids(self, **kwargs):
+        return sorted(c['Id'] for c in self.inventory.containers(**kwargs))
+
+    def test_containers(self):
+        self.assertEquals(self.ids(), [CONTAINER_A, CONTAINER_B])
+        self.assertEquals(self.ids(running=True), [CONTAINER_A])
+
+        # Listed once, until the next resync
+        self.ids()
+        self.assertEquals(self.api.count('containers/json'), 1)
+
+    def test_inspect_cache(self):
+        self.ids()
+        self.assertEquals(self.inventory.inspect(CONTAINER_A)['State']['Pid'], 100)
+        self.assertEquals(self.inventory.inspect(CONTAINER_A)['State']['Pid'], 100)
+        self.assertEquals(self.api.count('containers/%s/json' % CONTAINER_A), 1)
+
+        # Dropped by a resync if the container changed...
+        self.api.pids[CONTAINER_A] = 101
+        self.inventory.resync()
+        self.assertEquals(self.inventory.inspect(CONTAINER_A)['State']['Pid'], 100)
+        self.api.add_container(CONTAINER_A, status='Up 1 second', pid=102, Command='redis-server')
+        self.inventory.resync()
+        self.assertEquals(self.inventory.inspect(CONTAINER_A)['State']['Pid'], 102)
+
+        # ...or by an event about it
+        self.api.pids[CONTAINER_A] = 103
+        self.inventory.handle_event({'id': CONTAINER_A, 'status': 'restart', 'time': 1})
+        self.assertEquals(self.inventory.inspect(CONTAINER_A)['State']['Pid'], 103)
+        self.assertEquals(self.api.count('containers/%s/json' % CONTAINER_A), 3)
+
+    def test_entries_kept(self):
+        entry = [c for c in self.inventory.containers() if c['Id'] == CONTAINER_A][0]
+        self.inventory.handle_event({'id': CONTAINER_B, 'status': 'start', 'time': 1})
+        self.assertTrue(any(c is entry for c in self.inventory.containers()))
+
+        # Events which don't change the container are ignored
+        self.inventory.handle_event({'id': CONTAINER_A, 'status': 'exec_start: ls', 'time': 1})
+        self.inventory.handle_event({'id': 'redis:latest', 'status': 'pull', 'time': 1})
+        self.inventory.handle_event({'id': CONTAINER_A, 'Type': 'network', 'Action': 'connect', 'time': 1})
+        self.assertTrue(any(c is entry for c in self.inventory.containers()))
+        self.assertEquals(self.api.count('containers/json'), 2)
+
+    def test_follow_events(self):
+        self.inventory.start()
+        self.assertEquals(self.ids(running=True), [CONTAINER_A])
+
+        container_c = 'c' * 64
+        self.api.add_container(container_c)
+        self.api.send_event(container_c, 'start')
+        self.wait_for(lambda: container_c in self.ids(running=True))
+
+        self.api.add_container(CONTAINER_A, status='Exited (137) 1 second ago')
+        self.api.send_event(CONTAINER_A, 'die')
+        self.wait_for(lambda: CONTAINER_A not in self.ids(running=True))
+
+        del self.api.containers[CONTAINER_B]
+        self.api.send_event(CONTAINER_B, 'destroy')
+        self.wait_for(lambda: self.ids() == [CONTAINER_A, container_c])
+
+        # Only the containers of the events were listed again
+        self.assertTrue(self.api.count('containers/json') <= 4)
+
+    def test_resync_interval(self):
+        self.inventory.resync_interval = 0.1
+        self.inventory.start()
+        container_c = 'c' * 64
+        self.api.add_container(container_c)
+        # Without any event
+        self.wait_for(lambda: container_c in self.ids())
@@ -0,0 +1,143 @@
+# (C) Datadog, Inc. 2010-2016
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+# stdlib
+import os
+import shutil
+import tempfile
+
+# 3p
+import mock
+
+# project
+from tests.checks.common import AgentCheckTest
+from utils.dockerutil import DockerUtil
+
+CONTAINER_ID = 'a' * 64
+
+CGROUP_FILES = {
+    'memory': {
+        'memory.stat': "cache 100\nrss 200\nswap 10\nhierarchical_memory_limit 1000\n"
+                       "hierarchical_memsw_limit 1500\npgfault 42\n",
+    },
+    'cpuacct': {
+        'cpuacct.stat': "user 150\nsystem 50\n",
+    },
+    'blkio': {
+        'blkio.throttle.io_service_bytes': "8:0 Read 4096\n8:0 Write 8192\n8:0 Sync 0\n8:0 Async 12288\n"
+                                           "8:0 Total 12288\nTotal 12288\n",
+    },
+}
+
+# The same stats, in the cgroup v2 files
+CGROUP2_FILES = {
+    'memory.stat': "anon 200\nfile 100\nkernel_stack 16384\npgfault 42\n",
+    'memory.max': "1000\n",
+    'memory.swap.current': "10\n",
+    'memory.swap.max': "500\n",
+    'cpu.stat': "usage_usec 2000000\nuser_usec 1500000\nsystem_usec 500000\n",
+    'io.stat': "8:0 rbytes=4096 wbytes=8192 rios=1 wios=2 dbytes=0 dios=0\n",
+}
+
+
+def write_cgroup_tree(root, container_ids, cgroup2=False):
+    """
+    cgroup files of the containers, in `root` mounted as in the cgroup v1
+    `docker` layout, or as the cgroup v2 unified hierarchy with systemd
+    """
+    for container_id in container_ids:
+        if cgroup2:
+            directories = {os.path.join(root, 'system.slice', 'docker-%s.scope' % container_id): CGROUP2_FILES}
+        else:
+            directories = dict((os.path.join(root, cgroup, 'docker', container_id), files)
+                               for cgroup, files in CGROUP_FILES.iteritems())
+        for directory, files in directories.iteritems():
+            os.makedirs(directory)
+            for name, content in files.iteritems():
+                with open(os.path.join(directory, name), 'w') as f:
+                    f.write(content)
+
+    if cgroup2:
+        return None
+    return dict((cgroup, os.path.join(root, cgroup)) for cgroup in CGROUP_FILES)
+
+
+def setup_cgroups(check, mountpoints=None, cgroup2_mountpoint=None):
+    """What the initialization of the check finds on a host with cgroups"""
+    check._mountpoints = mountpoints or {}
+    check._cgroup2_mountpoint = cgroup2_mountpoint
+    check._cgroup_paths = {}
+    check._clock_ticks = 100
+    check.cgroup_listing_retries = 0
+    check.use_histogram = False
+
+
+class TestDockerDaemonCgroups(AgentCheckTest):
+    CHECK_NAME = 'docker_daemon'
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.load_check({'init_config': {}, 'instances': [{'url': 'unix://var/run/nonexistent.sock'}]})
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+    def _report(self):
+        self.check._report_cgroup_metrics({'Id': CONTAINER_ID}, ['container_name:a'])
+        return sorted((m[0], m[2]) for m in self.check.get_metrics())
+
+    def test_cgroup_paths(self):
+        mountpoints = write_cgroup_tree(self.root, [CONTAINER_ID])
+        setup_cgroups(self.check, mountpoints=mountpoints)
+
+        with mock.patch.object(DockerUtil, 'find_cgroup_filename_pattern',
+                               wraps=DockerUtil.find_cgroup_filename_pattern) as find_pattern:
+            for _ in range(2):
+                stats = self.check._read_cgroup_stats(CONTAINER_ID)
+                self.assertEquals(stats['memory']['rss'], '200')
+                self.assertEquals(stats['cpuacct'], {'user': '150', 'system': '50'})
+                self.assertEquals(stats['blkio'], {'io_read': 4096, 'io_write': 8192})
+            # Found once for all the cgroups
+            self.assertEquals(find_pattern.call_count, 1)
+
+        # Looked for again after the container is gone
+        shutil.rmtree(os.path.join(mountpoints['memory'], 'docker', CONTAINER_ID))
+        self.assertEquals(self.check._read_cgroup_stats(CONTAINER_ID)['memory'], None)
+        self.assertNotIn(CONTAINER_ID, self.check._cgroup_paths)
+
+        # And forgotten when it doesn't run anymore
+        self.check._cgroup_paths[CONTAINER_ID] = {}
+        self.check._report_performance_metrics({})
+        self.assertEquals(self.check._cgroup_paths, {})
+
+    def test_cgroup2(self):
+        mountpoints = write_cgroup_tree(os.path.join(self.root, 'v1'), [CONTAINER_ID])
+        setup_cgroups(self.check, mountpoints=mountpoints)
+        cgroup1_stats = self.check._read_cgroup_stats(CONTAINER_ID)
+        cgroup1_metrics = self._report()
+
+        cgroup2_root = os.path.join(self.root, 'v2')
+        write_cgroup_tree(cgroup2_root, [CONTAINER_ID], cgroup2=True)
+        setup_cgroups(self.check, cgroup2_mountpoint=cgroup2_root)
+        cgroup2_stats = self.check._read_cgroup_stats(CONTAINER_ID)
+        self.assertEquals(cgroup2_stats['memory'], {
+            'cache': '100', 'rss': '200', 'swap': '10',
+            'hierarchical_memory_limit': '1000', 'hierarchical_memsw_limit': '1500'})
+        self.assertEquals(cgroup2_stats['cpuacct'], {'user': 150, 'system': 50})
+        self.assertEquals(cgroup2_stats['blkio'], cgroup1_stats['blkio'])
+
+        # Same metrics
+        cgroup2_metrics = self._report()
+        self.assertTrue(cgroup2_metrics)
+        self.assertEquals(cgroup2_metrics, cgroup1_metrics)
+
+    def test_cgroup2_without_limits(self):
+        write_cgroup_tree(self.root, [CONTAINER_ID], cgroup2=True)
+        directory = os.path.join(self.root, 'system.slice', 'docker-%s.scope' % CONTAINER_ID)
+        with open(os.path.join(directory, 'memory.max'), 'w') as f:
+            f.write("max\n")
+        os.remove(os.path.join(directory, 'memory.swap.current'))
+        setup_cgroups(self.check, cgroup2_mountpoint=self.root)
+
+        self.assertEquals(self.check._read_cgroup_stats(CONTAINER_ID)['memory'], {'cache': '100', 'rss': '200'})
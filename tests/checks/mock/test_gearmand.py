@@ -0,0 +1,44 @@
+# stdlib
+import sys
+
+# 3p
+from mock import Mock
+
+# project
+from checks import AgentCheck
+from tests.checks.common import AgentCheckTest
+
+STATUS = [
+    {'task': 'reverse', 'running': 1, 'queued': 2, 'workers': 3},
+    {'task': 'resize', 'running': 0, 'queued': 5, 'workers': 1},
+]
+
+
+class TestGearman(AgentCheckTest):
+    """The check with a mocked gearman client"""
+    CHECK_NAME = 'gearmand'
+
+    CONFIG = {
+        'init_config': {},
+        'instances': [{'server': 'localhost', 'port': 4730, 'tags': ['env:test']}],
+    }
+
+    def setUp(self):
+        # the client library is not needed to run the check against a mocked client
+        sys.modules.setdefault('gearman', Mock(__version__='2.0.2'))
+        self.load_check(self.CONFIG)
+        self.check._get_client = Mock(return_value=Mock(get_status=Mock(return_value=STATUS)))
+
+    def test_tags(self):
+        tags = ['env:test', 'server:localhost', 'port:4730']
+        for _ in range(2):
+            self.run_check(self.CONFIG)
+
+            self.assertMetric('gearman.unique_tasks', value=2, tags=tags)
+            self.assertMetric('gearman.running', value=1, tags=tags)
+            self.assertMetric('gearman.queued', value=7, tags=tags)
+            self.assertMetric('gearman.workers', value=4, tags=tags)
+            self.assertServiceCheck(self.check.SERVICE_CHECK_NAME, status=AgentCheck.OK,
+                                    tags=['server:localhost', 'port:4730'])
+
+        self.assertEquals(self.CONFIG['instances'][0]['tags'], ['env:test'])
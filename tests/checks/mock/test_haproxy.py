@@ -58,7 +58,7 @@ class TestCheckHAProxy(AgentCheckTest):
             else:
                 self.assertMetric('haproxy.count_per_status', value=value, tags=tags)
 
-    @mock.patch('requests.get', return_value=mock.Mock(content=MOCK_DATA))
+    @mock.patch('requests.Session.get', return_value=mock.Mock(content=MOCK_DATA))
     def test_count_per_status_agg_only(self, mock_requests):
         config = copy.deepcopy(self.BASE_CONFIG)
         # with count_status_by_service set to False
@@ -73,7 +73,7 @@ class TestCheckHAProxy(AgentCheckTest):
 
         self._assert_agg_statuses(count_status_by_service=False)
 
-    @mock.patch('requests.get', return_value=mock.Mock(content=MOCK_DATA))
+    @mock.patch('requests.Session.get', return_value=mock.Mock(content=MOCK_DATA))
     def test_count_per_status_by_service(self, mock_requests):
         self.run_check(self.BASE_CONFIG)
 
@@ -87,7 +87,7 @@ class TestCheckHAProxy(AgentCheckTest):
 
         self._assert_agg_statuses()
 
-    @mock.patch('requests.get', return_value=mock.Mock(content=MOCK_DATA))
+    @mock.patch('requests.Session.get', return_value=mock.Mock(content=MOCK_DATA))
     def test_count_per_status_by_service_and_host(self, mock_requests):
         config = copy.deepcopy(self.BASE_CONFIG)
         config['instances'][0]['collect_status_metrics_by_host'] = True
@@ -104,7 +104,7 @@ class TestCheckHAProxy(AgentCheckTest):
 
         self._assert_agg_statuses()
 
-    @mock.patch('requests.get', return_value=mock.Mock(content=MOCK_DATA))
+    @mock.patch('requests.Session.get', return_value=mock.Mock(content=MOCK_DATA))
     def test_count_per_status_by_service_and_collate_per_host(self, mock_requests):
         config = copy.deepcopy(self.BASE_CONFIG)
         config['instances'][0]['collect_status_metrics_by_host'] = True
@@ -122,7 +122,7 @@ class TestCheckHAProxy(AgentCheckTest):
 
         self._assert_agg_statuses(collate_status_tags_per_host=True)
 
-    @mock.patch('requests.get', return_value=mock.Mock(content=MOCK_DATA))
+    @mock.patch('requests.Session.get', return_value=mock.Mock(content=MOCK_DATA))
     def test_count_per_status_collate_per_host(self, mock_requests):
         config = copy.deepcopy(self.BASE_CONFIG)
         config['instances'][0]['collect_status_metrics_by_host'] = True
@@ -48,7 +48,7 @@ class HDFSDataNode(AgentCheckTest):
         'datanode_url:' + HDFS_DATANODE_CONFIG['hdfs_datanode_jmx_uri']
     ]
 
-    @mock.patch('requests.get', side_effect=requests_get_mock)
+    @mock.patch('requests.Session.get', side_effect=requests_get_mock)
     def test_check(self, mock_requests):
         config = {
             'instances': [self.HDFS_DATANODE_CONFIG]
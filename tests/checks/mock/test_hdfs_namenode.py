@@ -83,7 +83,7 @@ class HDFSNameNode(AgentCheckTest):
         'namenode_url:' + HDFS_NAMENODE_CONFIG['hdfs_namenode_jmx_uri']
     ]
 
-    @mock.patch('requests.get', side_effect=requests_get_mock)
+    @mock.patch('requests.Session.get', side_effect=requests_get_mock)
     def test_check(self, mock_requests):
         config = {
             'instances': [self.HDFS_NAMENODE_CONFIG]
@@ -2,14 +2,20 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 # stdlib
+from fnmatch import fnmatch
+import threading
+import time
+import unittest
+
 import mock
 
 # 3p
 import simplejson as json
 
 # project
-from tests.checks.common import AgentCheckTest, Fixtures
+from tests.checks.common import AgentCheckTest, Fixtures, load_class
 from checks import AgentCheck
+from utils.kubeutil import KubeUtil
 
 CPU = "CPU"
 MEM = "MEM"
@@ -266,3 +272,189 @@ class TestKubernetes(AgentCheckTest):
                         self.assertMetric("{0}.{1}".format(m, m_suffix), count=1, tags=tags)
 
         self.coverage_report()
+
+
+def leaf_names(name, dat):
+    """The names of the numeric values of cAdvisor stats, as they are published"""
+    if isinstance(dat, dict):
+        for k, v in dat.iteritems():
+            for leaf in leaf_names('%s.%s' % (name, k.lower()), v):
+                yield leaf
+    elif isinstance(dat, list):
+        for leaf in leaf_names(name, dat[-1]):
+            yield leaf
+    elif isinstance(dat, (int, long, float)):
+        yield name
+
+
+class TestMetricSelector(unittest.TestCase):
+
+    PATTERNS = [
+        (['diskio.io_service_bytes.stats.total', 'network.??_bytes', 'cpu.*.total'],
+         ['memory.usage', 'filesystem.usage']),
+        (['cpu.*', 'network.*'], ['filesystem.*']),
+        (['*'], []),
+        ([], ['memory.*_usage', 'diskio.*.stats.[rw]*', 'network.interfaces.?x_packets']),
+        (['memory.usage'], ['memory.*']),
+    ]
+
+    def _select(self, selector, name, dat):
+        node = selector.root(name)
+        selected = {}
+
+        def walk(node, dat):
+            if isinstance(dat, dict):
+                for k, v in dat.iteritems():
+                    child = selector.child(node, k)
+                    if child is not None:
+                        walk(child, v)
+            elif isinstance(dat, list):
+                walk(node, dat[-1])
+            elif isinstance(dat, (int, long, float)) and node.kind is not None:
+                selected[node.name] = node.kind
+        if node is not None:
+            walk(node, dat)
+        return selected
+
+    def test_same_as_fnmatch(self):
+        MetricSelector = load_class('kubernetes', 'MetricSelector')
+        metrics = json.loads(Fixtures.read_file("metrics_1.2.json"))
+        stats = [subcontainer['stats'][-1] for subcontainer in metrics]
+        stats.append({'custom.metric': {'value': 1}, 'memory': {'usage': 2, 'working_set': 3}})
+
+        for rates, gauges in self.PATTERNS:
+            rates = ['kubernetes.%s' % pat for pat in rates]
+            gauges = ['kubernetes.%s' % pat for pat in gauges]
+            selector = MetricSelector(rates, gauges)
+            for _ in range(2):
+                for stat in stats:
+                    expected = {}
+                    for name in leaf_names('kubernetes', stat):
+                        if any(fnmatch(name, pat) for pat in rates):
+                            expected[name] = AgentCheck.rate
+                        elif any(fnmatch(name, pat) for pat in gauges):
+                            expected[name] = AgentCheck.gauge
+                    self.assertEquals(self._select(selector, 'kubernetes', stat), expected)
+
+    def test_skipped_subtrees(self):
+        MetricSelector = load_class('kubernetes', 'MetricSelector')
+        selector = MetricSelector(['kubernetes.cpu.*'], ['kubernetes.memory.usage'])
+        root = selector.root('kubernetes')
+        self.assertEquals(selector.child(root, 'diskio'), None)
+        self.assertEquals(selector.child(selector.child(root, 'memory'), 'working_set'), None)
+        cpu_usage = selector.child(selector.child(root, 'cpu'), 'usage')
+        self.assertEquals(cpu_usage.name, 'kubernetes.cpu.usage')
+        self.assertTrue(selector.child(cpu_usage, 'per_cpu_usage') is not None)
+        self.assertTrue(selector.child(root, 'cpu') is selector.child(root, 'cpu'))
+        self.assertEquals(selector.root('other'), None)
+
+
+class TestKubeUtil(unittest.TestCase):
+
+    DD_AGENT_CONTAINER = 'ef20f4bb10087c626aae1fb32db18c3f8cee0d57f9acc63c85126d3294f1c659'
+
+    def setUp(self):
+        KubeUtil._drop()
+        with mock.patch('utils.kubeutil.check_yaml', return_value={'instances': [{'host': 'foo'}]}):
+            with mock.patch('utils.kubeutil.get_conf_path', return_value=None):
+                self.kubeutil = KubeUtil()
+        self.pods_list = json.loads(Fixtures.read_file("pods_list_1.2.json", string_escape=False))
+
+    def tearDown(self):
+        KubeUtil._drop()
+
+    @mock.patch('utils.kubeutil.retrieve_json')
+    def test_pods_list_cache(self, mock_retrieve):
+        mock_retrieve.return_value = self.pods_list
+
+        self.assertEquals(self.kubeutil.retrieve_pods_list(), self.pods_list)
+        pod = self.kubeutil.get_pod_by_container_id(self.DD_AGENT_CONTAINER)
+        self.assertEquals(pod['metadata']['name'], 'dd-agent-idydc')
+        self.assertTrue(self.kubeutil.get_pod_by_name('default', 'dd-agent-idydc') is pod)
+        self.kubeutil.get_kube_labels()
+        self.assertEquals(mock_retrieve.call_count, 1)
+
+        # Fetched again once expired
+        self.kubeutil.pods_list_ttl = 0
+        self.kubeutil.retrieve_pods_list()
+        self.assertEquals(mock_retrieve.call_count, 2)
+
+    @mock.patch('utils.kubeutil.retrieve_json')
+    def test_unknown_container(self, mock_retrieve):
+        mock_retrieve.return_value = self.pods_list
+        self.kubeutil.retrieve_pods_list()
+
+        # The pod list may be older than the container
+        with mock.patch('utils.kubeutil.time.time', return_value=time.time() + KubeUtil.PODS_LIST_MIN_AGE):
+            self.assertEquals(self.kubeutil.get_pod_by_container_id('0' * 64), None)
+        self.assertEquals(mock_retrieve.call_count, 2)
+
+        # But not more than once every PODS_LIST_MIN_AGE seconds
+        self.assertEquals(self.kubeutil.get_pod_by_container_id('0' * 64), None)
+        self.assertEquals(mock_retrieve.call_count, 2)
+
+    def test_single_flight(self):
+        fetching = threading.Event()
+        release = threading.Event()
+
+        def slow_retrieve(url, **kwargs):
+            fetching.set()
+            release.wait(5)
+            return self.pods_list
+
+        with mock.patch('utils.kubeutil.retrieve_json', side_effect=slow_retrieve) as mock_retrieve:
+            results = []
+            threads = [threading.Thread(target=lambda: results.append(self.kubeutil.retrieve_pods_list()))
+                       for _ in range(5)]
+            for t in threads:
+                t.start()
+            fetching.wait(5)
+            release.set()
+            for t in threads:
+                t.join(5)
+
+        self.assertEquals(len(results), 5)
+        self.assertEquals(mock_retrieve.call_count, 1)
+
+    def _response(self, status_code, content=''):
+        response = mock.Mock(status_code=status_code)
+        response.iter_content.side_effect = lambda size: (content[i:i + 1000] for i in xrange(0, len(content), 1000))
+        if status_code >= 400:
+            response.raise_for_status.side_effect = Exception("HTTP %s" % status_code)
+        return response
+
+    def test_retrieve_metrics(self):
+        metrics = Fixtures.read_file("metrics_1.2.json")
+        expected = json.loads(metrics)
+        for subcontainer in expected:
+            subcontainer['stats'] = subcontainer['stats'][-1:]
+
+        with mock.patch.object(self.kubeutil.session, 'post', return_value=self._response(200, metrics)) as post:
+            self.assertEquals(self.kubeutil.retrieve_metrics(), expected)
+            self.assertEquals(post.call_args[1]['json'], {'num_stats': 1})
+
+    def test_retrieve_metrics_full_history(self):
+        metrics = Fixtures.read_file("metrics_1.2.json")
+        now = time.time()
+        with mock.patch.object(self.kubeutil.session, 'post', return_value=self._response(405)) as post:
+            with mock.patch.object(self.kubeutil.session, 'get', return_value=self._response(200, metrics)) as get:
+                for _ in range(2):
+                    subcontainers = self.kubeutil.retrieve_metrics()
+                    self.assertEquals(len(subcontainers), len(json.loads(metrics)))
+                    self.assertTrue(all(len(s['stats']) == 1 for s in subcontainers))
+                # cAdvisor isn't asked for the latest sample only again for a while
+                self.assertEquals(post.call_count, 1)
+                self.assertEquals(get.call_count, 2)
+
+                with mock.patch('utils.kubeutil.time.time',
+                                return_value=now + KubeUtil.CADVISOR_NUM_STATS_RETRY_INTERVAL + 1):
+                    self.kubeutil.retrieve_metrics()
+                self.assertEquals(post.call_count, 2)
+                self.assertEquals(get.call_count, 3)
+
+            # It takes it after an upgrade
+            post.return_value = self._response(200, metrics)
+            with mock.patch('utils.kubeutil.time.time',
+                            return_value=now + 2 * KubeUtil.CADVISOR_NUM_STATS_RETRY_INTERVAL + 2):
+                self.assertEquals(len(self.kubeutil.retrieve_metrics()), len(json.loads(metrics)))
+            self.assertEquals(post.call_count, 3)
@@ -79,6 +79,16 @@ def requests_get_mock(*args, **kwargs):
             return MockResponse(body, 200)
 
 
+def finished_job_requests_get_mock(*args, **kwargs):
+    '''
+    The application of requests_get_mock once its job succeeded
+    '''
+    response = requests_get_mock(*args, **kwargs)
+    if args[0] == MR_JOBS_URL:
+        response.json_data = response.json_data.replace('"RUNNING"', '"SUCCEEDED"')
+    return response
+
+
 class MapReduceCheck(AgentCheckTest):
     CHECK_NAME = 'mapreduce'
 
@@ -190,7 +200,7 @@ class MapReduceCheck(AgentCheckTest):
         'user_name:' + USER_NAME
     ]
 
-    @mock.patch('requests.get', side_effect=requests_get_mock)
+    @mock.patch('requests.Session.get', side_effect=requests_get_mock)
     def test_check(self, mock_requests):
         config = {
             'instances': [self.MR_CONFIG],
@@ -230,3 +240,28 @@ class MapReduceCheck(AgentCheckTest):
             tags=['url:http://localhost:8088'])
         self.assertServiceCheckOK(MAPREDUCE_SERVICE_CHECK,
             tags=['url:http://localhost:8088'])
+
+    @mock.patch('requests.Session.get', side_effect=finished_job_requests_get_mock)
+    def test_finished_job_cached(self, mock_requests):
+        config = {
+            'instances': [self.MR_CONFIG],
+            'init_config': self.INIT_CONFIG
+        }
+
+        self.run_check(config)
+        self.run_check(config)
+
+        # The counters and tasks of the finished job are only queried once
+        urls = [args[0] for args, kwargs in mock_requests.call_args_list]
+        self.assertEquals(urls.count(MR_JOBS_URL), 2)
+        self.assertEquals(urls.count(MR_JOB_COUNTERS_URL), 1)
+        self.assertEquals(urls.count(MR_TASKS_URL), 1)
+
+        # But their metrics are still sent
+        for metric, value in self.MAPREDUCE_MAP_TASK_METRIC_VALUES.iteritems():
+            self.assertMetric(metric,
+                value=value,
+                tags=self.MAPREDUCE_MAP_TASK_METRIC_TAGS)
+        self.assertMetric('mapreduce.job.counter.map_counter_value',
+            value=10,
+            tags=self.MAPREDUCE_JOB_COUNTER_METRIC_TAGS + ['counter_name:map_output_records'])
@@ -1,3 +1,8 @@
+# stdlib
+import os
+import shutil
+import tempfile
+
 # 3p
 import mock
 
@@ -19,6 +24,10 @@ def netstat_subprocess_mock(*args, **kwargs):
         return (Fixtures.read_file('netstat'), "", 0)
 
 
+def no_proc_net_mock(*args, **kwargs):
+    raise IOError("No such file or directory")
+
+
 class TestCheckNetwork(AgentCheckTest):
     CHECK_NAME = 'network'
 
@@ -50,7 +59,7 @@ class TestCheckNetwork(AgentCheckTest):
     @mock.patch('network.get_subprocess_output', side_effect=ss_subprocess_mock)
     @mock.patch('network.Platform.is_linux', return_value=True)
     def test_cx_state_linux_ss(self, mock_subprocess, mock_platform):
-        self.run_check({})
+        self.run_check({}, mocks={'_get_proc_net_cx_state': no_proc_net_mock})
 
         # Assert metrics
         for metric, value in self.CX_STATE_GAUGES_VALUES.iteritems():
@@ -59,8 +68,53 @@ class TestCheckNetwork(AgentCheckTest):
     @mock.patch('network.get_subprocess_output', side_effect=netstat_subprocess_mock)
     @mock.patch('network.Platform.is_linux', return_value=True)
     def test_cx_state_linux_netstat(self, mock_subprocess, mock_platform):
-        self.run_check({})
+        self.run_check({}, mocks={'_get_proc_net_cx_state': no_proc_net_mock})
 
         # Assert metrics
         for metric, value in self.CX_STATE_GAUGES_VALUES.iteritems():
             self.assertMetric(metric, value=value)
+
+    @mock.patch('network.get_subprocess_output')
+    @mock.patch('network.Platform.is_linux', return_value=True)
+    def test_cx_state_linux_proc(self, mock_platform, mock_subprocess):
+        agent_config = {'procfs_path': Fixtures.file('proc')}
+        self.load_check(self.config, agent_config=agent_config)
+        self.run_check({})
+
+        # No subprocess needed
+        self.assertFalse(mock_subprocess.called)
+        for metric, value in self.CX_STATE_GAUGES_VALUES.iteritems():
+            self.assertMetric(metric, value=value)
+
+    @mock.patch('network.get_subprocess_output')
+    @mock.patch('network.Platform.is_linux', return_value=True)
+    def test_cx_state_linux_proc_no_ipv6(self, mock_platform, mock_subprocess):
+        # IPv6 disabled: no /proc/net/tcp6 nor /proc/net/udp6
+        proc_location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, proc_location)
+        shutil.copytree(Fixtures.file('proc/net'), os.path.join(proc_location, 'net'))
+        os.remove(os.path.join(proc_location, 'net', 'tcp6'))
+        os.remove(os.path.join(proc_location, 'net', 'udp6'))
+
+        agent_config = {'procfs_path': proc_location}
+        self.load_check(self.config, agent_config=agent_config)
+        self.run_check({})
+
+        # The IPv4 connections are still counted from /proc/net
+        self.assertFalse(mock_subprocess.called)
+        for metric, value in self.CX_STATE_GAUGES_VALUES.iteritems():
+            self.assertMetric(metric, value=value if '4' in metric else 0)
+
+    def test_cx_state_linux_proc_missing(self):
+        # Nothing to read from /proc/net: the caller falls back to `ss` or `netstat`
+        proc_location = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, proc_location)
+        self.assertRaises(IOError, self.check._get_proc_net_cx_state, proc_location)
+
+    def test_count_proc_net_sockets_chunks(self):
+        # Lines split across chunks are counted once
+        path = Fixtures.file('proc/net/tcp')
+        expected = {'0A': 2, '01': 1, '06': 2}
+        for chunk_size in [1, 7, 100, 1024 * 1024]:
+            self.check.PROC_NET_CHUNK_SIZE = chunk_size
+            self.assertEquals(dict(self.check._count_proc_net_sockets(path)), expected)
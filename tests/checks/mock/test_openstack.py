@@ -3,6 +3,7 @@ from unittest import TestCase
 from checks import AgentCheck
 from tests.checks.common import AgentCheckTest, load_check, load_class
 from mock import patch
+import requests
 
 
 OS_CHECK_NAME = 'openstack'
@@ -151,6 +152,23 @@ EXAMPLE_AUTH_RESPONSE = {
     }
 }
 MOCK_HTTP_RESPONSE = MockHTTPResponse(response_dict=EXAMPLE_AUTH_RESPONSE, headers={"X-Subject-Token": "fake_token"})
+MOCK_RENEWED_HTTP_RESPONSE = MockHTTPResponse(response_dict=EXAMPLE_AUTH_RESPONSE, headers={"X-Subject-Token": "new_token"})
+
+
+class MockAPIResponse(MockHTTPResponse):
+    def __init__(self, response_dict, status_code=200):
+        super(MockAPIResponse, self).__init__(response_dict, {})
+        self.status_code = status_code
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(response=self)
+
+
+def expired_token_get_mock(url, headers=None, **kwargs):
+    if headers.get('X-Auth-Token') == 'fake_token':
+        return MockAPIResponse({}, status_code=401)
+    return MockAPIResponse({'network': {'id': url.rsplit('/', 1)[-1], 'admin_state_up': True}})
 
 class OSProjectScopeTest(TestCase):
     BAD_AUTH_SCOPES = [
@@ -296,3 +314,50 @@ class TestCheckOpenStack(AgentCheckTest):
             self.assertEqual(self.check._get_and_set_aggregate_list(), expected_aggregates)
             sleep(1.5)
             self.assertTrue(self.check._is_expired("aggregates"))
+
+    def test_cache_refreshed_in_background(self):
+        check = load_check(self.CHECK_NAME, dict(self.MOCK_CONFIG, init_config=dict(
+            self.MOCK_CONFIG["init_config"], cache_ttl={"servers": 0})), self.DEFAULT_AGENT_CONFIG)
+        self.assertEqual(check.CACHE_TTL["servers"], 0)
+        self.assertEqual(check.CACHE_TTL["networks"], 300)
+        check._current_scope = None
+
+        fetches = []
+
+        def fetch():
+            fetches.append(len(fetches))
+            return ["server_%s" % len(fetches)] if len(fetches) > 1 else []
+
+        # An empty list is fetched again
+        self.assertEqual(check._get_cached("servers", "test_name", fetch), [])
+        self.assertEqual(check._get_cached("servers", "test_name", fetch), ["server_2"])
+
+        # Once expired, the list is returned while fetched again
+        sleep(0.01)
+        self.assertEqual(check._get_cached("servers", "test_name", fetch), ["server_2"])
+        self.assertTrue(check._cache_refreshes[("servers", "test_name")].wait(5))
+        self.assertEqual(check._get_cached("servers", "test_name", fetch), ["server_3"])
+        check.stop()
+
+    @patch("requests.Session.get", side_effect=expired_token_get_mock)
+    def test_renew_scope_once(self, mock_get):
+        instance = self.MOCK_CONFIG["instances"][0]
+        with patch("openstack.OpenStackProjectScope.request_auth_token", return_value=MOCK_HTTP_RESPONSE):
+            self.check._current_scope = self.check.ensure_auth_scope(instance)
+
+        network_ids = ["network_%s" % i for i in range(8)]
+        with patch("openstack.OpenStackProjectScope.request_auth_token",
+                   return_value=MOCK_RENEWED_HTTP_RESPONSE) as mock_auth:
+            # All the requests fail with the expired token, a single one is requested
+            networks = self.check._concurrent_map_in_scope(self.check.get_details_for_single_network,
+                                                           [(nid,) for nid in network_ids])
+            self.assertEqual([network["network"]["id"] for network in networks], network_ids)
+            self.assertEqual(mock_auth.call_count, 1)
+            self.assertEqual(self.check.get_scope_for_instance(instance).auth_token, "new_token")
+
+            # Including the requests of the other threads
+            self.check.get_stats_for_single_network("network_0")
+            self.assertEqual(self.check.get_auth_token(), "new_token")
+            self.assertEqual(mock_auth.call_count, 1)
+
+        self.check.stop()
@@ -0,0 +1,56 @@
+# stdlib
+import sys
+
+# 3p
+from mock import Mock
+
+# project
+from tests.checks.common import AgentCheckTest
+
+
+class TestPostgres(AgentCheckTest):
+    """The check with a mocked database connection"""
+    CHECK_NAME = 'postgres'
+
+    CUSTOM_METRICS = [{
+        'descriptors': [['datname', 'customdb']],
+        'metrics': {
+            'numbackends': ['custom.numbackends', 'Gauge'],
+        },
+        'query': "SELECT datname, %s FROM pg_stat_database WHERE datname = 'datadog_test' LIMIT(1)",
+        'relation': False,
+    }]
+
+    CONFIG = {
+        'init_config': {},
+        'instances': [{
+            'host': 'localhost',
+            'port': 5432,
+            'username': 'datadog',
+            'dbname': 'datadog_test',
+            'custom_metrics': CUSTOM_METRICS,
+        }],
+    }
+
+    def setUp(self):
+        # the client library is not needed to run the check against a mocked connection
+        sys.modules.setdefault('pg8000', Mock())
+        self.load_check(self.CONFIG)
+
+    def test_custom_metrics(self):
+        mocks = {
+            'get_connection': Mock(),
+            '_get_version': Mock(return_value=[9, 4, 0]),
+            '_collect_stats': Mock(),
+        }
+        for _ in range(2):
+            self.run_check(self.CONFIG, mocks=mocks)
+
+        # The metric types are resolved to the collector methods on a copy of the instance
+        for args, kwargs in mocks['_collect_stats'].call_args_list:
+            custom_metrics = args[4]
+            self.assertEquals(custom_metrics[0]['metrics']['numbackends'],
+                              ['custom.numbackends', type(self.check).GAUGE])
+        self.assertEquals(mocks['_collect_stats'].call_count, 2)
+        self.assertEquals(self.CONFIG['instances'][0]['custom_metrics'], self.CUSTOM_METRICS)
+        self.assertEquals(self.CUSTOM_METRICS[0]['metrics']['numbackends'], ['custom.numbackends', 'Gauge'])
@@ -88,6 +88,16 @@ def requests_get_mock(*args, **kwargs):
             return MockResponse(body, 200)
 
 
+def finished_app_requests_get_mock(*args, **kwargs):
+    '''
+    The application of requests_get_mock once all its jobs are over
+    '''
+    response = requests_get_mock(*args, **kwargs)
+    if args[0] == SPARK_JOB_URL:
+        response.json_data = response.json_data.replace('"RUNNING"', '"SUCCEEDED"')
+    return response
+
+
 class SparkCheck(AgentCheckTest):
     CHECK_NAME = 'spark'
 
@@ -227,7 +237,7 @@ class SparkCheck(AgentCheckTest):
     ]
 
 
-    @mock.patch('requests.get', side_effect=requests_get_mock)
+    @mock.patch('requests.Session.get', side_effect=requests_get_mock)
     def test_check(self, mock_requests):
         config = {
             'instances': [self.SPARK_CONFIG]
@@ -282,3 +292,42 @@ class SparkCheck(AgentCheckTest):
             tags=['url:http://localhost:8088'])
         self.assertServiceCheckOK(SPARK_SERVICE_CHECK,
             tags=['url:http://localhost:8088'])
+
+    @mock.patch('requests.Session.get', side_effect=requests_get_mock)
+    def test_running_app_queried_again(self, mock_requests):
+        config = {
+            'instances': [self.SPARK_CONFIG]
+        }
+
+        self.run_check(config)
+        self.run_check(config)
+
+        # Only the applications of the YARN application are not queried again
+        urls = [args[0] for args, kwargs in mock_requests.call_args_list]
+        self.assertEquals(urls.count(SPARK_APP_URL), 1)
+        for url in [YARN_APP_URL, SPARK_JOB_URL, SPARK_STAGE_URL, SPARK_EXECUTOR_URL, SPARK_RDD_URL]:
+            self.assertEquals(urls.count(url), 2)
+
+    @mock.patch('requests.Session.get', side_effect=finished_app_requests_get_mock)
+    def test_finished_app_stages_cached(self, mock_requests):
+        config = {
+            'instances': [self.SPARK_CONFIG]
+        }
+
+        self.run_check(config)
+        self.run_check(config)
+
+        # The stages are not queried again while the jobs do not change
+        urls = [args[0] for args, kwargs in mock_requests.call_args_list]
+        self.assertEquals(urls.count(SPARK_JOB_URL), 2)
+        self.assertEquals(urls.count(SPARK_STAGE_URL), 1)
+
+        # But their metrics are still sent
+        for metric, value in self.SPARK_STAGE_RUNNING_METRIC_VALUES.iteritems():
+            self.assertMetric(metric,
+                value=value,
+                tags=self.SPARK_STAGE_RUNNING_METRIC_TAGS)
+        for metric, value in self.SPARK_STAGE_COMPLETE_METRIC_VALUES.iteritems():
+            self.assertMetric(metric,
+                value=value,
+                tags=self.SPARK_STAGE_COMPLETE_METRIC_TAGS)
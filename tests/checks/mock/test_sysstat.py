@@ -1,17 +1,26 @@
 # stdlib
 import logging
+import os
+import pwd
 import sys
+import time
 import unittest
 
+# 3p
+import mock
+
 # project
 from checks.system.unix import (
+    Cpu,
     IO,
     Load,
     Memory,
+    Processes,
 )
 from checks.system.unix import System
 from config import get_system_stats
-from tests.checks.common import get_check
+from tests.checks.common import Fixtures, get_check
+from tests.core.test_utils_procfs import FakeProc, SYSCONF
 from utils.platform import Platform
 
 logging.basicConfig(level=logging.DEBUG)
@@ -141,6 +150,43 @@ dm-1              0.00     0.00    0.00    0.00     0.00     0.00     0.00     0
         results = checker._parse_linux2(linux_output_dashes)
         self.assertTrue(sorted(results.keys()) == ['dm-0', 'dm-1', 'sda'])
 
+    @mock.patch('checks.system.unix.Platform.is_linux', return_value=True)
+    @mock.patch('checks.system.unix.IO._get_block_devices', return_value=set(['loop0', 'sda', 'sdb', 'dm-0']))
+    @mock.patch('checks.system.unix.time.time', side_effect=[1000.0, 1010.0])
+    def testLinuxDiskstats(self, *args):
+        checker = IO(logger)
+        # Nothing to compare the counters with on the first run
+        self.assertEquals(checker.check({'procfs_path': Fixtures.file('proc_1')}), {})
+
+        results = checker.check({'procfs_path': Fixtures.file('proc_2')})
+        # Partitions, unused and new devices are skipped
+        self.assertEquals(sorted(results.keys()), ['dm-0', 'sda'])
+        self.assertEquals(results['sda'], {
+            'rrqm/s': '2.00', 'wrqm/s': '8.00', 'r/s': '10.00', 'w/s': '40.00',
+            'rkB/s': '80.00', 'wkB/s': '320.00', 'avgrq-sz': '16.00', 'avgqu-sz': '0.20',
+            'await': '4.00', 'r_await': '3.00', 'w_await': '4.25', 'svctm': '1.00', '%util': '5.00',
+        })
+        self.assertEquals(results['dm-0'], {
+            'rrqm/s': '0.00', 'wrqm/s': '0.00', 'r/s': '5.00', 'w/s': '0.00',
+            'rkB/s': '40.00', 'wkB/s': '0.00', 'avgrq-sz': '16.00', 'avgqu-sz': '0.01',
+            'await': '2.00', 'r_await': '2.00', 'w_await': '0.00', 'svctm': '2.00', '%util': '1.00',
+        })
+
+    @mock.patch('checks.system.unix.Platform.is_linux', return_value=True)
+    def testLinuxProcStat(self, *args):
+        checker = Cpu(logger)
+        # Nothing to compare the counters with on the first run
+        self.assertFalse(checker.check({'procfs_path': Fixtures.file('proc_1')}))
+
+        results = checker.check({'procfs_path': Fixtures.file('proc_2')})
+        self.assertEquals(results, {
+            'cpuUser': 27.5, 'cpuSystem': 12.5, 'cpuWait': 5.0, 'cpuIdle': 50.0,
+            'cpuStolen': 0.0, 'cpuGuest': 5.0,
+        })
+
+        # No time elapsed
+        self.assertFalse(checker.check({'procfs_path': Fixtures.file('proc_2')}))
+
     def testNetwork(self):
         # FIXME: cx_state to true, but needs sysstat installed
         config = """
@@ -169,3 +215,36 @@ instances:
             assert 'system.net.tcp.retrans_packs' in metric_names
             assert 'system.net.tcp.sent_packs' in metric_names
             assert 'system.net.tcp.rcv_packs' in metric_names
+
+
+class TestProcesses(unittest.TestCase):
+
+    @mock.patch('checks.system.unix.Platform.is_linux', return_value=True)
+    @mock.patch('utils.procfs.os.sysconf', side_effect=SYSCONF.get)
+    def testLinuxProc(self, *args):
+        boot_time = int(time.time()) - 3600
+        proc = FakeProc(boot_time)
+        try:
+            proc.add(2, 'kthreadd', [])
+            proc.add(42, 'app', ['/usr/bin/app', '--secret'])
+            config = {'procfs_path': proc.path, 'api_key': 'apikey', 'hostname': 'myhost'}
+            checker = Processes(logger)
+
+            results = checker.check(config)
+            self.assertEquals((results['apiKey'], results['host']), ('apikey', 'myhost'))
+            user = pwd.getpwuid(os.getuid()).pw_name
+            start = time.strftime('%H:%M', time.localtime(boot_time + 10))
+            self.assertEquals(results['processes'], [
+                [user, '2', '3.0', '1.0', '102400', '10240', 'pts/0', 'Ssl+', start, '0:03', '[kthreadd]'],
+                [user, '42', '3.0', '1.0', '102400', '10240', 'pts/0', 'Ssl+', start, '0:03', '/usr/bin/app --secret'],
+            ])
+
+            config['exclude_process_args'] = True
+            self.assertEquals(checker.check(config)['processes'][1][-1], '/usr/bin/app')
+
+            # Only the processes using the most CPU or memory
+            proc.add(43, 'busy', ['/usr/bin/busy'], utime=1000)
+            config['processes_top_n'] = 1
+            self.assertEquals([p[1] for p in checker.check(config)['processes']], ['2', '43'])
+        finally:
+            proc.close()
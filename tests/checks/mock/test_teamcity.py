@@ -59,7 +59,7 @@ class TeamCityCheckTest(unittest.TestCase):
         }
         check = load_check('teamcity', CONFIG, agent_config)
 
-        with patch('requests.get', get_mock_first_build):
+        with patch('requests.Session.get', side_effect=get_mock_first_build):
             check.check(check.instances[0])
 
         metrics = check.get_metrics()
@@ -70,7 +70,7 @@ class TeamCityCheckTest(unittest.TestCase):
         # for newer builds
         self.assertEquals(len(events), 0)
 
-        with patch('requests.get', get_mock_one_more_build):
+        with patch('requests.Session.get', side_effect=get_mock_one_more_build):
             check.check(check.instances[0])
 
         events = check.get_events()
@@ -82,7 +82,7 @@ class TeamCityCheckTest(unittest.TestCase):
 
 
         # One more check should not create any more events
-        with patch('requests.get', get_mock_one_more_build):
+        with patch('requests.Session.get', side_effect=get_mock_one_more_build):
             check.check(check.instances[0])
 
         events = check.get_events()
@@ -115,7 +115,7 @@ class YARNCheck(AgentCheckTest):
         'node_id:h2:1235'
     ]
 
-    @mock.patch('requests.get', side_effect=requests_get_mock)
+    @mock.patch('requests.Session.get', side_effect=requests_get_mock)
     def test_check(self, mock_requests):
         config = {
             'instances': [self.YARN_CONFIG]
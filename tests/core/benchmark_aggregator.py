@@ -2,6 +2,10 @@
 """
 Performance tests for the agent/dogstatsd metrics aggregator.
 """
+# stdlib
+import timeit
+
+# project
 from aggregator import MetricsAggregator, MetricsBucketAggregator
 
 
@@ -11,6 +15,12 @@ class TestAggregatorPerf(object):
     LOOPS_PER_FLUSH = 2000
     METRIC_COUNT = 5
 
+    # Entities (containers...) with ENTITY_METRIC_COUNT metrics each, as submitted by checks
+    ENTITY_COUNT = 500
+    ENTITY_METRIC_COUNT = 20
+    ENTITY_TAGS = ['container_name:foo', 'image_name:bar', 'kube_namespace:default',
+                   'pod_name:foo-1234', 'kube_replication_controller:foo']
+
     def test_dogstatsd_aggregation_perf(self):
         ma = MetricsBucketAggregator('my.host')
 
@@ -51,6 +61,40 @@ class TestAggregatorPerf(object):
                     ma.set('set.%s' % j, float(i))
             ma.flush()
 
+    def _report_points_per_second(self, name, duration):
+        points = self.FLUSH_COUNT * self.ENTITY_COUNT * self.ENTITY_METRIC_COUNT
+        print "%s: %d points/s" % (name, points / duration)
+
+    def test_checksd_entity_aggregation_perf(self):
+        ma = MetricsAggregator('my.host')
+        names = ['metric.%s' % j for j in xrange(self.ENTITY_METRIC_COUNT)]
+
+        # Only time the submissions, flushes are the same for both APIs
+        duration = 0
+        for _ in xrange(self.FLUSH_COUNT):
+            start = timeit.default_timer()
+            for i in xrange(self.ENTITY_COUNT):
+                tags = self.ENTITY_TAGS + ['container_id:%s' % i]
+                for j, name in enumerate(names):
+                    ma.gauge(name, j, tags=tags)
+            duration += timeit.default_timer() - start
+            ma.flush()
+        self._report_points_per_second('gauge', duration)
+
+    def test_checksd_entity_bulk_aggregation_perf(self):
+        ma = MetricsAggregator('my.host')
+        names = ['metric.%s' % j for j in xrange(self.ENTITY_METRIC_COUNT)]
+
+        duration = 0
+        for _ in xrange(self.FLUSH_COUNT):
+            start = timeit.default_timer()
+            for i in xrange(self.ENTITY_COUNT):
+                tags = ma.tag_set(self.ENTITY_TAGS + ['container_id:%s' % i])
+                ma.submit_metrics(zip(names, xrange(self.ENTITY_METRIC_COUNT)), 'g', tags=tags)
+            duration += timeit.default_timer() - start
+            ma.flush()
+        self._report_points_per_second('bulk gauges', duration)
+
     def create_event_packet(self, title, text):
         p = "_e{{{title_len},{text_len}}}:{title}|{text}".format(
             title_len=len(title),
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Directory check scans of a generated tree of 1M files (set
+DIRECTORY_BENCHMARK_FILES to change it): the full walk of every run,
+compared to a cold and a warm incremental scan.
+"""
+# stdlib
+from fnmatch import fnmatch
+import os
+import shutil
+import tempfile
+import time
+
+# 3p
+from scandir import walk
+
+# project
+from tests.checks.common import load_class
+
+
+def full_walk(directory, pattern):
+    """The walk, fnmatch and stat of every file of the non incremental runs"""
+    files, size = 0, 0
+    for root, dirs, filenames in walk(directory):
+        for filename in filenames:
+            filename = os.path.join(root, filename)
+            if not fnmatch(filename, pattern):
+                continue
+            files += 1
+            size += os.stat(filename).st_size
+    return files, size
+
+
+class TestDirectoryScanPerf(object):
+
+    FILE_COUNT = int(os.environ.get('DIRECTORY_BENCHMARK_FILES', 1000000))
+    FILES_PER_DIRECTORY = 1000
+    DIRECTORIES_PER_DIRECTORY = 10
+
+    def _generate_tree(self, root):
+        """
+        FILE_COUNT files, FILES_PER_DIRECTORY by directory, in a tree of
+        DIRECTORIES_PER_DIRECTORY subdirectories
+        """
+        directory_count = (self.FILE_COUNT + self.FILES_PER_DIRECTORY - 1) // self.FILES_PER_DIRECTORY
+        for d in xrange(directory_count):
+            path = os.path.join(root, *str(d).zfill(4)[:-1])
+            path = os.path.join(path, 'd%s' % d)
+            os.makedirs(path)
+            for f in xrange(min(self.FILES_PER_DIRECTORY, self.FILE_COUNT - d * self.FILES_PER_DIRECTORY)):
+                with open(os.path.join(path, 'file_%s.log' % f), 'w') as fh:
+                    fh.write('x' * (f % 100))
+
+        # Make their mtime old enough to be trusted by the incremental scans
+        past = time.time() - 60
+        for path, dirs, _ in walk(root):
+            os.utime(path, (past, past))
+
+    def test_scan(self):
+        DirectoryScan = load_class('directory', 'DirectoryScan')
+        root = tempfile.mkdtemp()
+        try:
+            start = time.time()
+            self._generate_tree(root)
+            print "Generated %s files in %.1fs" % (self.FILE_COUNT, time.time() - start)
+
+            start = time.time()
+            files, size = full_walk(root, '*.log')
+            print "full walk: %.2fs" % (time.time() - start)
+
+            scan = DirectoryScan(root, '*.log', True, False)
+            for name in ['cold incremental scan', 'warm incremental scan']:
+                start = time.time()
+                assert scan.scan()
+                print "%s: %.2fs" % (name, time.time() - start)
+
+            # A new file in one of the directories
+            with open(os.path.join(root, '0', '0', '0', 'd0', 'new.log'), 'w') as fh:
+                fh.write('x')
+            start = time.time()
+            assert scan.scan()
+            print "incremental scan, after a change: %.2fs" % (time.time() - start)
+
+            scanned = [stats for _, files_stats in scan.iter_files() for _, stats in files_stats]
+            assert len(scanned) == files + 1
+            assert sum(stats[1] for stats in scanned) == size + 1
+        finally:
+            shutil.rmtree(root)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+cgroup stats of 300 containers, as read by the docker_daemon check: the
+cgroup files found again and parsed for each metric group of each container,
+compared to the files found once (cold, warm), and to the cgroup v2 reader.
+Run it with --nologcapture: nose's log capture makes the debug logs of the
+check expensive.
+"""
+# stdlib
+import shutil
+import sys
+import tempfile
+import timeit
+
+# project
+from tests.checks.common import load_check
+from tests.checks.mock.test_docker_daemon import setup_cgroups, write_cgroup_tree
+from utils.dockerutil import DockerUtil
+
+
+def find_and_parse(check, mountpoints, container_ids, cgroup_metrics):
+    """The cgroup files resolved and opened for each metric group, at every run"""
+    stats = {}
+    for container_id in container_ids:
+        for cgroup in cgroup_metrics:
+            stat_file = DockerUtil.find_cgroup_filename_pattern(mountpoints, container_id) % {
+                "mountpoint": mountpoints[cgroup["cgroup"]],
+                "id": container_id,
+                "file": cgroup["file"],
+            }
+            with open(stat_file, 'r') as fp:
+                if 'blkio' in stat_file:
+                    stats[container_id, cgroup["cgroup"]] = check._parse_blkio_metrics(fp.read().splitlines())
+                else:
+                    stats[container_id, cgroup["cgroup"]] = dict(map(lambda x: x.split(' ', 1),
+                                                                     fp.read().splitlines()))
+    return stats
+
+
+class TestDockerCgroupsPerf(object):
+
+    CONTAINER_COUNT = 300
+    REPEAT = 5
+
+    def test_cgroup_stats(self):
+        root = tempfile.mkdtemp()
+        try:
+            container_ids = ['%064x' % (i + 1) for i in xrange(self.CONTAINER_COUNT)]
+            mountpoints = write_cgroup_tree(root + '/v1', container_ids)
+            write_cgroup_tree(root + '/v2', container_ids, cgroup2=True)
+
+            check = load_check('docker_daemon', {'init_config': {}, 'instances': [{}]}, {})
+            cgroup_metrics = sys.modules[check.__module__].CGROUP_METRICS
+
+            def read_all():
+                return [check._read_cgroup_stats(container_id) for container_id in container_ids]
+
+            def cold():
+                setup_cgroups(check, mountpoints=mountpoints)
+                return read_all()
+
+            def cgroup2_cold():
+                setup_cgroups(check, cgroup2_mountpoint=root + '/v2')
+                return read_all()
+
+            assert len(find_and_parse(check, mountpoints, container_ids, cgroup_metrics)) == \
+                len(container_ids) * len(cgroup_metrics)
+            assert all(all(stats.values()) for stats in cold())
+            assert all(all(stats.values()) for stats in cgroup2_cold())
+
+            for name, setup, func in [
+                    ('files found for each metric group', None,
+                     lambda: find_and_parse(check, mountpoints, container_ids, cgroup_metrics)),
+                    ('files found once, cold', None, cold),
+                    ('files found once, warm', lambda: setup_cgroups(check, mountpoints=mountpoints), read_all),
+                    ('cgroup v2, cold', None, cgroup2_cold),
+                    ('cgroup v2, warm', lambda: setup_cgroups(check, cgroup2_mountpoint=root + '/v2'), read_all)]:
+                if setup is not None:
+                    setup()
+                    read_all()
+                elapsed = min(timeit.repeat(func, number=1, repeat=self.REPEAT))
+                print "%s: %.1fms" % (name, elapsed * 1000)
+        finally:
+            shutil.rmtree(root)
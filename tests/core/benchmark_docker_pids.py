@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+Pids of the containers on a synthetic /proc of 20k processes and 300
+containers: crawling all of /proc at every run, compared to the
+incremental index (cold, warm, and with the pids from the Docker API).
+"""
+# stdlib
+import os
+import re
+import shutil
+import tempfile
+import timeit
+
+# project
+from utils.dockerutil import ContainerPidIndex
+
+CONTAINER_ID_RE = re.compile('[0-9a-f]{64}')
+
+
+def full_crawl(proc_path, container_ids):
+    """The crawl of every run, reading the cgroup of every process"""
+    pids = {}
+    for folder in [_dir for _dir in os.listdir(proc_path) if _dir.isdigit()]:
+        path = os.path.join(proc_path, folder, 'cgroup')
+        try:
+            with open(path, 'r') as f:
+                content = [line.strip().split(':') for line in f.readlines()]
+        except IOError:
+            continue
+        for line in content:
+            if line[1] in ('cpu,cpuacct', 'cpuacct,cpu', 'cpuacct') and 'docker' in line[2]:
+                cpuacct = line[2]
+                break
+        else:
+            continue
+        matches = re.findall(CONTAINER_ID_RE, cpuacct)
+        if matches and matches[-1] in container_ids:
+            pids[matches[-1]] = folder
+    return pids
+
+
+class TestContainerPidsPerf(object):
+
+    PROCESS_COUNT = 20000
+    CONTAINER_COUNT = 300
+    REPEAT = 3
+
+    def _write_proc(self, proc_path):
+        """PROCESS_COUNT processes, spread over CONTAINER_COUNT containers and the host"""
+        container_ids = ['%064x' % (i + 1) for i in xrange(self.CONTAINER_COUNT)]
+        api_pids = {}
+        for pid in xrange(1, self.PROCESS_COUNT + 1):
+            os.mkdir(os.path.join(proc_path, str(pid)))
+            if pid % 2:
+                cgroup = "4:cpu,cpuacct:/\n1:name=systemd:/init.scope\n"
+            else:
+                container_id = container_ids[(pid // 2) % self.CONTAINER_COUNT]
+                api_pids.setdefault(container_id, pid)
+                cgroup = "11:memory:/docker/{0}\n4:cpu,cpuacct:/docker/{0}\n1:name=systemd:/docker/{0}\n".format(
+                    container_id)
+            with open(os.path.join(proc_path, str(pid), 'cgroup'), 'w') as f:
+                f.write(cgroup)
+        return container_ids, api_pids
+
+    def test_container_pids(self):
+        proc_path = tempfile.mkdtemp()
+        try:
+            container_ids, api_pids = self._write_proc(proc_path)
+            ids = set(container_ids)
+
+            def cold_index():
+                return ContainerPidIndex(proc_path).update(container_ids)
+
+            index = ContainerPidIndex(proc_path)
+            index.update(container_ids)
+
+            def warm_index():
+                return index.update(container_ids)
+
+            def api_index():
+                return ContainerPidIndex(proc_path).update(container_ids, api_pids.get)
+
+            assert len(full_crawl(proc_path, ids)) == len(warm_index()) == len(api_index()) == self.CONTAINER_COUNT
+
+            for name, func in [('full crawl', lambda: full_crawl(proc_path, ids)),
+                               ('index, cold', cold_index),
+                               ('index, warm', warm_index),
+                               ('index, cold with Docker API pids', api_index)]:
+                elapsed = min(timeit.repeat(func, number=1, repeat=self.REPEAT))
+                print "%s: %.1fms" % (name, elapsed * 1000)
+        finally:
+            shutil.rmtree(proc_path)
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Dogstream aggregation of the parsed points: streaming per-series
+accumulators, compared to sorting and grouping all the points of a run.
+"""
+# stdlib
+from itertools import groupby
+import logging
+import random
+import timeit
+
+# project
+from checks.datadog import Dogstream
+
+log = logging.getLogger(__name__)
+
+
+def point_sorter(p):
+    # Sort and group by timestamp, metric name, host_name, device_name
+    return (p[1], p[0], p[3].get('host_name', None), p[3].get('device_name', None))
+
+
+def legacy_aggregate(values):
+    """The sort-and-groupby aggregation of all the points of a run"""
+    output = []
+
+    values.sort(key=point_sorter)
+
+    for (timestamp, metric, host_name, device_name), val_attrs in groupby(values, key=point_sorter):
+        attributes = {}
+        vals = []
+        for _metric, _timestamp, v, a in val_attrs:
+            try:
+                v = float(v)
+                vals.append(v)
+                attributes.update(a)
+            except Exception:
+                pass
+
+        if len(vals) == 1:
+            val = vals[0]
+        elif len(vals) > 1:
+            val = vals[-1]
+        else:
+            continue
+
+        metric_type = str(attributes.get('metric_type', '')).lower()
+        if metric_type == 'gauge':
+            val = float(val)
+        elif metric_type == 'counter':
+            val = sum(vals)
+
+        output.append((metric, timestamp, val, attributes))
+
+    if output:
+        return {"dogstream": output}
+    else:
+        return {}
+
+
+class TestDogstreamAggregationPerf(object):
+
+    POINT_COUNT = 500000
+    METRIC_COUNT = 20
+    HOST_COUNT = 5
+    BUCKET_COUNT = 4
+    REPEAT = 3
+
+    def _points(self):
+        random.seed(42)
+        points = []
+        for i in xrange(self.POINT_COUNT):
+            metric = 'app.metric.%s' % (i % self.METRIC_COUNT)
+            timestamp = 1000000000 + 15 * random.randint(0, self.BUCKET_COUNT - 1)
+            attributes = {
+                'metric_type': 'counter' if i % 2 else 'gauge',
+                'host_name': 'host-%s' % (i % self.HOST_COUNT),
+            }
+            points.append((metric, timestamp, float(random.randint(0, 100)), attributes))
+        return points
+
+    def test_aggregation(self):
+        points = self._points()
+        dogstream = Dogstream(log, None)
+
+        def streaming():
+            dogstream._aggregates = {}
+            for metric, timestamp, value, attributes in points:
+                dogstream._aggregate(metric, timestamp, value, attributes)
+            return dogstream._flush_aggregates()
+
+        def legacy():
+            return legacy_aggregate(list(points))
+
+        assert streaming() == legacy()
+        series_count = len(streaming()['dogstream'])
+
+        for name, func in [('sort and groupby', legacy), ('streaming', streaming)]:
+            elapsed = min(timeit.repeat(func, number=1, repeat=self.REPEAT))
+            print "%s: %.0f points/s (%s points, %s series)" % (
+                name, self.POINT_COUNT / elapsed, self.POINT_COUNT, series_count)
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""
+Dogstream parsing of a synthetic log with declarative rules, compared to
+a hand-written parser trying each regex in turn.
+
+The log is 1GB by default, set DOGSTREAM_BENCHMARK_MB to change its size.
+"""
+# stdlib
+import calendar
+from datetime import datetime
+import logging
+import os
+import random
+import re
+import shutil
+import tempfile
+import time
+
+# 3p
+import mock
+
+# project
+from checks.datadog import Dogstreams
+
+log = logging.getLogger(__name__)
+
+RULES = """
+rules:
+  - pattern: '^(?P<date>\\S+ \\S+) INFO request (?P<method>[A-Z]+) (?P<status>\\d{3}) (?P<duration>\\d+)ms'
+    timestamp: date
+    timestamp_format: '%Y-%m-%d %H:%M:%S'
+    tags: [method, status]
+    metrics:
+      - name: app.request.duration
+        value: duration
+      - name: app.request.count
+        type: counter
+  - pattern: '^(?P<date>\\S+ \\S+) WARN slow query (?P<duration>\\d+)ms'
+    timestamp: date
+    timestamp_format: '%Y-%m-%d %H:%M:%S'
+    metric: app.db.slow_query
+    value: duration
+  - pattern: '^(?P<date>\\S+ \\S+) ERROR '
+    timestamp: date
+    timestamp_format: '%Y-%m-%d %H:%M:%S'
+    metric: app.errors
+    type: counter
+"""
+
+REQUEST_RE = re.compile(r'^(?P<date>\S+ \S+) INFO request (?P<method>[A-Z]+) (?P<status>\d{3}) (?P<duration>\d+)ms')
+SLOW_QUERY_RE = re.compile(r'^(?P<date>\S+ \S+) WARN slow query (?P<duration>\d+)ms')
+ERROR_RE = re.compile(r'^(?P<date>\S+ \S+) ERROR ')
+
+
+def _timestamp(date):
+    return calendar.timegm(datetime.strptime(date, '%Y-%m-%d %H:%M:%S').timetuple())
+
+
+def parse_handwritten(logger, line):
+    """The same rules, the way dogstream parsers are usually written"""
+    m = REQUEST_RE.search(line)
+    if m:
+        ts = _timestamp(m.group('date'))
+        tags = ['method:%s' % m.group('method'), 'status:%s' % m.group('status')]
+        return [
+            ('app.request.duration', ts, m.group('duration'), {'metric_type': 'gauge', 'tags': tags}),
+            ('app.request.count', ts, 1, {'metric_type': 'counter', 'tags': tags}),
+        ]
+    m = SLOW_QUERY_RE.search(line)
+    if m:
+        return ('app.db.slow_query', _timestamp(m.group('date')), m.group('duration'), {'metric_type': 'gauge'})
+    m = ERROR_RE.search(line)
+    if m:
+        return ('app.errors', _timestamp(m.group('date')), 1, {'metric_type': 'counter'})
+    return None
+
+
+class TestDogstreamRulesPerf(object):
+
+    SIZE_MB = int(os.environ.get('DOGSTREAM_BENCHMARK_MB', 1024))
+    # Most lines of a log don't turn into metrics
+    MATCHING_RATIO = 0.05
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.tmp_dir, 'app.log')
+        self.rules_path = os.path.join(self.tmp_dir, 'rules.yaml')
+        with open(self.rules_path, 'w') as f:
+            f.write(RULES)
+        self._write_log()
+        self.state_path = os.path.join(self.tmp_dir, 'dogstreams.json')
+        self.state_patch = mock.patch('checks.datadog.Dogstreams._get_state_path',
+                                      return_value=self.state_path)
+        self.state_patch.start()
+
+    def tearDown(self):
+        self.state_patch.stop()
+        shutil.rmtree(self.tmp_dir)
+
+    def _write_log(self):
+        random.seed(42)
+        size = self.SIZE_MB * 1024 * 1024
+        start = 1000000000
+        written = 0
+        with open(self.log_path, 'w') as f:
+            i = 0
+            while written < size:
+                block = []
+                for _ in xrange(1000):
+                    i += 1
+                    date = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(start + i / 1000))
+                    r = random.random()
+                    if r < self.MATCHING_RATIO * 0.8:
+                        line = '%s INFO request %s %s %sms' % (
+                            date, random.choice(['GET', 'POST']), random.choice([200, 404, 500]),
+                            random.randint(1, 500))
+                    elif r < self.MATCHING_RATIO * 0.9:
+                        line = '%s WARN slow query %sms' % (date, random.randint(500, 5000))
+                    elif r < self.MATCHING_RATIO:
+                        line = '%s ERROR connection reset by peer' % date
+                    else:
+                        line = '%s DEBUG cache lookup key=%s hit=%s worker=%s' % (
+                            date, random.randint(0, 10 ** 9), random.choice(['true', 'false']),
+                            random.randint(0, 64))
+                    block.append(line)
+                data = '\n'.join(block) + '\n'
+                f.write(data)
+                written += len(data)
+
+    def _run(self, parser_spec):
+        # Read the whole log on each run
+        if os.path.exists(self.state_path):
+            os.remove(self.state_path)
+        config = {
+            'dogstreams': '%s:%s' % (self.log_path, parser_spec),
+            'check_freq': 15,
+            'dogstream_max_bytes_per_run': 2 * self.SIZE_MB * 1024 * 1024,
+        }
+        dogstreams = Dogstreams.init(log, config)
+        start = time.time()
+        output = dogstreams.check(config, move_end=False)
+        return output, time.time() - start
+
+    def test_parsing(self):
+        rules_output, rules_elapsed = self._run('dogstream.rules:RuleParser:%s' % self.rules_path)
+        handwritten_output, handwritten_elapsed = self._run('%s:parse_handwritten' % __name__)
+
+        assert rules_output == handwritten_output
+
+        for name, elapsed in [('hand-written parser', handwritten_elapsed), ('rules', rules_elapsed)]:
+            print "%s: %.1f MB/s (%s MB, %s series)" % (
+                name, self.SIZE_MB / elapsed, self.SIZE_MB, len(rules_output['dogstream']))
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+The requests of a check polling 20 endpoints of a local server: a new
+connection for each request (`requests.get`), compared to the keep-alive
+connections of the HTTP client of the instance.
+"""
+# stdlib
+import threading
+import timeit
+
+# 3p
+import requests
+
+# project
+from tests.core.test_utils_http import StatsHandler, StatsServer
+from utils.http import HTTPClient
+
+
+class TestHTTPClientPerf(object):
+
+    URL_COUNT = 20
+    REPEAT = 5
+
+    def test_requests(self):
+        server = StatsServer(('127.0.0.1', 0), StatsHandler)
+        server.requests = []
+        server.version = 1
+        server.etags = True
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+        try:
+            urls = ['http://127.0.0.1:%s/%s' % (server.server_address[1], i) for i in xrange(self.URL_COUNT)]
+            client = HTTPClient()
+
+            def new_connections():
+                return [requests.get(url, timeout=10).json() for url in urls]
+
+            def keep_alive():
+                return [client.get_json(url) for url in urls]
+
+            def conditional():
+                return [client.get_json(url, conditional=True) for url in urls]
+
+            assert new_connections() == keep_alive() == conditional()
+
+            for name, func in [('a connection per request', new_connections),
+                               ('keep-alive connection', keep_alive),
+                               ('keep-alive connection, conditional requests', conditional)]:
+                elapsed = min(timeit.repeat(func, number=1, repeat=self.REPEAT))
+                print "%s: %.1fms" % (name, elapsed * 1000)
+        finally:
+            server.shutdown()
+            server.server_close()
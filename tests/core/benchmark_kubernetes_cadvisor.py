@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Decode of the cAdvisor subcontainers of a large node, made of the recorded
+kubernetes 1.1 fixture (60 samples of stats per container) for 150 containers:
+the whole document decoded at once, compared to the streaming decode, and to
+the document of the latest sample only. Each decode runs in a child process
+to measure its peak memory.
+"""
+# stdlib
+import os
+import resource
+import timeit
+
+# 3p
+import simplejson as json
+
+# project
+from utils.http import JSON_CHUNK_SIZE, iter_json_array
+
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'checks', 'fixtures', 'kubernetes', 'metrics_1.1.json')
+
+
+def full_decode(text):
+    """The decode of every run, keeping the latest sample"""
+    return [subcontainer['stats'][-1] for subcontainer in json.loads(text)]
+
+
+def streaming_decode(text):
+    chunks = (text[i:i + JSON_CHUNK_SIZE] for i in xrange(0, len(text), JSON_CHUNK_SIZE))
+    return [subcontainer['stats'][-1] for subcontainer in iter_json_array(chunks)]
+
+
+def peak_memory(func, text):
+    """Peak memory growth of func(text) in kB, in a child process"""
+    read_fd, write_fd = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_fd)
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        func(text)
+        os.write(write_fd, str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before))
+        os._exit(0)
+    os.close(write_fd)
+    with os.fdopen(read_fd) as f:
+        growth = int(f.read())
+    os.waitpid(pid, 0)
+    return growth
+
+
+class TestCAdvisorDecodePerf(object):
+
+    CONTAINER_COUNT = 150
+    REPEAT = 3
+
+    def test_decode(self):
+        with open(FIXTURE) as f:
+            subcontainers = json.load(f)
+        subcontainers = [subcontainers[i % len(subcontainers)] for i in xrange(self.CONTAINER_COUNT)]
+        history = json.dumps(subcontainers)
+        latest = json.dumps([dict(s, stats=s['stats'][-1:]) for s in subcontainers])
+
+        assert full_decode(history) == streaming_decode(history) == streaming_decode(latest)
+
+        for name, func, text in [('full history, decoded at once', full_decode, history),
+                                 ('full history, streaming decode', streaming_decode, history),
+                                 ('latest sample, streaming decode', streaming_decode, latest)]:
+            elapsed = min(timeit.repeat(lambda: func(text), number=1, repeat=self.REPEAT))
+            print "%s (%.1fMB): %.1fms, peak memory +%.1fMB" % (
+                name, len(text) / 1e6, elapsed * 1000, peak_memory(func, text) / 1024.)
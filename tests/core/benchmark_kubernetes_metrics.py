@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Raw cAdvisor metrics of the kubernetes check, selected out of the stats of
+150 subcontainers: the glob patterns matched at every numeric value, compared
+to the compiled selector (cold and warm).
+"""
+# stdlib
+from fnmatch import fnmatch
+import logging
+import numbers
+import os
+import timeit
+
+# 3p
+import simplejson as json
+
+# project
+from tests.checks.common import load_class
+
+NAMESPACE = 'kubernetes'
+ENABLED_RATES = ['kubernetes.diskio.io_service_bytes.stats.total', 'kubernetes.network.??_bytes',
+                 'kubernetes.cpu.*.total']
+ENABLED_GAUGES = ['kubernetes.memory.usage', 'kubernetes.filesystem.usage']
+FIXTURE = os.path.join(os.path.dirname(__file__), '..', 'checks', 'fixtures', 'kubernetes', 'metrics_1.2.json')
+
+
+def fnmatch_collect(metric, dat, rates, gauges, depth=0):
+    """The walk of every stat, matching each pattern at each numeric value"""
+    if depth >= 10:
+        return
+    if isinstance(dat, numbers.Number):
+        if ENABLED_RATES and any([fnmatch(metric, pat) for pat in ENABLED_RATES]):
+            rates.append((metric, float(dat)))
+        elif ENABLED_GAUGES and any([fnmatch(metric, pat) for pat in ENABLED_GAUGES]):
+            gauges.append((metric, float(dat)))
+    elif isinstance(dat, dict):
+        for k, v in dat.iteritems():
+            fnmatch_collect(metric + '.%s' % k.lower(), v, rates, gauges, depth + 1)
+    elif isinstance(dat, list):
+        fnmatch_collect(metric, dat[-1], rates, gauges, depth + 1)
+
+
+class TestKubernetesMetricsPerf(object):
+
+    SUBCONTAINER_COUNT = 150
+    REPEAT = 5
+
+    def test_raw_metrics(self):
+        Kubernetes = load_class('kubernetes', 'Kubernetes')
+        MetricSelector = load_class('kubernetes', 'MetricSelector')
+
+        with open(FIXTURE) as f:
+            metrics = json.load(f)
+        stats = [metrics[i % len(metrics)]['stats'][-1] for i in xrange(self.SUBCONTAINER_COUNT)]
+
+        # The check itself needs a kubelet
+        check = Kubernetes.__new__(Kubernetes)
+        check.log = logging.getLogger(__name__)
+        check.max_depth = 10
+
+        def fnmatch_all():
+            selected = []
+            for stat in stats:
+                rates, gauges = [], []
+                fnmatch_collect(NAMESPACE, stat, rates, gauges)
+                selected.append((sorted(rates), sorted(gauges)))
+            return selected
+
+        def selector_all():
+            selected = []
+            for stat in stats:
+                rates, gauges = [], []
+                check._collect_raw_metrics(check._selector.root(NAMESPACE), stat, rates, gauges)
+                selected.append((sorted(rates), sorted(gauges)))
+            return selected
+
+        def selector_cold():
+            check._selector = MetricSelector(ENABLED_RATES, ENABLED_GAUGES)
+            return selector_all()
+
+        assert fnmatch_all() == selector_cold()
+
+        for name, func in [('fnmatch at every value', fnmatch_all),
+                           ('compiled selector, cold', selector_cold),
+                           ('compiled selector, warm', selector_all)]:
+            elapsed = min(timeit.repeat(func, number=1, repeat=self.REPEAT))
+            print "%s: %.1fms" % (name, elapsed * 1000)
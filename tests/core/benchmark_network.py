@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Connection state counts of the network check at 500k sockets: parsing the
+output of `ss` (not counting the time `ss` takes to produce it), compared to
+counting the states of /proc/net directly.
+"""
+# stdlib
+import os
+import random
+import shutil
+import tempfile
+import timeit
+
+# project
+from tests.checks.common import load_check
+
+
+class TestNetworkCxStatePerf(object):
+
+    SOCKET_COUNT = 500000
+    REPEAT = 3
+
+    # /proc/net/tcp state -> `ss` state
+    STATES = [
+        ('01', 'ESTAB'),
+        ('06', 'TIME-WAIT'),
+        ('0A', 'LISTEN'),
+        ('08', 'CLOSE-WAIT'),
+        ('03', 'SYN-RECV'),
+    ]
+
+    def _write_procfs(self, path):
+        """
+        /proc/net files with SOCKET_COUNT IPv4 TCP sockets, and the `ss`
+        output listing the same ones
+        """
+        random.seed(42)
+        os.makedirs(os.path.join(path, 'net'))
+        proc_lines = ["  sl  local_address rem_address   st tx_queue rx_queue tr tm->when "
+                      "retrnsmt   uid  timeout inode"]
+        ss_lines = ["Netid  State      Recv-Q Send-Q     Local Address:Port       Peer Address:Port"]
+        for i in xrange(self.SOCKET_COUNT):
+            proc_state, ss_state = random.choice(self.STATES)
+            port = random.randint(1024, 65535)
+            proc_lines.append(
+                "%4d: 0A00020F:%04X 0A000301:01BB %s 00000000:00000000 00:00000000 00000000  "
+                "1000        0 %d 1 0000000000000000 20 4 30 10 -1" % (i, port, proc_state, 100000 + i))
+            ss_lines.append(
+                "tcp    %-10s 0      0              10.0.2.15:%-5d        10.0.3.1:443" % (ss_state, port))
+
+        with open(os.path.join(path, 'net', 'tcp'), 'w') as f:
+            f.write('\n'.join(proc_lines) + '\n')
+        for name in ['tcp6', 'udp', 'udp6']:
+            with open(os.path.join(path, 'net', name), 'w') as f:
+                f.write(proc_lines[0] + '\n')
+        return '\n'.join(ss_lines) + '\n'
+
+    def test_cx_state(self):
+        procfs = tempfile.mkdtemp()
+        try:
+            ss_output = self._write_procfs(procfs)
+            check = load_check('network', {'init_config': {}, 'instances': [{}]}, {})
+
+            def ss():
+                return check._parse_linux_cx_state(
+                    ss_output.splitlines()[1:], check.TCP_STATES['ss'], 1, ip_version='4')
+
+            def proc_net():
+                return check._get_proc_net_cx_state(procfs)
+
+            assert ss() == proc_net()
+
+            for name, func in [('ss output', ss), ('/proc/net', proc_net)]:
+                elapsed = min(timeit.repeat(func, number=1, repeat=self.REPEAT))
+                print "%s: %.3fs for %s sockets" % (name, elapsed, self.SOCKET_COUNT)
+        finally:
+            shutil.rmtree(procfs)
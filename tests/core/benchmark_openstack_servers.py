@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+A run of the openstack check on a host with 200 servers and 20 networks, each
+API request answered in 5ms: the servers and networks queried one at a time,
+compared to the concurrent requests, on the first run and the next ones (the
+lists of hypervisors, servers, networks and aggregates are cached).
+"""
+# stdlib
+import time
+import timeit
+
+# 3p
+import mock
+
+# project
+from tests.checks.common import load_check
+from tests.checks.mock.test_openstack import MOCK_HTTP_RESPONSE, MockAPIResponse
+
+LATENCY = 0.005
+SERVER_COUNT = 200
+NETWORK_COUNT = 20
+HOSTNAME = 'compute-1'
+
+
+def api_get_mock(url, **kwargs):
+    time.sleep(LATENCY)
+    path = url.split('/')
+    if path[-1] == 'os-hypervisors':
+        return MockAPIResponse({'hypervisors': [{'id': 1, 'hypervisor_hostname': HOSTNAME}]})
+    elif path[-1] == 'uptime':
+        return MockAPIResponse({'hypervisor': {'uptime': ' 16:53:48 up 1 day, 21:34,  3 users,  '
+                                                         'load average: 0.04, 0.14, 0.19\n'}})
+    elif path[-2] == 'os-hypervisors':
+        return MockAPIResponse({'hypervisor': {'id': 1, 'hypervisor_hostname': HOSTNAME, 'hypervisor_type': 'QEMU',
+                                               'state': 'up', 'running_vms': SERVER_COUNT}})
+    elif path[-1] == 'os-aggregates':
+        return MockAPIResponse({'aggregates': [{'name': 'staging', 'availability_zone': 'test',
+                                                'hosts': [HOSTNAME]}]})
+    elif path[-1] == 'servers':
+        return MockAPIResponse({'servers': [{'id': 'server_%s' % i} for i in xrange(SERVER_COUNT)]})
+    elif path[-1] == 'diagnostics':
+        return MockAPIResponse({'cpu0_time': 17300000000, 'memory': 524288, 'vda_read': 262144})
+    elif path[-1] == 'limits':
+        return MockAPIResponse({'limits': {'absolute': {'maxTotalCores': 20, 'totalCoresUsed': 2}}})
+    elif path[-1] == 'networks':
+        return MockAPIResponse({'networks': [{'id': 'network_%s' % i} for i in xrange(NETWORK_COUNT)]})
+    elif path[-2] == 'networks':
+        return MockAPIResponse({'network': {'id': path[-1], 'name': path[-1], 'admin_state_up': True}})
+    # the root of the APIs, for their service checks
+    return MockAPIResponse({})
+
+
+class TestOpenStackServersPerf(object):
+
+    REPEAT = 3
+
+    def test_servers(self):
+        instance = {
+            'name': 'test_name', 'user': {'name': 'test_name', 'password': 'test_pass', 'domain': {'id': 'test_id'}},
+            'auth_scope': {'project': {'id': 'test_project_id'}}
+        }
+        init_config = {'keystone_server_url': 'http://10.0.2.15:5000', 'ssl_verify': False, 'os_host': HOSTNAME}
+
+        for name, extra_config in [('one request at a time', {'max_concurrent_requests': 1}),
+                                   ('concurrent requests', {})]:
+            # the check module is loaded again each time
+            check = load_check('openstack', {'init_config': dict(init_config, **extra_config),
+                                             'instances': [instance]}, {})
+            with mock.patch('requests.Session.get', side_effect=api_get_mock), \
+                    mock.patch('openstack.OpenStackProjectScope.request_auth_token', return_value=MOCK_HTTP_RESPONSE):
+                try:
+                    first = timeit.timeit(lambda: check.check(instance), number=1)
+                    assert len(check.external_host_tags) == SERVER_COUNT
+                    assert not check.get_warnings()
+                    check.get_metrics()
+                    next_runs = min(timeit.repeat(lambda: check.check(instance), number=1, repeat=self.REPEAT))
+                finally:
+                    check.stop()
+                print "%s servers, %s: first run %.0fms, next runs %.0fms" % (
+                    SERVER_COUNT, name, first * 1000, next_runs * 1000)
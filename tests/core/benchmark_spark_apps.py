@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+A run of the spark check against a fake ResourceManager proxying the REST API
+of 10 to 100 Spark applications, half of them with all their jobs over, each
+request answered in 5ms: the applications queried one request at a time,
+compared to the concurrent requests, on the first run and the next ones
+(the applications and the stages of the finished ones are not queried again).
+"""
+# stdlib
+import BaseHTTPServer
+import os
+import SocketServer
+import threading
+import time
+import timeit
+import urlparse
+
+# 3p
+import simplejson as json
+
+# project
+from tests.checks.common import load_check
+
+FIXTURES = os.path.join(os.path.dirname(__file__), '..', 'checks', 'fixtures', 'spark')
+LATENCY = 0.005
+
+
+class FakeResourceManagerHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """The running applications of a ResourceManager, and the REST API of each one through its proxy"""
+    protocol_version = 'HTTP/1.1'
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        path = urlparse.urlparse(self.path).path.rstrip('/').split('/')
+        time.sleep(LATENCY)
+
+        if path[1:] == ['ws', 'v1', 'cluster', 'apps']:
+            body = {'apps': {'app': [
+                {'id': 'application_%s' % i, 'name': 'app_%s' % i,
+                 'trackingUrl': 'http://127.0.0.1:%s/proxy/application_%s' % (server.server_address[1], i)}
+                for i in xrange(server.app_count)]}}
+        elif len(path) == 6:
+            # /proxy/<yarn app id>/api/v1/applications
+            body = [{'id': 'spark_' + path[2], 'name': path[2]}]
+        else:
+            # /proxy/<yarn app id>/api/v1/applications/<spark app id>/<object>
+            running = int(path[2].split('_')[1]) % 2
+            body = server.objects['/'.join(path[7:])]
+            if path[7] == 'jobs' and not running:
+                body = body.replace('"RUNNING"', '"SUCCEEDED"')
+
+        body = body if isinstance(body, basestring) else json.dumps(body)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class FakeResourceManager(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    # the connections of all the workers at once
+    request_queue_size = 64
+
+
+class TestSparkAppsPerf(object):
+
+    APP_COUNTS = [10, 50, 100]
+    REPEAT = 3
+
+    def test_apps(self):
+        server = FakeResourceManager(('127.0.0.1', 0), FakeResourceManagerHandler)
+        server.objects = {}
+        for obj, fixture in [('jobs', 'job_metrics'), ('stages', 'stage_metrics'),
+                             ('executors', 'executor_metrics'), ('storage/rdd', 'rdd_metrics')]:
+            with open(os.path.join(FIXTURES, fixture)) as f:
+                server.objects[obj] = f.read()
+        thread = threading.Thread(target=server.serve_forever, args=(0.01,))
+        thread.daemon = True
+        thread.start()
+
+        instance = {
+            'resourcemanager_uri': 'http://127.0.0.1:%s' % server.server_address[1],
+            'cluster_name': 'SparkCluster',
+        }
+        try:
+            for app_count in self.APP_COUNTS:
+                server.app_count = app_count
+                for name, init_config in [('one request at a time', {'max_concurrent_requests': 1}),
+                                          ('concurrent requests', {})]:
+                    check = load_check('spark', {'init_config': init_config, 'instances': [instance]}, {})
+                    try:
+                        first = timeit.timeit(lambda: check.check(instance), number=1)
+                        assert len(check._spark_app_ids.values()[0]) == app_count
+                        check.get_metrics()
+                        next_runs = min(timeit.repeat(lambda: check.check(instance), number=1, repeat=self.REPEAT))
+                    finally:
+                        check.stop()
+                    print "%s apps, %s: first run %.0fms, next runs %.0fms" % (
+                        app_count, name, first * 1000, next_runs * 1000)
+        finally:
+            server.shutdown()
+            server.server_close()
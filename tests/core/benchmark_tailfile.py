@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the log tailer, in MB/s, compared to the previous
+implementation which reopened the file on every poll and matched line.
+"""
+# stdlib
+import binascii
+import logging
+import os
+from stat import ST_INO, ST_SIZE
+import tempfile
+import timeit
+
+# project
+from utils.tailfile import TailFile
+
+log = logging.getLogger(__name__)
+
+
+class LegacyTailFile(object):
+    """The tailer before it was made buffered and rotation-aware"""
+
+    CRC_SIZE = 16
+
+    def __init__(self, logger, path, callback):
+        self._path = path
+        self._f = None
+        self._inode = None
+        self._size = 0
+        self._crc = None
+        self._log = logger
+        self._callback = callback
+
+    def _open_file(self, move_end=False, pos=False):
+        already_open = False
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+            already_open = True
+
+        stat = os.stat(self._path)
+        inode = stat[ST_INO]
+        size = stat[ST_SIZE]
+
+        crc = None
+        if size >= self.CRC_SIZE:
+            tmp_file = open(self._path, 'r')
+            data = tmp_file.read(self.CRC_SIZE)
+            crc = binascii.crc32(data)
+
+        if already_open:
+            if self._inode is not None and inode != self._inode:
+                move_end = False
+                pos = False
+            elif self._size > 0 and size < self._size:
+                move_end = False
+                pos = False
+            if size >= self.CRC_SIZE and self._crc is not None and crc != self._crc:
+                move_end = False
+                pos = False
+
+        self._inode = inode
+        self._size = size
+        self._crc = crc
+
+        self._f = open(self._path, 'r')
+        if move_end:
+            self._f.seek(0, os.SEEK_END)
+        elif pos:
+            self._f.seek(pos)
+
+    def tail(self, line_by_line=True, move_end=True):
+        self._open_file(move_end=move_end)
+        while True:
+            pos = self._f.tell()
+            line = self._f.readline()
+            if line:
+                line = line.strip(chr(0))
+                if self._callback(line.rstrip("\n")) and line_by_line:
+                    yield True
+                    pos = self._f.tell()
+                    self._open_file(move_end=False, pos=pos)
+            else:
+                yield True
+                self._open_file(move_end=False, pos=pos)
+
+
+class TestTailFilePerf(object):
+
+    LINE = "2016-06-01 12:00:00 INFO some.metric 1465000000 42.0 host=foo,env=prod request_id=1234567890\n"
+    LINE_COUNT = 200000
+    POLLS = 10
+    REPEAT = 3
+
+    def _benchmark(self, tail_cls, line_by_line):
+        with tempfile.NamedTemporaryFile() as log_file:
+            lines = []
+            tail = tail_cls(log, log_file.name, lambda l: lines.append(l) or True)
+            gen = tail.tail(line_by_line=line_by_line, move_end=True)
+            gen.next()
+
+            lines_per_poll = self.LINE_COUNT / self.POLLS
+            elapsed = 0
+            for _ in xrange(self.POLLS):
+                log_file.write(self.LINE * lines_per_poll)
+                log_file.flush()
+
+                def poll():
+                    # Line by line, the tailer yields after each line
+                    for _ in xrange(lines_per_poll if line_by_line else 1):
+                        gen.next()
+
+                elapsed += timeit.timeit(poll, number=1)
+                assert len(lines) == lines_per_poll
+                del lines[:]
+
+            return len(self.LINE) * self.LINE_COUNT / elapsed / 1024 / 1024
+
+    def _compare(self, line_by_line):
+        for tail_cls in [LegacyTailFile, TailFile]:
+            throughput = max(self._benchmark(tail_cls, line_by_line) for _ in xrange(self.REPEAT))
+            print "%s (line_by_line=%s): %.1f MB/s" % (tail_cls.__name__, line_by_line, throughput)
+
+    def test_tail_throughput(self):
+        self._compare(line_by_line=False)
+
+    def test_tail_line_by_line_throughput(self):
+        self._compare(line_by_line=True)
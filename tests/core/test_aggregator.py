@@ -250,6 +250,35 @@ class TestMetricsAggregator(unittest.TestCase):
         nt.assert_equals(first['points'][0][1], 5)
         nt.assert_equals(first['host'], 'myhost')
 
+    def test_bulk_gauges(self):
+        stats = MetricsAggregator('myhost')
+        tags = stats.tag_set(['b', 'a', 'a'])
+        nt.assert_equals(tags, ('a', 'b'))
+        # Tag sets are not normalized twice
+        assert stats.tag_set(tags) is tags
+
+        stats.submit_metrics([('my.first.gauge', 1), ('my.second.gauge', 2)], 'g', tags=tags)
+        stats.submit_metrics({'my.first.gauge': 5}, 'g', tags=['a', 'b'])
+        # Same context as the bulk submissions
+        stats.gauge('my.second.gauge', 3, tags=['b', 'a'])
+        nt.assert_equals(stats.submitted_points, 4)
+
+        metrics = self.sort_metrics(stats.flush())
+        nt.assert_equals(len(metrics), 2)
+        first, second = metrics
+        nt.assert_equals(first['metric'], 'my.first.gauge')
+        nt.assert_equals(first['points'][0][1], 5)
+        nt.assert_equals(list(first['tags']), ['a', 'b'])
+        nt.assert_equals(first['host'], 'myhost')
+        nt.assert_equals(second['metric'], 'my.second.gauge')
+        nt.assert_equals(second['points'][0][1], 3)
+
+        # Old points are all discarded
+        stats.submit_metrics([('my.first.gauge', 1), ('my.second.gauge', 2)], 'g',
+                             timestamp=1000000000)
+        nt.assert_equals(stats.num_discarded_old_points, 2)
+        assert not stats.flush()
+
     def test_sets(self):
         stats = MetricsAggregator('myhost')
         stats.submit_packets('my.set:10|s')
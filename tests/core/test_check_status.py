@@ -11,6 +11,7 @@ from checks.check_status import (
     STATUS_ERROR,
     STATUS_OK,
 )
+from checks.collector import Collector
 
 
 class DummyAgentCheck(AgentCheck):
@@ -73,3 +74,36 @@ def test_persistence_fail():
 
     status = CollectorStatus.load_latest_status()
     assert not status
+
+
+class MetricsAgentCheck(AgentCheck):
+
+    def check(self, instance):
+        for i in xrange(instance['count']):
+            self.gauge('metric', i, tags=['i:%s' % i])
+
+
+def test_instance_check_stats():
+    instances = [
+        {'count': 3},
+        {'count': 5},
+    ]
+
+    check = MetricsAgentCheck('metrics_agent_check', {}, {}, instances)
+    instance_statuses = check.run()
+    nt.assert_equal([3, 5], [s.metric_count for s in instance_statuses])
+    for s in instance_statuses:
+        assert s.instance_check_stats['run_time'] >= 0
+        assert s.instance_check_stats['cpu_time'] >= 0
+
+    check_status = CheckStatus('metrics_agent_check', instance_statuses, 8,
+                               run_stats={'run_time': 0.1, 'cpu_time': 0.05,
+                                          'flush_time': 0.01, 'context_count': 5})
+    lines = CollectorStatus.check_status_lines(check_status)
+    assert any('collected 5 metrics' in l for l in lines), lines
+    assert any('5 contexts' in l for l in lines), lines
+
+    telemetry = Collector._get_check_telemetry_metrics(check_status, 0.1)
+    instance_run_times = [m for m in telemetry if m[0] == 'datadog.agent.check_instance_run_time']
+    nt.assert_equal(2, len(instance_run_times))
+    assert 'instance:1' in instance_run_times[1][3]['tags']
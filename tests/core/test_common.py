@@ -163,6 +163,8 @@ class TestCore(unittest.TestCase):
         checks = [load_check('redisdb', redis_config, agentConfig)]
 
         c = Collector(agentConfig, [], {}, get_hostname(agentConfig))
+        # Stops its host metadata refresher
+        self.addCleanup(c.stop)
         payload = c.run({
             'initialized_checks': checks,
             'init_failed_checks': {}
@@ -179,6 +181,12 @@ class TestCore(unittest.TestCase):
             tag = "check:%s" % check.name
             assert tag in all_tags, all_tags
 
+        # And the rest of the check telemetry
+        metric_names = set(m[0] for m in metrics)
+        for name in ['datadog.agent.check_cpu_time', 'datadog.agent.check_flush_time',
+                     'datadog.agent.check_context_count', 'datadog.agent.check_metric_count']:
+            assert name in metric_names, name
+
     def test_apptags(self):
         '''
         Tests that the app tags are sent if specified so
@@ -200,6 +208,8 @@ class TestCore(unittest.TestCase):
         checks = [load_check('redisdb', redis_config, agentConfig)]
 
         c = Collector(agentConfig, [], {}, get_hostname(agentConfig))
+        # Stops its host metadata refresher
+        self.addCleanup(c.stop)
         payload = c.run({
             'initialized_checks': checks,
             'init_failed_checks': {}
@@ -393,6 +403,34 @@ class TestCore(unittest.TestCase):
 
         NTPUtil._drop()
 
+    def test_instances_are_read_only(self):
+        class WritingCheck(AgentCheck):
+            def check(self, instance):
+                instance.setdefault('tags', []).append('foo:bar')
+
+        check = WritingCheck('writing', {}, {}, instances=[{}])
+        instance_statuses = check.run()
+        self.assertEquals(instance_statuses[0].status, 'ERROR')
+        self.assertTrue('TypeError' in instance_statuses[0].traceback)
+
+    def test_mutates_instances(self):
+        class WritingCheck(AgentCheck):
+            MUTATES_INSTANCES = True
+
+            def check(self, instance):
+                instance.setdefault('tags', []).append('foo:bar')
+                self.gauge('tags', len(instance['tags']))
+
+        instances = [{'tags': ['env:test']}]
+        check = WritingCheck('writing', {}, {}, instances=instances)
+        for _ in xrange(2):
+            instance_statuses = check.run()
+            self.assertEquals(instance_statuses[0].status, 'OK')
+            self.assertEquals(check.get_metrics()[0][2], 2)
+
+        # The configuration is never modified
+        self.assertEquals(instances, [{'tags': ['env:test']}])
+
 
 class TestAggregator(unittest.TestCase):
     def setUp(self):
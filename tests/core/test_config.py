@@ -315,6 +315,16 @@ class TestConfigLoadCheckDirectory(unittest.TestCase):
         self.assertEquals(1, len(checks['initialized_checks']))
         self.assertEquals(2, checks['initialized_checks'][0].instance_count())  # check that we picked the right conf
 
+    def testConfigWithCheckNames(self, *args):
+        copyfile('%s/valid_conf.yaml' % FIXTURE_PATH,
+            '%s/test_check.yaml' % TEMP_ETC_CONF_DIR)
+        copyfile('%s/valid_check_1.py' % FIXTURE_PATH,
+            '%s/test_check.py' % TEMP_ETC_CHECKS_DIR)
+        checks = load_check_directory({"additional_checksd": TEMP_ETC_CHECKS_DIR}, "foo", check_names={'other_check'})
+        self.assertEquals(0, len(checks['initialized_checks']))
+        checks = load_check_directory({"additional_checksd": TEMP_ETC_CHECKS_DIR}, "foo", check_names={'test_check'})
+        self.assertEquals(1, len(checks['initialized_checks']))
+
     def tearDown(self):
         for _dir in self.TEMP_DIRS:
             rmtree(_dir)
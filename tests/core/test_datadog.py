@@ -4,11 +4,13 @@ from datetime import datetime
 import logging
 import os
 import re
-from tempfile import gettempdir, NamedTemporaryFile
+import shutil
+from tempfile import gettempdir, mkdtemp, NamedTemporaryFile
 import time
 import unittest
 
 # 3p
+import mock
 from nose.plugins.attrib import attr
 
 # project
@@ -36,6 +38,13 @@ def parse_function_plugin(logger, line, state):
     return tuple(res)
 
 
+def parse_tagged_function_plugin(logger, line):
+    """Points tagged with the tags after their value, as a list or a set"""
+    metric, ts, value, kind, tags = line.split(' ', 4)
+    tags = tags.split(',')
+    return metric, ts, value, {'tags': set(tags) if kind == 'set' else tags}
+
+
 class ParseClassPlugin(object):
     """Class-based stateful parser"""
     def __init__(self, logger=None, user_args=(), **kwargs):
@@ -91,6 +100,10 @@ class TailTestCase(unittest.TestCase):
     def setUp(self):
         self.log_file = NamedTemporaryFile()
         self.logger = logging.getLogger('test.dogstream')
+        self.state_file = NamedTemporaryFile()
+        self.state_path_patch = mock.patch('checks.datadog.Dogstreams._get_state_path',
+                                           return_value=self.state_file.name)
+        self.state_path_patch.start()
 
     def _write_log(self, log_data):
         for data in log_data:
@@ -98,6 +111,8 @@ class TailTestCase(unittest.TestCase):
         self.log_file.flush()
 
     def tearDown(self):
+        self.state_path_patch.stop()
+        self.state_file.close()
         self.log_file.close()
 
 # Don't run these tests on Windows because the temp file scheme used in them
@@ -228,6 +243,25 @@ class TestDogstream(TailTestCase):
         actual_output = statedog.check(self.config, move_end=False)
         self.assertEquals(expected_output, actual_output)
 
+    def test_dogstream_function_plugin_tags(self):
+        """The points of custom parsers are aggregated regardless of their tags"""
+        log_data = [
+            'test.metric 1000000000 1 list env:prod',
+            'test.metric 1000000000 2 list env:staging',
+            'test.metric 1000000000 3 set env:dev,role:db',
+        ]
+        expected_output = {
+            "dogstream": [
+                ('test.metric', 1000000000, 3, {'tags': set(['env:dev', 'role:db'])}),
+            ]
+        }
+        self._write_log(log_data)
+
+        dogstream = Dogstreams.init(self.logger, {'dogstreams': '{0}:{1}:parse_tagged_function_plugin'.format(
+            self.log_file.name, __name__)})
+        self.assertEquals(dogstream.check(self.config, move_end=False), expected_output)
+        self.assertEquals(dogstream.dogstreams[0]._error_count, 0)
+
     def test_dogstream_new_plugin(self):
         """Ensure that class-based stateful plugins work"""
         log_data = [
@@ -458,3 +492,260 @@ class TestDogstream(TailTestCase):
         dogstream = Dogstreams.init(self.logger, {'dogstreams': '%s:dogstream.supervisord_log:parse_supervisord' % self.log_file.name})
         actual_output = dogstream.check(self.config, move_end=False)
         self.assertEquals(expected_output, actual_output)
+
+
+@attr('unix')
+class TestDogstreamCheckpoints(TailTestCase):
+
+    LINE = "test.metric.a %s 1 metric_type=counter"
+
+    def _write_points(self, timestamps):
+        self._write_log(self.LINE % ts for ts in timestamps)
+
+    def _values(self, output):
+        return [(timestamp, value) for _, timestamp, value, _ in output.get('dogstream', [])]
+
+    def test_budget(self):
+        """
+        The backlog is read across runs, within the budget of each run
+        """
+        line_size = len(self.LINE % 1000000000) + 1
+        config = {
+            'dogstreams': self.log_file.name,
+            'check_freq': 1,
+            'dogstream_max_bytes_per_run': 3 * line_size,
+        }
+        dogstreams = Dogstreams.init(self.logger, config)
+        self._write_points(range(1000000000, 1000000007))
+
+        self.assertEquals(self._values(dogstreams.check(config, move_end=False)),
+                          [(1000000000, 1), (1000000001, 1), (1000000002, 1)])
+        backlog = dogstreams.get_backlog_metrics()
+        self.assertEquals(backlog[0][0], 'datadog.agent.dogstream.backlog_bytes')
+        self.assertEquals(backlog[0][2], 4 * line_size)
+        self.assertEquals(backlog[0][3], {'tags': ['log_path:%s' % self.log_file.name]})
+
+        self.assertEquals(self._values(dogstreams.check(config, move_end=False)),
+                          [(1000000003, 1), (1000000004, 1), (1000000005, 1)])
+        self.assertEquals(self._values(dogstreams.check(config, move_end=False)),
+                          [(1000000006, 1)])
+        self.assertEquals(dogstreams.get_backlog_metrics()[0][2], 0)
+
+        config['dogstream_max_lines_per_run'] = 1
+        dogstreams = Dogstreams.init(self.logger, config)
+        self._write_points([1000000007, 1000000008])
+        self.assertEquals(self._values(dogstreams.check(config)), [(1000000007, 1)])
+
+    def test_resume(self):
+        """
+        Lines written while the agent was down are read when it restarts
+        """
+        config = {'dogstreams': self.log_file.name, 'check_freq': 1}
+        dogstreams = Dogstreams.init(self.logger, config)
+        self._write_points([1000000000])
+        self.assertEquals(self._values(dogstreams.check(config, move_end=False)), [(1000000000, 1)])
+
+        # Restart
+        self._write_points([1000000001])
+        dogstreams = Dogstreams.init(self.logger, config)
+        self._write_points([1000000002])
+        self.assertEquals(self._values(dogstreams.check(config)),
+                          [(1000000001, 1), (1000000002, 1)])
+
+        # Restart after the log was rotated: the new file is read from its start
+        self.log_file.truncate(0)
+        self.log_file.seek(0)
+        self._write_points([1000000003])
+        dogstreams = Dogstreams.init(self.logger, config)
+        self.assertEquals(self._values(dogstreams.check(config)), [(1000000003, 1)])
+
+
+@attr('unix')
+class TestDogstreamRules(TailTestCase):
+
+    RULES = """
+rules:
+  - pattern: '^(?P<date>\\S+ \\S+) INFO request (?P<method>[A-Z]+) (?P<status>\\d{3}) (?P<duration>\\d+)ms'
+    timestamp: date
+    timestamp_format: '%Y-%m-%d %H:%M:%S'
+    tags: [method, status]
+    metrics:
+      - name: app.request.duration
+        value: duration
+      - name: app.request.count
+        type: counter
+  - pattern: '^(?P<ts>\\d+) ERROR'
+    timestamp: ts
+    metric: app.errors
+    type: counter
+"""
+
+    def setUp(self):
+        TailTestCase.setUp(self)
+        self.rules_file = NamedTemporaryFile()
+        self.rules_file.write(self.RULES)
+        self.rules_file.flush()
+
+    def tearDown(self):
+        self.rules_file.close()
+        TailTestCase.tearDown(self)
+
+    def test_rules(self):
+        self._write_log([
+            '2012-05-14 12:46:01 INFO request GET 200 12ms',
+            '2012-05-14 12:46:02 INFO request GET 200 18ms',
+            '2012-05-14 12:46:03 INFO request POST 500 40ms',
+            '2012-05-14 12:46:03 DEBUG nothing to see',
+            '1000000000 ERROR something broke',
+            '1000000001 ERROR something broke again',
+        ])
+        ts = calendar.timegm((2012, 5, 14, 12, 46, 0, 0, 0, 0))
+        get_tags = {'tags': ['method:GET', 'status:200']}
+        post_tags = {'tags': ['method:POST', 'status:500']}
+
+        def attrs(metric_type, tags=None):
+            attributes = {'metric_type': metric_type}
+            attributes.update(tags or {})
+            return attributes
+
+        config = {'dogstreams': '%s:dogstream.rules:RuleParser:%s' % (self.log_file.name, self.rules_file.name),
+                  'check_freq': 15}
+        dogstream = Dogstreams.init(self.logger, config)
+        self.assertEquals(dogstream.check(config, move_end=False), {
+            'dogstream': [
+                ('app.errors', 999999990, 2, attrs('counter')),
+                ('app.request.count', ts, 2, attrs('counter', get_tags)),
+                ('app.request.count', ts, 1, attrs('counter', post_tags)),
+                ('app.request.duration', ts, 18, attrs('gauge', get_tags)),
+                ('app.request.duration', ts, 40, attrs('gauge', post_tags)),
+            ]
+        })
+
+    def test_combined_rules(self):
+        from dogstream.rules import RuleSet
+
+        # More groups than a single regex supports
+        rules = RuleSet([{'pattern': 'metric%s (?P<value>\\d+)' % i, 'metric': 'm%s' % i, 'value': 'value'}
+                         for i in range(100)])
+        self.assertTrue(len(rules._regexes) > 1)
+        self.assertEquals(rules.parse_line('metric99 12')[0][0], 'm99')
+        self.assertEquals(rules.parse_line('metric0 12')[0][2], '12')
+        self.assertEquals(rules.parse_line('metric 12'), None)
+
+    def test_standalone_rules(self):
+        from dogstream.rules import RuleSet
+
+        rules = RuleSet([
+            {'pattern': 'INFO (?P<value>\\d+)', 'metric': 'info', 'value': 'value'},
+            # Its flag would apply to the other rules in a combined regex
+            {'pattern': '(?i)warn (?P<value>\\d+)', 'metric': 'warn', 'value': 'value'},
+            # Numbered references, to groups renumbered in a combined regex
+            {'pattern': '(\\w+)=\\1 (?P<value>\\d+)', 'metric': 'same', 'value': 'value'},
+            {'pattern': '^(?P<open><)?(?P<value>\\d+)(?(open)>) ms', 'metric': 'ms', 'value': 'value'},
+            {'pattern': 'DEBUG (?P<value>\\d+)', 'metric': 'debug', 'value': 'value'},
+        ])
+        self.assertEquals([rule is not None for _, rule in rules._regexes], [False, True, True, True, False])
+        self.assertEquals(rules.parse_line('WARN 1')[0][:3:2], ('warn', '1'))
+        self.assertEquals(rules.parse_line('info 1'), None)
+        self.assertEquals(rules.parse_line('debug 1'), None)
+        self.assertEquals(rules.parse_line('DEBUG 2')[0][:3:2], ('debug', '2'))
+        self.assertEquals(rules.parse_line('a=a 3')[0][:3:2], ('same', '3'))
+        self.assertEquals(rules.parse_line('a=b 3'), None)
+        self.assertEquals(rules.parse_line('<4> ms')[0][:3:2], ('ms', '4'))
+        self.assertEquals(rules.parse_line('<4 ms'), None)
+
+    def test_timestamp_timezone(self):
+        from dogstream.rules import RuleError, RuleSet
+
+        line = '2012-05-14 12:46:01 done'
+        rule = {'pattern': '^(?P<date>\\S+ \\S+) done', 'metric': 'done',
+                'timestamp': 'date', 'timestamp_format': '%Y-%m-%d %H:%M:%S'}
+        self.assertEquals(RuleSet([rule]).parse_line(line)[0][1],
+                          calendar.timegm((2012, 5, 14, 12, 46, 1, 0, 0, 0)))
+        self.assertEquals(RuleSet([dict(rule, timestamp_timezone='local')]).parse_line(line)[0][1],
+                          time.mktime((2012, 5, 14, 12, 46, 1, 0, 0, -1)))
+        with self.assertRaises(RuleError):
+            RuleSet([dict(rule, timestamp_timezone='CEST')])
+
+    def test_required_literal(self):
+        from dogstream.rules import required_literal
+
+        self.assertEquals(required_literal('^\\S+ INFO request (?P<m>GET|POST)'), ' INFO request ')
+        self.assertEquals(required_literal('(?P<a>foo)(?P<b>bar)\\d'), 'foobar')
+        self.assertEquals(required_literal('(foo|bar)+'), None)
+        self.assertEquals(required_literal('(?i)error'), None)
+
+
+@attr('unix')
+class TestDogstreamRescan(TailTestCase):
+
+    def setUp(self):
+        TailTestCase.setUp(self)
+        self.log_dir = mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+        TailTestCase.tearDown(self)
+
+    def _write(self, name, timestamps):
+        with open(os.path.join(self.log_dir, name), 'a') as f:
+            for ts in timestamps:
+                print >> f, "test.metric.%s %s 1 metric_type=counter" % (name, ts)
+
+    def _metrics(self, output):
+        return sorted((metric, timestamp) for metric, timestamp, _, _ in output.get('dogstream', []))
+
+    def test_rescan(self):
+        """
+        Logs matching the glob are followed as they appear and disappear
+        """
+        config = {
+            'dogstreams': os.path.join(self.log_dir, '*.log'),
+            'check_freq': 1,
+            'dogstream_rescan_interval': 0,
+        }
+        self._write('a.log', [1000000000])
+        dogstreams = Dogstreams.init(self.logger, config)
+        self.assertEquals(self._metrics(dogstreams.check(config, move_end=False)),
+                          [('test.metric.a.log', 1000000000)])
+
+        config['dogstream_rescan_interval'] = 60
+        self._write('b.log', [1000000001])
+        self.assertEquals(self._metrics(dogstreams.check(config)), [])
+
+        # The new log is read from its start
+        dogstreams._last_scan = 0
+        self._write('a.log', [1000000002])
+        self.assertEquals(self._metrics(dogstreams.check(config)),
+                          [('test.metric.a.log', 1000000002), ('test.metric.b.log', 1000000001)])
+
+        old = [d for d in dogstreams.dogstreams if d.log_path.endswith('a.log')][0]
+        os.remove(os.path.join(self.log_dir, 'a.log'))
+        dogstreams._last_scan = 0
+        dogstreams.check(config)
+        self.assertEquals([d.log_path for d in dogstreams.dogstreams], [os.path.join(self.log_dir, 'b.log')])
+        self.assertTrue(old._tail is None)
+        dogstreams.stop()
+
+    def test_parallel(self):
+        """
+        Logs read by the worker pool give the same output as read in turn
+        """
+        names = ['%s.log' % i for i in range(8)]
+        for name in names:
+            self._write(name, range(1000000000, 1000000010))
+        expected = sorted(('test.metric.%s' % name, ts) for name in names for ts in range(1000000000, 1000000010))
+
+        for workers in [1, 4]:
+            config = {
+                'dogstreams': os.path.join(self.log_dir, '*.log'),
+                'check_freq': 1,
+                'dogstream_workers': workers,
+            }
+            dogstreams = Dogstreams.init(self.logger, config)
+            self.assertEquals(self._metrics(dogstreams.check(config, move_end=False)), expected)
+            self.assertEquals(dogstreams._pool is not None, workers > 1)
+            dogstreams.stop()
+            # Forget the positions, to read the logs again
+            with open(self.state_file.name, 'w') as f:
+                f.write('{}')
@@ -1,8 +1,10 @@
 # stdlib
+import socket
 import time
 import types
 
 # 3p
+import mock
 import unittest
 
 # project
@@ -24,3 +26,23 @@ class TestEC2(unittest.TestCase):
         if "instance-id" in d:
             assert d["instance-id"].startswith("i-"), d
         assert end - start <= 1.15, "It took %s seconds to get ec2 metadata" % (end-start)
+
+    def test_metadata_timeout(self):
+        """
+        Each request has its own timeout, the default one of the sockets is left alone
+        """
+        default_timeouts = []
+
+        def urlopen(url, timeout=None):
+            default_timeouts.append(socket.getdefaulttimeout())
+            self.assertEquals(timeout, EC2.TIMEOUT)
+            raise IOError("not on EC2")
+
+        EC2.metadata = {}
+        before = socket.getdefaulttimeout()
+        with mock.patch('util.urllib2.urlopen', side_effect=urlopen):
+            EC2.get_metadata({'collect_instance_metadata': True})
+            EC2.get_tags({'collect_instance_metadata': True})
+        self.assertTrue(default_timeouts)
+        self.assertEquals(set(default_timeouts), set([before]))
+        self.assertEquals(socket.getdefaulttimeout(), before)
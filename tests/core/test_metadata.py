@@ -1,8 +1,17 @@
+# stdlib
+import os
+import shutil
+import tempfile
+import time
 import unittest
 
+# 3p
+import mock
+
 # project
 from checks import AgentCheck
 from checks.collector import Collector
+from utils.host_metadata import MetadataRefresher
 
 
 class TestMetadata(unittest.TestCase):
@@ -65,3 +74,130 @@ class TestMetadata(unittest.TestCase):
         self.assertEquals(service_metadata[0], {'foo': "bar"})
         self.assertEquals(service_metadata[1], {})
         self.assertEquals(service_metadata[2], {'foo': "bar"})
+
+
+class TestMetadataRefresher(unittest.TestCase):
+    """
+    Test the background refresh of the host metadata.
+    """
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        self.cache_path = os.path.join(self.cache_dir, 'host_metadata.json')
+        self.calls = []
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def _source(self, name, fail=False):
+        def source():
+            self.calls.append(name)
+            if fail:
+                raise Exception("Metadata service unreachable")
+            return {'source': name}
+        return source
+
+    def test_ttl(self):
+        """
+        Sources are refreshed once their TTL has expired
+        """
+        refresher = MetadataRefresher(cache_path=self.cache_path)
+        refresher.register('fast', self._source('fast'), 10)
+        refresher.register('slow', self._source('slow'), 100)
+        self.assertFalse(refresher.is_ready('fast', 'slow'))
+
+        next_refresh = refresher.refresh()
+        self.assertTrue(refresher.is_ready('fast', 'slow'))
+        self.assertEquals(refresher.get('fast'), {'source': 'fast'})
+        self.assertAlmostEqual(next_refresh, time.time() + 10, delta=1)
+
+        refresher.refresh()
+        self.assertEquals(sorted(self.calls), ['fast', 'slow'])
+
+        with mock.patch('time.time', return_value=time.time() + 20):
+            refresher.refresh()
+        self.assertEquals(sorted(self.calls), ['fast', 'fast', 'slow'])
+
+    def test_failing_source(self):
+        """
+        A failing source keeps its previous snapshot
+        """
+        refresher = MetadataRefresher(cache_path=self.cache_path)
+        refresher.register('source', self._source('source', fail=True), 10)
+        refresher.refresh()
+        self.assertTrue(refresher.is_ready('source'))
+        self.assertEquals(refresher.get('source', 'default'), 'default')
+
+        refresher.register('source', self._source('source'), 10)
+        refresher.refresh(force=True)
+        refresher.register('source', self._source('source', fail=True), 10)
+        refresher.refresh(force=True)
+        self.assertEquals(refresher.get('source'), {'source': 'source'})
+
+    def test_disk_cache(self):
+        """
+        Snapshots of the persistent sources survive restarts
+        """
+        refresher = MetadataRefresher(cache_key='host', cache_path=self.cache_path)
+        refresher.register('persistent', self._source('persistent'), 10)
+        refresher.register('volatile', self._source('volatile'), 10, persist=False)
+        refresher.refresh()
+
+        refresher = MetadataRefresher(cache_key='host', cache_path=self.cache_path)
+        refresher.register('persistent', self._source('persistent'), 10)
+        refresher.register('volatile', self._source('volatile'), 10, persist=False)
+        self.assertTrue(refresher.is_ready('persistent'))
+        self.assertFalse(refresher.is_ready('volatile'))
+        refresher.refresh()
+        self.assertEquals(sorted(self.calls), ['persistent', 'volatile', 'volatile'])
+
+        # The cache of another host is ignored
+        refresher = MetadataRefresher(cache_key='other_host', cache_path=self.cache_path)
+        refresher.register('persistent', self._source('persistent'), 10)
+        self.assertFalse(refresher.is_ready('persistent'))
+
+    def test_background_refresh(self):
+        refresher = MetadataRefresher(cache_path=self.cache_path)
+        refresher.register('source', self._source('source'), 10)
+        refresher.start()
+        try:
+            for _ in xrange(100):
+                if refresher.is_ready('source'):
+                    break
+                time.sleep(0.01)
+            self.assertEquals(refresher.get('source'), {'source': 'source'})
+        finally:
+            refresher.stop()
+        self.assertFalse(refresher.is_running())
+
+    def test_collector_host_metadata(self):
+        """
+        The collector only attaches the latest snapshot of the host metadata
+        """
+        agentConfig = {
+            'api_key': 'foo',
+            'tags': 'env:test',
+            'collect_ec2_tags': True,
+            'create_dd_check_tags': False,
+        }
+        with mock.patch('utils.host_metadata.MetadataRefresher._get_cache_path',
+                        return_value=self.cache_path):
+            c = Collector(agentConfig, None, {}, "foo")
+
+        payload = {'host-tags': {}, 'events': {}}
+        c._populate_payload_metadata(payload, [], start_event=False)
+        self.assertFalse(payload.get('meta'))
+
+        with mock.patch('checks.collector.EC2.get_tags', return_value=['ec2:tag']), \
+                mock.patch('checks.collector.GCE.get_tags', return_value=None), \
+                mock.patch('checks.collector.EC2.get_metadata', return_value={}), \
+                mock.patch('checks.collector.Collector._run_gohai', return_value='{"gohai": 1}'):
+            c._metadata_refresher.refresh()
+
+        payload = {'host-tags': {}, 'events': {}}
+        with mock.patch.object(c, '_get_hostname_metadata') as get_hostname_metadata:
+            c._populate_payload_metadata(payload, [], start_event=False)
+            self.assertFalse(get_hostname_metadata.called)
+
+        self.assertEquals(payload['meta']['hostname'], "foo")
+        self.assertEquals(payload['gohai'], '{"gohai": 1}')
+        self.assertEquals(payload['host-tags'], {'system': [u'env:test', 'ec2:tag']})
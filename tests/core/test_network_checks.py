@@ -0,0 +1,97 @@
+# stdlib
+import threading
+import time
+import unittest
+
+# project
+from checks.collector import Collector
+from checks.libs.thread_pool import SharedPool
+import checks.network_checks as network_checks
+from checks.network_checks import NetworkCheck, Status
+
+
+class DummyNetworkCheck(NetworkCheck):
+    SERVICE_CHECK_NAME = 'dummy.can_connect'
+
+    def __init__(self, *args, **kwargs):
+        NetworkCheck.__init__(self, *args, **kwargs)
+        self.unstuck = threading.Event()
+
+    def _check(self, instance):
+        if instance.get('stuck'):
+            self.unstuck.wait(10)
+        return Status.UP, "OK"
+
+    def report_as_service_check(self, sc_name, status, instance, msg=None):
+        self.service_check(self.SERVICE_CHECK_NAME, NetworkCheck.STATUS_TO_SERVICE_CHECK[status],
+                           tags=['instance:%s' % instance['name']], message=msg)
+
+
+class TestNetworkCheck(unittest.TestCase):
+
+    def setUp(self):
+        network_checks._shared_pool = SharedPool(4, name="Test")
+        self.timeout = network_checks.TIMEOUT
+
+    def tearDown(self):
+        network_checks._shared_pool = None
+        network_checks.TIMEOUT = self.timeout
+
+    def _run(self, check, count):
+        for _ in xrange(100):
+            check.run()
+            if len(check.service_checks) >= count:
+                return check.get_service_checks()
+            time.sleep(0.02)
+        return check.get_service_checks()
+
+    def test_shared_pool(self):
+        instances = [{'name': 'instance_%s' % i, 'skip_event': True} for i in xrange(3)]
+        checks = [
+            DummyNetworkCheck('dummy_%s' % i, {}, {}, instances=instances) for i in xrange(3)
+        ]
+        for check in checks:
+            service_checks = self._run(check, 3)
+            self.assertEquals(set(sc['tags'][0] for sc in service_checks),
+                              set(['instance:instance_%s' % i for i in xrange(3)]))
+            self.assertTrue(check.pool is network_checks.get_shared_pool())
+            check.stop()
+
+        self.assertTrue(network_checks.get_shared_pool().get_nworkers() <= 4)
+
+    def test_stuck_instance(self):
+        network_checks.TIMEOUT = 0.05
+        instances = [
+            {'name': 'stuck', 'stuck': True, 'skip_event': True},
+            {'name': 'fine', 'skip_event': True},
+        ]
+        check = DummyNetworkCheck('dummy', {}, {}, instances=instances)
+        check.run()
+        time.sleep(0.1)
+
+        # The stuck job is abandoned, the other instance keeps being checked
+        service_checks = self._run(check, 2)
+        self.assertTrue('stuck' in check.jobs_status)
+        self.assertEquals(set(sc['tags'][0] for sc in service_checks), set(['instance:fine']))
+        stats = network_checks.get_shared_pool().stats()
+        self.assertEquals(stats['clients']['dummy']['timeouts'], 1)
+
+        check.unstuck.set()
+        check.stop()
+        for _ in xrange(100):
+            if not network_checks.get_shared_pool().stats()['abandoned_workers']:
+                break
+            time.sleep(0.01)
+
+    def test_io_pool_metrics(self):
+        self.assertEquals(Collector._get_io_pool_metrics(None), [])
+
+        check = DummyNetworkCheck('dummy', {}, {}, instances=[{'name': 'fine', 'skip_event': True}])
+        self._run(check, 1)
+        check.stop()
+
+        metrics = Collector._get_io_pool_metrics(network_checks.get_shared_pool())
+        names = set(m[0] for m in metrics)
+        for name in ['saturation', 'workers', 'queued_jobs', 'queue_wait_time.avg', 'job_latency.max']:
+            self.assertTrue('datadog.agent.io_pool.%s' % name in names, names)
+        self.assertTrue(all(m[3]['tags'] == ['check:dummy'] for m in metrics if 'job_latency' in m[0]))
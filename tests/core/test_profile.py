@@ -0,0 +1,73 @@
+# stdlib
+import os
+import signal
+import tempfile
+import time
+import unittest
+
+# 3p
+import mock
+
+# project
+from utils.platform import Platform
+from utils.profile import SamplingProfiler
+
+
+def busy_loop(duration):
+    end = time.time() + duration
+    while time.time() < end:
+        sum(xrange(1000))
+
+
+class TestSamplingProfiler(unittest.TestCase):
+
+    def setUp(self):
+        if not SamplingProfiler.is_supported() or Platform.is_windows():
+            raise unittest.case.SkipTest("ITIMER_PROF is not supported")
+        fd, self.output_path = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.output_path)
+
+    def test_folded_stacks_dump(self):
+        profiler = SamplingProfiler(self.output_path, duration=0.3, interval=0.001)
+        self.assertTrue(profiler.start())
+        # Can't be started twice
+        self.assertFalse(profiler.start())
+
+        busy_loop(0.5)
+        # Nothing is dumped from the signal handler
+        self.assertTrue(profiler.is_running())
+        self.assertEquals(os.path.getsize(self.output_path), 0)
+        profiler.poll()
+        self.assertFalse(profiler.is_running())
+
+        with open(self.output_path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        for line in lines:
+            stack, count = line.rsplit(' ', 1)
+            self.assertTrue(int(count) > 0)
+        self.assertTrue(any('busy_loop' in line for line in lines))
+
+    def test_stop_before_deadline(self):
+        profiler = SamplingProfiler(self.output_path, duration=60, interval=0.001)
+        profiler.start()
+        busy_loop(0.05)
+        profiler.poll()
+        self.assertTrue(profiler.is_running())
+        profiler.stop()
+        self.assertFalse(profiler.is_running())
+        with open(self.output_path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(any('busy_loop' in line for line in lines), lines)
+
+    def test_system_calls_not_interrupted(self):
+        profiler = SamplingProfiler(self.output_path, duration=60, interval=0.001)
+        with mock.patch('utils.profile.signal.siginterrupt') as siginterrupt:
+            profiler.start()
+        try:
+            siginterrupt.assert_called_once_with(signal.SIGPROF, False)
+        finally:
+            profiler.stop()
@@ -0,0 +1,261 @@
+# (C) Datadog, Inc. 2010-2016
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+# stdlib
+import base64
+import BaseHTTPServer
+import json
+import SocketServer
+import threading
+import time
+import unittest
+import urlparse
+
+# project
+from utils.service_discovery.config_stores import get_config_store
+
+TEMPLATE_DIR = '/datadog/check_configs'
+
+REDIS_TEMPLATE = {
+    'check_names': '["redisdb"]',
+    'init_configs': '[{}]',
+    'instances': '[{"host": "%%host%%", "port": "%%port%%"}]',
+}
+NGINX_TEMPLATE = {
+    'check_names': '["nginx"]',
+    'init_configs': '[{}]',
+    'instances': '[{"nginx_status_url": "http://%%host%%/nginx_status/"}]',
+}
+
+
+class FakeKVHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """The reads of the etcd v2 and consul KV APIs, with their watches and blocking queries"""
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, content, index, status=200):
+        body = json.dumps(content)
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('X-Etcd-Index', str(index))
+        self.send_header('X-Consul-Index', str(index))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlparse.urlparse(self.path)
+        query = dict((k, v[0]) for k, v in urlparse.parse_qs(url.query).iteritems())
+        kv = self.server.kv
+
+        if url.path == '/v2/machines':
+            body = 'http://127.0.0.1:%s' % self.server.server_address[1]
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif url.path.startswith('/v2/keys/'):
+            self._etcd_read(kv, url.path[len('/v2/keys'):], query)
+        elif url.path.startswith('/v1/kv/'):
+            self._consul_read(kv, url.path[len('/v1/kv/'):], query)
+        else:
+            self._send_json({'message': 'page not found'}, kv.index, status=404)
+
+    def _etcd_read(self, kv, prefix, query):
+        if query.get('wait') == 'true':
+            kv.requests.append('watch')
+            index = kv.wait_for(int(query['waitIndex']) - 1)
+            if index is None:
+                return
+            self._send_json({'action': 'set', 'node': {'key': prefix, 'modifiedIndex': index}}, index)
+            return
+
+        kv.requests.append('read')
+        index, values = kv.read(prefix)
+        if prefix in values:
+            self._send_json({'action': 'get', 'node': {'key': prefix, 'value': values[prefix]}}, index)
+            return
+        if not values:
+            self._send_json({'errorCode': 100, 'message': 'Key not found', 'cause': prefix, 'index': index},
+                            index, status=404)
+            return
+        nodes = {}
+        for key, value in values.iteritems():
+            parent = nodes
+            parts = key[len(prefix):].strip('/').split('/')
+            for i, part in enumerate(parts[:-1]):
+                parent = parent.setdefault(part, {'key': '/'.join([prefix] + parts[:i + 1]), 'dir': True,
+                                                  'children': {}})['children']
+            parent[parts[-1]] = {'key': key, 'value': value, 'modifiedIndex': index}
+
+        def to_node(node):
+            if 'children' in node:
+                node['nodes'] = [to_node(child) for child in node.pop('children').values()]
+            return node
+        self._send_json({'action': 'get', 'node': to_node({'key': prefix, 'dir': True, 'children': nodes})}, index)
+
+    def _consul_read(self, kv, prefix, query):
+        if 'index' in query:
+            kv.requests.append('watch')
+            if kv.wait_for(int(query['index']), timeout=float(query.get('wait', '5s').rstrip('s'))) is None:
+                return
+        else:
+            kv.requests.append('read')
+        index, values = kv.read('/' + prefix)
+        if not values:
+            self._send_json(None, index, status=404)
+            return
+        if 'recurse' not in query:
+            values = {'/' + prefix: values['/' + prefix]}
+        self._send_json([{'Key': key.lstrip('/'), 'Value': base64.b64encode(value), 'ModifyIndex': index}
+                         for key, value in sorted(values.iteritems())], index)
+
+
+class FakeKVServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # The watches are cut when the test ends
+        pass
+
+
+class FakeKV(object):
+    """A key/value store served over HTTP like etcd and consul"""
+    def __init__(self):
+        self.values = {}
+        self.index = 10
+        self.requests = []
+        self.closing = False
+        self.changed = threading.Condition()
+
+        self.server = FakeKVServer(('127.0.0.1', 0), FakeKVHandler)
+        self.server.kv = self
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.port = self.server.server_address[1]
+
+    def put_template(self, identifier, template):
+        with self.changed:
+            for param, value in template.iteritems():
+                self.values['%s/%s/%s' % (TEMPLATE_DIR, identifier, param)] = value
+            self.index += 1
+            self.changed.notify_all()
+
+    def delete_template(self, identifier):
+        with self.changed:
+            for key in self.values.keys():
+                if key.startswith('%s/%s/' % (TEMPLATE_DIR, identifier)):
+                    del self.values[key]
+            self.index += 1
+            self.changed.notify_all()
+
+    def read(self, prefix):
+        with self.changed:
+            return self.index, dict((k, v) for k, v in self.values.iteritems()
+                                    if k == prefix or k.startswith(prefix + '/'))
+
+    def wait_for(self, index, timeout=None):
+        """Wait for a change after `index`, return the new index or None when closing"""
+        deadline = time.time() + (timeout or 60)
+        with self.changed:
+            while self.index <= index and not self.closing and time.time() < deadline:
+                self.changed.wait(0.05)
+            return None if self.closing else self.index
+
+    def close(self):
+        self.closing = True
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class ConfigStoreWatchTest(object):
+    """The templates watched on a fake backend, the tests are run for etcd and consul"""
+    BACKEND = None
+
+    def setUp(self):
+        self.kv = FakeKV()
+        self.kv.put_template('custom/redis', REDIS_TEMPLATE)
+        self.kv.put_template('docker.io/nginx:latest', NGINX_TEMPLATE)
+        self.agentConfig = {
+            'sd_config_backend': self.BACKEND,
+            'sd_template_dir': TEMPLATE_DIR,
+            'sd_backend_host': '127.0.0.1',
+            'sd_backend_port': self.kv.port,
+        }
+        self.store = get_config_store(self.agentConfig)
+        self.store.watch_timeout = 1
+
+    def tearDown(self):
+        self.store._drop()
+        self.kv.close()
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while True:
+            res = condition()
+            if res:
+                return res
+            if time.time() > deadline:
+                self.fail("Timed out waiting for the config store")
+            time.sleep(0.01)
+
+    def start_watcher(self):
+        self.assertFalse(self.store.crawl_config_template())
+        self.wait_for(lambda: self.store._templates is not None)
+
+    def test_reads_from_memory(self):
+        self.start_watcher()
+        reads = self.kv.requests.count('read')
+
+        for _ in range(3):
+            self.assertEquals(self.store.get_check_tpls('custom/redis'),
+                              [('redisdb', {}, {'host': '%%host%%', 'port': '%%port%%'})])
+            self.assertEquals(self.store.get_check_tpls('docker.io/nginx:latest')[0][0], 'nginx')
+            self.assertEquals(self.store.get_check_tpls('unknown'), [])
+        self.assertEquals(self.kv.requests.count('read'), reads)
+
+    def test_changed_checks(self):
+        self.start_watcher()
+
+        # Only the checks of the changed template
+        self.kv.put_template('custom/redis', dict(REDIS_TEMPLATE, instances='[{"host": "%%host%%"}]'))
+        self.assertEquals(self.wait_for(self.store.crawl_config_template), set(['redisdb']))
+        self.assertEquals(self.store.get_check_tpls('custom/redis'), [('redisdb', {}, {'host': '%%host%%'})])
+
+        # Of the old and new check names
+        self.kv.put_template('docker.io/nginx:latest', dict(NGINX_TEMPLATE, check_names='["nginx_plus"]'))
+        self.assertEquals(self.wait_for(self.store.crawl_config_template), set(['nginx', 'nginx_plus']))
+
+        self.kv.delete_template('custom/redis')
+        self.assertEquals(self.wait_for(self.store.crawl_config_template), set(['redisdb']))
+        self.assertEquals(self.store.get_check_tpls('custom/redis'), [])
+        self.assertFalse(self.store.crawl_config_template())
+
+    def test_watch_timeout(self):
+        self.start_watcher()
+        time.sleep(1.5)
+        self.assertFalse(self.store.crawl_config_template())
+        self.assertTrue(self.kv.requests.count('watch') >= 2)
+
+        self.kv.put_template('memcached', dict(REDIS_TEMPLATE, check_names='["mcache"]'))
+        self.assertEquals(self.wait_for(self.store.crawl_config_template), set(['mcache']))
+
+    def test_without_watch(self):
+        self.store._drop()
+        self.store = get_config_store(dict(self.agentConfig, sd_watch_templates=False))
+        self.assertFalse(self.store.crawl_config_template())
+        self.assertEquals(self.store.get_check_tpls('custom/redis')[0][0], 'redisdb')
+        self.assertTrue(self.store._templates is None)
+        self.assertEquals(self.kv.requests.count('watch'), 0)
+
+
+class TestEtcdStoreWatch(ConfigStoreWatchTest, unittest.TestCase):
+    BACKEND = 'etcd'
+
+
+class TestConsulStoreWatch(ConfigStoreWatchTest, unittest.TestCase):
+    BACKEND = 'consul'
@@ -1,10 +1,15 @@
+# stdlib
 import logging
+import os
+import shutil
 import subprocess
 import tempfile
 import unittest
 
 # 3p
+import mock
 from nose.plugins.attrib import attr
+from nose.plugins.skip import SkipTest
 
 
 # Don't run these tests on Windows because the temp file scheme used in them
@@ -70,3 +75,125 @@ class TestTail(unittest.TestCase):
             self.assertEquals(self.last_line, new_string[:-1], self.last_line)
         except OSError:
             "logrotate is not present"
+
+
+@attr('unix')
+class TestTailFile(unittest.TestCase):
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.log_dir, 'test.log')
+        self.log_file = open(self.log_path, 'w')
+        self.lines = []
+
+    def tearDown(self):
+        self.log_file.close()
+        shutil.rmtree(self.log_dir)
+
+    def _write(self, data):
+        self.log_file.write(data)
+        self.log_file.flush()
+
+    def _tail(self, **kwargs):
+        from utils.tailfile import TailFile
+        tail = TailFile(logging.getLogger(), self.log_path, self.lines.append, **kwargs)
+        return tail, tail.tail(line_by_line=False, move_end=True)
+
+    @staticmethod
+    def _open_fds():
+        return len(os.listdir('/proc/self/fd'))
+
+    def test_lines(self):
+        self._write("skipped\n")
+        tail, gen = self._tail()
+        gen.next()
+        self.assertEquals(self.lines, [])
+
+        # Incomplete lines are only read once complete
+        self._write("foo\nbar\nba")
+        gen.next()
+        self.assertEquals(self.lines, ['foo', 'bar'])
+        self._write("z\n")
+        gen.next()
+        self.assertEquals(self.lines, ['foo', 'bar', 'baz'])
+
+        # Large amounts of lines are read in chunks
+        tail.CHUNK_SIZE = 64
+        self._write("".join("line %s\n" % i for i in xrange(1000)))
+        gen.next()
+        self.assertEquals(self.lines[3:], ["line %s" % i for i in xrange(1000)])
+
+    def test_line_by_line(self):
+        from utils.tailfile import TailFile
+        tail = TailFile(logging.getLogger(), self.log_path, lambda l: self.lines.append(l) or True)
+        gen = tail.tail(line_by_line=True, move_end=True)
+        gen.next()
+        self._write("foo\nbar\n")
+        gen.next()
+        self.assertEquals(self.lines, ['foo'])
+        gen.next()
+        self.assertEquals(self.lines, ['foo', 'bar'])
+
+    def test_rename_rotation(self):
+        tail, gen = self._tail()
+        gen.next()
+        fds = self._open_fds()
+
+        self._write("before rotation\n")
+        os.rename(self.log_path, self.log_path + '.1')
+        self._write("written to the rotated file\n")
+        self.log_file.close()
+        self.log_file = open(self.log_path, 'w')
+        self._write("after rotation\n")
+
+        for _ in xrange(10):
+            gen.next()
+
+        self.assertEquals(self.lines, ['before rotation', 'written to the rotated file', 'after rotation'])
+        # Files are not reopened on each poll, nor leaked
+        self.assertEquals(self._open_fds(), fds)
+
+    def test_truncation(self):
+        self._write("a long line written before the truncation\n")
+        tail, gen = self._tail()
+        gen.next()
+
+        self.log_file.truncate(0)
+        self.log_file.seek(0)
+        self._write("after the truncation\n")
+        gen.next()
+        self.assertEquals(self.lines, ['after the truncation'])
+
+        # Truncated, then rewritten past the previous position (copytruncate)
+        self.log_file.truncate(0)
+        self.log_file.seek(0)
+        self._write("a much longer line written after another truncation\n")
+        gen.next()
+        self.assertEquals(self.lines, ['after the truncation', 'a much longer line written after another truncation'])
+
+    def test_inotify(self):
+        from utils.tailfile import InotifyWatch
+        if not InotifyWatch.is_supported():
+            raise SkipTest("inotify is not supported")
+
+        tail, gen = self._tail(use_inotify=True)
+        gen.next()
+        self.assertTrue(tail._watch is not None)
+
+        # Idle file: no poll
+        with mock.patch.object(tail, '_poll', return_value=iter([])) as poll:
+            gen.next()
+            self.assertFalse(poll.called)
+
+        self._write("foo\n")
+        gen.next()
+        self.assertEquals(self.lines, ['foo'])
+
+        os.rename(self.log_path, self.log_path + '.1')
+        self.log_file.close()
+        self.log_file = open(self.log_path, 'w')
+        self._write("bar\n")
+        gen.next()
+        gen.next()
+        self.assertEquals(self.lines, ['foo', 'bar'])
+        tail.close()
@@ -0,0 +1,129 @@
+# stdlib
+import threading
+import time
+import unittest
+
+# project
+from checks.libs.thread_pool import SharedPool, TimeoutError
+
+
+class TestSharedPool(unittest.TestCase):
+
+    def setUp(self):
+        self.pool = SharedPool(4, name="Test")
+        self.release = threading.Event()
+        self.lock = threading.Lock()
+        self.running = {}
+        self.max_running = {}
+
+    def tearDown(self):
+        self.release.set()
+
+    def _job(self, client):
+        with self.lock:
+            self.running[client] = self.running.get(client, 0) + 1
+            self.max_running[client] = max(self.max_running.get(client, 0), self.running[client])
+        self.release.wait(10)
+        with self.lock:
+            self.running[client] -= 1
+        return client
+
+    def _wait_running(self, count):
+        for _ in xrange(100):
+            if sum(self.running.values()) >= count:
+                return
+            time.sleep(0.01)
+
+    def test_results(self):
+        self.pool.register('a')
+        results = [self.pool.apply_async('a', lambda x: x * x, args=(i,)) for i in xrange(10)]
+        self.assertEquals([r.get(5) for r in results], [i * i for i in xrange(10)])
+
+        def fail():
+            raise ValueError("boom")
+
+        self.assertRaises(ValueError, self.pool.apply_async('a', fail).get, 5)
+        self.assertTrue(self.pool.get_nworkers() <= 4)
+
+    def test_quotas(self):
+        self.pool.register('a', quota=1)
+        self.pool.register('b')
+
+        results = [self.pool.apply_async(c, self._job, args=(c,)) for c in ['a'] * 3 + ['b'] * 6]
+        self._wait_running(4)
+
+        # 'a' is capped by its quota, 'b' gets the rest of the pool
+        self.assertEquals(self.running, {'a': 1, 'b': 3})
+        self.release.set()
+        self.assertEquals([r.get(5) for r in results], ['a'] * 3 + ['b'] * 6)
+        self.assertEquals(self.max_running['a'], 1)
+        self.assertEquals(self.pool.stats()['clients']['a']['jobs'], 3)
+
+    def test_fair_share(self):
+        self.pool.register('a')
+        self.pool.register('b')
+        self.pool.register('c', quota=1)
+
+        # Jobs queued while the workers are busy
+        for client, count in [('a', 6), ('b', 6), ('c', 2)]:
+            for _ in xrange(count):
+                self.pool._queues[client].append(client)
+        self.pool._running.update({'a': 4, 'b': 0, 'c': 0})
+
+        picked = []
+        for _ in xrange(4):
+            job = self.pool._next_job()
+            self.pool._running[job] += 1
+            picked.append(job)
+
+        # Fair shares of 4 // 3 == 1 worker, the next ones are lent to 'b'
+        # (not to 'c', capped by its quota, nor to 'a', over its share)
+        self.assertEquals(picked, ['b', 'c', 'a', 'b'])
+
+    def test_timeout(self):
+        self.pool.register('a')
+        stuck = self.pool.apply_async('a', self._job, args=('a',), timeout=0.05)
+        self._wait_running(1)
+        time.sleep(0.1)
+        self.pool.reap()
+
+        # Only the stuck job is abandoned, the pool keeps on working
+        self.assertRaises(TimeoutError, stuck.get, 0)
+        self.assertEquals(self.pool.apply_async('a', lambda: 42).get(5), 42)
+
+        stats = self.pool.stats()
+        self.assertEquals(stats['abandoned_workers'], 1)
+        self.assertEquals(stats['clients']['a']['timeouts'], 1)
+        self.assertEquals(stats['clients']['a']['jobs'], 1)
+
+        self.release.set()
+        for _ in xrange(100):
+            if not self.pool.stats()['abandoned_workers']:
+                break
+            time.sleep(0.01)
+        self.assertEquals(self.pool.stats()['abandoned_workers'], 0)
+
+    def test_stats(self):
+        self.pool.register('a', label='check_a')
+        self.pool.apply_async('a', time.sleep, args=(0.05,)).get(5)
+
+        stats = self.pool.stats()
+        self.assertEquals(stats['queued_jobs'], 0)
+        self.assertTrue(0 < stats['saturation'] <= 1)
+        client_stats = stats['clients']['check_a']
+        self.assertTrue(client_stats['job_latency.max'] >= 0.05)
+        self.assertTrue(client_stats['queue_wait_time.avg'] <= client_stats['job_latency.avg'])
+
+        # Stats are reset
+        self.assertEquals(self.pool.stats()['clients'], {})
+
+    def test_unregister(self):
+        self.pool.register('a', quota=1)
+        self.pool.apply_async('a', self._job, args=('a',))
+        queued = self.pool.apply_async('a', self._job, args=('a',))
+        self._wait_running(1)
+
+        self.pool.unregister('a')
+        self.release.set()
+        self.assertFalse(queued.wait(0.1))
+        self.assertRaises(ValueError, self.pool.apply_async, 'a', self._job)
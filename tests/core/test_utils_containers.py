@@ -0,0 +1,46 @@
+# stdlib
+import copy
+import pickle
+import unittest
+
+# project
+from utils.containers import freeze_read_only, hash_mutable, thaw
+
+
+class TestReadOnlyContainers(unittest.TestCase):
+
+    CONFIG = {
+        'host': 'localhost',
+        'tags': ['foo:bar'],
+        'metrics': [{'name': 'm', 'params': {'a': 1}}],
+    }
+
+    def test_reads(self):
+        frozen = freeze_read_only(self.CONFIG)
+        self.assertTrue(isinstance(frozen, dict))
+        self.assertEquals(frozen, self.CONFIG)
+        self.assertEquals(frozen.get('tags', []) + ['baz'], ['foo:bar', 'baz'])
+        self.assertEquals(frozen['metrics'][0]['params']['a'], 1)
+        self.assertEquals(hash_mutable(frozen), hash_mutable(self.CONFIG))
+
+    def test_writes(self):
+        frozen = freeze_read_only(self.CONFIG)
+        self.assertRaises(TypeError, frozen.__setitem__, 'host', 'remote')
+        self.assertRaises(TypeError, frozen.pop, 'host')
+        self.assertRaises(TypeError, frozen.update, {'host': 'remote'})
+        self.assertRaises(TypeError, frozen['tags'].append, 'baz')
+        self.assertRaises(TypeError, frozen['metrics'][0]['params'].setdefault, 'b', 2)
+
+        def iadd():
+            tags = frozen['tags']
+            tags += ['baz']
+        self.assertRaises(TypeError, iadd)
+
+    def test_copies(self):
+        frozen = freeze_read_only(self.CONFIG)
+        for mutable in [thaw(frozen), copy.deepcopy(frozen), pickle.loads(pickle.dumps(frozen))]:
+            self.assertEquals(mutable, self.CONFIG)
+            mutable['tags'].append('baz')
+            mutable['metrics'][0]['params']['b'] = 2
+
+        self.assertEquals(frozen, self.CONFIG)
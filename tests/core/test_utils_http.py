@@ -0,0 +1,230 @@
+# stdlib
+import BaseHTTPServer
+import SocketServer
+import threading
+import time
+import unittest
+
+# 3p
+import requests
+import simplejson as json
+
+# project
+from checks import AgentCheck
+from checks.network_checks import NetworkCheck, Status
+from utils.http import HTTPClient, iter_json_array
+
+
+def chunked(text, size):
+    return [text[i:i + size] for i in xrange(0, len(text), size)]
+
+
+class TestIterJsonArray(unittest.TestCase):
+    DOCUMENT = [
+        {'name': '/', 'stats': [{'cpu': {'usage': {'total': i}}} for i in range(60)]},
+        {'name': u'/docker/\xe9t\xe9', 'stats': []},
+        [1, 2.5, None, True, "a string, with ] and ["],
+        12345678,
+        -0.5e-3,
+        "\\",
+        None,
+    ]
+
+    def test_chunks(self):
+        text = json.dumps(self.DOCUMENT, indent=2)
+        for size in (1, 2, 7, 64, 1000, len(text)):
+            self.assertEquals(list(iter_json_array(chunked(text, size))), self.DOCUMENT)
+
+    def test_empty(self):
+        self.assertEquals(list(iter_json_array([' [ ', ' ]'])), [])
+
+    def test_lazy(self):
+        chunks = iter(chunked(json.dumps([{'a': 1}, {'b': 2}]) + 'garbage', 4))
+        elements = iter_json_array(chunks)
+        self.assertEquals(next(elements), {'a': 1})
+        self.assertTrue(next(chunks, None) is not None)
+
+    def test_invalid(self):
+        for text in ['', '{"a": 1}', '[1, 2', '[{"a": 1}', '[1 2]', '[{"a": }]']:
+            with self.assertRaises(ValueError):
+                list(iter_json_array(chunked(text, 3)))
+
+
+class StatsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """A JSON document with an ETag, served on keep-alive connections"""
+    protocol_version = 'HTTP/1.1'
+    # one write per response, or the client waits for the delayed ACK of the headers
+    wbufsize = -1
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.client_address, self.headers.get('If-None-Match')))
+        server.cookies.append(self.headers.get('Cookie'))
+        time.sleep(server.delay)
+        if self.path == '/missing':
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        etag = '"%s"' % server.version
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'version': server.version, 'path': self.path})
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if server.etags:
+            self.send_header('ETag', etag)
+        if self.path == '/login':
+            self.send_header('Set-Cookie', 'session=1; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class StatsServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class JSONCheck(AgentCheck):
+    def check(self, instance):
+        self.http_client(instance).get_json(instance['url'])
+
+
+class JSONNetworkCheck(NetworkCheck):
+    def _check(self, instance):
+        self.http_client(instance).get_json(instance['url'])
+        return Status.UP, "UP"
+
+    def report_as_service_check(self, sc_name, status, instance, msg=None):
+        self.service_check('test.can_connect', status)
+
+
+class TestHTTPClient(unittest.TestCase):
+    def setUp(self):
+        self.server = StatsServer(('127.0.0.1', 0), StatsHandler)
+        self.server.requests = []
+        self.server.cookies = []
+        self.server.version = 1
+        self.server.etags = True
+        self.server.delay = 0
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:%s' % self.server.server_address[1]
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_keep_alive(self):
+        client = HTTPClient()
+        for path in ['/a', '/b', '/a']:
+            self.assertEquals(client.get_json(self.url + path)['path'], path)
+        # all the requests on the same connection
+        self.assertEquals(len(set(address for address, _ in self.server.requests)), 1)
+
+    def test_conditional(self):
+        client = HTTPClient()
+        self.assertEquals(client.get_json(self.url, conditional=True)['version'], 1)
+        self.assertEquals(client.get_json(self.url, conditional=True)['version'], 1)
+        self.assertEquals([etag for _, etag in self.server.requests], [None, '"1"'])
+
+        self.server.version = 2
+        self.assertEquals(client.get_json(self.url, conditional=True)['version'], 2)
+        self.assertEquals(self.server.requests[-1][1], '"1"')
+
+        # Without validators, nothing is sent back
+        self.server.etags = False
+        self.server.version = 3
+        client.get_json(self.url, conditional=True)
+        client.get_json(self.url, conditional=True)
+        self.assertEquals([etag for _, etag in self.server.requests[-2:]], ['"2"', None])
+
+        # Not unless asked
+        client = HTTPClient()
+        self.server.etags = True
+        client.get(self.url)
+        client.get(self.url)
+        self.assertEquals(self.server.requests[-1][1], None)
+
+    def test_no_cookies(self):
+        client = HTTPClient()
+        r = client.get(self.url + '/login')
+        self.assertEquals(r.cookies['session'], '1')
+        client.get(self.url)
+        self.assertEquals(self.server.cookies, [None, None])
+        self.assertEquals(len(client.session.cookies), 0)
+
+    def test_stats(self):
+        client = HTTPClient()
+        self.assertTrue(client.pop_stats() is None)
+        client.get(self.url)
+        client.get(self.url)
+        stats = client.pop_stats()
+        self.assertEquals(stats['http_requests'], 2)
+        self.assertTrue(stats['http_time'] > 0)
+        self.assertTrue(client.pop_stats() is None)
+
+    def test_check_clients(self):
+        instances = [{'url': self.url + '/a'}, {'url': self.url + '/b'}]
+        check = JSONCheck('http_check', {}, {}, instances)
+        for _ in range(2):
+            statuses = check.run()
+            self.assertEquals([s.instance_check_stats['http_requests'] for s in statuses], [1, 1])
+
+        # one client per instance, kept across runs
+        self.assertEquals(len(check._http_clients), 2)
+        self.assertTrue(check.http_client(instances[0]) is check.http_client(instances[0]))
+        self.assertEquals(len(set(address for address, _ in self.server.requests)), 2)
+
+    def test_network_check_clients(self):
+        instances = [{'name': 'a', 'url': self.url + '/a', 'skip_event': True},
+                     {'name': 'b', 'url': self.url + '/b', 'skip_event': True}]
+        check = JSONNetworkCheck('http_check', {}, {}, instances)
+        counts = [0, 0]
+        try:
+            for _ in range(3):
+                statuses = check.run()
+                for i, status in enumerate(statuses):
+                    counts[i] += (status.instance_check_stats or {}).get('http_requests', 0)
+                deadline = time.time() + 5
+                while not all(r.ready() for r in check.jobs_results.values()) and time.time() < deadline:
+                    time.sleep(0.01)
+        finally:
+            check.stop()
+
+        # the requests are sent after the runs, each of them is counted for its own instance
+        for i, instance in enumerate(instances):
+            counts[i] += (check._pop_http_stats(instance) or {}).get('http_requests', 0)
+        self.assertEquals(counts, [3, 3])
+
+    def test_concurrent_map(self):
+        self.server.delay = 0.1
+        check = JSONCheck('http_check', {'max_concurrent_requests': 4}, {}, [{}])
+        client = check.http_client({}, pool_size=check.io_pool_size())
+        self.assertEquals(check.io_pool_size(), 4)
+
+        paths = ['/%s' % i for i in range(8)]
+        start = time.time()
+        documents = check.concurrent_map(client.get_json, [(self.url + path,) for path in paths], timeout=5)
+        elapsed = time.time() - start
+
+        # in order, 4 at a time on as many connections
+        self.assertEquals([document['path'] for document in documents], paths)
+        self.assertTrue(0.2 <= elapsed < 0.7, elapsed)
+        self.assertTrue(len(set(address for address, _ in self.server.requests)) <= 4)
+        self.assertEquals(check._pop_http_stats()['http_requests'], 8)
+
+        # the first error once all the calls returned
+        paths = ['/a', '/missing', '/b']
+        with self.assertRaises(requests.HTTPError):
+            check.concurrent_map(client.get_json, [(self.url + path,) for path in paths])
+        self.assertEquals(len(self.server.requests), 11)
+        check.stop()
@@ -0,0 +1,111 @@
+# stdlib
+import os
+import pwd
+import shutil
+import tempfile
+import time
+import unittest
+
+# 3p
+import mock
+from nose.plugins.attrib import attr
+
+# project
+from utils.procfs import ProcSnapshotter
+
+SYSCONF = {'SC_CLK_TCK': 100, 'SC_PAGE_SIZE': 4096}
+
+STAT_LINE = "{pid} ({name}) S 1 {pid} {pid} 34816 {pid} 4194560 100 0 0 0 {utime} 50 0 0 20 0 3 0 " \
+    "{starttime} 104857600 2560 18446744073709551615 1 1 0 0 0 0 0 4096 0 0 0 0 17 0 0 0 0 0 0"
+
+
+class FakeProc(object):
+    """
+    A /proc with the files the snapshots read
+    """
+
+    def __init__(self, boot_time):
+        self.path = tempfile.mkdtemp()
+        self._write('stat', "cpu  1 0 1 1 0 0 0 0 0 0\nbtime %s\n" % boot_time)
+        self._write('uptime', "110.00 400.00\n")
+        self._write('meminfo', "MemTotal:        1024000 kB\nMemFree:          512000 kB\n")
+
+    def _write(self, path, content):
+        with open(os.path.join(self.path, path), 'w') as f:
+            f.write(content)
+
+    def add(self, pid, name, cmdline, utime=250, starttime=1000):
+        if not os.path.isdir(os.path.join(self.path, str(pid))):
+            os.mkdir(os.path.join(self.path, str(pid)))
+        self._write(os.path.join(str(pid), 'stat'),
+                    STAT_LINE.format(pid=pid, name=name, utime=utime, starttime=starttime))
+        self._write(os.path.join(str(pid), 'cmdline'), ''.join(arg + '\0' for arg in cmdline))
+
+    def add_file(self, pid, name, content):
+        self._write(os.path.join(str(pid), name), content)
+
+    def remove(self, pid):
+        shutil.rmtree(os.path.join(self.path, str(pid)))
+
+    def close(self):
+        shutil.rmtree(self.path)
+
+
+@attr('unix')
+class TestProcSnapshotter(unittest.TestCase):
+
+    def setUp(self):
+        self.proc = FakeProc(int(time.time()) - 3600)
+        self.sysconf_patch = mock.patch('utils.procfs.os.sysconf', side_effect=SYSCONF.get)
+        self.sysconf_patch.start()
+
+    def tearDown(self):
+        self.sysconf_patch.stop()
+        self.proc.close()
+
+    def test_snapshot(self):
+        self.proc.add(42, 'my (app)', ['/usr/bin/app', '--flag'])
+        self.proc.add(2, 'kthreadd', [])
+        snapshotter = ProcSnapshotter(self.proc.path)
+
+        processes = snapshotter.snapshot()
+        self.assertEquals([p.pid for p in processes], [2, 42])
+        app = processes[1]
+        self.assertEquals(app.name, 'my (app)')
+        self.assertEquals(app.cmdline, ['/usr/bin/app', '--flag'])
+        self.assertEquals(processes[0].cmdline, [])
+        self.assertEquals(app.user, pwd.getpwuid(os.getuid()).pw_name)
+        self.assertEquals((app.utime, app.stime, app.num_threads, app.starttime), (250, 50, 3, 1000))
+        self.assertEquals((app.vsize, app.rss), (104857600, 2560 * 4096))
+        self.assertEquals((app.minflt, app.cminflt, app.majflt, app.cmajflt), (100, 0, 0, 0))
+        self.assertEquals(app.recent_cpu, 300)
+
+        self.assertEquals(snapshotter.get_uptime(), 110.0)
+        self.assertEquals(snapshotter.get_mem_total(), 1024000)
+
+    def test_static_data_cache(self):
+        """
+        The user and command line of a process are only read when it's first seen
+        """
+        self.proc.add(42, 'app', ['/usr/bin/app'])
+        snapshotter = ProcSnapshotter(self.proc.path)
+        snapshotter.snapshot()
+
+        # Same process, later on
+        self.proc.add(42, 'app', ['/usr/bin/app', 'changed'], utime=350)
+        with mock.patch('utils.procfs.os.stat') as stat:
+            app = snapshotter.snapshot()[0]
+            self.assertFalse(stat.called)
+        self.assertEquals(app.cmdline, ['/usr/bin/app'])
+        self.assertEquals(app.recent_cpu, 100)
+
+        # The pid is reused by another process
+        self.proc.add(42, 'other', ['/usr/bin/other'], starttime=2000)
+        app = snapshotter.snapshot()[0]
+        self.assertEquals(app.cmdline, ['/usr/bin/other'])
+        self.assertEquals(app.recent_cpu, 300)
+
+        # Exited processes are forgotten
+        self.proc.remove(42)
+        self.assertEquals(snapshotter.snapshot(), [])
+        self.assertEquals(snapshotter._static, {})
@@ -263,27 +263,14 @@ class GCE(object):
             GCE.metadata = {}
             return GCE.metadata
 
-        socket_to = None
-        try:
-            socket_to = socket.getdefaulttimeout()
-            socket.setdefaulttimeout(GCE.TIMEOUT)
-        except Exception:
-            pass
-
         try:
             opener = urllib2.build_opener()
             opener.addheaders = [('X-Google-Metadata-Request','True')]
-            GCE.metadata = json.loads(opener.open(GCE.URL).read().strip())
+            GCE.metadata = json.loads(opener.open(GCE.URL, timeout=GCE.TIMEOUT).read().strip())
 
         except Exception:
             GCE.metadata = {}
 
-        try:
-            if socket_to is None:
-                socket_to = 3
-            socket.setdefaulttimeout(socket_to)
-        except Exception:
-            pass
         return GCE.metadata
 
 
@@ -361,7 +348,8 @@ class EC2(object):
         Raise `NoIAMRole` when unavailable.
         """
         try:
-            return urllib2.urlopen(EC2.METADATA_URL_BASE + "/iam/security-credentials/").read().strip()
+            return urllib2.urlopen(EC2.METADATA_URL_BASE + "/iam/security-credentials/",
+                                   timeout=EC2.TIMEOUT).read().strip()
         except urllib2.HTTPError as err:
             if err.code == 404:
                 raise EC2.NoIAMRole()
@@ -377,17 +365,11 @@ class EC2(object):
             return []
 
         EC2_tags = []
-        socket_to = None
-        try:
-            socket_to = socket.getdefaulttimeout()
-            socket.setdefaulttimeout(EC2.TIMEOUT)
-        except Exception:
-            pass
-
         try:
             iam_role = EC2.get_iam_role()
-            iam_params = json.loads(urllib2.urlopen(EC2.METADATA_URL_BASE + "/iam/security-credentials/" + unicode(iam_role)).read().strip())
-            instance_identity = json.loads(urllib2.urlopen(EC2.INSTANCE_IDENTITY_URL).read().strip())
+            iam_params = json.loads(urllib2.urlopen(EC2.METADATA_URL_BASE + "/iam/security-credentials/" + unicode(iam_role),
+                                                    timeout=EC2.TIMEOUT).read().strip())
+            instance_identity = json.loads(urllib2.urlopen(EC2.INSTANCE_IDENTITY_URL, timeout=EC2.TIMEOUT).read().strip())
             region = instance_identity['region']
 
             import boto.ec2
@@ -415,13 +397,6 @@ class EC2(object):
         except Exception:
             log.exception("Problem retrieving custom EC2 tags")
 
-        try:
-            if socket_to is None:
-                socket_to = 3
-            socket.setdefaulttimeout(socket_to)
-        except Exception:
-            pass
-
         return EC2_tags
 
     @staticmethod
@@ -437,35 +412,21 @@ class EC2(object):
         # 'i-deadbeef'
 
         # Every call may add TIMEOUT seconds in latency so don't abuse this call
-        # python 2.4 does not support an explicit timeout argument so force it here
-        # Rather than monkey-patching urllib2, just lower the timeout globally for these calls
+        # The timeout is given to each request: the default timeout of the sockets
+        # is shared with the other threads (checks, host metadata refresh)
 
         if not agentConfig['collect_instance_metadata']:
             log.info("Instance metadata collection is disabled. Not collecting it.")
             return {}
 
-        socket_to = None
-        try:
-            socket_to = socket.getdefaulttimeout()
-            socket.setdefaulttimeout(EC2.TIMEOUT)
-        except Exception:
-            pass
-
         for k in ('instance-id', 'hostname', 'local-hostname', 'public-hostname', 'ami-id', 'local-ipv4', 'public-keys/', 'public-ipv4', 'reservation-id', 'security-groups'):
             try:
-                v = urllib2.urlopen(EC2.METADATA_URL_BASE + "/" + unicode(k)).read().strip()
+                v = urllib2.urlopen(EC2.METADATA_URL_BASE + "/" + unicode(k), timeout=EC2.TIMEOUT).read().strip()
                 assert type(v) in (types.StringType, types.UnicodeType) and len(v) > 0, "%s is not a string" % v
                 EC2.metadata[k.rstrip('/')] = v
             except Exception:
                 pass
 
-        try:
-            if socket_to is None:
-                socket_to = 3
-            socket.setdefaulttimeout(socket_to)
-        except Exception:
-            pass
-
         return EC2.metadata
 
     @staticmethod
@@ -17,3 +17,69 @@ def freeze(o):
 
 def hash_mutable(m):
     return hash(freeze(m))
+
+
+def _read_only(*args, **kwargs):
+    raise TypeError("This object is read-only. Copy it (e.g. with `copy.deepcopy`) to modify it.")
+
+
+class ReadOnlyDict(dict):
+    """
+    A dictionary that can't be modified. It is still a `dict`, so reads are as cheap
+    as with a regular dictionary. Copies are regular (mutable) dictionaries.
+    """
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+class ReadOnlyList(list):
+    """
+    A list that can't be modified. It is still a `list`, so it can be read, sliced and
+    concatenated as usual: slices and concatenations are regular (mutable) lists.
+    """
+    __setitem__ = __delitem__ = __setslice__ = __delslice__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = reverse = sort = _read_only
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return (list, (list(self),))
+
+
+def freeze_read_only(o):
+    """
+    Recursively turn the dictionaries and lists of `o` into read-only ones.
+    Unlike `freeze`, the result can be used wherever a dict or a list is expected.
+    """
+    if isinstance(o, dict):
+        return ReadOnlyDict((k, freeze_read_only(v)) for k, v in o.iteritems())
+
+    if isinstance(o, list):
+        return ReadOnlyList(freeze_read_only(v) for v in o)
+
+    return o
+
+
+def thaw(o):
+    """
+    Return a mutable deep copy of an object frozen with `freeze_read_only`.
+    """
+    if isinstance(o, dict):
+        return dict((k, thaw(v)) for k, v in o.iteritems())
+
+    if isinstance(o, list):
+        return [thaw(v) for v in o]
+
+    return o
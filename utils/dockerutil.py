@@ -5,6 +5,8 @@
 # stdlib
 import logging
 import os
+import re
+import threading
 import time
 
 # 3rd party
@@ -23,10 +25,295 @@ DEFAULT_TIMEOUT = 5
 DEFAULT_VERSION = 'auto'
 CHECK_NAME = 'docker_daemon'
 CONFIG_RELOAD_STATUS = ['start', 'die', 'stop', 'kill']  # used to trigger service discovery
+CONTAINER_ID_RE = re.compile('[0-9a-f]{64}')
+CPUACCT_CGROUPS = ('cpu,cpuacct', 'cpuacct,cpu', 'cpuacct')
+DEFAULT_INVENTORY_RESYNC_INTERVAL = 300
+INVENTORY_RETRY_INTERVAL = 5
+# Container events after which the inventory lists the container again
+INVENTORY_REFRESH_EVENTS = frozenset(['create', 'start', 'restart', 'die', 'stop', 'kill', 'oom',
+                                      'pause', 'unpause', 'rename', 'update'])
 
 log = logging.getLogger(__name__)
 
 
+class ContainerPidIndex(object):
+    """
+    One pid of each running container, kept between runs as long as it's
+    alive and in that container (its cgroup is read again at every update, a
+    pid may be reused by another process). The pid of a new container is taken from the Docker API when
+    given, or else found by crawling /proc: the containers of the processes
+    are kept as well, so that only the processes started since the last
+    crawl have their cgroup file read. The Docker API is asked once per
+    container, its answers being kept until the container is gone.
+    """
+
+    def __init__(self, proc_path):
+        self.proc_path = proc_path
+        # container id -> pid
+        self._container_pids = {}
+        # container id -> pid given by the Docker API, None when it gave none or
+        # the process isn't in proc_path (e.g. another pid namespace)
+        self._api_pids = {}
+        # pid -> container id (None if not in a container), for the pids crawled
+        self._pid_containers = {}
+        # Whether the last crawl found no process at all (/proc not shared)
+        self.empty_proc = False
+
+    def _runs_in(self, pid, container_id):
+        """Whether a process is alive and in a container"""
+        try:
+            return self._read_container_id(pid) == container_id
+        except IOError:
+            return False
+
+    def _read_container_id(self, pid):
+        """Container of a process, from its cpuacct cgroup"""
+        with open(os.path.join(self.proc_path, pid, 'cgroup'), 'r') as f:
+            for line in f:
+                fields = line.strip().split(':')
+                if len(fields) > 2 and fields[1] in CPUACCT_CGROUPS and 'docker' in fields[2]:
+                    matches = CONTAINER_ID_RE.findall(fields[2])
+                    if matches:
+                        return matches[-1]
+                    return None
+        return None
+
+    def _crawl(self):
+        """
+        Update the containers of the processes, reading the cgroups of the new
+        ones. Return the pids read.
+        """
+        pids = [entry for entry in os.listdir(self.proc_path) if entry.isdigit()]
+        self.empty_proc = not pids
+
+        alive = set(pids)
+        for pid in self._pid_containers.keys():
+            if pid not in alive:
+                del self._pid_containers[pid]
+
+        read = set()
+        for pid in pids:
+            if pid in self._pid_containers:
+                continue
+            try:
+                self._pid_containers[pid] = self._read_container_id(pid)
+                read.add(pid)
+            except IOError as e:
+                #  Issue #2074
+                log.debug("Cannot read the cgroup of process %s, it likely raced to finish: %s", pid, e)
+        return read
+
+    def update(self, container_ids, get_pid=None):
+        """
+        Return the {container id: pid} of the containers `container_ids`.
+        `get_pid(container_id)` gives the pid of a container from the Docker
+        API (its State.Pid), /proc is only crawled if some are still unknown.
+        It's only called for the containers it wasn't asked about yet.
+        """
+        self.empty_proc = False
+        container_ids = set(container_ids)
+        for container_id in self._api_pids.keys():
+            if container_id not in container_ids:
+                del self._api_pids[container_id]
+        for container_id, pid in self._container_pids.items():
+            if container_id not in container_ids or not self._runs_in(pid, container_id):
+                del self._container_pids[container_id]
+                if self._api_pids.get(container_id) == pid:
+                    # Restarted: its new pid is asked
+                    del self._api_pids[container_id]
+
+        unknown = container_ids.difference(self._container_pids)
+        if unknown and get_pid is not None:
+            for container_id in list(unknown):
+                if container_id not in self._api_pids:
+                    pid = get_pid(container_id)
+                    self._api_pids[container_id] = \
+                        str(pid) if pid and self._runs_in(str(pid), container_id) else None
+                pid = self._api_pids[container_id]
+                if pid is not None:
+                    self._container_pids[container_id] = pid
+                    unknown.discard(container_id)
+
+        if unknown:
+            read = self._crawl()
+            for pid, container_id in self._pid_containers.items():
+                if container_id in unknown:
+                    if pid not in read and not self._runs_in(pid, container_id):
+                        # Reused since it was crawled, read again at the next crawl
+                        del self._pid_containers[pid]
+                        continue
+                    self._container_pids[container_id] = pid
+                    unknown.discard(container_id)
+                    if not unknown:
+                        break
+
+        return dict(self._container_pids)
+
+
+class ContainerInventory(object):
+    """
+    The containers of the host, as listed by `containers(all=True)`, and
+    their inspect results, shared by the Docker check and service discovery.
+
+    A full listing loads it, then a background thread follows the Docker
+    events stream: only the container an event is about is listed again,
+    and its inspect result dropped. All the containers are listed again
+    every `resync_interval` seconds, to catch what the events missed.
+
+    Entries are replaced, never updated in place: what is derived from an
+    entry (like its tags) stays valid as long as the same entry is returned.
+    """
+
+    def __init__(self, settings, resync_interval=DEFAULT_INVENTORY_RESYNC_INTERVAL):
+        self.settings = settings
+        self.resync_interval = resync_interval
+        self._lock = threading.Lock()
+        # container id -> entry of `containers(all=True)`
+        self._containers = {}
+        # container id -> inspect result
+        self._inspects = {}
+        # Incremented at each change, so that a stale inspect result isn't cached
+        self._version = 0
+        self._synced_at = None
+        self._events_since = None
+        self._client = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def is_running(container):
+        return container["Status"].startswith("Up") or container["Status"].startswith("Restarting")
+
+    def _get_client(self):
+        if self._client is None:
+            self._client = Client(**self.settings)
+        return self._client
+
+    def start(self):
+        if self._thread is None:
+            # A new event each time: a stopped thread may still be waiting for the stream
+            self._stop = threading.Event()
+            self._thread = threading.Thread(target=self._follow_events, args=(self._stop,),
+                                            name='docker-inventory')
+            self._thread.daemon = True
+            self._thread.start()
+
+    def stop(self):
+        """Stop following the events, the thread exits at the next one (or timeout)"""
+        self._stop.set()
+        self._thread = None
+        if self._client is not None:
+            self._client.close()
+
+    def resync(self):
+        """List all the containers again"""
+        synced_at = int(time.time())
+        containers = dict((c['Id'], c) for c in self._get_client().containers(all=True))
+        with self._lock:
+            for container_id in self._inspects.keys():
+                if _strip_status(containers.get(container_id)) != _strip_status(self._containers.get(container_id)):
+                    del self._inspects[container_id]
+            self._containers = containers
+            self._version += 1
+            self._synced_at = synced_at
+            if self._events_since is None:
+                self._events_since = synced_at
+
+    def refresh(self, container_id):
+        """List one container again, after an event about it"""
+        containers = self._get_client().containers(all=True, filters={'id': container_id})
+        # The filter matches id prefixes
+        entry = next((c for c in containers if c['Id'] == container_id), None)
+        with self._lock:
+            self._inspects.pop(container_id, None)
+            if entry is None:
+                self._containers.pop(container_id, None)
+            else:
+                self._containers[container_id] = entry
+            self._version += 1
+
+    def handle_event(self, event):
+        if not isinstance(event, dict):
+            # See DockerUtil.get_events
+            log.debug('Unable to parse Docker event: %s', event)
+            return
+        self._events_since = event.get('time', self._events_since)
+        if event.get('Type', 'container') != 'container':
+            return
+        container_id = event.get('id')
+        status = event.get('status') or event.get('Action')
+        if not container_id or not CONTAINER_ID_RE.match(container_id):
+            return
+        if status == 'destroy':
+            with self._lock:
+                self._containers.pop(container_id, None)
+                self._inspects.pop(container_id, None)
+                self._version += 1
+        elif status in INVENTORY_REFRESH_EVENTS:
+            self.refresh(container_id)
+
+    def _resync_due(self):
+        return self._synced_at is None or time.time() - self._synced_at >= self.resync_interval
+
+    def _follow_events(self, stop):
+        # The events stream is read with a timeout of the resync interval, so that
+        # an idle stream doesn't delay the next resync
+        settings = dict(self.settings, timeout=self.resync_interval)
+        events_client = Client(**settings)
+        try:
+            while not stop.is_set():
+                try:
+                    if self._resync_due():
+                        self.resync()
+                    for event in events_client.events(since=self._events_since, decode=True):
+                        if stop.is_set():
+                            return
+                        self.handle_event(event)
+                        if self._resync_due():
+                            break
+                    else:
+                        # The stream ended, Docker may be restarting
+                        stop.wait(INVENTORY_RETRY_INTERVAL)
+                except Exception as e:
+                    log.debug("Error while following the Docker events, retrying in %ss: %s",
+                              INVENTORY_RETRY_INTERVAL, e)
+                    stop.wait(INVENTORY_RETRY_INTERVAL)
+        finally:
+            events_client.close()
+
+    def containers(self, running=False):
+        """
+        The entries of `containers(all=True)`, or of the running containers
+        only. The first call lists them if the thread didn't yet.
+        """
+        if self._synced_at is None:
+            self.resync()
+        with self._lock:
+            containers = self._containers.values()
+        if running:
+            return [c for c in containers if self.is_running(c)]
+        return containers
+
+    def inspect(self, container_id):
+        """`inspect_container` result, from the cache if the container didn't change since"""
+        with self._lock:
+            inspect = self._inspects.get(container_id)
+            version = self._version
+        if inspect is None:
+            inspect = self._get_client().inspect_container(container_id)
+            with self._lock:
+                if self._version == version and container_id in self._containers:
+                    self._inspects[container_id] = inspect
+        return inspect
+
+
+def _strip_status(container):
+    """A container entry without its Status text, which changes with its uptime"""
+    if container is None:
+        return None
+    return dict((k, v) for k, v in container.iteritems() if k != 'Status' and not k.startswith('_'))
+
+
 class DockerUtil:
     __metaclass__ = Singleton
 
@@ -34,6 +321,7 @@ class DockerUtil:
 
     def __init__(self, **kwargs):
         self._docker_root = None
+        self._inventory = None
         self.events = []
 
         if 'init_config' in kwargs and 'instance' in kwargs:
@@ -122,9 +410,26 @@ class DockerUtil:
     def client(self):
         return Client(**self.settings)
 
+    def get_inventory(self):
+        """The container inventory, started at the first call, None if it's disabled"""
+        if not self._inventory_enabled:
+            return None
+        if self._inventory is None:
+            self._inventory = ContainerInventory(self.settings, self._inventory_resync_interval)
+            self._inventory.start()
+        return self._inventory
+
     def set_docker_settings(self, init_config, instance):
         """Update docker settings"""
+        from config import _is_affirmative
         self._docker_root = init_config.get('docker_root', '/')
+        self._inventory_enabled = _is_affirmative(init_config.get('container_inventory', False))
+        self._inventory_resync_interval = int(init_config.get(
+            'inventory_resync_interval', DEFAULT_INVENTORY_RESYNC_INTERVAL))
+        if self._inventory is not None:
+            # It uses the previous settings
+            self._inventory.stop()
+            self._inventory = None
         self.settings = {
             "version": init_config.get('api_version', DEFAULT_VERSION),
             "base_url": instance.get("url", ''),
@@ -182,6 +487,26 @@ class DockerUtil:
                 return os.path.join(self._docker_root, candidate)
             raise Exception("Can't find mounted %s cgroups." % hierarchy)
 
+    def find_cgroup2(self):
+        """Mount point of the cgroup v2 unified hierarchy, None if it isn't mounted."""
+        with open(os.path.join(self._docker_root, "/proc/mounts"), 'r') as fp:
+            mounts = map(lambda x: x.split(), fp.read().splitlines())
+        for mount in mounts:
+            if len(mount) > 2 and mount[2] == "cgroup2" and os.path.exists(mount[1]):
+                return os.path.join(self._docker_root, mount[1])
+        return None
+
+    @classmethod
+    def find_cgroup2_path(cls, mountpoint, container_id):
+        """Directory of a container in the cgroup v2 unified hierarchy."""
+        for path in (os.path.join(mountpoint, "system.slice", "docker-%s.scope" % container_id),
+                     os.path.join(mountpoint, "docker", container_id),
+                     os.path.join(mountpoint, container_id)):
+            if os.path.isdir(path):
+                return path
+
+        raise MountException("Cannot find the cgroup v2 directory of container %s." % container_id[:12])
+
     @classmethod
     def find_cgroup_filename_pattern(cls, mountpoints, container_id):
         # We try with different cgroups so that it works even if only one is properly working
@@ -247,4 +572,6 @@ class DockerUtil:
     @classmethod
     def _drop(cls):
         if cls in cls._instances:
+            if cls._instances[cls]._inventory is not None:
+                cls._instances[cls]._inventory.stop()
             del cls._instances[cls]
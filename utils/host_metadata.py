@@ -0,0 +1,183 @@
+# (C) Datadog, Inc. 2010-2016
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+# stdlib
+import logging
+import os
+import tempfile
+import threading
+import time
+
+# 3p
+import simplejson as json
+
+# project
+from utils.pidfile import PidFile
+
+log = logging.getLogger(__name__)
+
+# Delay before retrying a source that failed, if shorter than its TTL
+RETRY_INTERVAL = 60
+CACHE_FILE_NAME = 'host_metadata.json'
+
+
+class MetadataRefresher(object):
+    """
+    Refresh host metadata sources in a background thread, so that the
+    collector only has to read their latest snapshot.
+
+    Each source is a function called again once its TTL has expired. A
+    source failing keeps its previous snapshot and is retried later.
+    Snapshots of the persistent sources are written to an on-disk cache,
+    and loaded back when the agent restarts with the same `cache_key`
+    (e.g. the hostname the metadata is collected for).
+    """
+
+    def __init__(self, cache_key=None, cache_path=None):
+        self._cache_key = cache_key
+        self._cache_path = cache_path or self._get_cache_path()
+        self._sources = {}
+        self._snapshots = {}
+        self._next_refresh = {}
+        self._failed = set()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._load_cache()
+
+    @staticmethod
+    def _get_cache_path():
+        return os.path.join(PidFile.get_dir(), CACHE_FILE_NAME)
+
+    def register(self, name, func, ttl, persist=True):
+        """
+        Register the `func` source under `name`, to be refreshed every `ttl` seconds.
+        """
+        with self._lock:
+            self._sources[name] = {'func': func, 'ttl': ttl, 'persist': persist}
+            snapshot = self._snapshots.get(name)
+            if snapshot is None or not persist:
+                self._snapshots.pop(name, None)
+                self._next_refresh[name] = 0
+            else:
+                self._next_refresh[name] = snapshot['timestamp'] + ttl
+
+    def get(self, name, default=None):
+        """
+        Return the latest snapshot of a source, or `default` if it was never collected.
+        """
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            return default
+        return snapshot['value']
+
+    def get_timestamp(self, name):
+        """
+        Return the time of the latest snapshot of a source, None if it was never collected.
+        """
+        snapshot = self._snapshots.get(name)
+        if snapshot is None:
+            return None
+        return snapshot['timestamp']
+
+    def is_ready(self, *names):
+        """
+        Return whether all the given sources have been collected, or tried to be.
+        """
+        return all(name in self._snapshots or name in self._failed for name in names)
+
+    def refresh(self, force=False):
+        """
+        Refresh the sources whose TTL has expired, or all of them if `force`.
+        Return the time at which the next source has to be refreshed.
+        """
+        now = time.time()
+        with self._lock:
+            due = [name for name, next_refresh in self._next_refresh.iteritems()
+                   if force or next_refresh <= now]
+            sources = dict((name, self._sources[name]) for name in due)
+
+        refreshed = False
+        for name, source in sources.iteritems():
+            if self._stop.is_set():
+                break
+            try:
+                value = source['func']()
+            except Exception:
+                log.exception("Unable to collect the %s host metadata", name)
+                retry = min(source['ttl'], RETRY_INTERVAL)
+                with self._lock:
+                    self._failed.add(name)
+                    self._next_refresh[name] = time.time() + retry
+                continue
+
+            now = time.time()
+            with self._lock:
+                self._failed.discard(name)
+                self._snapshots[name] = {'value': value, 'timestamp': now}
+                self._next_refresh[name] = now + source['ttl']
+            refreshed = refreshed or source['persist']
+
+        if refreshed:
+            self._save_cache()
+
+        with self._lock:
+            return min(self._next_refresh.itervalues()) if self._next_refresh else None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="MetadataRefresher")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(1)
+            self._thread = None
+
+    def is_running(self):
+        return self._thread is not None
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                next_refresh = self.refresh()
+            except Exception:
+                log.exception("Error refreshing the host metadata")
+                next_refresh = None
+
+            delay = RETRY_INTERVAL if next_refresh is None else next_refresh - time.time()
+            self._stop.wait(max(delay, 1))
+
+    def _load_cache(self):
+        try:
+            with open(self._cache_path) as f:
+                cache = json.load(f)
+            if cache.get('key') != self._cache_key:
+                log.debug("Ignoring the host metadata cache of %s", cache.get('key'))
+                return
+            self._snapshots = cache['snapshots']
+            log.debug("Loaded host metadata cache from %s", self._cache_path)
+        except IOError:
+            pass
+        except Exception:
+            log.warning("Unable to load the host metadata cache from %s", self._cache_path,
+                        exc_info=True)
+
+    def _save_cache(self):
+        with self._lock:
+            snapshots = dict((name, snapshot) for name, snapshot in self._snapshots.iteritems()
+                             if name in self._sources and self._sources[name]['persist'])
+        try:
+            # Write to a temporary file first, so that a partial cache is never loaded
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self._cache_path))
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'key': self._cache_key, 'snapshots': snapshots}, f)
+            os.rename(tmp_path, self._cache_path)
+        except Exception:
+            log.warning("Unable to persist the host metadata cache to %s", self._cache_path,
+                        exc_info=True)
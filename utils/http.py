@@ -2,13 +2,203 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 
+# stdlib
+import cookielib
+import logging
+import re
+import threading
+import timeit
+
+# 3p
 import requests
+import simplejson as json
+
 
+log = logging.getLogger(__name__)
 
 DEFAULT_TIMEOUT = 10
+JSON_CHUNK_SIZE = 65536
+
+WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+
+class NoCookiesPolicy(cookielib.DefaultCookiePolicy):
+    """Store no cookie: each run of a check sends the same requests"""
+    def set_ok(self, cookie, request):
+        return False
+
+
+class HTTPClient(object):
+    """
+    The HTTP requests of a check instance, sent on a `requests` session kept
+    across runs: its keep-alive connections are reused instead of paying the
+    DNS, TCP and TLS setup of each URL at every run.
+
+    `timeout`, `verify`, `cert`, `auth`, `headers` and `proxies` are the
+    defaults of every request, each of them can be overriden per request. The
+    proxies of the environment are used unless `trust_env` is False. The
+    requests sent from several threads at once need a `pool_size` of as many
+    connections per host.
+
+    The cookies set by the servers are not kept from one request to the next,
+    as with a new session per request (they still follow the redirects).
+
+    The time spent in requests is recorded, see `pop_stats`.
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, verify=True, cert=None, auth=None,
+                 headers=None, proxies=None, trust_env=True, pool_size=None):
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.verify = verify
+        self.session.cert = cert
+        self.session.auth = auth
+        self.session.trust_env = trust_env
+        self.session.cookies.set_policy(NoCookiesPolicy())
+        if headers:
+            self.session.headers.update(headers)
+        if proxies:
+            self.session.proxies.update(proxies)
+        if pool_size:
+            adapter = requests.adapters.HTTPAdapter(pool_maxsize=pool_size)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+
+        # url -> (validators, response) of the conditional requests
+        self._validated = {}
+        self.request_count = 0
+        self.request_time = 0.0
+        self._stats_lock = threading.Lock()
+
+    def _send(self, send, url, kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        start = timeit.default_timer()
+        try:
+            return send(url, **kwargs)
+        finally:
+            elapsed = timeit.default_timer() - start
+            with self._stats_lock:
+                self.request_count += 1
+                self.request_time += elapsed
+            log.debug("%s took %.3fs", url, elapsed)
 
+    def get(self, url, conditional=False, **kwargs):
+        """
+        GET `url`. When `conditional` is True, the ETag and Last-Modified of the
+        previous response are sent back, and that response is returned again if
+        the server replies it's not modified (304).
+        """
+        if not conditional:
+            return self._send(self.session.get, url, kwargs)
 
-def retrieve_json(url, timeout=DEFAULT_TIMEOUT):
-    r = requests.get(url, timeout=timeout)
+        validators, previous = self._validated.get(url, ({}, None))
+        if validators:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **validators)
+        r = self._send(self.session.get, url, kwargs)
+        if r.status_code == 304 and previous is not None:
+            return previous
+
+        validators = {}
+        if r.headers.get('ETag'):
+            validators['If-None-Match'] = r.headers['ETag']
+        if r.headers.get('Last-Modified'):
+            validators['If-Modified-Since'] = r.headers['Last-Modified']
+        if validators and r.status_code == 200 and not kwargs.get('stream'):
+            # read it now, it's returned again later
+            r.content
+            self._validated[url] = (validators, r)
+        else:
+            self._validated.pop(url, None)
+        return r
+
+    def get_json(self, url, conditional=False, **kwargs):
+        """
+        GET `url` and decode the JSON response, raise an HTTPError on an error status
+        """
+        r = self.get(url, conditional=conditional, **kwargs)
+        r.raise_for_status()
+        return r.json()
+
+    def post(self, url, **kwargs):
+        return self._send(self.session.post, url, kwargs)
+
+    def pop_stats(self):
+        """
+        Return the number of requests and the time spent in them since the last
+        call, or None when there were none
+        """
+        with self._stats_lock:
+            if not self.request_count:
+                return None
+            stats = {'http_requests': self.request_count, 'http_time': self.request_time}
+            self.request_count, self.request_time = 0, 0.0
+        return stats
+
+    def close(self):
+        self._validated.clear()
+        self.session.close()
+
+
+def retrieve_json(url, timeout=DEFAULT_TIMEOUT, session=None):
+    r = (session or requests).get(url, timeout=timeout)
     r.raise_for_status()
     return r.json()
+
+
+def iter_json_array(chunks):
+    """
+    Decode a JSON array from the chunks of its text, and yield each of its
+    elements as soon as it's complete: only one element is decoded at a time.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(chunks)
+    buf, idx, eof = '', 0, False
+    # what may come next: '[', a value or ']', a value, ',' or ']'
+    expected = '['
+    # decode once the buffer holds that many characters, it grows after an incomplete value
+    wanted = 1
+
+    while True:
+        idx = WHITESPACE.match(buf, idx).end()
+        if not eof and len(buf) - idx < wanted:
+            parts, size = [buf[idx:]], len(buf) - idx
+            while size < wanted:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    eof = True
+                    break
+                parts.append(chunk)
+                size += len(chunk)
+            buf, idx = ''.join(parts), 0
+            continue
+        if idx == len(buf):
+            raise ValueError("The JSON array is truncated")
+
+        char = buf[idx]
+        if expected == '[':
+            if char != '[':
+                raise ValueError("Expected a JSON array, got %r" % buf[idx:idx + 20])
+            idx += 1
+            expected = 'value]'
+        elif expected in (',]', 'value]') and char == ']':
+            return
+        elif expected == ',]':
+            if char != ',':
+                raise ValueError("Expected ',' or ']' in the JSON array, got %r" % buf[idx:idx + 20])
+            idx += 1
+            expected = 'value'
+        else:
+            try:
+                value, end = decoder.raw_decode(buf, idx)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                wanted = 2 * (len(buf) - idx)
+                continue
+            if end == len(buf) and not eof and not isinstance(value, (dict, list, basestring)):
+                # a number may go on in the next chunk
+                wanted = len(buf) - idx + 1
+                continue
+            yield value
+            # the next element is likely about as big, don't try to decode it before
+            idx, wanted = end, end - idx
+            expected = ',]'
@@ -6,12 +6,17 @@
 from collections import defaultdict
 import logging
 import os
+import threading
+import time
 from urlparse import urljoin
 
+# 3p
+import requests
+
 # project
 from util import check_yaml
 from utils.checkfiles import get_conf_path
-from utils.http import retrieve_json
+from utils.http import DEFAULT_TIMEOUT, JSON_CHUNK_SIZE, iter_json_array, retrieve_json
 from utils.singleton import Singleton
 from utils.dockerutil import DockerUtil
 
@@ -33,6 +38,11 @@ class KubeUtil():
     DEFAULT_CADVISOR_PORT = 4194
     DEFAULT_KUBELET_PORT = 10255
     DEFAULT_MASTER_PORT = 8080
+    DEFAULT_PODS_LIST_TTL = 10
+    # A container missing from the pod list triggers a new fetch, if it's at least this old
+    PODS_LIST_MIN_AGE = 1
+    # cAdvisor refusing the number of stats to return is asked again after that many seconds
+    CADVISOR_NUM_STATS_RETRY_INTERVAL = 600
 
     POD_NAME_LABEL = "io.kubernetes.pod.name"
     NAMESPACE_LABEL = "io.kubernetes.pod.namespace"
@@ -65,8 +75,19 @@ class KubeUtil():
 
         self.kube_health_url = '%s://%s:%d/healthz' % (self.method, self.host, self.kubelet_port)
 
+        # One session, and its connections, for the kubelet and cAdvisor
+        self.session = requests.Session()
+        # Until when cAdvisor is known not to take the number of stats to return, in a POST
+        self._cadvisor_num_stats_retry_at = 0
+
+        # The pod list is shared by the kubernetes and docker checks, and service discovery
+        self.pods_list_ttl = float(instance.get('pods_list_ttl', KubeUtil.DEFAULT_PODS_LIST_TTL))
+        self._pods_lock = threading.Lock()
+        # (fetch time, pod list, {container id: pod}, {(namespace, pod name): pod})
+        self._pods = None
+
     def get_kube_labels(self, excluded_keys=None):
-        pods = retrieve_json(self.pods_list_url)
+        pods = self.retrieve_pods_list()
         return self.extract_kube_labels(pods, excluded_keys=excluded_keys)
 
     def extract_kube_labels(self, pods_list, excluded_keys=None):
@@ -93,5 +114,76 @@ class KubeUtil():
 
         return kube_labels
 
+    def _get_pods(self, max_age):
+        """
+        The cached pod list and its indexes, fetched again from the kubelet if
+        older than `max_age` seconds. One caller at a time fetches it, the
+        others wait for it and use its result.
+        """
+        with self._pods_lock:
+            if self._pods is None or time.time() - self._pods[0] >= max_age:
+                pods_list = retrieve_json(self.pods_list_url, session=self.session)
+                by_container, by_name = {}, {}
+                for pod in pods_list.get('items') or []:
+                    metadata = pod.get('metadata', {})
+                    by_name[(metadata.get('namespace'), metadata.get('name'))] = pod
+                    for status in pod.get('status', {}).get('containerStatuses', []):
+                        container_id = status.get('containerID', '').split('//')[-1]
+                        if container_id:
+                            by_container[container_id] = pod
+                self._pods = (time.time(), pods_list, by_container, by_name)
+            return self._pods
+
     def retrieve_pods_list(self):
-        return retrieve_json(self.pods_list_url)
+        """The pod list of the kubelet, at most `pods_list_ttl` seconds old."""
+        return self._get_pods(self.pods_list_ttl)[1]
+
+    def get_pod_by_container_id(self, container_id):
+        """The pod of a container, None if it's not in a pod."""
+        pod = self._get_pods(self.pods_list_ttl)[2].get(container_id)
+        if pod is None:
+            # The container may be newer than the pod list
+            pod = self._get_pods(self.PODS_LIST_MIN_AGE)[2].get(container_id)
+        return pod
+
+    def get_pod_by_name(self, namespace, pod_name):
+        """A pod by its namespace and name, None if it's unknown."""
+        return self._get_pods(self.pods_list_ttl)[3].get((namespace, pod_name))
+
+    def retrieve_metrics(self, url=None):
+        """
+        The subcontainers of cAdvisor with their latest stats only. cAdvisor is
+        asked for the latest sample, and when it returns more anyway the older
+        ones are dropped as each subcontainer is decoded. When cAdvisor refuses
+        that request, the full history is fetched, and the request is tried
+        again every CADVISOR_NUM_STATS_RETRY_INTERVAL seconds.
+        """
+        url = url or self.metrics_url
+        r = None
+        now = time.time()
+        if now >= self._cadvisor_num_stats_retry_at:
+            r = self.session.post(url, json={'num_stats': 1}, stream=True, timeout=DEFAULT_TIMEOUT)
+            if r.status_code in (400, 404, 405, 501):
+                log.debug("cAdvisor doesn't take the number of stats to return (%s), "
+                          "falling back to the full history for %ss",
+                          r.status_code, self.CADVISOR_NUM_STATS_RETRY_INTERVAL)
+                r.close()
+                self._cadvisor_num_stats_retry_at = now + self.CADVISOR_NUM_STATS_RETRY_INTERVAL
+                r = None
+        if r is None:
+            r = self.session.get(url, stream=True, timeout=DEFAULT_TIMEOUT)
+
+        try:
+            r.raise_for_status()
+            subcontainers = []
+            for subcontainer in iter_json_array(r.iter_content(JSON_CHUNK_SIZE)):
+                subcontainer['stats'] = subcontainer.get('stats', [])[-1:]
+                subcontainers.append(subcontainer)
+            return subcontainers
+        finally:
+            r.close()
+
+    @classmethod
+    def _drop(cls):
+        if cls in cls._instances:
+            del cls._instances[cls]
@@ -0,0 +1,158 @@
+# (C) Datadog, Inc. 2010-2016
+# All rights reserved
+# Licensed under Simplified BSD License (see LICENSE)
+
+"""
+Snapshots of the process table read directly from /proc (Linux only).
+"""
+# stdlib
+import os
+import pwd
+
+
+class ProcessInfo(object):
+    """
+    What a snapshot knows about a process: the fields of /proc/<pid>/stat
+    it uses, and its user and command line.
+    """
+    __slots__ = (
+        'pid', 'name', 'state', 'ppid', 'pgrp', 'session', 'tty_nr', 'tpgid',
+        'minflt', 'cminflt', 'majflt', 'cmajflt', 'utime', 'stime', 'nice', 'num_threads', 'starttime', 'vsize', 'rss',
+        'uid', 'user', 'cmdline', 'recent_cpu',
+    )
+
+    def __init__(self, **kwargs):
+        for name in self.__slots__:
+            setattr(self, name, kwargs.get(name))
+
+
+class ProcSnapshotter(object):
+    """
+    Read the process table from /proc/<pid>/stat, without forking `ps`.
+
+    What doesn't change during the life of a process (its user, its
+    command line) is only read when the process is first seen, and reused
+    by the next snapshots as long as the pid isn't reused.
+    """
+
+    def __init__(self, procfs_path='/proc'):
+        self.procfs_path = procfs_path.rstrip('/')
+        self.clock_ticks = os.sysconf('SC_CLK_TCK')
+        self.page_size = os.sysconf('SC_PAGE_SIZE')
+        # pid -> (starttime, uid, user, cmdline)
+        self._static = {}
+        # pid -> (starttime, cpu ticks at the previous snapshot)
+        self._cpu_ticks = {}
+        # uid -> user name
+        self._users = {}
+        self._boot_time = None
+
+    def _read(self, *path):
+        with open(os.path.join(self.procfs_path, *path)) as f:
+            return f.read()
+
+    def get_user(self, uid):
+        user = self._users.get(uid)
+        if user is None:
+            try:
+                user = pwd.getpwuid(uid).pw_name
+            except KeyError:
+                user = str(uid)
+            self._users[uid] = user
+        return user
+
+    def get_boot_time(self):
+        """
+        Unix time at which the system booted
+        """
+        if self._boot_time is None:
+            for line in self._read('stat').splitlines():
+                if line.startswith('btime'):
+                    self._boot_time = int(line.split()[1])
+                    break
+        return self._boot_time
+
+    def get_uptime(self):
+        return float(self._read('uptime').split()[0])
+
+    def get_mem_total(self):
+        """
+        Physical memory of the system, in kB
+        """
+        for line in self._read('meminfo').splitlines():
+            if line.startswith('MemTotal:'):
+                return int(line.split()[1])
+        return None
+
+    def _read_process(self, pid):
+        content = self._read(pid, 'stat')
+        # The name is between parentheses, and may contain spaces and parentheses itself
+        head, _, tail = content.rpartition(')')
+        name = head.partition('(')[2]
+        fields = tail.split()
+
+        starttime = int(fields[19])
+        static = self._static.get(pid)
+        if static is None or static[0] != starttime:
+            uid = os.stat(os.path.join(self.procfs_path, pid)).st_uid
+            cmdline = self._read(pid, 'cmdline').rstrip('\0').split('\0')
+            if cmdline == ['']:
+                cmdline = []
+            static = (starttime, uid, self.get_user(uid), cmdline)
+            self._static[pid] = static
+
+        utime, stime = int(fields[11]), int(fields[12])
+        ticks = utime + stime
+        last = self._cpu_ticks.get(pid)
+        recent_cpu = ticks - last[1] if last is not None and last[0] == starttime else ticks
+        self._cpu_ticks[pid] = (starttime, ticks)
+
+        return ProcessInfo(
+            pid=int(pid),
+            name=name,
+            state=fields[0],
+            ppid=int(fields[1]),
+            pgrp=int(fields[2]),
+            session=int(fields[3]),
+            tty_nr=int(fields[4]),
+            tpgid=int(fields[5]),
+            minflt=int(fields[7]),
+            cminflt=int(fields[8]),
+            majflt=int(fields[9]),
+            cmajflt=int(fields[10]),
+            utime=utime,
+            stime=stime,
+            nice=int(fields[16]),
+            num_threads=int(fields[17]),
+            starttime=starttime,
+            vsize=int(fields[20]),
+            rss=int(fields[21]) * self.page_size,
+            uid=static[1],
+            user=static[2],
+            cmdline=static[3],
+            recent_cpu=recent_cpu,
+        )
+
+    def snapshot(self):
+        """
+        Return the ProcessInfo of the running processes, by increasing pid.
+        `recent_cpu` is the CPU time (in clock ticks) they used since the
+        previous snapshot, or since they started.
+        """
+        pids = sorted((entry for entry in os.listdir(self.procfs_path) if entry.isdigit()), key=int)
+        processes = []
+        for pid in pids:
+            try:
+                processes.append(self._read_process(pid))
+            except (IOError, OSError, IndexError, ValueError):
+                # The process exited while being read
+                continue
+
+        # Forget about the processes which exited
+        seen = set(pids)
+        for cache in (self._static, self._cpu_ticks):
+            for pid in cache.keys():
+                if pid not in seen:
+                    del cache[pid]
+
+        return processes
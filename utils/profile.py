@@ -3,14 +3,28 @@
 # Licensed under Simplified BSD License (see LICENSE)
 
 # stdlib
+from collections import defaultdict
 import cProfile  # noqa, it seems that import-names thinks it's not stdlib
 from cStringIO import StringIO
 import logging
+import os
 import pstats  # noqa, same here
+import signal
+import time
 
 log = logging.getLogger('collector')
 
 
+def process_cpu_time():
+    """
+    Return the CPU time (user + system) consumed so far by the current process, in seconds.
+    Cheap enough to be called around every check instance run. It's the time of all the
+    threads: around a check run, it includes the CPU used meanwhile by the other ones.
+    """
+    user, system = os.times()[:2]
+    return user + system
+
+
 class AgentProfiler(object):
     PSTATS_LIMIT = 20
     DUMP_TO_FILE = True
@@ -77,6 +91,104 @@ class AgentProfiler(object):
 
         return wrapped_func
 
+class SamplingProfiler(object):
+    """
+    Low-overhead statistical profiler.
+
+    Once started, the stack of the main thread is sampled every `interval` seconds of
+    CPU time (ITIMER_PROF). After `duration` seconds the samples are dumped to
+    `output_path` in the folded stacks format (`frame;frame;frame count`), which can be
+    fed as is to flamegraph.pl or speedscope. The samples stop at the deadline, they're
+    dumped by the next call to `poll`, out of the signal handler.
+    """
+    DEFAULT_INTERVAL = 0.005
+    DEFAULT_DURATION = 60
+    STACKS_DUMP_FILE = './collector-stacks.folded'
+
+    def __init__(self, output_path=None, duration=None, interval=None):
+        self.output_path = output_path or self.STACKS_DUMP_FILE
+        self.duration = float(duration or self.DEFAULT_DURATION)
+        self.interval = float(interval or self.DEFAULT_INTERVAL)
+        self._samples = defaultdict(int)
+        self._deadline = None
+        # Set by the signal handler once the deadline is reached
+        self._expired = False
+        self._previous_handler = None
+
+    @staticmethod
+    def is_supported():
+        return hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+    def is_running(self):
+        return self._deadline is not None
+
+    def start(self):
+        """
+        Start sampling for `duration` seconds. Returns False if the profiler could not be started.
+        """
+        if not self.is_supported():
+            log.warning("Sampling profiler is not supported on this platform")
+            return False
+        if self.is_running():
+            log.info("Sampling profiler is already running")
+            return False
+
+        self._samples.clear()
+        self._expired = False
+        self._previous_handler = signal.signal(signal.SIGPROF, self._sample)
+        # Restart the system calls the signal interrupts, instead of failing them with EINTR
+        signal.siginterrupt(signal.SIGPROF, False)
+        self._deadline = time.time() + self.duration
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        log.info("Sampling profiler started for %ss", self.duration)
+        return True
+
+    def stop(self):
+        """
+        Stop sampling and dump the collected stacks.
+        """
+        if not self.is_running():
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self._previous_handler = None
+        self._deadline = None
+        try:
+            self.dump()
+        except Exception:
+            log.exception("Cannot dump sampling profiler output to %s", self.output_path)
+
+    def poll(self):
+        """
+        Stop the profiler and dump its samples if its window has elapsed. The main loop calls
+        this regularly.
+        """
+        if self.is_running() and (self._expired or time.time() >= self._deadline):
+            self.stop()
+
+    def _sample(self, signum, frame):
+        if self._expired:
+            return
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append("%s (%s:%d)" % (code.co_name, code.co_filename, code.co_firstlineno))
+            frame = frame.f_back
+        stack.reverse()
+        self._samples[';'.join(stack)] += 1
+
+        if time.time() >= self._deadline:
+            signal.setitimer(signal.ITIMER_PROF, 0, 0)
+            self._expired = True
+
+    def dump(self):
+        with open(self.output_path, 'w') as f:
+            for stack, count in sorted(self._samples.iteritems()):
+                f.write("%s %d\n" % (stack, count))
+        log.info("Sampling profiler dumped %d samples to %s",
+                 sum(self._samples.itervalues()), self.output_path)
+
+
 def pretty_statistics(stats):
     #FIXME: This should really be clever enough to handle more varied statistics
     # Right now memory_info is the only one that we will predictably have 'before' and 'after'
@@ -100,3 +212,24 @@ def pretty_statistics(stats):
                        mem_before['vms'], mem_after['vms'], mem_after['vms'] - mem_before['vms'])
     else:
         return ""
+
+
+def pretty_instance_check_stats(stats):
+    """
+    Format the per-instance run statistics recorded by `AgentCheck.run`
+    """
+    line = "%.3fs" % stats.get('run_time', 0)
+    if stats.get('cpu_time') is not None:
+        line += " (CPU %.3fs)" % stats['cpu_time']
+    if stats.get('http_requests'):
+        line += ", %s HTTP requests in %.3fs" % (stats['http_requests'], stats.get('http_time', 0))
+    return line
+
+
+def pretty_run_stats(stats):
+    """
+    Format the per-check run statistics recorded by the collector
+    """
+    return "run time %.3fs, CPU time %.3fs, flush time %.3fs, %s contexts" % (
+        stats.get('run_time', 0), stats.get('cpu_time', 0),
+        stats.get('flush_time', 0), stats.get('context_count', 0))
@@ -6,6 +6,7 @@
 import logging
 import simplejson as json
 from os import path
+import threading
 
 # 3p
 from requests.packages.urllib3.exceptions import TimeoutError
@@ -24,6 +25,10 @@ CHECK_NAMES = 'check_names'
 INIT_CONFIGS = 'init_configs'
 INSTANCES = 'instances'
 
+# How long a watch of the templates blocks on the backend before it's issued again
+DEFAULT_WATCH_TIMEOUT = 60
+WATCH_RETRY_INTERVAL = 5
+
 
 class KeyNotFound(Exception):
     pass
@@ -35,6 +40,10 @@ class AbstractConfigStore(object):
 
     previous_config_index = None
 
+    # {identifier: {param: raw value}}, kept up to date by the watcher once it's started
+    _templates = None
+    _watcher = None
+
     def __init__(self, agentConfig):
         self.client = None
         self.agentConfig = agentConfig
@@ -42,11 +51,17 @@ class AbstractConfigStore(object):
         self.client = self.get_client()
         self.sd_template_dir = agentConfig.get('sd_template_dir')
         self.auto_conf_images = get_auto_conf_images(agentConfig)
+        self.watch_templates = agentConfig.get('sd_watch_templates', True)
+        self.watch_timeout = DEFAULT_WATCH_TIMEOUT
+        self._changes_lock = threading.Lock()
+        self._changed_checks = set()
+        self._stop_watcher = threading.Event()
 
     @classmethod
     def _drop(cls):
         """Drop the config store instance. This is only used for testing."""
         if cls in cls._instances:
+            cls._instances[cls].stop_watcher()
             del cls._instances[cls]
 
     def _extract_settings(self, config):
@@ -61,6 +76,92 @@ class AbstractConfigStore(object):
     def dump_directory(self, path, **kwargs):
         raise NotImplementedError()
 
+    def _read_templates(self, path, index=None, timeout=None):
+        """
+        Return the index of the backend and the templates under `path` as
+        {identifier: {param: raw value}}. With an index, block up to `timeout`
+        seconds until the templates change after it, and return None if they didn't.
+        """
+        raise NotImplementedError()
+
+    @staticmethod
+    def _index_templates(path, items):
+        """Group (key, value) pairs of the template directory `path` by identifier"""
+        prefix = path.strip('/') + '/'
+        templates = {}
+        for key, value in items:
+            key = key.lstrip('/')
+            if not key.startswith(prefix):
+                continue
+            identifier, _, param = key[len(prefix):].rpartition('/')
+            if identifier and param:
+                templates.setdefault(identifier, {})[param] = value
+        return templates
+
+    def start_watcher(self):
+        """Keep the templates in memory, updated by watching the backend in a thread"""
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop_watcher = threading.Event()
+        self._watcher = threading.Thread(target=self._watch_templates, args=(self._stop_watcher,),
+                                         name='sd-template-watcher')
+        self._watcher.daemon = True
+        self._watcher.start()
+
+    def stop_watcher(self):
+        """Stop the watcher, the templates are read from the backend again"""
+        if self._watcher is None:
+            return
+        self._stop_watcher.set()
+        self._watcher = None
+        self._templates = None
+
+    def _watch_templates(self, stop):
+        index = None
+        while not stop.is_set():
+            try:
+                res = self._read_templates(self.sd_template_dir, index=index, timeout=self.watch_timeout)
+            except Exception as ex:
+                log.warning('Failed to watch the configuration templates, retrying in %ss: %s',
+                            WATCH_RETRY_INTERVAL, ex)
+                index = None
+                stop.wait(WATCH_RETRY_INTERVAL)
+                continue
+            if res is None or stop.is_set():
+                continue
+            index, templates = res
+            self._update_templates(templates)
+
+    def _update_templates(self, templates):
+        """Swap in the new templates and remember the checks they changed"""
+        previous = self._templates
+        self._templates = templates
+        if previous is None:
+            return
+
+        changed = set()
+        for identifier in set(previous) | set(templates):
+            if previous.get(identifier) == templates.get(identifier):
+                continue
+            log.debug('The configuration template of %s changed.', identifier)
+            for template in (previous.get(identifier), templates.get(identifier)):
+                changed.update(self._template_check_names(identifier, template))
+        if changed:
+            with self._changes_lock:
+                self._changed_checks.update(changed)
+
+    def _template_check_names(self, identifier, template):
+        """Names of the checks a template configures, or of its auto-configuration without it"""
+        if template is None:
+            auto_conf_check = self.auto_conf_images.get(identifier.split(':')[0])
+            return [auto_conf_check] if auto_conf_check else []
+        try:
+            return json.loads(template.get(CHECK_NAMES) or '[]')
+        except json.JSONDecodeError:
+            log.error('Could not decode the check names of the configuration template '
+                      'for the container with ident %s.' % identifier)
+            return []
+
     def _get_auto_config(self, image_name):
         # use the image name, ignore the tag
         if image_name.split(':')[0] in self.auto_conf_images:
@@ -172,6 +273,16 @@ class AbstractConfigStore(object):
         return source, check_names, init_config_tpls, instance_tpls
 
     def _issue_read(self, identifier):
+        templates = self._templates
+        if templates is not None:
+            if identifier not in templates:
+                raise KeyNotFound("The key %s was not found in the templates" % identifier)
+            template = templates[identifier]
+            try:
+                return [json.loads(template[param]) for param in (CHECK_NAMES, INIT_CONFIGS, INSTANCES)]
+            except KeyError as ex:
+                raise KeyNotFound("The key %s/%s was not found in the templates" % (identifier, ex.args[0]))
+
         try:
             check_names = json.loads(
                 self.client_read(path.join(self.sd_template_dir, identifier, CHECK_NAMES).lstrip('/')))
@@ -184,7 +295,20 @@ class AbstractConfigStore(object):
             return None
 
     def crawl_config_template(self):
-        """Return whether or not configuration templates have changed since the previous crawl"""
+        """
+        Return whether or not configuration templates have changed since the previous crawl.
+        When they are watched, return the names of the checks they changed instead.
+        """
+        if self.watch_templates:
+            self.start_watcher()
+            with self._changes_lock:
+                changed_checks, self._changed_checks = self._changed_checks, set()
+            if changed_checks:
+                log.info('Detected an update in config template, reloading the configs of %s...'
+                         % ', '.join(sorted(changed_checks)))
+                return changed_checks
+            return False
+
         try:
             config_index = self.client_read(self.sd_template_dir.lstrip('/'), recursive=True, watch=True)
         except KeyNotFound:
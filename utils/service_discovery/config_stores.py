@@ -41,6 +41,9 @@ def extract_sd_config(config):
     if config.has_option('Main', 'sd_backend_port'):
         sd_config['sd_backend_port'] = config.get(
             'Main', 'sd_backend_port')
+    if config.has_option('Main', 'sd_watch_templates'):
+        sd_config['sd_watch_templates'] = config.get(
+            'Main', 'sd_watch_templates').lower() in ("yes", "true")
     return sd_config
 
 
@@ -76,3 +76,12 @@ class ConsulStore(AbstractConfigStore):
             templates[image][param] = value
 
         return templates
+
+    def _read_templates(self, path, index=None, timeout=None):
+        """Read the directory, with a blocking query if an index is given"""
+        path = path.lstrip('/')
+        wait = '%ss' % timeout if index is not None and timeout else None
+        new_index, leaves = self.client.kv.get(path, recurse=True, index=index, wait=wait)
+        if index is not None and new_index == index:
+            return None
+        return new_index, self._index_templates(path, [(leaf.get('Key'), leaf.get('Value')) for leaf in leaves or []])
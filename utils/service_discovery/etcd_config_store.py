@@ -4,7 +4,7 @@
 
 from requests.packages.urllib3.exceptions import TimeoutError
 
-from etcd import EtcdKeyNotFound
+from etcd import EtcdEventIndexCleared, EtcdKeyNotFound, EtcdWatchTimedOut
 from etcd import Client as etcd_client
 from utils.service_discovery.abstract_config_store import AbstractConfigStore, KeyNotFound
 
@@ -76,3 +76,22 @@ class EtcdStore(AbstractConfigStore):
             templates[image][param] = value
 
         return templates
+
+    def _read_templates(self, path, index=None, timeout=None):
+        """Wait for a change of the directory after `index`, then read all of it"""
+        if index is not None:
+            try:
+                self.client.read(path, recursive=True, wait=True, waitIndex=index + 1, timeout=timeout)
+            except (EtcdWatchTimedOut, TimeoutError):
+                return None
+            except EtcdEventIndexCleared:
+                # etcd doesn't keep the history back to `index` anymore, read everything again
+                pass
+
+        try:
+            directory = self.client.read(path, recursive=True, timeout=DEFAULT_TIMEOUT)
+        except EtcdKeyNotFound as ex:
+            # there is no template yet, watch for the directory
+            return (ex.payload or {}).get('index'), {}
+        return directory.etcd_index, self._index_templates(
+            path, [(leaf.key, leaf.value) for leaf in directory.leaves if not leaf.dir])
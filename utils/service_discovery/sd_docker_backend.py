@@ -21,6 +21,7 @@ class SDDockerBackend(AbstractSDBackend):
 
     def __init__(self, agentConfig):
         self.docker_client = DockerUtil().client
+        self.inventory = DockerUtil().get_inventory()
         if is_k8s():
             self.kubeutil = KubeUtil()
 
@@ -67,17 +68,11 @@ class SDDockerBackend(AbstractSDBackend):
             # kubernetes case
             log.debug("Couldn't find the IP address for container %s (%s), "
                       "using the kubernetes way." % (c_id[:12], c_img))
-            pod_list = self.kubeutil.retrieve_pods_list().get('items', [])
-            for pod in pod_list:
+            pod = self.kubeutil.get_pod_by_container_id(c_id)
+            if pod is not None:
                 pod_ip = pod.get('status', {}).get('podIP')
-                if pod_ip is None:
-                    continue
-                else:
-                    c_statuses = pod.get('status', {}).get('containerStatuses', [])
-                    for status in c_statuses:
-                        # compare the container id with those of containers in the current pod
-                        if c_id == status.get('containerID', '').split('//')[-1]:
-                            return pod_ip
+                if pod_ip is not None:
+                    return pod_ip
 
         log.error("No IP address was found for container %s (%s)" % (c_id[:12], c_img))
         return None
@@ -197,12 +192,9 @@ class SDDockerBackend(AbstractSDBackend):
 
     def _get_kube_config(self, c_id, key):
         """Get a part of a pod config from the kubernetes API"""
-        pods = self.kubeutil.retrieve_pods_list().get('items', [])
-        for pod in pods:
-            c_statuses = pod.get('status', {}).get('containerStatuses', [])
-            for status in c_statuses:
-                if c_id == status.get('containerID', '').split('//')[-1]:
-                    return pod.get(key, {})
+        pod = self.kubeutil.get_pod_by_container_id(c_id)
+        if pod is not None:
+            return pod.get(key, {})
 
     def get_configs(self):
         """Get the config for all docker containers running on the host."""
@@ -210,7 +202,7 @@ class SDDockerBackend(AbstractSDBackend):
         containers = [(
             container.get('Image'),
             container.get('Id'), container.get('Labels')
-        ) for container in self.docker_client.containers()]
+        ) for container in self._get_running_containers()]
 
         # used by the configcheck agent command to trace where check configs come from
         trace_config = self.agentConfig.get(TRACE_CONFIG, False)
@@ -247,13 +239,23 @@ class SDDockerBackend(AbstractSDBackend):
                               'discovery failed, leaving it alone.' % (cid[:12], image))
         return configs
 
+    def _get_running_containers(self):
+        if self.inventory is not None:
+            return self.inventory.containers(running=True)
+        return self.docker_client.containers()
+
+    def _inspect_container(self, c_id):
+        if self.inventory is not None:
+            return self.inventory.inspect(c_id)
+        return self.docker_client.inspect_container(c_id)
+
     def get_config_id(self, image, labels):
         """Look for a DATADOG_ID label, return its value or the image name if missing"""
         return labels.get(DATADOG_ID) or image
 
     def _get_check_configs(self, c_id, identifier, trace_config=False):
         """Retrieve configuration templates and fill them with data pulled from docker and tags."""
-        inspect = self.docker_client.inspect_container(c_id)
+        inspect = self._inspect_container(c_id)
         config_templates = self._get_config_templates(identifier, trace_config=trace_config)
         if not config_templates:
             log.debug('No config template for container %s with identifier %s. '
@@ -2,105 +2,323 @@
 # All rights reserved
 # Licensed under Simplified BSD License (see LICENSE)
 
+# stdlib
 import binascii
+import ctypes
+import ctypes.util
+import errno
 import os
+import time
 from stat import ST_INO, ST_SIZE
 
+# project
+from utils.platform import Platform
+
+
+class InotifyWatch(object):
+    """
+    Watch a file and its directory with inotify, to tell whether it may
+    have changed (written, truncated, rotated) since the last call.
+    """
+
+    IN_NONBLOCK = 0o4000
+    IN_MODIFY = 0x2
+    IN_ATTRIB = 0x4
+    IN_MOVED_FROM = 0x40
+    IN_MOVED_TO = 0x80
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    IN_DELETE_SELF = 0x400
+    IN_MOVE_SELF = 0x800
+
+    FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+    DIR_EVENTS = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+    _libc = None
+
+    @classmethod
+    def is_supported(cls):
+        if not Platform.is_linux():
+            return False
+        if cls._libc is None:
+            try:
+                libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+                libc.inotify_init1
+                cls._libc = libc
+            except (OSError, AttributeError):
+                cls._libc = False
+        return bool(cls._libc)
+
+    def __init__(self, path):
+        self._path = path
+        self._fd = self._libc.inotify_init1(self.IN_NONBLOCK)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self._file_wd = None
+        self._add_watch(os.path.dirname(os.path.abspath(path)), self.DIR_EVENTS)
+        self.watch_file()
+
+    def _add_watch(self, path, mask):
+        wd = self._libc.inotify_add_watch(self._fd, path, mask)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_add_watch failed on %s" % path)
+        return wd
+
+    def watch_file(self):
+        """(Re)watch the file at the path, after it has been (re)opened"""
+        if self._file_wd is not None:
+            self._libc.inotify_rm_watch(self._fd, self._file_wd)
+            self._file_wd = None
+        try:
+            self._file_wd = self._add_watch(self._path, self.FILE_EVENTS)
+        except OSError:
+            # The file doesn't exist (yet), the directory watch reports its creation
+            pass
+        # The file is read right after, discard the events until now
+        self.changed()
+
+    def changed(self):
+        """Drain the pending events, return True if there were any"""
+        changed = False
+        while True:
+            try:
+                if not os.read(self._fd, 4096):
+                    break
+                changed = True
+            except OSError as e:
+                if e.errno == errno.EAGAIN:
+                    break
+                raise
+        return changed
+
+    def close(self):
+        os.close(self._fd)
+
 
 class TailFile(object):
+    """
+    Follow a file, calling back on each new line.
+
+    The file is read in large chunks, split into lines in memory, and
+    checked for rotation or truncation (inode, size and CRC of its first
+    bytes) once per poll only, keeping a single handle open. With
+    `use_inotify` (Linux only), polls are skipped altogether while the
+    file and its directory don't change.
+
+    The position in the file can be checkpointed with `get_state`, and
+    given back to `tail` to resume from it.
+    """
 
     CRC_SIZE = 16
+    CHUNK_SIZE = 256 * 1024
+    # Poll even without inotify events every so often, in case some were missed
+    INOTIFY_POLL_INTERVAL = 60
 
-    def __init__(self, logger, path, callback):
+    def __init__(self, logger, path, callback, use_inotify=False):
         self._path = path
         self._f = None
         self._inode = None
         self._size = 0
         self._crc = None
+        self._buffer = ''
         self._log = logger
         self._callback = callback
+        self._use_inotify = use_inotify
+        self._watch = None
+        self._last_poll = 0
+        # Per poll budget
+        self._max_bytes = None
+        self._max_lines = None
+        self._read_bytes = 0
+        self._read_lines_count = 0
+        self._exhausted = False
 
-    def _open_file(self, move_end=False, pos=False):
-
-        already_open = False
-        # close and reopen to handle logrotate
+    def _open_file(self, move_end=False, state=None):
         if self._f is not None:
             self._f.close()
             self._f = None
-            already_open = True
-
-        stat = os.stat(self._path)
-        inode = stat[ST_INO]
-        size = stat[ST_SIZE]
-
-        # Compute CRC of the beginning of the file
-        crc = None
-        if size >= self.CRC_SIZE:
-            tmp_file = open(self._path, 'r')
-            data = tmp_file.read(self.CRC_SIZE)
-            crc = binascii.crc32(data)
-
-        if already_open:
-            # Check if file has been removed
-            if self._inode is not None and inode != self._inode:
-                self._log.debug("File removed, reopening")
-                move_end = False
-                pos = False
-
-            # Check if file has been truncated
-            elif self._size > 0 and size < self._size:
-                self._log.debug("File truncated, reopening")
-                move_end = False
-                pos = False
-
-            # Check if file has been truncated and too much data has
-            # alrady been written (copytruncate and opened files...)
-            if size >= self.CRC_SIZE and self._crc is not None and crc != self._crc:
-                self._log.debug("Begining of file modified, reopening")
-                move_end = False
-                pos = False
-
-        self._inode = inode
-        self._size = size
-        self._crc = crc
+        self._buffer = ''
 
         self._f = open(self._path, 'r')
-        if move_end:
+        stat = os.fstat(self._f.fileno())
+        self._inode = stat[ST_INO]
+        self._size = stat[ST_SIZE]
+        self._crc = self._head_crc()
+
+        if state is not None and self._can_resume(state):
+            self._log.debug("Resuming file %s at %s" % (self._path, state['offset']))
+            self._f.seek(state['offset'])
+        elif state is not None:
+            self._log.debug("File %s changed since its checkpoint, reading it from the start" % (self._path))
+        elif move_end:
             self._log.debug("Opening file %s" % (self._path))
             self._f.seek(0, os.SEEK_END)
-        elif pos:
-            self._log.debug("Reopening file %s at %s" % (self._path, pos))
-            self._f.seek(pos)
+        else:
+            self._log.debug("Reopening file %s" % (self._path))
 
-        return True
+        if self._watch is not None:
+            self._watch.watch_file()
 
-    def tail(self, line_by_line=True, move_end=True):
+    def _can_resume(self, state):
+        """Whether the checkpointed state is a position in the open file"""
+        return state.get('inode') == self._inode \
+            and state.get('crc') == self._crc \
+            and 0 <= state.get('offset', -1) <= self._size
+
+    def get_state(self):
+        """
+        Checkpoint of the position in the file: the offset of the first
+        line not read yet, with the inode and head CRC of the file.
+        """
+        if self._f is None:
+            return None
+        return {
+            'inode': self._inode,
+            'crc': self._crc,
+            'offset': self._f.tell() - len(self._buffer),
+        }
+
+    def get_backlog(self):
+        """Number of bytes written to the file and not read yet"""
+        if self._f is None:
+            return 0
+        return max(os.fstat(self._f.fileno())[ST_SIZE] - self.get_state()['offset'], 0)
+
+    def _head_crc(self):
+        """CRC of the first bytes of the open file, None if it's too small"""
+        pos = self._f.tell()
+        self._f.seek(0)
+        data = self._f.read(self.CRC_SIZE)
+        self._f.seek(pos)
+        if len(data) < self.CRC_SIZE:
+            return None
+        return binascii.crc32(data)
+
+    def _check_truncation(self, size):
+        """
+        Reopen the file if it was truncated, return whether it was.
+        """
+        self._size = size
+        if size < self._f.tell():
+            self._log.debug("File truncated, reopening")
+            self._open_file()
+            return True
+
+        # Check if file has been truncated and too much data has
+        # already been written (copytruncate and opened files...)
+        if size >= self.CRC_SIZE:
+            crc = self._head_crc()
+            if self._crc is None:
+                self._crc = crc
+            elif crc != self._crc:
+                self._log.debug("Beginning of file modified, reopening")
+                self._open_file()
+                return True
+
+        return False
+
+    def _poll(self):
+        """
+        Yield the new lines of the file, following its truncations and
+        rotations. The path is only stat'ed once.
+        """
+        try:
+            stat = os.stat(self._path)
+        except OSError:
+            # Removed and not recreated yet, keep following the current one
+            stat = None
+
+        replaced = stat is not None and stat[ST_INO] != self._inode
+        if stat is not None and not replaced:
+            self._check_truncation(stat[ST_SIZE])
+
+        for line in self._read_lines():
+            yield line
+
+        if replaced and not self._exhausted:
+            # Lines written to the rotated file were read, switch to the new one
+            self._log.debug("File removed, reopening")
+            self._open_file()
+            for line in self._read_lines():
+                yield line
+
+    def _should_poll(self):
+        if self._watch is None or self._exhausted:
+            return True
+        now = time.time()
+        if self._watch.changed() or now - self._last_poll >= self.INOTIFY_POLL_INTERVAL:
+            self._last_poll = now
+            return True
+        return False
+
+    def _read_lines(self):
+        """
+        Read the file until its end or the end of the budget of the poll,
+        and yield the complete lines.
+        """
+        while not self._exhausted:
+            offset = self._f.tell() - len(self._buffer)
+            data = self._f.read(self.CHUNK_SIZE)
+            if not data:
+                return
+            lines = (self._buffer + data).split('\n')
+            # The last line is incomplete, keep it for the next read
+            self._buffer = lines.pop()
+            for i, line in enumerate(lines):
+                offset += len(line) + 1
+                # a truncate may have create holes in the file
+                yield line.strip('\x00')
+
+                self._read_bytes += len(line) + 1
+                self._read_lines_count += 1
+                if (self._max_bytes and self._read_bytes >= self._max_bytes) or \
+                        (self._max_lines and self._read_lines_count >= self._max_lines):
+                    self._exhausted = True
+                    if i < len(lines) - 1:
+                        # Resume right after this line at the next poll
+                        self._f.seek(offset)
+                        self._buffer = ''
+                    return
+
+    def tail(self, line_by_line=True, move_end=True, state=None, max_bytes=None, max_lines=None):
         """Read line-by-line and run callback on each line.
         line_by_line: yield each time a callback has returned True
-        move_end: start from the last line of the log"""
+        move_end: start from the last line of the log
+        state: checkpoint to resume from, see `get_state`
+        max_bytes, max_lines: budget of each poll, the rest of the file is
+        read by the next ones"""
+        self._max_bytes = max_bytes
+        self._max_lines = max_lines
         try:
-            self._open_file(move_end=move_end)
+            if self._use_inotify and InotifyWatch.is_supported():
+                try:
+                    self._watch = InotifyWatch(self._path)
+                except OSError as e:
+                    self._log.warning("Unable to watch %s with inotify, polling it: %s", self._path, e)
+            self._open_file(move_end=move_end, state=state)
+            self._last_poll = time.time()
 
             while True:
-                pos = self._f.tell()
-                line = self._f.readline()
-                if line:
-                    line = line.strip(chr(0))  # a truncate may have create holes in the file
-                    if self._callback(line.rstrip("\n")):
-                        if line_by_line:
-                            yield True
-                            pos = self._f.tell()
-                            self._open_file(move_end=False, pos=pos)
-                        else:
-                            continue
-                    else:
-                        continue
-                else:
+                self._read_bytes = 0
+                self._read_lines_count = 0
+                self._exhausted = False
+                for line in self._poll():
+                    if self._callback(line) and line_by_line:
+                        yield True
+
+                yield True
+                while not self._should_poll():
                     yield True
-                    assert pos == self._f.tell()
-                    self._open_file(move_end=False, pos=pos)
 
         except Exception as e:
             # log but survive
             self._log.exception(e)
             raise StopIteration(e)
+
+    def close(self):
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        if self._watch is not None:
+            self._watch.close()
+            self._watch = None